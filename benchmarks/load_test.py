@@ -0,0 +1,432 @@
+"""
+Load generator for the convert → clean → chunk → generate path.
+
+Runs N concurrent sessions against a Marker API and an OpenAI-compatible
+LLM endpoint (real ones, or the stand-ins in mock_servers.py). Each
+session repeatedly converts a PDF with marker_client, cleans and chunks
+the markdown, and generates cards for the chunks with
+generate_cards_concurrently, the same way the web interface does. The
+report gives throughput and latency percentiles per stage and per LLM
+request, which is what worker counts and concurrency limits are sized
+from.
+
+Usage:
+  python benchmarks/mock_servers.py marker --port 8080 --latency 2 --workers 2 &
+  python benchmarks/mock_servers.py llm --port 8001 --latency 0.5 --tokens-per-sec 80 &
+  python benchmarks/load_test.py --sessions 8 --iterations 3
+  python benchmarks/load_test.py --sessions 16 --duration 120 --output load.json
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from anki_core import (  # noqa: E402
+    build_packed_prompt,
+    build_prompt,
+    parse_cards_from_output,
+    parse_packed_cards_from_output,
+)
+from concurrent_generation import DEFAULT_MAX_CONCURRENCY, generate_cards_concurrently  # noqa: E402
+from file_fingerprint import hash_file  # noqa: E402
+from markdown_chunker import chunk_markdown, estimate_tokens_many  # noqa: E402
+from markdown_cleaner import clean_markdown  # noqa: E402
+from marker_client import RETRY_STATUS_CODES, MarkerClient, convert_pdf_to_markdown  # noqa: E402
+from pdf2anki_types import Card  # noqa: E402
+from prompt_packing import pack_sections, packing_budget  # noqa: E402
+
+SYSTEM_MESSAGE = "You are a helpful assistant that creates educational flashcards."
+MAX_COMPLETION_TOKENS = 2000
+
+
+@dataclass
+class LoadTestConfig:
+    """
+    Parameters of a load test run.
+
+    Attributes:
+        marker_url: Marker API base URL
+        llm_url: OpenAI-compatible base URL (e.g. http://localhost:8001/v1)
+        sessions: Concurrent sessions
+        iterations: Documents per session (ignored when duration_sec is set)
+        duration_sec: Keep starting documents until this many seconds have passed
+        pages: Pages of the generated test PDF
+        max_tokens: Maximum tokens per chunk
+        cards_per_chunk: Cards requested per chunk
+        max_cards: Cards requested per document at most (default: every chunk gets cards_per_chunk)
+        generate_workers: Parallel LLM requests per session
+        context_tokens: Pack consecutive chunks into requests for a model with
+            this context window (default: one request per chunk)
+        note_type: "basic" or "cloze"
+        model: Model name sent to the LLM endpoint
+        api_key: Bearer token for the LLM endpoint, if it needs one
+        streaming: Stream conversion uploads and responses (see convert_pdf_to_markdown)
+        timeout_sec: HTTP timeout per request
+    """
+    marker_url: str = "http://localhost:8080"
+    llm_url: str = "http://localhost:8001/v1"
+    sessions: int = 4
+    iterations: int = 3
+    duration_sec: Optional[float] = None
+    pages: int = 10
+    max_tokens: int = 2000
+    cards_per_chunk: int = 3
+    max_cards: Optional[int] = None
+    generate_workers: int = DEFAULT_MAX_CONCURRENCY
+    context_tokens: Optional[int] = None
+    note_type: str = "basic"
+    model: str = "mock"
+    api_key: Optional[str] = None
+    streaming: bool = False
+    timeout_sec: int = 300
+
+
+@dataclass
+class DocumentRun:
+    """Timings of one document processed by one session."""
+    session: int
+    iteration: int
+    ok: bool = False
+    error: Optional[str] = None
+    convert_sec: float = 0.0
+    process_sec: float = 0.0
+    generate_sec: float = 0.0
+    total_sec: float = 0.0
+    chunks: int = 0
+    cards: int = 0
+    llm_requests: int = 0
+    llm_failures: int = 0
+    llm_latencies: List[float] = field(default_factory=list)
+
+
+def write_test_pdf(path: Path, pages: int, title: str) -> Path:
+    """Write a PDF with ``pages`` blank pages; ``title`` makes its SHA256 unique."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(max(1, pages)):
+        writer.add_blank_page(width=612, height=792)
+    writer.add_metadata({"/Title": title})
+    with path.open("wb") as f:
+        writer.write(f)
+    return path
+
+
+def _llm_session(pool_size: int, max_retries: int = 2) -> requests.Session:
+    """Pooled session retrying 429/5xx like the OpenAI client does."""
+    retry = Retry(
+        total=max_retries,
+        status=max_retries,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"POST"}),
+        backoff_factor=0.5,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class LoadTest:
+    """
+    Drives concurrent sessions and collects per-document timings.
+
+    Sessions share one pooled MarkerClient and one LLM session, like
+    concurrent users of a single server process.
+    """
+
+    def __init__(self, config: LoadTestConfig) -> None:
+        self.config = config
+        self.runs: List[DocumentRun] = []
+        self._lock = threading.Lock()
+        sessions = max(1, config.sessions)
+        self.marker = MarkerClient(config.marker_url, timeout_seconds=config.timeout_sec, pool_maxsize=sessions)
+        self.llm = _llm_session(pool_size=sessions * max(1, config.generate_workers))
+        self.headers = {"Authorization": f"Bearer {config.api_key}"} if config.api_key else {}
+
+    def close(self) -> None:
+        self.marker.close()
+        self.llm.close()
+
+    def complete(self, prompt: str) -> str:
+        """Send one chat completion request and return the reply text."""
+        response = self.llm.post(
+            self.config.llm_url.rstrip("/") + "/chat/completions",
+            json={
+                "model": self.config.model,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_MESSAGE},
+                    {"role": "user", "content": prompt},
+                ],
+                "max_completion_tokens": MAX_COMPLETION_TOKENS,
+            },
+            headers=self.headers,
+            timeout=self.config.timeout_sec,
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"] or ""
+
+    def run_document(self, session: int, iteration: int, pdf_path: Path, pdf_sha256: str, workdir: Path) -> DocumentRun:
+        """Convert, process and generate cards for one document."""
+        config = self.config
+        run = DocumentRun(session=session, iteration=iteration)
+        started = time.perf_counter()
+        try:
+            paths = convert_pdf_to_markdown(
+                pdf_path=pdf_path,
+                api_base_url=config.marker_url,
+                output_root=workdir,
+                timeout_seconds=config.timeout_sec,
+                use_cache=False,
+                streaming=config.streaming,
+                client=self.marker,
+                source_sha256=pdf_sha256,
+            )
+            markdown = paths.markdown_path.read_text(encoding="utf-8")
+            converted = time.perf_counter()
+            run.convert_sec = converted - started
+
+            cleaned = clean_markdown(markdown).cleaned_text
+            chunks = chunk_markdown(cleaned, pdf_sha256=pdf_sha256, max_tokens=config.max_tokens).chunks
+            processed = time.perf_counter()
+            run.process_sec = processed - converted
+            run.chunks = len(chunks)
+
+            latencies: List[float] = []
+
+            if config.context_tokens:
+                budget = packing_budget(
+                    SYSTEM_MESSAGE + build_packed_prompt(config.note_type, "mixed", []),
+                    MAX_COMPLETION_TOKENS,
+                    config.context_tokens,
+                )
+                packs = pack_sections(
+                    estimate_tokens_many([chunk.text for chunk in chunks]), config.cards_per_chunk, budget
+                )
+            else:
+                packs = [[index] for index in range(len(chunks))]
+
+            def generate(pack: List[int], requested: int) -> List[Card]:
+                counts = [min(config.cards_per_chunk, requested - config.cards_per_chunk * i) for i in range(len(pack))]
+                sections = [(chunks[index].text, count) for index, count in zip(pack, counts) if count > 0]
+                if len(sections) == 1:
+                    prompt = build_prompt(config.note_type, sections[0][1], "mixed", sections[0][0])
+                else:
+                    prompt = build_packed_prompt(config.note_type, "mixed", sections)
+                sent = time.perf_counter()
+                content = self.complete(prompt)
+                latencies.append(time.perf_counter() - sent)
+                if len(sections) == 1:
+                    return parse_cards_from_output(content, config.note_type)
+                by_section = parse_packed_cards_from_output(content, config.note_type, len(sections))
+                return [card for cards in by_section for card in cards]
+
+            def failed(pack, error: BaseException) -> None:
+                run.llm_failures += 1
+                run.error = f"{type(error).__name__}: {error}"
+
+            num_cards = config.max_cards if config.max_cards is not None else len(chunks) * config.cards_per_chunk
+            outcome = generate_cards_concurrently(
+                packs,
+                generate,
+                num_cards=num_cards,
+                cards_per_chunk=config.cards_per_chunk,
+                max_concurrency=config.generate_workers,
+                on_error=failed,
+                cards_for=lambda pack: config.cards_per_chunk * len(pack),
+                poll_interval=0.05,
+            )
+            run.generate_sec = time.perf_counter() - processed
+            run.cards = len(outcome.cards)
+            run.llm_requests = outcome.completed_chunks
+            run.llm_latencies = latencies
+            run.ok = outcome.failed_chunks == 0
+        except Exception as e:
+            run.error = f"{type(e).__name__}: {e}"
+        run.total_sec = time.perf_counter() - started
+        return run
+
+    def run_session(self, session: int, deadline: Optional[float]) -> None:
+        config = self.config
+        with tempfile.TemporaryDirectory(prefix=f"pdf2anki_load_{session}_") as tmp:
+            workdir = Path(tmp)
+            # Each session uploads its own PDF so conversions land in separate directories
+            pdf_path = write_test_pdf(workdir / f"session_{session}.pdf", config.pages, f"load test session {session}")
+            pdf_sha256 = hash_file(pdf_path)
+            iteration = 0
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        break
+                elif iteration >= config.iterations:
+                    break
+                run = self.run_document(session, iteration, pdf_path, pdf_sha256, workdir)
+                with self._lock:
+                    self.runs.append(run)
+                iteration += 1
+
+    def run(self) -> dict:
+        """Run all sessions to completion and return the report."""
+        sessions = max(1, self.config.sessions)
+        started = time.perf_counter()
+        deadline = started + self.config.duration_sec if self.config.duration_sec else None
+        with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="load-session") as executor:
+            for future in [executor.submit(self.run_session, i, deadline) for i in range(sessions)]:
+                future.result()
+        return build_report(self.config, self.runs, time.perf_counter() - started)
+
+
+def percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return round(ordered[int(rank) - 1], 4)
+
+
+def latency_summary(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    """Count, mean and tail percentiles of a list of durations in seconds."""
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 4) if values else None,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+def build_report(config: LoadTestConfig, runs: List[DocumentRun], elapsed_sec: float) -> dict:
+    """Aggregate document runs into throughput and latency figures."""
+    ok = [r for r in runs if r.ok]
+    converted = [r for r in runs if r.convert_sec > 0]
+    llm_latencies = [latency for r in runs for latency in r.llm_latencies]
+    cards = sum(r.cards for r in runs)
+    errors = Counter(r.error for r in runs if r.error)
+
+    def per_sec(n: int) -> Optional[float]:
+        return round(n / elapsed_sec, 3) if elapsed_sec > 0 else None
+
+    settings = asdict(config)
+    # Keep the key out of reports
+    settings["api_key"] = "***" if config.api_key else None
+    return {
+        "config": settings,
+        "elapsed_sec": round(elapsed_sec, 3),
+        "documents": {"total": len(runs), "ok": len(ok), "failed": len(runs) - len(ok)},
+        "throughput": {
+            "documents_per_min": round(len(ok) * 60 / elapsed_sec, 3) if elapsed_sec > 0 else None,
+            "conversions_per_min": round(len(converted) * 60 / elapsed_sec, 3) if elapsed_sec > 0 else None,
+            "llm_requests_per_sec": per_sec(len(llm_latencies)),
+            "cards_per_sec": per_sec(cards),
+        },
+        "totals": {
+            "chunks": sum(r.chunks for r in runs),
+            "cards": cards,
+            "llm_requests": sum(r.llm_requests for r in runs),
+            "llm_failures": sum(r.llm_failures for r in runs),
+        },
+        "latency": {
+            "document": latency_summary([r.total_sec for r in ok]),
+            "convert": latency_summary([r.convert_sec for r in converted]),
+            "process": latency_summary([r.process_sec for r in converted]),
+            "generate": latency_summary([r.generate_sec for r in ok]),
+            "llm_request": latency_summary(llm_latencies),
+        },
+        "errors": dict(errors.most_common(10)),
+    }
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test conversion and card generation with concurrent sessions")
+    parser.add_argument("--marker-url", default=os.getenv("MARKER_API_BASE", "http://localhost:8080"), help="Marker API base URL")
+    parser.add_argument("--llm-url", default=os.getenv("LLM_API_BASE", "http://localhost:8001/v1"), help="OpenAI-compatible base URL")
+    parser.add_argument("--model", default=os.getenv("LLM_MODEL", "mock"), help="Model name (default: LLM_MODEL or mock)")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions (default: 4)")
+    parser.add_argument("--iterations", type=int, default=3, help="Documents per session (default: 3)")
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead of --iterations")
+    parser.add_argument("--pages", type=int, default=10, help="Pages of the test PDF (default: 10)")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="Maximum tokens per chunk (default: 2000)")
+    parser.add_argument("--cards-per-chunk", type=int, default=3, help="Cards requested per chunk (default: 3)")
+    parser.add_argument("--max-cards", type=int, default=None, help="Cards per document at most (default: all chunks)")
+    parser.add_argument("--generate-workers", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Parallel LLM requests per session (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--context-tokens", type=int, default=None,
+                        help="Pack chunks into requests for this context window (default: one request per chunk)")
+    parser.add_argument("--note-type", choices=["basic", "cloze"], default="basic")
+    parser.add_argument("--streaming", action="store_true", help="Stream conversion uploads and responses")
+    parser.add_argument("--timeout", type=int, default=300, help="HTTP timeout seconds per request")
+    parser.add_argument("--output", default=None, help="Also write the report JSON to this path")
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        marker_url=args.marker_url,
+        llm_url=args.llm_url,
+        sessions=args.sessions,
+        iterations=args.iterations,
+        duration_sec=args.duration,
+        pages=args.pages,
+        max_tokens=args.max_tokens,
+        cards_per_chunk=args.cards_per_chunk,
+        max_cards=args.max_cards,
+        generate_workers=args.generate_workers,
+        context_tokens=args.context_tokens,
+        note_type=args.note_type,
+        model=args.model,
+        api_key=os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY"),
+        streaming=args.streaming,
+        timeout_sec=args.timeout,
+    )
+    test = LoadTest(config)
+    try:
+        report = test.run()
+    finally:
+        test.close()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Stand-in Marker API and LLM servers for load testing.
+
+``create_marker_app`` fakes the Marker API routes PDF2Anki uses (/convert,
+/celery/convert, /celery/result/{task_id}, /health) and answers with
+synthetic marker-style markdown and images. ``create_llm_app`` fakes an
+OpenAI-compatible /v1/chat/completions endpoint that answers card prompts
+with the numbered "Question:/Answer:" (or "Cloze:/Extra:") list the
+prompts ask for, one list per section for prompts that pack several
+chunks. Latency, payload size, capacity and error rate are
+configurable, so the client side can be exercised at realistic timings
+without a GPU or an API key.
+
+Usage:
+  python benchmarks/mock_servers.py marker --port 8080 --latency 2.0 --markdown-bytes 200KB --workers 2
+  python benchmarks/mock_servers.py llm --port 8001 --latency 0.5 --tokens-per-sec 80
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import random
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import generate_markdown, generate_model_output  # noqa: E402
+
+_CARD_COUNT = re.compile(r"Generate exactly (\d+) (flashcards|cloze deletions)")
+_SECTION_COUNT = re.compile(r"SECTION (\d+): exactly (\d+) (flashcards|cloze deletions)")
+
+
+@dataclass
+class MockMarkerConfig:
+    """
+    Behaviour of the fake Marker API.
+
+    Attributes:
+        latency_sec: Base conversion time per request
+        latency_per_mb_sec: Extra conversion time per MB of uploaded PDF
+        jitter_sec: Uniform random variation added to each conversion time
+        markdown_bytes: Size of the returned markdown
+        images: Number of images returned per conversion
+        image_bytes: Size of each image before base64 encoding
+        workers: Conversions processed at once; further requests wait (like GPU workers)
+        error_rate: Fraction of requests answered with 503 and Retry-After
+        seed: Seed for the synthetic payload and the random delays
+    """
+    latency_sec: float = 1.0
+    latency_per_mb_sec: float = 0.0
+    jitter_sec: float = 0.0
+    markdown_bytes: int = 50 * 1024
+    images: int = 2
+    image_bytes: int = 16 * 1024
+    workers: int = 1
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+@dataclass
+class MockLLMConfig:
+    """
+    Behaviour of the fake OpenAI-compatible API.
+
+    Attributes:
+        latency_sec: Time to first token
+        tokens_per_sec: Decode speed; completion time grows with the reply length (0: instant)
+        jitter_sec: Uniform random variation added to each request
+        max_concurrency: Requests processed at once; further requests wait (0: unlimited)
+        error_rate: Fraction of requests answered with 429 and Retry-After
+        seed: Seed for the random delays and errors
+    """
+    latency_sec: float = 0.5
+    tokens_per_sec: float = 0.0
+    jitter_sec: float = 0.0
+    max_concurrency: int = 0
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _retry_later(status_code: int, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": message}, headers={"Retry-After": "1"})
+
+
+def create_marker_app(config: Optional[MockMarkerConfig] = None) -> FastAPI:
+    """Build the fake Marker API application."""
+    config = config or MockMarkerConfig()
+    rng = random.Random(config.seed)
+    markdown = generate_markdown(config.markdown_bytes, config.seed)
+    image_data = base64.b64encode(random.Random(config.seed).randbytes(config.image_bytes)).decode("ascii")
+    images = {f"_page_{i + 1}_Picture_0.jpeg": image_data for i in range(config.images)}
+    slots = asyncio.Semaphore(max(1, config.workers))
+    tasks: Dict[str, asyncio.Task] = {}
+    state = {"requests": 0, "active": 0}
+
+    app = FastAPI(title="Mock Marker API")
+
+    async def convert(filename: str, size: int) -> dict:
+        delay = config.latency_sec + config.latency_per_mb_sec * size / (1024 * 1024)
+        delay += rng.uniform(0, config.jitter_sec) if config.jitter_sec > 0 else 0.0
+        async with slots:
+            state["active"] += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                state["active"] -= 1
+        return {
+            "filename": filename,
+            "markdown": markdown,
+            "metadata": {"languages": None, "toc": [], "pages": None, "custom_metadata": {"mock": True}},
+            "images": images,
+            "status": "ok",
+            "time": round(delay, 3),
+        }
+
+    def should_fail() -> bool:
+        state["requests"] += 1
+        return config.error_rate > 0 and rng.random() < config.error_rate
+
+    @app.get("/health")
+    async def health():
+        return {"message": "Welcome to Marker-api", "type": "distributed", "workers": config.workers}
+
+    @app.post("/convert")
+    async def convert_pdf(pdf_file: UploadFile = File(...)):
+        contents = await pdf_file.read()
+        if should_fail():
+            return _retry_later(503, "Mock Marker API is busy")
+        return {"status": "Success", "result": await convert(pdf_file.filename, len(contents))}
+
+    @app.post("/celery/convert")
+    async def celery_convert(pdf_file: UploadFile = File(...)):
+        contents = await pdf_file.read()
+        if should_fail():
+            return _retry_later(503, "Mock Marker API is busy")
+        task_id = str(uuid.uuid4())
+        tasks[task_id] = asyncio.create_task(convert(pdf_file.filename, len(contents)))
+        return {"task_id": task_id, "status": "Processing"}
+
+    @app.get("/celery/result/{task_id}")
+    async def celery_result(task_id: str):
+        task = tasks.get(task_id)
+        if task is None:
+            return JSONResponse(status_code=404, content={"task_id": task_id, "status": "Unknown"})
+        if not task.done():
+            return JSONResponse(status_code=202, content={"task_id": task_id, "status": "Processing"})
+        del tasks[task_id]
+        return {"task_id": task_id, "status": "Success", "result": task.result()}
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": state["requests"], "active": state["active"], "pending_tasks": len(tasks)}
+
+    return app
+
+
+def create_llm_app(config: Optional[MockLLMConfig] = None) -> FastAPI:
+    """Build the fake OpenAI-compatible application."""
+    config = config or MockLLMConfig()
+    rng = random.Random(config.seed)
+    slots = asyncio.Semaphore(config.max_concurrency) if config.max_concurrency > 0 else None
+    state = {"requests": 0, "active": 0}
+
+    app = FastAPI(title="Mock LLM API")
+
+    async def complete(body: dict):
+        state["requests"] += 1
+        if config.error_rate > 0 and rng.random() < config.error_rate:
+            return _retry_later(429, "Rate limit reached (mock)")
+
+        messages = body.get("messages") or []
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        sections = _SECTION_COUNT.findall(prompt)
+        if sections:
+            content = "\n".join(
+                f"=== SECTION {index} ===\n" + generate_model_output(
+                    int(count), "cloze" if noun == "cloze deletions" else "basic", seed=rng.randrange(1 << 30)
+                )
+                for index, count, noun in sections
+            )
+        else:
+            match = _CARD_COUNT.search(prompt)
+            num_cards = int(match.group(1)) if match else 3
+            note_type = "cloze" if match and match.group(2) == "cloze deletions" else "basic"
+            content = generate_model_output(num_cards, note_type, seed=rng.randrange(1 << 30))
+
+        prompt_tokens = _approx_tokens(prompt)
+        completion_tokens = _approx_tokens(content)
+        delay = config.latency_sec
+        if config.tokens_per_sec > 0:
+            delay += completion_tokens / config.tokens_per_sec
+        delay += rng.uniform(0, config.jitter_sec) if config.jitter_sec > 0 else 0.0
+
+        state["active"] += 1
+        try:
+            if slots is not None:
+                async with slots:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(delay)
+        finally:
+            state["active"] -= 1
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "mock",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    # OpenAI clients append /chat/completions to a base URL that may or may not end in /v1
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await complete(await request.json())
+
+    @app.post("/chat/completions")
+    async def chat_completions_no_prefix(request: Request):
+        return await complete(await request.json())
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "pdf2anki"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": state["requests"], "active": state["active"]}
+
+    return app
+
+
+def main() -> None:
+    import argparse
+
+    import uvicorn
+
+    from run_benchmarks import parse_size
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--host", default="127.0.0.1")
+    common.add_argument("--seed", type=int, default=0)
+
+    parser = argparse.ArgumentParser(description="Run a mock Marker API or OpenAI-compatible LLM server")
+    sub = parser.add_subparsers(dest="server", required=True)
+
+    marker = sub.add_parser("marker", parents=[common], help="Fake Marker API (/convert, /celery/*)")
+    marker.add_argument("--port", type=int, default=8080)
+    marker.add_argument("--latency", type=float, default=1.0, help="Base seconds per conversion (default: 1.0)")
+    marker.add_argument("--latency-per-mb", type=float, default=0.0, help="Extra seconds per MB of PDF")
+    marker.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds (uniform, 0..jitter)")
+    marker.add_argument("--markdown-bytes", default="50KB", help="Size of the returned markdown (default: 50KB)")
+    marker.add_argument("--images", type=int, default=2, help="Images per conversion (default: 2)")
+    marker.add_argument("--image-bytes", default="16KB", help="Size of each image (default: 16KB)")
+    marker.add_argument("--workers", type=int, default=1, help="Conversions processed at once (default: 1)")
+    marker.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+
+    llm = sub.add_parser("llm", parents=[common], help="Fake OpenAI-compatible /v1/chat/completions")
+    llm.add_argument("--port", type=int, default=8001)
+    llm.add_argument("--latency", type=float, default=0.5, help="Seconds to first token (default: 0.5)")
+    llm.add_argument("--tokens-per-sec", type=float, default=0.0, help="Decode speed (default: instant)")
+    llm.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds (uniform, 0..jitter)")
+    llm.add_argument("--max-concurrency", type=int, default=0, help="Requests processed at once (default: unlimited)")
+    llm.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    if args.server == "marker":
+        app = create_marker_app(MockMarkerConfig(
+            latency_sec=args.latency,
+            latency_per_mb_sec=args.latency_per_mb,
+            jitter_sec=args.jitter,
+            markdown_bytes=parse_size(args.markdown_bytes),
+            images=args.images,
+            image_bytes=parse_size(args.image_bytes),
+            workers=args.workers,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ))
+    else:
+        app = create_llm_app(MockLLMConfig(
+            latency_sec=args.latency,
+            tokens_per_sec=args.tokens_per_sec,
+            jitter_sec=args.jitter,
+            max_concurrency=args.max_concurrency,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Benchmarks for the markdown processing hot paths.
+
+Times cleaning, chunking, semantic detection, card parsing and TSV export
+(plus the streaming clean+chunk pass and the whole chain end to end) on
+synthetic marker-style markdown of several sizes. Results are written as
+JSON together with the commit and environment, and can be compared with an
+earlier run to catch regressions. No network or GPU is needed.
+
+Usage:
+  python benchmarks/run_benchmarks.py                      # 10KB, 1MB, 50MB
+  python benchmarks/run_benchmarks.py --sizes 10KB,1MB --repeat 5
+  python benchmarks/run_benchmarks.py --compare benchmarks/results/old.json --max-regression 1.25
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from anki_core import parse_cards_from_output  # noqa: E402
+from markdown_chunker import _get_encoding, chunk_markdown  # noqa: E402
+from markdown_cleaner import clean_markdown  # noqa: E402
+from process_markdown import process_conversion  # noqa: E402
+from semantic_detector import identify_semantic_structures  # noqa: E402
+from synthetic import generate_markdown, generate_model_output  # noqa: E402
+
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = "10KB,1MB,50MB"
+DEFAULT_RESULTS_DIR = ROOT / "benchmarks" / "results"
+CARDS_PER_CHUNK = 3
+PDF_SHA256 = "0" * 64
+
+_UNITS = {"KB": 1024, "MB": 1024 * 1024, "GB": 1024 * 1024 * 1024, "B": 1}
+
+
+def parse_size(label: str) -> int:
+    """Parse '10KB', '1MB', '50MB' or a plain byte count."""
+    text = label.strip().upper()
+    for unit, factor in _UNITS.items():
+        if text.endswith(unit) and text[: -len(unit)].strip():
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> Tuple[List[float], object]:
+    """Run ``fn`` ``repeat`` times with the GC paused; returns the timings and the last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return timings, result
+
+
+def _entry(name: str, size_label: str, input_bytes: int, timings: List[float], items: int) -> dict:
+    median = statistics.median(timings)
+    return {
+        "name": name,
+        "size": size_label,
+        "input_bytes": input_bytes,
+        "items": items,
+        "repeat": len(timings),
+        "min_sec": round(min(timings), 6),
+        "median_sec": round(median, 6),
+        "mb_per_sec": round(input_bytes / (1024 * 1024) / median, 3) if median > 0 else None,
+    }
+
+
+def bench_size(size_label: str, repeat: int, log: Callable[[str], None] = print) -> List[dict]:
+    """Run every benchmark on one synthetic document."""
+    size_bytes = parse_size(size_label)
+    markdown = generate_markdown(size_bytes)
+    md_bytes = len(markdown.encode("utf-8"))
+    results = []
+
+    def add(name: str, input_bytes: int, timings: List[float], items: int) -> None:
+        entry = _entry(name, size_label, input_bytes, timings, items)
+        results.append(entry)
+        log(f"  {name:<28} {entry['median_sec']:>10.4f}s  {entry['mb_per_sec'] or 0:>9.2f} MB/s  ({items} items)")
+
+    log(f"[{size_label}] {md_bytes:,} bytes")
+
+    timings, cleaning = time_call(lambda: clean_markdown(markdown), repeat)
+    cleaned = cleaning.cleaned_text
+    add("clean_markdown", md_bytes, timings, 1)
+
+    cleaned_bytes = len(cleaned.encode("utf-8"))
+    timings, chunking = time_call(lambda: chunk_markdown(cleaned, pdf_sha256=PDF_SHA256, max_tokens=2000), repeat)
+    chunks = chunking.chunks
+    add("chunk_markdown", cleaned_bytes, timings, len(chunks))
+
+    timings, _ = time_call(lambda: [identify_semantic_structures(c) for c in chunks], repeat)
+    add("identify_semantic_structures", cleaned_bytes, timings, len(chunks))
+
+    model_output = generate_model_output(max(1, len(chunks)) * CARDS_PER_CHUNK)
+    output_bytes = len(model_output.encode("utf-8"))
+    timings, cards = time_call(lambda: parse_cards_from_output(model_output, "basic"), repeat)
+    add("parse_cards_from_output", output_bytes, timings, len(cards))
+
+    timings, rows = time_call(lambda: [card.to_tsv_row() for card in cards], repeat)
+    add("card_to_tsv_row", output_bytes, timings, len(rows))
+
+    with tempfile.TemporaryDirectory(prefix="pdf2anki_bench_") as tmp:
+        md_path = Path(tmp) / "marker.md"
+        md_path.write_text(markdown, encoding="utf-8")
+        timings, processed = time_call(lambda: process_conversion(md_path, Path(tmp), PDF_SHA256), repeat)
+        add("process_conversion_streaming", md_bytes, timings, processed["total_chunks"])
+
+    def end_to_end() -> int:
+        text = clean_markdown(markdown).cleaned_text
+        doc_chunks = chunk_markdown(text, pdf_sha256=PDF_SHA256, max_tokens=2000).chunks
+        for c in doc_chunks:
+            identify_semantic_structures(c)
+        parsed = parse_cards_from_output(model_output, "basic")
+        return len("\n".join(card.to_tsv_row() for card in parsed))
+
+    timings, _ = time_call(end_to_end, repeat)
+    add("end_to_end", md_bytes, timings, len(chunks))
+    return results
+
+
+def run_benchmarks(sizes: List[str], repeat: int = 3, large_repeat: int = 1, log: Callable[[str], None] = print) -> dict:
+    """
+    Run all benchmarks and return the results document.
+
+    Args:
+        sizes: Size labels such as "10KB" or "50MB"
+        repeat: Runs per benchmark for inputs under 10MB (the median is reported)
+        large_repeat: Runs per benchmark for inputs of 10MB and more
+    """
+    results = []
+    for label in sizes:
+        n = repeat if parse_size(label) < 10 * 1024 * 1024 else large_repeat
+        results.extend(bench_size(label, max(1, n), log))
+    return {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "tokenizer": "tiktoken" if _get_encoding() is not None else "approximate",
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> List[dict]:
+    """Median time ratios (current / baseline) for benchmarks present in both runs."""
+    previous: Dict[Tuple[str, str], dict] = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        old = previous.get((r["name"], r["size"]))
+        if old is None or not old.get("median_sec"):
+            continue
+        rows.append({
+            "name": r["name"],
+            "size": r["size"],
+            "baseline_sec": old["median_sec"],
+            "current_sec": r["median_sec"],
+            "ratio": round(r["median_sec"] / old["median_sec"], 3),
+        })
+    return rows
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark markdown cleaning, chunking, semantic detection and card parsing")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated document sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark for inputs under 10MB (default: 3)")
+    parser.add_argument("--large-repeat", type=int, default=1, help="Runs per benchmark for inputs of 10MB and more (default: 1)")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: benchmarks/results/<commit>-<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="With --compare, exit with status 1 if any median is slower than this ratio (e.g. 1.25)")
+    args = parser.parse_args()
+
+    document = run_benchmarks([s for s in args.sizes.split(",") if s.strip()], args.repeat, args.large_repeat)
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = DEFAULT_RESULTS_DIR / f"{document['git_commit'] or 'nogit'}-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(document, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(document, baseline)
+        print(f"\nCompared with {args.compare} ({baseline.get('git_commit')}):")
+        for row in rows:
+            print(f"  {row['name']:<28} {row['size']:>6}  {row['baseline_sec']:>10.4f}s -> {row['current_sec']:>10.4f}s  x{row['ratio']}")
+        if args.max_regression is not None:
+            regressed = [row for row in rows if row["ratio"] > args.max_regression]
+            if regressed:
+                print(f"\n{len(regressed)} benchmark(s) slower than x{args.max_regression}", file=sys.stderr)
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
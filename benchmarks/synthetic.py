@@ -0,0 +1,125 @@
+"""
+Synthetic marker-style markdown and model output for benchmarks.
+
+Documents mimic what marker-pdf produces for lecture slides and papers:
+repeated page headers and footers, headings, definition paragraphs, inline
+and display math, tables, image references, lists and OCR debris. Output is
+deterministic for a given size and seed, so timings are comparable across
+commits.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import random
+from typing import List
+
+_WORDS = (
+    "gradient descent converges when the learning rate is small enough relative to the "
+    "curvature of the loss surface and the estimator remains unbiased under mild conditions "
+    "while the variance of the stochastic updates decreases as the batch size grows the "
+    "kernel matrix is positive semidefinite for every valid covariance function and the "
+    "posterior distribution concentrates around the true parameter"
+).split()
+
+_TERMS = (
+    "Entropy", "Gradient", "Eigenvalue", "Likelihood", "Regularization", "Convolution",
+    "Backpropagation", "Markov chain", "Hilbert space", "Lagrangian", "Bayes rule", "Softmax",
+)
+
+
+def _sentence(rng: random.Random, min_words: int = 8, max_words: int = 22) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def _page(rng: random.Random, page: int) -> List[str]:
+    term = rng.choice(_TERMS)
+    lines = [
+        "Introduction to Machine Learning — Lecture Notes",
+        "",
+        f"## {page}. {term} and {rng.choice(_TERMS)}",
+        "",
+        f"**{term}** is a {' '.join(rng.choice(_WORDS) for _ in range(8))}.",
+        "",
+        " ".join(_sentence(rng) for _ in range(rng.randint(3, 6))),
+        "",
+        f"- **{rng.choice(_TERMS)}**: {_sentence(rng, 5, 10)}",
+        f"- {rng.choice(_TERMS)} - {_sentence(rng, 5, 10)}",
+        f"- The loss is $L(\\theta) = \\frac{{1}}{{n}} \\sum_{{i=1}}^{{n}} \\ell(x_i, y_i; \\theta)$ for page {page}.",
+        "",
+        "$$",
+        f"\\nabla_\\theta L = \\mathbb{{E}}[\\nabla \\ell] + \\lambda_{page % 7} \\theta",
+        "$$",
+        "",
+        "| Method | Rate | Memory |",
+        "|--------|------|--------|",
+        f"| SGD | {rng.randint(1, 99)}% | O(n) |",
+        f"| Adam | {rng.randint(1, 99)}% | O(2n) |",
+        "",
+        f"![](_page_{page}_Picture_{rng.randint(0, 3)}.jpeg)",
+        "",
+        "Definition: " + _sentence(rng, 6, 12),
+        "",
+        " ".join(_sentence(rng) for _ in range(rng.randint(2, 5))),
+        "",
+        "|||",
+        "~~~",
+        "",
+        "",
+        "",
+        f"Page {page}",
+        "University of Somewhere    ",
+        "",
+    ]
+    if page % 5 == 0:
+        lines[2:2] = [f"# Chapter {page // 5}: {term}", ""]
+    return lines
+
+
+def generate_markdown(size_bytes: int, seed: int = 0) -> str:
+    """Return synthetic marker-style markdown of at least ``size_bytes`` UTF-8 bytes."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    page = 1
+    while total < size_bytes:
+        text = "\n".join(_page(rng, page)) + "\n"
+        parts.append(text)
+        total += len(text.encode("utf-8"))
+        page += 1
+    return "".join(parts)
+
+
+def generate_model_output(num_cards: int, note_type: str = "basic", seed: int = 0) -> str:
+    """Return a numbered card list in the format the prompts ask the model for."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(1, num_cards + 1):
+        term = rng.choice(_TERMS)
+        if note_type == "cloze":
+            items.append(
+                f"{i}. Cloze: {{{{c1::{term}}}}} {_sentence(rng, 6, 14)} \\(x_{i}^2\\)\n"
+                f"   Extra: {_sentence(rng, 4, 10)}"
+            )
+        else:
+            items.append(
+                f"{i}. Question: What is {term.lower()} in the context of {rng.choice(_WORDS)}?\n"
+                f"   Answer: {_sentence(rng, 8, 20)} See \\[\\sum_i w_i x_i\\]."
+            )
+    return "\n\n".join(items) + "\n"
@@ -1,6 +1,7 @@
 import aiohttp
 import asyncio
 import requests
+from contextlib import ExitStack
 from typing import List, Union, Dict, Any
 from enum import Enum
 from pydantic import BaseModel
@@ -123,16 +124,19 @@ class MarkerAPIClient:
     def _convert_batch(
         self, file_paths: List[str], show_progress: bool
     ) -> BatchConversionResponse:
-        files = []
-        iterable = tqdm(file_paths, desc="Preparing files", disable=not show_progress)
-        for file_path in iterable:
-            files.append(("pdf_files", open(file_path, "rb")))
-            logger.info(f"Prepared file: {file_path}")
-
-        logger.info("Sending batch conversion request")
-        response = self.session.post(
-            f"{self.base_url}{self._batch_convert_endpoint()}", files=files
-        )
+        with ExitStack() as stack:
+            files = []
+            iterable = tqdm(
+                file_paths, desc="Preparing files", disable=not show_progress
+            )
+            for file_path in iterable:
+                files.append(("pdf_files", stack.enter_context(open(file_path, "rb"))))
+                logger.info(f"Prepared file: {file_path}")
+
+            logger.info("Sending batch conversion request")
+            response = self.session.post(
+                f"{self.base_url}{self._batch_convert_endpoint()}", files=files
+            )
         response.raise_for_status()
         logger.info("Batch conversion request successful")
         return BatchConversionResponse(**response.json())
@@ -150,33 +154,35 @@ class MarkerAPIClient:
             raise ValueError("file_paths must be a string or a list of strings")
 
     async def _aconvert_single(self, file_path: str) -> ConversionResponse:
-        data = aiohttp.FormData()
-        data.add_field("pdf_file", open(file_path, "rb"))
-        logger.info(f"Sending async request to convert {file_path}")
-        async with self.async_session.post(
-            f"{self.base_url}{self._convert_endpoint()}", data=data
-        ) as response:
-            response.raise_for_status()
-            logger.info(f"Successfully converted {file_path} asynchronously")
-            return ConversionResponse(**(await response.json()))
+        with open(file_path, "rb") as file:
+            data = aiohttp.FormData()
+            data.add_field("pdf_file", file)
+            logger.info(f"Sending async request to convert {file_path}")
+            async with self.async_session.post(
+                f"{self.base_url}{self._convert_endpoint()}", data=data
+            ) as response:
+                response.raise_for_status()
+                logger.info(f"Successfully converted {file_path} asynchronously")
+                return ConversionResponse(**(await response.json()))
 
     async def _aconvert_batch(
         self, file_paths: List[str], show_progress: bool
     ) -> BatchConversionResponse:
-        data = aiohttp.FormData()
-        async for file_path in atqdm(
-            file_paths, desc="Preparing files", disable=not show_progress
-        ):
-            data.add_field("pdf_files", open(file_path, "rb"))
-            logger.info(f"Prepared file: {file_path}")
-
-        logger.info("Sending async batch conversion request")
-        async with self.async_session.post(
-            f"{self.base_url}{self._batch_convert_endpoint()}", data=data
-        ) as response:
-            response.raise_for_status()
-            logger.info("Async batch conversion request successful")
-            return BatchConversionResponse(**(await response.json()))
+        with ExitStack() as stack:
+            data = aiohttp.FormData()
+            async for file_path in atqdm(
+                file_paths, desc="Preparing files", disable=not show_progress
+            ):
+                data.add_field("pdf_files", stack.enter_context(open(file_path, "rb")))
+                logger.info(f"Prepared file: {file_path}")
+
+            logger.info("Sending async batch conversion request")
+            async with self.async_session.post(
+                f"{self.base_url}{self._batch_convert_endpoint()}", data=data
+            ) as response:
+                response.raise_for_status()
+                logger.info("Async batch conversion request successful")
+                return BatchConversionResponse(**(await response.json()))
 
     def get_result(self, task_id: str) -> ConversionResponse:
         if self.server_type != ServerType.distributed:
@@ -10,7 +10,7 @@ from marker.logger import configure_logging
 from marker_api.celery_routes import (
     celery_convert_pdf,
     celery_result,
-    celery_convert_pdf_concurrent_await,
+    celery_convert_pdf_sharded,
     celery_batch_convert,
     celery_batch_result,
 )
@@ -25,7 +25,7 @@ from marker_api.model.schema import (
     HealthResponse,
     ServerType,
 )
-from typing import List
+from typing import List, Optional
 
 # Initialize logging
 configure_logging()
@@ -79,8 +79,10 @@ def setup_routes(app: FastAPI, celery_live: bool):
         logger.info("Adding Celery routes")
 
         @app.post("/convert", response_model=ConversionResponse)
-        async def convert_pdf(pdf_file: UploadFile = File(...)):
-            return await celery_convert_pdf_concurrent_await(pdf_file)
+        async def convert_pdf(
+            pdf_file: UploadFile = File(...), pages_per_shard: Optional[int] = None
+        ):
+            return await celery_convert_pdf_sharded(pdf_file, pages_per_shard)
 
         @app.post("/celery/convert", response_model=CeleryTaskResponse)
         async def celery_convert(pdf_file: UploadFile = File(...)):
@@ -1,13 +1,24 @@
 from fastapi import UploadFile, File
+from celery import chord
 from celery.result import AsyncResult
 from fastapi.responses import JSONResponse
-from marker_api.celery_tasks import convert_pdf_to_markdown, process_batch
+from marker_api.celery_tasks import (
+    convert_pdf_to_markdown,
+    convert_pdf_shard,
+    merge_pdf_shards,
+    process_batch,
+)
+from marker_api.sharding import split_pdf_pages
 import logging
 import asyncio
-from typing import List
+import os
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Default page-range size for sharded conversion (0 disables sharding)
+DEFAULT_PAGES_PER_SHARD = int(os.environ.get("MARKER_API_PAGES_PER_SHARD", "0"))
+
 
 async def celery_convert_pdf(pdf_file: UploadFile = File(...)):
     contents = await pdf_file.read()
@@ -62,6 +73,55 @@ async def celery_convert_pdf_concurrent_await(pdf_file: UploadFile = File(...)):
         )
 
 
+async def celery_convert_pdf_sharded(
+    pdf_file: UploadFile = File(...), pages_per_shard: Optional[int] = None
+):
+    """
+    Convert a PDF by fanning page ranges out to the Celery workers.
+
+    The PDF is split into ranges of ``pages_per_shard`` pages, each range is
+    converted by its own convert_pdf_shard task, and merge_pdf_shards joins
+    the results in page order. PDFs that fit in one range are converted as a
+    single task.
+    """
+    if pages_per_shard is None:
+        pages_per_shard = DEFAULT_PAGES_PER_SHARD
+    if pages_per_shard <= 0:
+        return await celery_convert_pdf_concurrent_await(pdf_file)
+
+    contents = await pdf_file.read()
+    shards = await asyncio.to_thread(split_pdf_pages, contents, pages_per_shard)
+    if len(shards) <= 1:
+        await pdf_file.seek(0)
+        return await celery_convert_pdf_concurrent_await(pdf_file)
+
+    logger.info(f"Converting {pdf_file.filename} as {len(shards)} shards")
+    task = chord(
+        convert_pdf_shard.s(pdf_file.filename, shard_content, index, start, end)
+        for index, (start, end, shard_content) in enumerate(shards)
+    )(merge_pdf_shards.s(pdf_file.filename))
+
+    async def check_task_status():
+        while True:
+            if task.ready():
+                return task.get()
+            await asyncio.sleep(1)
+
+    try:
+        result = await asyncio.wait_for(check_task_status(), timeout=600)
+        return {"status": "Success", "result": result}
+    except asyncio.TimeoutError:
+        return JSONResponse(
+            status_code=408,
+            content={"status": "Timeout", "message": "Task processing took too long"},
+        )
+    except Exception as e:
+        logger.error(f"Sharded conversion of {pdf_file.filename} failed: {str(e)}")
+        return JSONResponse(
+            status_code=500, content={"status": "Error", "message": str(e)}
+        )
+
+
 # async def celery_batch_convert(pdf_files: List[UploadFile] = File(...)):
 #     batch_data = []
 #     for pdf_file in pdf_files:
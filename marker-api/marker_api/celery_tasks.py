@@ -3,8 +3,10 @@ from marker_api.celery_worker import celery_app
 from marker.convert import convert_single_pdf
 from marker.models import load_all_models
 import io
+import time
 import logging
-from marker_api.utils import process_image_to_base64
+from marker_api.utils import encode_images
+from marker_api.sharding import merge_shard_results
 from celery.signals import worker_process_init
 
 logger = logging.getLogger(__name__)
@@ -37,11 +39,7 @@ class PDFConversionTask(Task):
 def convert_pdf_to_markdown(self, filename, pdf_content):
     pdf_file = io.BytesIO(pdf_content)
     markdown_text, images, metadata = convert_single_pdf(pdf_file, model_list)
-    image_data = {}
-    for i, (img_filename, image) in enumerate(images.items()):
-        logger.debug(f"Processing image {img_filename}")
-        image_base64 = process_image_to_base64(image, img_filename)
-        image_data[img_filename] = image_base64
+    image_data = encode_images(images)
 
     return {
         "filename": filename,
@@ -52,6 +50,32 @@ def convert_pdf_to_markdown(self, filename, pdf_content):
     }
 
 
+@celery_app.task(
+    ignore_result=False, bind=True, base=PDFConversionTask, name="convert_pdf_shard"
+)
+def convert_pdf_shard(self, filename, pdf_content, shard_index, start_page, end_page):
+    started = time.time()
+    shard = {
+        "index": shard_index,
+        "start_page": start_page,
+        "end_page": end_page,
+        "worker": self.request.hostname,
+    }
+    try:
+        result = convert_pdf_to_markdown(filename, pdf_content)
+    except Exception as e:
+        logger.error(f"Error converting shard {shard_index} of {filename}: {str(e)}")
+        result = {"filename": filename, "status": "Error", "error": str(e)}
+    shard["seconds"] = round(time.time() - started, 3)
+    result["shard"] = shard
+    return result
+
+
+@celery_app.task(ignore_result=False, name="merge_pdf_shards")
+def merge_pdf_shards(shard_results, filename):
+    return merge_shard_results(filename, shard_results)
+
+
 # @celery_app.task(
 #     ignore_result=False, bind=True, base=PDFConversionTask, name="process_batch"
 # )
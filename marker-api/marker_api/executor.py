@@ -0,0 +1,219 @@
+import asyncio
+import concurrent.futures
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marker takes about 4.5GB of VRAM on average per task
+VRAM_PER_TASK_MB = 4608
+
+
+class QueueFullError(Exception):
+    """Raised when a conversion cannot be admitted because the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Conversion queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def default_worker_count() -> int:
+    """
+    Number of concurrent conversions for this device.
+
+    Uses MARKER_API_WORKERS when set, otherwise one worker per
+    VRAM_PER_TASK_MB of free GPU memory (one worker on CPU).
+    """
+    configured = os.environ.get("MARKER_API_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    try:
+        from marker_api.utils import DeviceType, get_ram_available
+
+        device_type, ram_available = get_ram_available()
+    except Exception as e:
+        logger.warning(f"Could not read device memory, using one worker: {str(e)}")
+        return 1
+    if device_type == DeviceType.GPU:
+        return max(1, ram_available // VRAM_PER_TASK_MB)
+    return 1
+
+
+class ConversionExecutor:
+    """
+    Server-wide executor for CPU/GPU-bound conversions.
+
+    Conversions run on a fixed pool of worker threads so the event loop stays
+    free for other requests. At most ``workers + queue_size`` conversions are
+    admitted at a time; beyond that ``submit`` raises QueueFullError with a
+    Retry-After estimate based on recent conversion times. A conversion keeps
+    its slot until its worker finishes, even if the request awaiting it is
+    cancelled.
+
+    Args:
+    workers (int): Number of conversions that run at once.
+    queue_size (int): Number of admitted conversions allowed to wait for a worker.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="marker-convert"
+        )
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._avg_seconds: Optional[float] = None
+        # Batch items waiting for a slot (see submit_many)
+        self._waiters: List[asyncio.Future] = []
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        with self._lock:
+            avg = self._avg_seconds
+            waiting = max(0, self._admitted - self.workers) + len(self._waiters)
+        if avg is None:
+            return 30
+        return max(1, math.ceil(avg * (waiting + 1) / self.workers))
+
+    def _admit(self, count: int) -> None:
+        with self._lock:
+            if self._admitted + count > self.capacity:
+                self._rejected += 1
+                admitted = False
+            else:
+                self._admitted += count
+                admitted = True
+        if not admitted:
+            raise QueueFullError(self.retry_after())
+
+    async def _admit_waiting(self) -> None:
+        """Take a slot, waiting for one to free up instead of raising."""
+        while True:
+            with self._lock:
+                if self._admitted < self.capacity:
+                    self._admitted += 1
+                    return
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+            await waiter
+
+    def _release(self, seconds: Optional[float]) -> None:
+        with self._lock:
+            self._admitted -= 1
+            if seconds is not None:
+                self._completed += 1
+                # Exponential moving average of conversion time
+                if self._avg_seconds is None:
+                    self._avg_seconds = seconds
+                else:
+                    self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+            waiters, self._waiters = self._waiters, []
+        # Called from worker threads; every waiter re-checks for a free slot
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def _finished(self, future: concurrent.futures.Future) -> None:
+        seconds = None
+        if not future.cancelled() and future.exception() is None:
+            seconds = future.result()[1]
+        self._release(seconds)
+
+    def _run(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            self._running += 1
+        started = time.time()
+        try:
+            return fn(*args), time.time() - started
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _start(self, fn: Callable[..., Any], *args) -> "asyncio.Future":
+        """Queue an admitted call; its slot is released when the worker is done with it."""
+        future = self._pool.submit(self._run, fn, *args)
+        future.add_done_callback(self._finished)
+        return asyncio.wrap_future(future)
+
+    async def _await(self, fn: Callable[..., Any], *args) -> Any:
+        result, _ = await self._start(fn, *args)
+        return result
+
+    async def submit(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run ``fn(*args)`` on the pool and await its result.
+
+        Raises:
+        QueueFullError: If the executor is already at capacity.
+        """
+        self._admit(1)
+        return await self._await(fn, *args)
+
+    async def submit_many(self, fn: Callable[..., Any], args_list) -> list:
+        """
+        Run ``fn(*args)`` for each entry of ``args_list`` and await all results.
+
+        The first call is admitted like ``submit``; the others queue for slots
+        as earlier conversions finish, so a batch may be larger than the
+        executor's capacity.
+
+        Raises:
+        QueueFullError: If the executor is already at capacity.
+        """
+        args_list = list(args_list)
+        if not args_list:
+            return []
+        self._admit(1)
+        first = self._start(fn, *args_list[0])
+
+        async def queued(args) -> Any:
+            await self._admit_waiting()
+            return await self._await(fn, *args)
+
+        results = await asyncio.gather(first, *(queued(args) for args in args_list[1:]))
+        return [results[0][0]] + results[1:]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "admitted": self._admitted,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "waiting": len(self._waiters),
+                "avg_seconds": round(self._avg_seconds, 3) if self._avg_seconds else None,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def create_conversion_executor() -> ConversionExecutor:
+    """Build the executor from MARKER_API_WORKERS and MARKER_API_QUEUE_SIZE."""
+    workers = default_worker_count()
+    queue_size = os.environ.get("MARKER_API_QUEUE_SIZE")
+    executor = ConversionExecutor(
+        workers, int(queue_size) if queue_size else 2 * workers
+    )
+    logger.info(
+        f"Conversion executor: {executor.workers} workers, queue size {executor.queue_size}"
+    )
+    return executor
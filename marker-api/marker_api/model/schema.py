@@ -43,12 +43,23 @@ class GeneralMetadata(BaseModel):
     custom_metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
+class ShardTiming(BaseModel):
+    index: int
+    start_page: int = Field(..., description="First page of the range (0-based, inclusive)")
+    end_page: int = Field(..., description="End of the range (0-based, exclusive)")
+    seconds: Optional[float] = None
+    worker: Optional[str] = None
+
+
 class PDFConversionResult(BaseModel):
     filename: str
     markdown: str
     metadata: GeneralMetadata
     images: Dict[str, str]
     status: str
+    shards: Optional[List[ShardTiming]] = Field(
+        None, description="Per-shard timings (only for sharded conversions)"
+    )
 
 
 class ConversionResponse(BaseModel):
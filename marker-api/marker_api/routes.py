@@ -1,8 +1,8 @@
-import os
 import time
-import base64
 from marker.convert import convert_single_pdf
 from marker.logger import configure_logging
+from marker_api.metrics import stage_metrics
+from marker_api.utils import encode_images
 import logging
 
 # Initialize logging
@@ -11,44 +11,38 @@ logger = logging.getLogger(__name__)
 
 
 # Function to parse PDF and return markdown, metadata, and image data
-def parse_pdf_and_return_markdown(pdf_file: bytes, extract_images: bool, model_list):
+def parse_pdf_and_return_markdown(
+    pdf_file: bytes, extract_images: bool, model_list, images_as_base64: bool = True
+):
     """
     Function to parse a PDF and extract text and images.
 
     Args:
     pdf_file (bytes): The content of the PDF file.
     extract_images (bool): Whether to extract images or not.
+    images_as_base64 (bool): Encode images as base64 strings if True, raw PNG bytes otherwise.
 
     Returns
     tuple: A tuple containing the full text, metadata, and image data (if extracted).
     """
     logger.debug("Parsing PDF file")
-    full_text, images, out_meta = convert_single_pdf(pdf_file, model_list)
+    with stage_metrics.stage("convert", bytes_in=len(pdf_file)) as stage:
+        full_text, images, out_meta = convert_single_pdf(pdf_file, model_list)
+        stage.add_bytes(bytes_out=len(full_text.encode("utf-8")))
     logger.debug(f"Images extracted: {list(images.keys())}")
     image_data = {}
     if extract_images:
-        for i, (filename, image) in enumerate(images.items()):
-            logger.debug(f"Processing image {filename}")
-
-            # Save image as PNG
-            image.save(filename, "PNG")
-
-            # Read the saved image file as bytes
-            with open(filename, "rb") as f:
-                image_bytes = f.read()
-
-            # Convert image to base64
-            image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-            image_data[f"{filename}"] = image_base64
-
-            # Remove the temporary image file
-            os.remove(filename)
+        with stage_metrics.stage("encode_images") as stage:
+            image_data = encode_images(images, as_base64=images_as_base64)
+            stage.add_bytes(bytes_out=sum(len(data) for data in image_data.values()))
 
     return full_text, out_meta, image_data
 
 
 # Function to process a single PDF file
-def process_pdf_file(file_content: bytes, filename: str, model_list):
+def process_pdf_file(
+    file_content: bytes, filename: str, model_list, images_as_base64: bool = True
+):
     """
     Function to process a single PDF file.
 
@@ -56,6 +50,7 @@ def process_pdf_file(file_content: bytes, filename: str, model_list):
     file_content (bytes): The content of the PDF file.
     filename (str): The name of the PDF file.
     model_list: The list of loaded models.
+    images_as_base64 (bool): Encode images as base64 strings if True, raw PNG bytes otherwise.
 
     Returns:
     dict: A dictionary containing the filename, markdown text, metadata, image data, status, and processing time.
@@ -63,7 +58,10 @@ def process_pdf_file(file_content: bytes, filename: str, model_list):
     entry_time = time.time()
     logger.info(f"Entry time for {filename}: {entry_time}")
     markdown_text, metadata, image_data = parse_pdf_and_return_markdown(
-        file_content, extract_images=True, model_list=model_list
+        file_content,
+        extract_images=True,
+        model_list=model_list,
+        images_as_base64=images_as_base64,
     )
     completion_time = time.time()
     logger.info(f"Model processes complete time for {filename}: {completion_time}")
@@ -0,0 +1,127 @@
+import io
+import re
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+# marker names extracted images "<page>_image_<n>.<ext>", with pages counted
+# from the start of the PDF it was given
+_PAGE_IMAGE_NAME = re.compile(r"^(\d+)(_image_.*)$")
+
+
+def count_pdf_pages(pdf_content: bytes) -> int:
+    """
+    Count the pages of a PDF.
+
+    Args:
+    pdf_content (bytes): The content of the PDF file.
+
+    Returns:
+    int: The number of pages.
+    """
+    return len(PdfReader(io.BytesIO(pdf_content)).pages)
+
+
+def split_pdf_pages(pdf_content: bytes, pages_per_shard: int) -> List[Tuple[int, int, bytes]]:
+    """
+    Split a PDF into page ranges.
+
+    Args:
+    pdf_content (bytes): The content of the PDF file.
+    pages_per_shard (int): Maximum number of pages per range.
+
+    Returns:
+    list: (start_page, end_page, pdf_bytes) tuples in page order, with
+    0-based start_page inclusive and end_page exclusive.
+    """
+    reader = PdfReader(io.BytesIO(pdf_content))
+    total = len(reader.pages)
+    pages_per_shard = max(1, pages_per_shard)
+    shards = []
+    for start in range(0, total, pages_per_shard):
+        end = min(start + pages_per_shard, total)
+        writer = PdfWriter()
+        for page_number in range(start, end):
+            writer.add_page(reader.pages[page_number])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        shards.append((start, end, buffer.getvalue()))
+    logger.debug(f"Split {total} pages into {len(shards)} shards")
+    return shards
+
+
+def _global_image_name(name: str, shard_index: int, start_page: int) -> str:
+    match = _PAGE_IMAGE_NAME.match(name)
+    if match:
+        return f"{int(match.group(1)) + start_page}{match.group(2)}"
+    return f"shard{shard_index}_{name}"
+
+
+def _offset_toc(toc: List[Dict[str, Any]], start_page: int) -> List[Dict[str, Any]]:
+    entries = []
+    for entry in toc or []:
+        entry = dict(entry)
+        for key in ("page", "page_id"):
+            if isinstance(entry.get(key), int):
+                entry[key] += start_page
+        entries.append(entry)
+    return entries
+
+
+def merge_shard_results(filename: str, shard_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-shard conversion results into one result in page order.
+
+    Image names are renumbered to document pages (and the markdown references
+    rewritten to match), table of contents pages are offset, and the page
+    counts are summed. Each shard's timing is reported under "shards".
+
+    Args:
+    filename (str): The original PDF filename.
+    shard_results (list): Results of convert_pdf_shard, in any order.
+
+    Returns:
+    dict: A conversion result in the same shape as convert_pdf's.
+    """
+    shard_results = sorted(shard_results, key=lambda r: r["shard"]["start_page"])
+    markdown_parts = []
+    images: Dict[str, str] = {}
+    toc: List[Dict[str, Any]] = []
+    languages = None
+    pages = 0
+    shards = []
+
+    for result in shard_results:
+        shard = result["shard"]
+        shards.append(shard)
+        if result.get("status") != "ok":
+            raise RuntimeError(
+                f"Shard {shard['index']} (pages {shard['start_page'] + 1}-{shard['end_page']}) "
+                f"failed: {result.get('error', 'unknown error')}"
+            )
+
+        markdown = result["markdown"]
+        for name, data in (result.get("images") or {}).items():
+            new_name = _global_image_name(name, shard["index"], shard["start_page"])
+            if new_name != name:
+                markdown = markdown.replace(f"]({name})", f"]({new_name})")
+            images[new_name] = data
+        markdown_parts.append(markdown.strip("\n"))
+
+        metadata = result.get("metadata") or {}
+        toc.extend(_offset_toc(metadata.get("toc"), shard["start_page"]))
+        if languages is None:
+            languages = metadata.get("languages")
+        pages += metadata.get("pages") or (shard["end_page"] - shard["start_page"])
+
+    return {
+        "filename": filename,
+        "markdown": "\n\n".join(part for part in markdown_parts if part) + "\n",
+        "metadata": {"languages": languages, "toc": toc, "pages": pages},
+        "images": images,
+        "status": "ok",
+        "shards": shards,
+    }
@@ -1,6 +1,12 @@
 import base64
+import json
+import os
+import tempfile
 import torch
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from typing import IO, Any, Dict, Optional
 import pynvml
 import io
 from art import text2art
@@ -15,30 +21,103 @@ class DeviceType(Enum):
     GPU = "gpu"
 
 
-def process_image_to_base64(image: Image.Image, filename: str) -> str:
+# Images are encoded in parallel; PNG compression releases the GIL
+IMAGE_ENCODE_WORKERS = int(os.environ.get("MARKER_API_IMAGE_WORKERS", "4"))
+
+
+def process_image_to_png(image: Image.Image, filename: str) -> bytes:
     """
-    Process an image and convert it to base64.
+    Encode an image as PNG in memory.
 
     Args:
     image (PIL.Image.Image): The image to process.
-    filename (str): The filename to use for the temporary file.
+    filename (str): The image name, used for error messages.
 
     Returns:
-    str: The base64 encoded string of the image.
+    bytes: The PNG bytes of the image (empty on failure).
     """
     try:
-        # Save image as PNG in memory
         img_byte_arr = io.BytesIO()
         image.save(img_byte_arr, format="PNG")
-        img_byte_arr = img_byte_arr.getvalue()
-
-        # Convert image to base64
-        image_base64 = base64.b64encode(img_byte_arr).decode("utf-8")
-
-        return image_base64
+        return img_byte_arr.getvalue()
     except Exception as e:
         logger.error(f"Error processing image {filename}: {str(e)}")
-        return ""
+        return b""
+
+
+def process_image_to_base64(image: Image.Image, filename: str) -> str:
+    """
+    Process an image and convert it to base64.
+
+    Args:
+    image (PIL.Image.Image): The image to process.
+    filename (str): The image name, used for error messages.
+
+    Returns:
+    str: The base64 encoded string of the image.
+    """
+    return base64.b64encode(process_image_to_png(image, filename)).decode("utf-8")
+
+
+def encode_images(
+    images: Dict[str, Image.Image], as_base64: bool = True, max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Encode extracted images as PNG in memory, in parallel.
+
+    Args:
+    images (dict): Image name to PIL image, as returned by marker.
+    as_base64 (bool): Return base64 strings if True, raw PNG bytes otherwise.
+    max_workers (int): Encoder threads (default: MARKER_API_IMAGE_WORKERS).
+
+    Returns:
+    dict: Image name to encoded image, in the original order.
+    """
+    if not images:
+        return {}
+    encode = process_image_to_base64 if as_base64 else process_image_to_png
+    workers = min(max_workers or IMAGE_ENCODE_WORKERS, len(images))
+    if workers <= 1:
+        return {name: encode(image, name) for name, image in images.items()}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-encode") as pool:
+        encoded = pool.map(lambda item: encode(item[1], item[0]), images.items())
+        return dict(zip(images.keys(), encoded))
+
+
+def build_conversion_zip(
+    filename: str, markdown: str, metadata: Dict[str, Any], images: Dict[str, bytes]
+) -> IO[bytes]:
+    """
+    Package a conversion as a zip archive instead of JSON with base64 images.
+
+    The archive contains ``<stem>.md``, ``metadata.json`` and the PNG images
+    next to the markdown, so its image links resolve once extracted. Images
+    are stored without recompression. The archive is written to a temporary
+    file rather than memory, so a large image set is not held twice.
+
+    Args:
+    filename (str): The original PDF filename.
+    markdown (str): The converted markdown.
+    metadata (dict): The conversion metadata.
+    images (dict): Image name to PNG bytes.
+
+    Returns:
+    file: The zip archive in a temporary file, positioned at its start. The
+    caller closes it, which deletes the file.
+    """
+    stem = os.path.splitext(os.path.basename(filename or "document"))[0] or "document"
+    archive_file = tempfile.TemporaryFile()
+    try:
+        with zipfile.ZipFile(archive_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(f"{stem}.md", markdown)
+            archive.writestr("metadata.json", json.dumps(metadata, ensure_ascii=False, default=str))
+            for name, data in images.items():
+                archive.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+        archive_file.seek(0)
+    except BaseException:
+        archive_file.close()
+        raise
+    return archive_file
 
 
 def get_ram_available():
@@ -1,16 +1,19 @@
 import os
-import asyncio
 import argparse
 from fastapi import FastAPI, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-import concurrent.futures
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import List, Literal
 from marker.logger import configure_logging  # Import logging configuration
 from marker.models import load_all_models  # Import function to load models
 from marker_api.routes import (
     process_pdf_file,
 )
-from marker_api.utils import print_markerapi_text_art
+from marker_api.utils import build_conversion_zip, print_markerapi_text_art
+from marker_api.executor import QueueFullError, create_conversion_executor
+from marker_api.metrics import metrics_enabled, stage_metrics
 from contextlib import asynccontextmanager
 import logging
 import gradio as gr
@@ -29,15 +32,32 @@ logger = logging.getLogger(__name__)
 # Global variable to hold model list
 model_list = None
 
+# Server-wide executor that runs conversions off the event loop
+conversion_executor = None
+
+# Zip responses are sent from their temporary file in pieces of this size
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024
+
 
 # Event that runs on startup to load all models
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global model_list
+    global model_list, conversion_executor
     logger.debug("--------------------- Loading OCR Model -----------------------")
     print_markerapi_text_art()
     model_list = load_all_models()
+    conversion_executor = create_conversion_executor()
     yield
+    conversion_executor.shutdown()
+
+
+def queue_full_response(error: QueueFullError) -> JSONResponse:
+    logger.warning(str(error))
+    return JSONResponse(
+        status_code=503,
+        content={"status": "Busy", "message": "Conversion queue is full"},
+        headers={"Retry-After": str(error.retry_after)},
+    )
 
 
 # Initialize FastAPI app
@@ -63,15 +83,56 @@ def server():
     return HealthResponse(message="Welcome to Marker-api", type=ServerType.simple)
 
 
+if metrics_enabled():
+
+    @app.get("/metrics")
+    def metrics():
+        """
+        Per-stage timings and executor statistics in the Prometheus text format.
+        """
+        gauges = {}
+        if conversion_executor is not None:
+            gauges = {f"executor_{k}": v for k, v in conversion_executor.stats().items()}
+        return Response(
+            content=stage_metrics.render(gauges),
+            media_type="text/plain; version=0.0.4",
+        )
+
+
 # Endpoint to convert a single PDF to markdown
 @app.post("/convert", response_model=ConversionResponse)
-async def convert_pdf_to_markdown(pdf_file: UploadFile):
+async def convert_pdf_to_markdown(
+    pdf_file: UploadFile, output_format: Literal["json", "zip"] = "json"
+):
     """
     Endpoint to convert a single PDF to markdown.
+
+    With output_format=zip the markdown, metadata and PNG images are returned
+    as a zip archive instead of JSON with base64-encoded images.
     """
     logger.debug(f"Received file: {pdf_file.filename}")
     file = await pdf_file.read()
-    response = process_pdf_file(file, pdf_file.filename, model_list)
+    as_zip = output_format == "zip"
+    try:
+        response = await conversion_executor.submit(
+            process_pdf_file, file, pdf_file.filename, model_list, not as_zip
+        )
+    except QueueFullError as e:
+        return queue_full_response(e)
+    if as_zip:
+        archive = await run_in_threadpool(
+            build_conversion_zip,
+            response["filename"], response["markdown"], response["metadata"], response["images"],
+        )
+        return StreamingResponse(
+            iter(lambda: archive.read(ZIP_STREAM_CHUNK_SIZE), b""),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f'attachment; filename="{pdf_file.filename}.zip"',
+                "Content-Length": str(os.fstat(archive.fileno()).st_size),
+            },
+            background=BackgroundTask(archive.close),
+        )
     return ConversionResponse(status="Success", result=response)
 
 
@@ -80,21 +141,17 @@ async def convert_pdf_to_markdown(pdf_file: UploadFile):
 async def convert_pdfs_to_markdown(pdf_files: List[UploadFile] = File(...)):
     """
     Endpoint to convert multiple PDFs to markdown.
+
+    The files queue for the shared conversion workers one after another, so
+    a batch may hold more files than the executor admits at once.
     """
     logger.debug(f"Received {len(pdf_files)} files for batch conversion")
 
-    async def process_files(files):
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
-            coroutines = [
-                loop.run_in_executor(
-                    pool, process_pdf_file, await file.read(), file.filename, model_list
-                )
-                for file in files
-            ]
-            return await asyncio.gather(*coroutines)
-
-    responses = await process_files(pdf_files)
+    files = [(await file.read(), file.filename, model_list) for file in pdf_files]
+    try:
+        responses = await conversion_executor.submit_many(process_pdf_file, files)
+    except QueueFullError as e:
+        return queue_full_response(e)
     return BatchConversionResponse(results=responses)
 
 
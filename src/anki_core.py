@@ -22,57 +22,151 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
 
-from typing import List
+from typing import List, Sequence, Tuple
 import re
 
 from pdf2anki_types import Card
 
 
-def build_output_instructions(note_type: str, num_cards: int) -> str:
-    """
-    Return instruction block describing the exact output format expected from the model.
-    """
-    note = (note_type or "basic").lower()
-    if note == "cloze":
+def _numbered_list_format(note_type: str) -> str:
+    """Example of the numbered list the model must output for one note type."""
+    if (note_type or "basic").lower() == "cloze":
         return (
-            "Generate exactly {num_cards} cloze deletions. Output ONLY a numbered list with this exact format:\n"
-            "1. Cloze: [Text containing {{c1::...}} or {{cN::...}}]\n   Extra: [optional extra]\n\n"
+            "1. Cloze: [Text containing {c1::...} or {cN::...}]\n   Extra: [optional extra]\n\n"
             "2. Cloze: [Text]\n   Extra: [optional extra]"
-        ).format(num_cards=num_cards)
+        )
     return (
-        "Generate exactly {num_cards} flashcards. Output ONLY a numbered list with this exact format:\n"
         "1. Question: [question text]\n   Answer: [answer text]\n\n"
         "2. Question: [question text]\n   Answer: [answer text]"
-    ).format(num_cards=num_cards)
+    )
+
+
+def _card_noun(note_type: str) -> str:
+    return "cloze deletions" if (note_type or "basic").lower() == "cloze" else "flashcards"
+
+
+def build_output_instructions(note_type: str, num_cards: int) -> str:
+    """
+    Return instruction block describing the exact output format expected from the model.
+    """
+    return (
+        f"Generate exactly {num_cards} {_card_noun(note_type)}. "
+        "Output ONLY a numbered list with this exact format:\n" + _numbered_list_format(note_type)
+    )
+
+
+_MATH_GUIDELINES = (
+    "MATHEMATICAL EXPRESSIONS (MathJax/LaTeX):\n"
+    "- Use MathJax format for all mathematical expressions in TSV fields.\n"
+    "- Inline math: \\( ... \\) for expressions within text (e.g., What is the gradient of \\(f(x)=x^2\\)?)\n"
+    "- Display math: \\[ ... \\] for centered equations on their own line (e.g., \\[\\frac{\\partial^2 u}{\\partial t^2}=c^2\\nabla^2 u\\])\n"
+    "- For cloze deletions with math, wrap the math inside the cloze: {{c1::\\(formula\\)}}\n"
+    "- Avoid literal tab characters inside formulas; use spaces instead.\n"
+    "- Use <br> for line breaks inside fields (HTML is allowed).\n"
+    "- If the source content uses [$]...[/$] format, convert to MathJax: [$]...[/$] → \\(...\\) (inline) or \\[...\\] (display)\n"
+    "- Complex environments like \\begin{aligned}...\\end{aligned} work in \\[...\\] blocks.\n\n"
+)
+
+
+def _focus_text(content_focus: str) -> str:
+    return content_focus if content_focus and content_focus != "mixed" else "key concepts, definitions, and important details"
 
 
 def build_prompt(note_type: str, num_cards: int, content_focus: str, markdown_content: str) -> str:
     """
     Build the full user prompt for the chat completion request.
     Note: System message should be set separately (e.g., "You are a helpful assistant that creates educational flashcards.")
+
+    The content is included in full; callers keep it within the model's
+    context window (see prompt_packing).
     """
-    focus = content_focus if content_focus and content_focus != "mixed" else "key concepts, definitions, and important details"
     instructions = build_output_instructions(note_type, num_cards)
-    content = (markdown_content or "")[:4000]
     return (
-        f"Create Anki flashcards from the following content. Focus on {focus}.\n\n"
+        f"Create Anki flashcards from the following content. Focus on {_focus_text(content_focus)}.\n\n"
         "IMPORTANT:\n"
         f"- {instructions}\n"
         "- Do not include any other text, explanations, headings, or formatting.\n"
         "- Keep each item concise but informative.\n\n"
-        "MATHEMATICAL EXPRESSIONS (MathJax/LaTeX):\n"
-        "- Use MathJax format for all mathematical expressions in TSV fields.\n"
-        "- Inline math: \\( ... \\) for expressions within text (e.g., What is the gradient of \\(f(x)=x^2\\)?)\n"
-        "- Display math: \\[ ... \\] for centered equations on their own line (e.g., \\[\\frac{\\partial^2 u}{\\partial t^2}=c^2\\nabla^2 u\\])\n"
-        "- For cloze deletions with math, wrap the math inside the cloze: {{c1::\\(formula\\)}}\n"
-        "- Avoid literal tab characters inside formulas; use spaces instead.\n"
-        "- Use <br> for line breaks inside fields (HTML is allowed).\n"
-        "- If the source content uses [$]...[/$] format, convert to MathJax: [$]...[/$] → \\(...\\) (inline) or \\[...\\] (display)\n"
-        "- Complex environments like \\begin{aligned}...\\end{aligned} work in \\[...\\] blocks.\n\n"
-        f"Content:\n{content}\n"
+        + _MATH_GUIDELINES
+        + f"Content:\n{markdown_content or ''}\n"
+    )
+
+
+def section_marker(index: int) -> str:
+    """Delimiter line that starts section ``index`` (1-based) of a packed prompt and of its reply."""
+    return f"=== SECTION {index} ==="
+
+
+_SECTION_MARKER = re.compile(r"^[ \t#*]*=+\s*SECTION\s+(\d+)\s*=+[ \t*]*$", re.MULTILINE | re.IGNORECASE)
+
+
+def build_packed_prompt(note_type: str, content_focus: str, sections: Sequence[Tuple[str, int]]) -> str:
+    """
+    Build one prompt asking for cards from several chunks at once.
+
+    Each chunk becomes a section delimited by ``section_marker``; the model
+    is asked to repeat the markers in its reply so the cards can be
+    attributed back to their chunks with ``parse_packed_cards_from_output``.
+
+    Args:
+        note_type: "basic" or "cloze"
+        content_focus: Card type focus (definitions, concepts, mixed)
+        sections: ``(content, num_cards)`` per chunk, in document order
+
+    Returns:
+        The user prompt
+    """
+    noun = _card_noun(note_type)
+    counts = "".join(
+        f"  - SECTION {index}: exactly {num_cards} {noun}\n"
+        for index, (_, num_cards) in enumerate(sections, start=1)
+    )
+    content = "\n\n".join(
+        f"{section_marker(index)}\n{text}" for index, (text, _) in enumerate(sections, start=1)
+    )
+    return (
+        f"Create Anki flashcards from the following content. Focus on {_focus_text(content_focus)}.\n\n"
+        f"The content is divided into {len(sections)} sections, each starting with a line like \"{section_marker(1)}\". "
+        "Make the cards of each section only from that section's text.\n\n"
+        "IMPORTANT:\n"
+        f"- Generate exactly this many {noun} per section:\n{counts}"
+        "- For every section, output its marker line followed by a numbered list with this exact format:\n"
+        f"{section_marker(1)}\n" + _numbered_list_format(note_type) + "\n"
+        "- Do not include any other text, explanations, headings, or formatting.\n"
+        "- Keep each item concise but informative.\n\n"
+        + _MATH_GUIDELINES
+        + f"Content:\n{content}\n"
     )
 
 
+def split_packed_output(model_output: str, num_sections: int) -> List[str]:
+    """
+    Split the reply to a packed prompt into the text of each section.
+
+    Sections the model skipped are empty strings; text before the first
+    marker and markers beyond ``num_sections`` are ignored. A reply without
+    any marker is attributed to the first section.
+    """
+    text = model_output or ""
+    parts = [""] * num_sections
+    markers = list(_SECTION_MARKER.finditer(text))
+    if not markers:
+        if num_sections:
+            parts[0] = text
+        return parts
+    for marker, following in zip(markers, markers[1:] + [None]):
+        index = int(marker.group(1)) - 1
+        if 0 <= index < num_sections:
+            end = following.start() if following is not None else len(text)
+            parts[index] += text[marker.end():end]
+    return parts
+
+
+def parse_packed_cards_from_output(model_output: str, note_type: str, num_sections: int) -> List[List[Card]]:
+    """Parse the reply to a packed prompt into one list of Card objects per section."""
+    return [parse_cards_from_output(part, note_type) for part in split_packed_output(model_output, num_sections)]
+
+
 def parse_cards_from_output(model_output: str, note_type: str) -> List[Card]:
     """
     Parse model output into a list of Card objects according to note_type.
@@ -0,0 +1,373 @@
+"""
+Native Anki deck (.apkg) export.
+
+An .apkg file is a zip archive holding an Anki collection database
+(collection.anki2) and a media map. This module builds that database on
+disk from an iterable of cards, inserting notes and cards in batches with
+``executemany``, then streams the database file into the zip. Memory use
+is bounded by the batch size rather than the deck size, so very large
+decks never have to be held as one TSV string or one list of cards.
+
+Basic cards use a "Front"/"Back" note type and cloze cards a
+"Text"/"Extra" cloze note type, the same layouts as ``Card.to_tsv_row``.
+Note GUIDs are derived from the card's SourceReference and question, so
+importing a regenerated deck updates existing notes instead of adding
+copies.
+
+Usage:
+  python src/apkg_writer.py anki_cards.tsv --deck "Lecture 3" --output lecture3.apkg
+  python src/apkg_writer.py anki_cards.tsv --note-type cloze
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import string
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from pdf2anki_types import Card
+
+DEFAULT_DECK_NAME = "PDF2Anki"
+DEFAULT_BATCH_SIZE = 1000
+
+# Fixed note type IDs, so every exported deck shares the same two note types in Anki
+BASIC_MODEL_ID = 1735689600001
+CLOZE_MODEL_ID = 1735689600002
+
+_BASE91 = string.ascii_letters + string.digits + "!#$%&()*+,-./:;<=>?@[]^_`{|}~"
+_HTML_TAG = re.compile(r"<[^>]+>")
+_CLOZE_NUMBER = re.compile(r"\{\{c(\d+)::")
+
+_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null,
+    tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null,
+    time integer not null, type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+"""
+
+# Created after the inserts, which is faster than maintaining them row by row
+_INDEXES = """
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+_CSS = ".card {\n font-family: arial;\n font-size: 20px;\n text-align: center;\n color: black;\n background-color: white;\n}\n"
+_CLOZE_CSS = _CSS + ".cloze {\n font-weight: bold;\n color: blue;\n}\n"
+
+
+@dataclass
+class ApkgResult:
+    """
+    Summary of an .apkg export.
+
+    Attributes:
+        path: Written .apkg file
+        notes: Number of notes written
+        cards: Number of cards (cloze notes have one per cloze number)
+        skipped: Notes skipped because an earlier note had the same GUID
+    """
+    path: Path
+    notes: int
+    cards: int
+    skipped: int
+
+
+def _guid(card: Card) -> str:
+    """Stable base91 note GUID from the card's source and question (Anki's guid64 format)."""
+    source = card.source_ref
+    key = "\x1f".join([
+        source.pdf_sha256 if source else "",
+        (source.chunk_id or "") if source else "",
+        (card.note_type or "basic").lower(),
+        card.question.strip(),
+    ])
+    value = int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+    digits = []
+    while value:
+        value, remainder = divmod(value, len(_BASE91))
+        digits.append(_BASE91[remainder])
+    return "".join(reversed(digits)) or _BASE91[0]
+
+
+def _deck_id(deck_name: str) -> int:
+    # Stable per name, so re-imports land in the same deck; kept clear of the default deck (1)
+    return 2 + int.from_bytes(hashlib.sha256(deck_name.encode("utf-8")).digest()[:6], "big")
+
+
+def _sort_field(text: str) -> str:
+    return _HTML_TAG.sub("", text)
+
+
+def _checksum(text: str) -> int:
+    return int(hashlib.sha1(_sort_field(text).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _note_fields(card: Card) -> Tuple[int, List[str], List[int]]:
+    """(model id, fields, card ordinals) for a card's layout."""
+    if (card.note_type or "basic").lower() == "cloze":
+        extra = card.extra if card.extra is not None else (card.answer or "")
+        numbers = sorted({int(n) for n in _CLOZE_NUMBER.findall(card.question) if int(n) > 0})
+        return CLOZE_MODEL_ID, [card.question, extra], [n - 1 for n in numbers] or [0]
+    return BASIC_MODEL_ID, [card.question, card.answer], [0]
+
+
+def _field(name: str, ord_: int) -> Dict:
+    return {"name": name, "ord": ord_, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+
+
+def _models(deck_id: int, now: int) -> Dict[str, Dict]:
+    common = {
+        "mod": now, "usn": -1, "sortf": 0, "did": deck_id, "tags": [], "vers": [],
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage{amssymb,amsmath}\n"
+                    "\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+        "latexPost": "\\end{document}", "latexsvg": False,
+    }
+    basic = dict(
+        common, id=BASIC_MODEL_ID, name="PDF2Anki Basic", type=0, css=_CSS,
+        flds=[_field("Front", 0), _field("Back", 1)],
+        tmpls=[{
+            "name": "Card 1", "ord": 0, "did": None, "bqfmt": "", "bafmt": "",
+            "qfmt": "{{Front}}", "afmt": "{{FrontSide}}\n\n<hr id=answer>\n\n{{Back}}",
+        }],
+        req=[[0, "any", [0]]],
+    )
+    cloze = dict(
+        common, id=CLOZE_MODEL_ID, name="PDF2Anki Cloze", type=1, css=_CLOZE_CSS,
+        flds=[_field("Text", 0), _field("Extra", 1)],
+        tmpls=[{
+            "name": "Cloze", "ord": 0, "did": None, "bqfmt": "", "bafmt": "",
+            "qfmt": "{{cloze:Text}}", "afmt": "{{cloze:Text}}<br>\n{{Extra}}",
+        }],
+        req=[[0, "any", [0]]],
+    )
+    return {str(BASIC_MODEL_ID): basic, str(CLOZE_MODEL_ID): cloze}
+
+
+def _deck(deck_id: int, name: str, now: int) -> Dict:
+    return {
+        "id": deck_id, "name": name, "desc": "", "mod": now, "usn": -1, "dyn": 0, "conf": 1,
+        "collapsed": False, "browserCollapsed": False, "extendNew": 10, "extendRev": 50,
+        "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0],
+    }
+
+
+_DECK_CONFIG = {
+    "1": {
+        "id": 1, "name": "Default", "mod": 0, "usn": 0, "dyn": False, "maxTaken": 60,
+        "timer": 0, "autoplay": True, "replayq": True,
+        "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "order": 1,
+                "perDay": 20, "bury": True, "separate": True},
+        "rev": {"perDay": 200, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500,
+                "bury": True, "minSpace": 1},
+        "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+    }
+}
+
+
+def _write_collection(conn: sqlite3.Connection, deck_name: str, now_sec: int) -> int:
+    deck_id = _deck_id(deck_name)
+    conf = {
+        "nextPos": 1, "estTimes": True, "activeDecks": [1], "sortType": "noteFld", "timeLim": 0,
+        "sortBackwards": False, "addToCur": True, "curDeck": 1, "newBury": True, "newSpread": 0,
+        "dueCounts": True, "curModel": str(BASIC_MODEL_ID), "collapseTime": 1200,
+    }
+    decks = {"1": _deck(1, "Default", now_sec), str(deck_id): _deck(deck_id, deck_name, now_sec)}
+    conn.execute(
+        "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+        (
+            now_sec, now_sec * 1000, now_sec * 1000,
+            json.dumps(conf), json.dumps(_models(deck_id, now_sec)),
+            json.dumps(decks), json.dumps(_DECK_CONFIG),
+        ),
+    )
+    return deck_id
+
+
+def _batches(cards: Iterable[Card], size: int) -> Iterator[List[Card]]:
+    iterator = iter(cards)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_apkg(
+    cards: Iterable[Card],
+    output_path: Path,
+    deck_name: str = DEFAULT_DECK_NAME,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> ApkgResult:
+    """
+    Write ``cards`` to an Anki deck package.
+
+    Args:
+        cards: Cards to export; consumed once, in batches, so a generator works
+        output_path: Destination .apkg path (replaced atomically)
+        deck_name: Name of the deck the cards are imported into
+        batch_size: Notes inserted per ``executemany`` call
+
+    Returns:
+        ApkgResult with the number of notes and cards written
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    now_sec = int(time.time())
+    next_id = now_sec * 1000
+    seen_guids = set()
+    notes_written = cards_written = skipped = 0
+
+    with tempfile.TemporaryDirectory(prefix="apkg-", dir=output_path.parent) as tmp:
+        collection_path = Path(tmp) / "collection.anki2"
+        conn = sqlite3.connect(str(collection_path))
+        try:
+            # A scratch file: no journal or fsyncs while building it
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(_SCHEMA)
+            deck_id = _write_collection(conn, deck_name, now_sec)
+
+            for batch in _batches(cards, max(1, batch_size)):
+                note_rows = []
+                card_rows = []
+                for card in batch:
+                    guid = _guid(card)
+                    if guid in seen_guids:
+                        skipped += 1
+                        continue
+                    seen_guids.add(guid)
+                    model_id, fields, ords = _note_fields(card)
+                    note_id = next_id
+                    next_id += 1
+                    tags = " ".join(tag.replace(" ", "_") for tag in card.tags)
+                    note_rows.append((
+                        note_id, guid, model_id, now_sec, -1, f" {tags} " if tags else "",
+                        "\x1f".join(fields), _sort_field(fields[0]), _checksum(fields[0]), 0, "",
+                    ))
+                    for ord_ in ords:
+                        card_rows.append((
+                            next_id, note_id, deck_id, ord_, now_sec, -1,
+                            0, 0, notes_written + 1, 0, 0, 0, 0, 0, 0, 0, 0, "",
+                        ))
+                        next_id += 1
+                    notes_written += 1
+                    cards_written += len(ords)
+                conn.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", note_rows)
+                conn.executemany(
+                    "INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", card_rows
+                )
+                conn.commit()
+
+            conn.executescript(_INDEXES)
+            conn.commit()
+        finally:
+            conn.close()
+
+        partial_path = Path(tmp) / "deck.apkg"
+        with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            # Copied from disk in blocks, never read into memory whole
+            archive.write(collection_path, "collection.anki2")
+            archive.writestr("media", "{}")
+        partial_path.replace(output_path)
+
+    return ApkgResult(path=output_path, notes=notes_written, cards=cards_written, skipped=skipped)
+
+
+def iter_tsv_cards(tsv_path: Path, note_type: str = "basic") -> Iterator[Card]:
+    """
+    Read cards back from a TSV written with ``Card.to_tsv_row``, one line at a time.
+
+    Args:
+        tsv_path: TSV file (front, back/extra, semicolon-separated tags)
+        note_type: "basic" or "cloze", the layout the TSV was written with
+
+    Yields:
+        Card objects
+    """
+    cloze = note_type.lower() == "cloze"
+    with open(tsv_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                continue
+            parts = line.split("\t")
+            parts += [""] * (3 - len(parts))
+            question, back, tags = parts[0], parts[1], parts[2]
+            tag_list = [tag for tag in tags.split(";") if tag]
+            if cloze:
+                yield Card(question=question, answer="", note_type="cloze", extra=back, tags=tag_list)
+            else:
+                yield Card(question=question, answer=back, note_type="basic", tags=tag_list)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a PDF2Anki TSV export into an Anki .apkg deck")
+    parser.add_argument("tsv", type=Path, help="TSV file written by PDF2Anki")
+    parser.add_argument("--note-type", choices=["basic", "cloze"], default="basic")
+    parser.add_argument("--deck", default=None, help="Deck name (default: TSV file name)")
+    parser.add_argument("--output", "-o", type=Path, default=None, help="Output path (default: TSV path with .apkg)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    result = write_apkg(
+        iter_tsv_cards(args.tsv, args.note_type),
+        args.output or args.tsv.with_suffix(".apkg"),
+        deck_name=args.deck or args.tsv.stem,
+        batch_size=args.batch_size,
+    )
+    print(f"Wrote {result.notes} notes ({result.cards} cards) to {result.path}"
+          + (f"; skipped {result.skipped} duplicates" if result.skipped else ""))
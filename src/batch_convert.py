@@ -0,0 +1,461 @@
+"""
+Batch conversion of whole directories through the Marker API.
+
+PDFs are uploaded concurrently over a single aiohttp session, with a
+semaphore bounding the number of requests in flight. Each file is streamed
+from disk, and each response is written to ``conversions/<sha256>/`` as it
+arrives (markdown to ``marker.md``, images to ``images/``), so memory use
+does not grow with the size of the batch. Conversions already in the cache
+are skipped. A throughput summary (pages/sec, MB/sec, p50/p95 latency) is
+reported at the end. Progress is recorded in a job manifest, so an
+interrupted run resumes where it stopped.
+
+Usage:
+  python src/batch_convert.py --input-dir /path/to/pdfs --outdir outputs --concurrency 8
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+from conversion_cache import ConversionCache, get_conversion_cache, make_cache_key
+from file_fingerprint import pdf_page_count
+from job_manifest import JobManifest, default_manifest_path, stage_reached
+from marker_client import (
+    RETRY_STATUS_CODES,
+    STREAM_CHUNK_SIZE,
+    ConversionResponseWriter,
+    compute_sha256,
+    ensure_dir,
+)
+from process_markdown import process_conversion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_CONCURRENCY = 4
+
+
+@dataclass
+class BatchItemResult:
+    """
+    Outcome of converting one file.
+
+    Attributes:
+        source_path: Input PDF
+        status: "converted", "cached" or "failed"
+        sha256: Content hash of the PDF
+        size_bytes: PDF size
+        pages: Page count, if it could be read
+        latency_sec: Time from upload start to response written (0 for cache hits)
+        markdown_path: Written or cached marker.md
+        error: Error message for failed files
+    """
+    source_path: str
+    status: str
+    sha256: Optional[str] = None
+    size_bytes: int = 0
+    pages: Optional[int] = None
+    latency_sec: float = 0.0
+    markdown_path: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchSummary:
+    """Throughput summary of a batch run."""
+    files: int = 0
+    converted: int = 0
+    cached: int = 0
+    failed: int = 0
+    total_bytes: int = 0
+    total_pages: int = 0
+    elapsed_sec: float = 0.0
+    pages_per_sec: float = 0.0
+    mb_per_sec: float = 0.0
+    latency_p50_sec: Optional[float] = None
+    latency_p95_sec: Optional[float] = None
+    results: List[BatchItemResult] = field(default_factory=list)
+
+    def to_dict(self, include_results: bool = False) -> dict:
+        data = asdict(self)
+        if not include_results:
+            data.pop("results")
+        return data
+
+
+def find_pdfs(input_dir: Path, recursive: bool = True) -> List[Path]:
+    """List PDF files under ``input_dir`` in a stable order."""
+    pattern = "**/*" if recursive else "*"
+    return sorted(p for p in Path(input_dir).glob(pattern) if p.is_file() and p.suffix.lower() == ".pdf")
+
+
+def _percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return round(ordered[int(rank) - 1], 4)
+
+
+def summarize(results: List[BatchItemResult], elapsed_sec: float) -> BatchSummary:
+    """Aggregate per-file results into a throughput summary."""
+    converted = [r for r in results if r.status == "converted"]
+    summary = BatchSummary(
+        files=len(results),
+        converted=len(converted),
+        cached=sum(1 for r in results if r.status == "cached"),
+        failed=sum(1 for r in results if r.status == "failed"),
+        elapsed_sec=round(elapsed_sec, 4),
+        results=results,
+    )
+    # Throughput counts what actually went through the API
+    summary.total_bytes = sum(r.size_bytes for r in converted)
+    summary.total_pages = sum(r.pages or 0 for r in converted)
+    if elapsed_sec > 0:
+        summary.pages_per_sec = round(summary.total_pages / elapsed_sec, 4)
+        summary.mb_per_sec = round(summary.total_bytes / (1024 * 1024) / elapsed_sec, 4)
+    latencies = [r.latency_sec for r in converted]
+    summary.latency_p50_sec = _percentile(latencies, 50)
+    summary.latency_p95_sec = _percentile(latencies, 95)
+    return summary
+
+
+def _retry_delay(response: "aiohttp.ClientResponse", attempt: int) -> float:
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return float(2 ** attempt)
+
+
+async def _post_and_write(
+    session: "aiohttp.ClientSession",
+    pdf_path: Path,
+    url: str,
+    conv_dir: Path,
+    max_retries: int,
+    on_uploaded: Callable[[], None],
+) -> dict:
+    """Upload one PDF and stream the response to disk; returns meta fields."""
+    attempt = 0
+    while True:
+        with pdf_path.open("rb") as f:
+            form = aiohttp.FormData()
+            form.add_field("pdf_file", f, filename=pdf_path.name, content_type="application/pdf")
+            async with session.post(url, data=form, headers={"Accept": "application/json"}) as response:
+                if response.status in RETRY_STATUS_CODES and attempt < max_retries:
+                    delay = _retry_delay(response, attempt)
+                    logger.warning(f"{pdf_path.name}: status {response.status}, retrying in {delay:.1f}s")
+                else:
+                    if response.status >= 400:
+                        body = await response.text()
+                        (conv_dir / "error.log").write_text(json.dumps({
+                            "status_code": response.status,
+                            "response_text": body[:1000],
+                            "attempts": attempt + 1,
+                        }, ensure_ascii=False, indent=2), encoding="utf-8")
+                        raise RuntimeError(f"HTTP {response.status}")
+                    on_uploaded()
+                    writer = ConversionResponseWriter(conv_dir, response.headers.get("Content-Type"))
+                    try:
+                        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                            writer.feed(chunk)
+                        image_count = writer.close()
+                    except BaseException:
+                        writer.abort()
+                        raise
+                    return {"status_code": response.status, "retry_count": attempt, "images": image_count}
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _convert_one(
+    session: "aiohttp.ClientSession",
+    semaphore: asyncio.Semaphore,
+    pdf_path: Path,
+    url: str,
+    output_root: Path,
+    cache: Optional[ConversionCache],
+    engine_version: str,
+    api_convert_path: str,
+    max_retries: int,
+    manifest: Optional[JobManifest],
+    process: bool,
+    max_tokens: int,
+) -> BatchItemResult:
+    result = BatchItemResult(source_path=str(pdf_path), status="failed")
+    stage = "hashed"
+    stat = None
+
+    def begin(name: str) -> None:
+        nonlocal stage
+        stage = name
+        if manifest is not None:
+            manifest.begin(pdf_path, name, stat)
+
+    def complete(name: str, **values) -> None:
+        if manifest is not None:
+            manifest.complete(pdf_path, name, stat, **values)
+
+    try:
+        stat = pdf_path.stat()
+        result.size_bytes = stat.st_size
+        entry = manifest.lookup(pdf_path, stat) if manifest is not None else None
+        completed = entry.stage if entry is not None else None
+
+        options = {"api_convert_path": api_convert_path}
+
+        # Finished in an earlier run with the same engine and options: skip without re-hashing
+        if stage_reached(completed, "chunked" if process else "converted"):
+            markdown_path = entry.artifacts.get("markdown_path")
+            if (
+                cache is not None
+                and markdown_path
+                and Path(markdown_path).exists()
+                and entry.artifacts.get("cache_key") == make_cache_key(entry.sha256, engine_version, options)
+                and (not process or entry.artifacts.get("max_tokens") == max_tokens)
+            ):
+                result.status = "cached"
+                result.sha256 = entry.sha256
+                result.pages = entry.artifacts.get("pages")
+                result.markdown_path = markdown_path
+                return result
+            completed = "hashed"
+
+        if stage_reached(completed, "hashed") and entry.sha256:
+            result.sha256 = entry.sha256
+            result.pages = entry.artifacts.get("pages")
+        else:
+            begin("hashed")
+            result.sha256 = await asyncio.to_thread(compute_sha256, pdf_path)
+            result.pages = await asyncio.to_thread(pdf_page_count, pdf_path)
+            complete("hashed", sha256=result.sha256, pages=result.pages)
+        cache_key = make_cache_key(result.sha256, engine_version, options)
+        conv_dir = output_root / "conversions" / result.sha256
+
+        cached = cache.lookup(result.sha256, cache_key) if cache is not None else None
+        if cached is not None:
+            result.status = "cached"
+            result.markdown_path = str(cached[0])
+            complete("converted", markdown_path=result.markdown_path, cache_key=cache_key)
+        else:
+            ensure_dir(conv_dir)
+            async with semaphore:
+                started = time.perf_counter()
+                begin("uploaded")
+
+                def uploaded() -> None:
+                    complete("uploaded")
+                    begin("converted")
+
+                response_meta = await _post_and_write(session, pdf_path, url, conv_dir, max_retries, uploaded)
+                result.latency_sec = round(time.perf_counter() - started, 4)
+
+            (conv_dir / "error.log").unlink(missing_ok=True)
+            meta = {
+                "source_path": str(pdf_path.resolve()),
+                "source_sha256": result.sha256,
+                "api_url": url,
+                "status_code": response_meta["status_code"],
+                "retry_count": response_meta["retry_count"],
+                "engine_version": engine_version,
+                "cache_key": cache_key,
+                "streaming": True,
+                "images": response_meta["images"],
+            }
+            (conv_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+            result.status = "converted"
+            result.markdown_path = str(conv_dir / "marker.md")
+            complete("converted", markdown_path=result.markdown_path, cache_key=cache_key)
+
+        if process and not stage_reached(completed, "chunked"):
+            begin("cleaned")
+            processing = await asyncio.to_thread(
+                process_conversion, Path(result.markdown_path), Path(result.markdown_path).parent,
+                result.sha256, max_tokens=max_tokens,
+            )
+            complete("cleaned", cleaned_md_path=processing["cleaned_md_path"])
+            complete(
+                "chunked",
+                chunks_jsonl_path=processing["chunks_jsonl_path"],
+                total_chunks=processing["total_chunks"],
+                max_tokens=max_tokens,
+            )
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        result.status = "failed"
+        result.error = f"{type(e).__name__}: {e}"
+        logger.error(f"Failed to convert {pdf_path}: {result.error}")
+        if manifest is not None and stat is not None:
+            manifest.fail(pdf_path, stage, result.error, stat)
+    return result
+
+
+async def convert_batch_async(
+    pdf_paths: Sequence[Path],
+    api_base_url: str,
+    output_root: Path,
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    timeout_seconds: int = 300,
+    api_convert_path: str = "/convert",
+    max_retries: int = 3,
+    use_cache: bool = True,
+    engine_version: Optional[str] = None,
+    on_result: Optional[Callable[[BatchItemResult], None]] = None,
+    manifest: Optional[JobManifest] = None,
+    process: bool = False,
+    max_tokens: int = 2000,
+) -> BatchSummary:
+    """
+    Convert ``pdf_paths`` with at most ``max_concurrency`` uploads in flight.
+
+    Args:
+        pdf_paths: Input PDFs
+        api_base_url: Marker API base URL
+        output_root: Root for ``conversions/<sha256>/``
+        max_concurrency: Maximum simultaneous conversion requests
+        timeout_seconds: Total timeout per request
+        api_convert_path: Conversion endpoint path
+        max_retries: Retries for 429/5xx responses (Retry-After is honored)
+        use_cache: Skip PDFs that already have a cached conversion, or that the
+            manifest records as finished with the same cache key (and
+            max_tokens when processing); False converts every PDF again
+        engine_version: Engine version for the cache key (default: MARKER_ENGINE_VERSION)
+        on_result: Called with each file's result as it completes
+        manifest: Job ledger; files it records as finished are skipped without
+            re-hashing (see ``use_cache``), unchanged files are not re-hashed,
+            and every stage is recorded as it completes
+        process: Also clean and chunk each conversion (cleaned.md, chunks.jsonl)
+        max_tokens: Maximum tokens per chunk when processing
+
+    Returns:
+        BatchSummary with per-file results in completion order
+    """
+    if not HAS_AIOHTTP:
+        raise ImportError("aiohttp is required for batch conversion: pip install aiohttp")
+
+    output_root = Path(output_root).resolve()
+    if engine_version is None:
+        engine_version = os.getenv("MARKER_ENGINE_VERSION", "unknown")
+    cache = get_conversion_cache(output_root) if use_cache else None
+    url = api_base_url.rstrip("/") + api_convert_path
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    connector = aiohttp.TCPConnector(limit=max(1, max_concurrency))
+    timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+
+    results: List[BatchItemResult] = []
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [
+            asyncio.create_task(_convert_one(
+                session, semaphore, Path(p), url, output_root, cache,
+                engine_version, api_convert_path, max_retries,
+                manifest, process, max_tokens,
+            ))
+            for p in pdf_paths
+        ]
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    elapsed = time.perf_counter() - started
+
+    if cache is not None:
+        cache.evict()
+    return summarize(results, elapsed)
+
+
+def convert_batch(pdf_paths: Sequence[Path], api_base_url: str, output_root: Path, **kwargs) -> BatchSummary:
+    """Synchronous wrapper around convert_batch_async."""
+    return asyncio.run(convert_batch_async(pdf_paths, api_base_url, output_root, **kwargs))
+
+
+def convert_directory(input_dir: Path, api_base_url: str, output_root: Path, recursive: bool = True, **kwargs) -> BatchSummary:
+    """Convert every PDF under ``input_dir``; see convert_batch_async for options."""
+    return convert_batch(find_pdfs(input_dir, recursive=recursive), api_base_url, output_root, **kwargs)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a directory of PDFs through the Marker API")
+    parser.add_argument("--input-dir", required=True, help="Directory containing PDFs")
+    parser.add_argument("--api", default=os.getenv("MARKER_API_BASE", "http://localhost:8080"), help="Marker API base URL")
+    parser.add_argument("--outdir", default="outputs", help="Root output directory (default: outputs)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY, help="Maximum simultaneous conversions")
+    parser.add_argument("--timeout", type=int, default=300, help="HTTP timeout seconds per file")
+    parser.add_argument("--no-recursive", action="store_true", help="Only convert PDFs directly inside --input-dir")
+    parser.add_argument("--no-cache", action="store_true", help="Convert even if a cached conversion exists")
+    parser.add_argument("--summary", default=None, help="Also write the summary (with per-file results) to this JSON file")
+    parser.add_argument("--manifest", default=None, help="Job manifest path (default: <outdir>/manifests/<input-dir>-<hash>.sqlite3)")
+    parser.add_argument("--no-manifest", action="store_true", help="Do not record or resume from a job manifest")
+    parser.add_argument("--process", action="store_true", help="Also clean and chunk each conversion")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="Maximum tokens per chunk with --process (default: 2000)")
+    args = parser.parse_args()
+
+    input_dir = Path(args.input_dir).expanduser()
+    out_root = Path(args.outdir).expanduser()
+    manifest = None
+    if not args.no_manifest:
+        manifest_path = Path(args.manifest) if args.manifest else default_manifest_path(out_root, input_dir)
+        manifest = JobManifest(manifest_path)
+
+    def report(result: BatchItemResult) -> None:
+        print(f"[{result.status}] {result.source_path}" + (f" ({result.error})" if result.error else ""), flush=True)
+
+    summary = convert_directory(
+        input_dir,
+        api_base_url=args.api,
+        output_root=out_root,
+        recursive=not args.no_recursive,
+        max_concurrency=args.concurrency,
+        timeout_seconds=args.timeout,
+        use_cache=not args.no_cache,
+        on_result=report,
+        manifest=manifest,
+        process=args.process,
+        max_tokens=args.max_tokens,
+    )
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary.to_dict(include_results=True), ensure_ascii=False, indent=2), encoding="utf-8")
+    output = summary.to_dict()
+    if manifest is not None:
+        output["manifest"] = manifest.summary()
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Card deduplication across chunks and runs.
+
+Neighbouring chunks often cover the same topic, and regenerating a deck
+for the same PDF produces the same questions again. Each card's question
+is normalized (cloze markers, MathJax delimiters, HTML, sentence
+punctuation, whitespace and case removed; math operators, sub- and
+superscripts are kept, so $x^2$ and $x_2$ stay different) and
+fingerprinted twice: a digest of the normalized text catches exact
+duplicates, and a 64-bit SimHash of its words and word pairs catches near
+duplicates (a few words changed, the same formulas). Both are looked up
+in hash tables, so each card costs O(1) however large the deck is; near
+duplicates are found by splitting the SimHash into bands and only
+comparing cards that share a band.
+
+Fingerprints of exported cards are kept per source PDF in a small SQLite
+database (default: outputs/card_index.sqlite3), so a later run for the
+same PDF can skip questions that are already in an exported deck.
+
+Usage:
+  python src/card_dedup.py --stats
+  python src/card_dedup.py --forget <pdf_sha256>
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pdf2anki_types import Card
+
+DEFAULT_INDEX_PATH = Path("outputs") / "card_index.sqlite3"
+
+# Questions whose SimHashes differ in at most this many bits are duplicates.
+# The hash is split into MAX_DISTANCE + 1 bands, so two such questions
+# always agree on at least one whole band.
+MAX_DISTANCE = 3
+SIMHASH_BITS = 64
+_BANDS = MAX_DISTANCE + 1
+_BAND_BITS = SIMHASH_BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_CLOZE = re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*)?\}\}", re.DOTALL)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_MATH_DELIMITER = re.compile(r"\\[()\[\]]|\[/?\$\$?\]|\$\$?")
+_EMPHASIS = re.compile(r"\*\*|__|`")
+# Sentence punctuation; a period between digits (3.14) is kept
+_PUNCTUATION = re.compile(r"[?!,;:\"“”‘’？！、。]|\.(?!\d)")
+# Operators, sub/superscripts and brackets become tokens of their own, so
+# "2+3" and "2 + 3" normalize alike
+_OPERATOR = re.compile(r"([\^_+\-*/=<>()\[\]{}|\\])")
+# Tokens of a formula: operators, numbers, LaTeX commands and single-letter variables
+_FORMULA_TOKEN = re.compile(r"[\d^_+\-*/=<>()\[\]{}|\\]|^[^\Wai_]$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    pdf_sha256 TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (pdf_sha256, digest)
+);
+"""
+
+
+def normalize_question(text: str) -> str:
+    """Lower-case tokens of a question with cloze markers, MathJax delimiters, HTML and sentence punctuation removed."""
+    text = _CLOZE.sub(r"\1", text or "")
+    text = _HTML_TAG.sub(" ", text)
+    text = _MATH_DELIMITER.sub(" ", text)
+    text = _EMPHASIS.sub(" ", text)
+    text = _PUNCTUATION.sub(" ", text.casefold())
+    return " ".join(_OPERATOR.sub(r" \1 ", text).split())
+
+
+def formula_tokens(normalized: str) -> Tuple[str, ...]:
+    """The math of a normalized question (operators, numbers, variables) in order."""
+    return tuple(token for token in normalized.split() if _FORMULA_TOKEN.search(token))
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(normalized: str) -> int:
+    """64-bit SimHash of a normalized question's words and adjacent word pairs."""
+    words = normalized.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    # Bit i of the result is set when more than half of the feature hashes
+    # have it set; counting down the columns of their binary strings keeps
+    # the per-bit work in C.
+    rows = [format(_feature_hash(feature), "064b") for feature in features]
+    half = len(rows) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*rows)), 2)
+
+
+def fingerprint(question: str) -> Tuple[str, int]:
+    """(digest of the normalized question, SimHash) for a card question."""
+    normalized = normalize_question(question)
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+    return digest, simhash(normalized)
+
+
+def _bands(value: int) -> List[Tuple[int, int]]:
+    return [(band, (value >> (band * _BAND_BITS)) & _BAND_MASK) for band in range(_BANDS)]
+
+
+class CardIndex:
+    """
+    In-memory duplicate index for one deck; safe to share between threads.
+
+    Args:
+        max_distance: Largest SimHash bit difference still treated as a
+            duplicate (at most MAX_DISTANCE; 0 keeps only exact matches)
+    """
+
+    def __init__(self, max_distance: int = MAX_DISTANCE) -> None:
+        self.max_distance = max(0, min(max_distance, MAX_DISTANCE))
+        self._lock = threading.Lock()
+        self._digests: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, Tuple[str, ...], str]]] = {}
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def _find(self, digest: str, value: int, formula: Tuple[str, ...]) -> Optional[str]:
+        if digest in self._digests:
+            return self._digests[digest]
+        if self.max_distance == 0:
+            return None
+        for key in _bands(value):
+            for other, other_formula, question in self._buckets.get(key, ()):
+                # A few changed words are a rewording; a changed formula is a different question
+                if other_formula == formula and bin(value ^ other).count("1") <= self.max_distance:
+                    return question
+        return None
+
+    def _insert(self, digest: str, value: int, question: str) -> None:
+        self._digests[digest] = question
+        formula = formula_tokens(normalize_question(question))
+        for key in _bands(value):
+            self._buckets.setdefault(key, []).append((value, formula, question))
+
+    def lookup(self, question: str) -> Optional[str]:
+        """The indexed question that ``question`` duplicates, or None."""
+        digest, value = fingerprint(question)
+        formula = formula_tokens(normalize_question(question))
+        with self._lock:
+            return self._find(digest, value, formula)
+
+    def add(self, question: str, digest: Optional[str] = None, value: Optional[int] = None) -> bool:
+        """Index ``question`` unless it duplicates an indexed one; returns True if it was added."""
+        if digest is None or value is None:
+            digest, value = fingerprint(question)
+        formula = formula_tokens(normalize_question(question))
+        with self._lock:
+            if self._find(digest, value, formula) is not None:
+                self.duplicates += 1
+                return False
+            self._insert(digest, value, question)
+            return True
+
+    def filter(self, cards: Iterable[Card]) -> List[Card]:
+        """Return the cards that are not duplicates (of indexed cards or of each other), indexing them."""
+        return [card for card in cards if self.add(card.question)]
+
+
+class CardIndexStore:
+    """
+    SQLite-backed fingerprints of exported cards, per source PDF; safe to share between threads.
+
+    Only ``card_engine.export_deck`` saves here, so the index holds what the
+    user actually took away, never cards that were merely generated.
+
+    Args:
+        path: Database file path
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def load(self, pdf_sha256: str, max_distance: int = MAX_DISTANCE) -> CardIndex:
+        """An index holding every card stored for ``pdf_sha256``."""
+        index = CardIndex(max_distance)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT digest, simhash, question FROM cards WHERE pdf_sha256 = ? ORDER BY created_at",
+                (pdf_sha256,),
+            ).fetchall()
+        for digest, value, question in rows:
+            # Stored as a signed 64-bit integer
+            index._insert(digest, value & ((1 << SIMHASH_BITS) - 1), question)
+        return index
+
+    def save(self, pdf_sha256: str, cards: Iterable[Card]) -> int:
+        """Remember ``cards`` as part of the deck for ``pdf_sha256``; returns the number of new entries."""
+        now = time.time()
+        rows = []
+        for card in cards:
+            digest, value = fingerprint(card.question)
+            if value >= 1 << (SIMHASH_BITS - 1):
+                value -= 1 << SIMHASH_BITS
+            rows.append((pdf_sha256, digest, value, card.question, now))
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO cards (pdf_sha256, digest, simhash, question, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def forget(self, pdf_sha256: str) -> int:
+        """Delete the stored cards of ``pdf_sha256``; returns the number removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM cards WHERE pdf_sha256 = ?", (pdf_sha256,))
+            self._conn.commit()
+            return max(cursor.rowcount, 0)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries, pdfs = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT pdf_sha256) FROM cards"
+            ).fetchone()
+        return {"path": str(self.path), "entries": entries, "pdfs": pdfs}
+
+
+_default_store: Optional[CardIndexStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_card_index_store() -> CardIndexStore:
+    """
+    Return the process-wide card index store.
+
+    Configured by CARD_INDEX_PATH (default: outputs/card_index.sqlite3).
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CardIndexStore(Path(os.getenv("CARD_INDEX_PATH", str(DEFAULT_INDEX_PATH))))
+        return _default_store
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Inspect or maintain the card deduplication index")
+    parser.add_argument("--stats", action="store_true", help="Print index statistics (default)")
+    parser.add_argument("--forget", metavar="PDF_SHA256", help="Delete the stored cards of one PDF")
+    args = parser.parse_args()
+
+    store = get_card_index_store()
+    if args.forget:
+        print(json.dumps({"forgotten": store.forget(args.forget)}))
+    print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,883 @@
+"""
+UI-free card generation engine.
+
+Everything between a converted PDF and an exported deck lives here:
+cleaning and chunking the markdown, prompting the LLM per chunk or per
+pack of small chunks (with the response cache, rate limits, chunk card
+reuse and duplicate filtering),
+and writing the TSV and .apkg files. It never imports Streamlit; callers
+pass callbacks for progress, errors and cancellation, and read warnings
+from the returned result. The Streamlit app and the ``pdf2anki`` command
+line tool are both thin clients of this module.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import openai
+    HAS_OPENAI = True
+except ImportError:
+    openai = None
+    HAS_OPENAI = False
+
+from anki_core import build_packed_prompt, build_prompt, parse_cards_from_output, parse_packed_cards_from_output
+from apkg_writer import DEFAULT_DECK_NAME, write_apkg
+from card_dedup import CardIndex, get_card_index_store
+from chunk_cards import (
+    chunk_text_sha256,
+    generation_settings_key,
+    get_chunk_card_store,
+    plan_regeneration,
+    reuse_unchanged_chunks,
+)
+from concurrent_generation import RateLimiter, generate_cards_concurrently, get_rate_limiter, limits_from_env
+from instrumentation import recording, span, utf8_size, write_instrumentation
+from llm_cache import LLMResponseCache, get_llm_cache, make_cache_key
+from markdown_chunker import estimate_tokens, estimate_tokens_many, split_large_chunk
+from markdown_processor_wrapper import (
+    convert_domain_chunk_to_pdfanki,
+    get_semantic_info_for_chunk,
+    process_markdown_for_streamlit,
+)
+from pdf2anki_types import Card, Chunk, SourceReference
+from prompt_packing import PackingBudget, pack_sections, packing_budget
+
+SYSTEM_MESSAGE = "You are a helpful assistant that creates educational flashcards."
+MAX_COMPLETION_TOKENS = 2000
+DEFAULT_PAGES_PER_SHARD = 10
+
+
+class LLMNotConfiguredError(RuntimeError):
+    """Raised when neither LLM_API_BASE nor OPENAI_API_KEY is set."""
+
+
+@dataclass
+class LLMConfig:
+    """
+    Where and how to reach the LLM.
+
+    Attributes:
+        model: Model name sent with each request
+        base_url: OpenAI-compatible endpoint (None for OpenAI itself)
+        api_key: API key ("no-key-required" for local servers)
+    """
+    model: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+
+    @property
+    def endpoint(self) -> str:
+        """Key for the endpoint's shared rate limiter."""
+        return self.base_url or "openai"
+
+    @classmethod
+    def from_env(cls) -> "LLMConfig":
+        """
+        Read LLM_API_BASE / LLM_MODEL / LLM_API_KEY, or OPENAI_API_KEY / OPENAI_MODEL.
+
+        Raises:
+            LLMNotConfiguredError: If neither endpoint is configured
+        """
+        llm_base = os.getenv("LLM_API_BASE")
+        if llm_base:
+            # OpenAI-compatible endpoint (e.g., llama.cpp, vLLM)
+            return cls(
+                model=os.getenv("LLM_MODEL", "llama-3.1-8b-instruct"),
+                base_url=llm_base.rstrip("/"),
+                api_key=os.getenv("LLM_API_KEY", "no-key-required"),
+            )
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise LLMNotConfiguredError("No LLM configured. Set LLM_API_BASE (for Llama) or OPENAI_API_KEY.")
+        # Use OPENAI_MODEL env var if set, otherwise default to gpt-5
+        return cls(model=os.getenv("OPENAI_MODEL", "gpt-5"), api_key=api_key)
+
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(config: LLMConfig):
+    """Return the shared OpenAI client for an endpoint and key (its connection pool is reused)."""
+    if not HAS_OPENAI:
+        raise RuntimeError("The openai package is required for card generation (pip install openai)")
+    key = (config.base_url, config.api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = openai.OpenAI(base_url=config.base_url, api_key=config.api_key)
+            _clients[key] = client
+        return client
+
+
+def complete_prompt(
+    prompt: str,
+    llm: LLMConfig,
+    rate_limiter: Optional[RateLimiter] = None,
+    response_cache: Optional[LLMResponseCache] = None,
+) -> str:
+    """
+    Return the model's reply to ``prompt``, consulting the response cache first.
+
+    API errors are raised to the caller.
+    """
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key(
+            llm.model,
+            SYSTEM_MESSAGE,
+            prompt,
+            {"max_completion_tokens": MAX_COMPLETION_TOKENS},
+        )
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    if rate_limiter is not None:
+        rate_limiter.acquire(tokens=estimate_tokens(prompt) + MAX_COMPLETION_TOKENS)
+
+    # Call the chat completions API (without temperature parameter as default)
+    with span("llm_call", bytes_in=utf8_size(prompt)) as llm_call:
+        response = get_llm_client(llm).chat.completions.create(
+            model=llm.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_MESSAGE},
+                {"role": "user", "content": prompt}
+            ],
+            max_completion_tokens=MAX_COMPLETION_TOKENS
+        )
+        content = response.choices[0].message.content or ""
+        llm_call.add_bytes(bytes_out=utf8_size(content))
+
+    if response_cache is not None and content.strip():
+        response_cache.put(cache_key, llm.model, content)
+    return content
+
+
+def chunk_prompt_content(chunk_text: str, semantic_info: Optional[dict] = None) -> str:
+    """Chunk text followed by its key terms and definitions, as sent to the LLM."""
+    enhanced_content = chunk_text
+    if semantic_info:
+        key_terms = semantic_info.get("key_terms", [])
+        definitions = semantic_info.get("definitions", [])
+        if key_terms:
+            enhanced_content += f"\n\nKey terms in this section: {', '.join(key_terms[:10])}"
+        if definitions:
+            enhanced_content += "\n\nImportant definitions:\n"
+            for def_item in definitions[:5]:
+                enhanced_content += f"- {def_item.get('term', '')}: {def_item.get('definition', '')}\n"
+    return enhanced_content
+
+
+def _attach_source(cards: List[Card], pdf_sha256: Optional[str], chunk_id: str) -> None:
+    """Point each card's source_ref at ``chunk_id`` of the PDF."""
+    for card in cards:
+        if card.source_ref is None:
+            card.source_ref = SourceReference(
+                pdf_sha256=pdf_sha256 or "",
+                chunk_id=chunk_id
+            )
+        else:
+            if pdf_sha256:
+                card.source_ref.pdf_sha256 = pdf_sha256
+            card.source_ref.chunk_id = chunk_id
+
+
+def request_cards_for_chunk(
+    chunk_text: str,
+    chunk_id: str,
+    num_cards_per_chunk: int,
+    card_type: str,
+    note_type: str,
+    llm: LLMConfig,
+    pdf_sha256: Optional[str] = None,
+    semantic_info: Optional[dict] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    response_cache: Optional[LLMResponseCache] = None,
+) -> List[Card]:
+    """
+    Generate Anki cards from a single chunk.
+
+    API errors are raised, so this function is safe to call from worker threads.
+
+    Args:
+        chunk_text: The chunk text content
+        chunk_id: ID of the chunk
+        num_cards_per_chunk: Number of cards to generate from this chunk
+        card_type: Type of cards to generate
+        note_type: Note type (basic or cloze)
+        llm: LLM endpoint and model
+        pdf_sha256: SHA256 of the source PDF, recorded in each card's source_ref
+        semantic_info: Optional semantic structure information
+        rate_limiter: Optional limiter shared by all requests to the endpoint
+        response_cache: Optional cache; identical prompts are answered without an API call
+
+    Returns:
+        List of Card objects
+    """
+    with span("prompt_build", bytes_in=utf8_size(chunk_text)) as prompt_build:
+        # Enhance prompt with semantic information if available
+        enhanced_content = chunk_prompt_content(chunk_text, semantic_info)
+
+        # Prepare the prompt
+        prompt_template = build_prompt(
+            note_type=note_type,
+            num_cards=num_cards_per_chunk,
+            content_focus=card_type,
+            markdown_content=enhanced_content,
+        )
+        prompt_build.add_bytes(bytes_out=utf8_size(prompt_template))
+
+    content = complete_prompt(prompt_template, llm, rate_limiter, response_cache)
+    with span("parse", bytes_in=utf8_size(content)):
+        cards = parse_cards_from_output(content, note_type)
+
+    # Add chunk reference to cards
+    _attach_source(cards, pdf_sha256, chunk_id)
+    return cards
+
+
+def request_cards_for_pack(
+    sections: Sequence[Tuple[str, str, int]],
+    card_type: str,
+    note_type: str,
+    llm: LLMConfig,
+    pdf_sha256: Optional[str] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    response_cache: Optional[LLMResponseCache] = None,
+) -> List[List[Card]]:
+    """
+    Generate Anki cards for several chunks with one request.
+
+    API errors are raised, so this function is safe to call from worker threads.
+
+    Args:
+        sections: ``(chunk_id, prompt content, num_cards)`` per chunk, in
+            document order (content as returned by chunk_prompt_content)
+        card_type: Type of cards to generate
+        note_type: Note type (basic or cloze)
+        llm: LLM endpoint and model
+        pdf_sha256: SHA256 of the source PDF, recorded in each card's source_ref
+        rate_limiter: Optional limiter shared by all requests to the endpoint
+        response_cache: Optional cache; identical prompts are answered without an API call
+
+    Returns:
+        One list of Card objects per section; a section the model skipped is empty
+    """
+    with span("prompt_build", bytes_in=sum(utf8_size(content) for _, content, _ in sections)) as prompt_build:
+        prompt_template = build_packed_prompt(
+            note_type=note_type,
+            content_focus=card_type,
+            sections=[(content, num_cards) for _, content, num_cards in sections],
+        )
+        prompt_build.add_bytes(bytes_out=utf8_size(prompt_template))
+
+    content = complete_prompt(prompt_template, llm, rate_limiter, response_cache)
+    with span("parse", bytes_in=utf8_size(content)):
+        cards_by_section = parse_packed_cards_from_output(content, note_type, len(sections))
+
+    for (chunk_id, _, num_cards), cards in zip(sections, cards_by_section):
+        # A model that over-delivers for one section does not take another's budget
+        del cards[num_cards:]
+        _attach_source(cards, pdf_sha256, chunk_id)
+    return cards_by_section
+
+
+@dataclass
+class GenerationOptions:
+    """
+    How cards are generated for one document.
+
+    Attributes:
+        num_cards: Number of cards wanted
+        card_type: Content focus (definitions, concepts, mixed)
+        note_type: "basic" or "cloze"
+        use_chunking: Clean and chunk the markdown and prompt per chunk
+            (requires the PDF's SHA256; otherwise one prompt for the document)
+        max_tokens_per_chunk: Maximum tokens per chunk
+        max_concurrency: Maximum parallel LLM requests (default: LLM_MAX_CONCURRENCY or 4)
+        use_response_cache: Reuse stored responses for identical prompts
+        deduplicate: Drop cards whose question duplicates another card of this run
+        skip_exported_cards: With ``deduplicate``, also drop cards whose question
+            is already in a deck exported earlier for the same PDF (see
+            ``export_deck``), so a regeneration only adds new cards
+        reuse_unchanged_sections: Reuse the stored cards of chunks whose text
+            was seen before instead of sending them to the LLM again
+        pack_chunks: Send consecutive small chunks together in one request,
+            as many as fit the model's context window
+        context_tokens: The model's context window (default: LLM_CONTEXT_TOKENS
+            or 8192); chunks larger than fits one request are split further
+    """
+    num_cards: int = 10
+    card_type: str = "mixed"
+    note_type: str = "basic"
+    use_chunking: bool = True
+    max_tokens_per_chunk: int = 2000
+    max_concurrency: Optional[int] = None
+    use_response_cache: bool = True
+    deduplicate: bool = True
+    skip_exported_cards: bool = False
+    reuse_unchanged_sections: bool = True
+    pack_chunks: bool = True
+    context_tokens: Optional[int] = None
+
+
+@dataclass
+class GenerationResult:
+    """
+    Cards and bookkeeping from one generation run.
+
+    Attributes:
+        cards: Generated cards, at most ``num_cards``
+        cancelled: True if the run stopped because of the cancel check
+        total_chunks: Chunks the markdown was split into (0 without chunking)
+        failed_chunks: Chunks whose LLM request raised
+        reused_chunks: Chunks answered from stored cards of unchanged sections
+        requests: Requests the other chunks were sent in (fewer than the
+            chunks when small chunks are packed together)
+        dropped_cards: Cards removed as duplicates
+        warnings: Messages for the user (e.g. a fallback that was taken)
+    """
+    cards: List[Card] = field(default_factory=list)
+    cancelled: bool = False
+    total_chunks: int = 0
+    failed_chunks: int = 0
+    reused_chunks: int = 0
+    requests: int = 0
+    dropped_cards: int = 0
+    warnings: List[str] = field(default_factory=list)
+
+
+def _card_index(options: GenerationOptions, pdf_sha256: Optional[str]) -> Optional[CardIndex]:
+    """The duplicate index a run starts from: empty, or the PDF's exported cards."""
+    if not options.deduplicate:
+        return None
+    if options.skip_exported_cards and pdf_sha256:
+        return get_card_index_store().load(pdf_sha256)
+    return CardIndex()
+
+
+def _warn_if_all_exported(result: GenerationResult, options: GenerationOptions) -> None:
+    if options.skip_exported_cards and not result.cards and result.dropped_cards:
+        result.warnings.append(
+            f"All {result.dropped_cards} generated cards are already in decks exported earlier for this PDF. "
+            "Turn off skipping exported cards, or forget the PDF's cards with "
+            "`python src/card_dedup.py --forget <pdf_sha256>`, to build the full deck again."
+        )
+
+
+def generate_cards(
+    markdown_content: str,
+    llm: LLMConfig,
+    options: Optional[GenerationOptions] = None,
+    pdf_sha256: Optional[str] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+) -> GenerationResult:
+    """
+    Generate Anki cards from converted markdown.
+
+    With chunking, errors of individual chunks are passed to ``on_error``
+    and the remaining chunks still run. Without chunking the single request's
+    error is raised.
+
+    Args:
+        markdown_content: The markdown content to generate cards from
+        llm: LLM endpoint and model
+        options: Generation options (default: GenerationOptions())
+        pdf_sha256: SHA256 hash of the source PDF (required for chunking)
+        should_cancel: Polled between request completions; True stops the run
+        on_progress: Called as ``on_progress(completed, total)``, counting
+            requests (packed chunks count once) and reused chunks
+        on_error: Called as ``on_error(chunk_id, exception)`` when a request
+            fails; for a packed request ``chunk_id`` names its first and last chunk
+
+    Returns:
+        GenerationResult
+    """
+    options = options or GenerationOptions()
+    result = GenerationResult()
+
+    use_chunking = options.use_chunking
+    if use_chunking and not pdf_sha256:
+        result.warnings.append("PDF SHA256 not provided. Falling back to non-chunking mode.")
+        use_chunking = False
+
+    if not use_chunking:
+        response_cache = get_llm_cache() if options.use_response_cache else None
+        card_index = _card_index(options, pdf_sha256)
+        budget = packing_budget(
+            SYSTEM_MESSAGE + build_prompt(options.note_type, options.num_cards, options.card_type, ""),
+            MAX_COMPLETION_TOKENS,
+            options.context_tokens,
+        )
+        document_tokens = estimate_tokens(markdown_content)
+        if document_tokens > budget.content_tokens:
+            markdown_content = split_large_chunk(markdown_content, budget.content_tokens, None)[0]
+            result.warnings.append(
+                f"The document has about {document_tokens} tokens but only {budget.content_tokens} fit in one "
+                "request; cards were generated from its beginning. Enable chunking to cover the whole document."
+            )
+        result.requests = 1
+        prompt_template = build_prompt(
+            note_type=options.note_type,
+            num_cards=options.num_cards,
+            content_focus=options.card_type,
+            markdown_content=markdown_content,
+        )
+        content = complete_prompt(prompt_template, llm, response_cache=response_cache)
+        cards = parse_cards_from_output(content, options.note_type)
+        if card_index is not None:
+            kept = card_index.filter(cards)
+            result.dropped_cards = len(cards) - len(kept)
+            cards = kept
+        result.cards = cards
+        _warn_if_all_exported(result, options)
+        return result
+
+    # Clean and chunk
+    _, chunking_result = process_markdown_for_streamlit(
+        markdown_content,
+        pdf_sha256=pdf_sha256,
+        max_tokens=chunk_token_limit(options, result.warnings),
+        remove_images=False
+    )
+    generated = generate_cards_for_chunks(
+        chunking_result.chunks,
+        llm,
+        options,
+        pdf_sha256=pdf_sha256,
+        should_cancel=should_cancel,
+        on_progress=on_progress,
+        on_error=on_error,
+    )
+    generated.warnings[:0] = result.warnings
+    return generated
+
+
+def _chunk_budget(options: GenerationOptions) -> PackingBudget:
+    """Per-request budget of the packed prompts ``generate_cards_for_chunks`` sends."""
+    return packing_budget(
+        SYSTEM_MESSAGE + build_packed_prompt(options.note_type, options.card_type, []),
+        MAX_COMPLETION_TOKENS,
+        options.context_tokens,
+    )
+
+
+def chunk_token_limit(options: GenerationOptions, warnings: Optional[List[str]] = None) -> int:
+    """
+    Maximum tokens per chunk: ``options.max_tokens_per_chunk``, lowered so a chunk fits one request.
+
+    A message is appended to ``warnings`` when the limit was lowered.
+    """
+    max_tokens = options.max_tokens_per_chunk
+    content_tokens = _chunk_budget(options).content_tokens
+    if max_tokens > content_tokens:
+        max_tokens = content_tokens
+        if warnings is not None:
+            warnings.append(
+                f"Chunks were limited to {max_tokens} tokens so that each fits the model's context window "
+                "(LLM_CONTEXT_TOKENS)."
+            )
+    return max_tokens
+
+
+def generate_cards_for_chunks(
+    chunks: Sequence[Chunk],
+    llm: LLMConfig,
+    options: Optional[GenerationOptions] = None,
+    pdf_sha256: Optional[str] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+) -> GenerationResult:
+    """
+    Generate Anki cards for chunks that are already cleaned and chunked.
+
+    Chunks should be at most ``chunk_token_limit(options)`` tokens. Errors of
+    individual requests are passed to ``on_error`` and the remaining
+    requests still run. Arguments are as for ``generate_cards``.
+
+    Returns:
+        GenerationResult
+    """
+    options = options or GenerationOptions()
+    result = GenerationResult()
+    response_cache = get_llm_cache() if options.use_response_cache else None
+
+    card_index = _card_index(options, pdf_sha256)
+
+    chunks = list(chunks)
+    budget = _chunk_budget(options)
+    result.total_chunks = len(chunks)
+    if result.total_chunks == 0:
+        result.warnings.append("No chunks created from markdown content.")
+        return result
+
+    cards_per_chunk = max(1, options.num_cards // result.total_chunks)
+
+    env_concurrency, requests_per_minute, tokens_per_minute = limits_from_env()
+    rate_limiter = get_rate_limiter(
+        llm.endpoint,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+    )
+
+    # Prompt content by chunk id, computed up front for the chunks that are packed
+    contents: Dict[str, str] = {}
+
+    def generate_for_chunk(chunk: Chunk, requested: int) -> List[Card]:
+        # Runs on a worker thread
+        content = contents.get(chunk.id)
+        if content is None:
+            content = chunk_prompt_content(chunk.text, get_semantic_info_for_chunk(chunk))
+        return request_cards_for_chunk(
+            chunk_text=content,
+            chunk_id=chunk.id,
+            num_cards_per_chunk=requested,
+            card_type=options.card_type,
+            note_type=options.note_type,
+            llm=llm,
+            pdf_sha256=pdf_sha256,
+            rate_limiter=rate_limiter,
+            response_cache=response_cache,
+        )
+
+    chunk_store = None
+    unchanged: List[int] = []
+    if options.reuse_unchanged_sections:
+        chunk_store = get_chunk_card_store()
+        settings = generation_settings_key(
+            llm.model,
+            options.note_type,
+            options.card_type,
+            SYSTEM_MESSAGE + build_prompt(options.note_type, 0, options.card_type, ""),
+        )
+        unchanged = plan_regeneration(chunks, chunk_store, settings, cards_per_chunk).unchanged
+        result.reused_chunks = len(unchanged)
+        generate_for_chunk = reuse_unchanged_chunks(generate_for_chunk, chunk_store, settings)
+
+    if options.pack_chunks:
+        # Unchanged chunks are answered from the store, so only new or edited ones share requests
+        standalone = set(unchanged)
+        for index, chunk in enumerate(chunks):
+            if index not in standalone:
+                contents[chunk.id] = chunk_prompt_content(chunk.text, get_semantic_info_for_chunk(chunk))
+        costs = estimate_tokens_many([contents.get(chunk.id, "") for chunk in chunks])
+        packs = pack_sections(costs, cards_per_chunk, budget, standalone=standalone)
+    else:
+        packs = [[index] for index in range(len(chunks))]
+    result.requests = len(packs) - len(unchanged)
+
+    def generate_for_pack(pack: List[int], requested: int) -> List[Card]:
+        # Runs on a worker thread; chunks past the requested total are left out
+        allocation: List[Tuple[int, int]] = []
+        for index in pack:
+            count = min(cards_per_chunk, requested - sum(n for _, n in allocation))
+            if count <= 0:
+                break
+            allocation.append((index, count))
+        if len(allocation) == 1:
+            index, count = allocation[0]
+            return generate_for_chunk(chunks[index], count)
+
+        cards_by_section = request_cards_for_pack(
+            [(chunks[index].id, contents[chunks[index].id], count) for index, count in allocation],
+            card_type=options.card_type,
+            note_type=options.note_type,
+            llm=llm,
+            pdf_sha256=pdf_sha256,
+            rate_limiter=rate_limiter,
+            response_cache=response_cache,
+        )
+        cards: List[Card] = []
+        for (index, count), section_cards in zip(allocation, cards_by_section):
+            if chunk_store is not None and section_cards:
+                chunk_store.put(chunk_text_sha256(chunks[index].text), settings, count, section_cards)
+            cards.extend(section_cards)
+        return cards
+
+    def pack_failed(pack: List[int], error: BaseException) -> None:
+        result.failed_chunks += len(pack)
+        if on_error is not None:
+            first, last = chunks[pack[0]].id, chunks[pack[-1]].id
+            on_error(first if first == last else f"{first}..{last}", error)
+
+    outcome = generate_cards_concurrently(
+        packs,
+        generate_for_pack,
+        num_cards=options.num_cards,
+        cards_per_chunk=cards_per_chunk,
+        max_concurrency=options.max_concurrency or env_concurrency,
+        should_cancel=should_cancel,
+        on_progress=on_progress,
+        on_error=pack_failed,
+        filter_cards=card_index.filter if card_index is not None else None,
+        cards_for=lambda pack: cards_per_chunk * len(pack),
+    )
+    result.cards = outcome.cards[:options.num_cards]
+    result.cancelled = outcome.cancelled
+    result.dropped_cards = outcome.dropped_cards
+    _warn_if_all_exported(result, options)
+    return result
+
+
+def write_tsv(cards: Iterable[Card], path: Path) -> int:
+    """Write cards as Anki TSV rows, one at a time; returns the number written."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for card in cards:
+            if count:
+                f.write("\n")
+            f.write(card.to_tsv_row())
+            count += 1
+    return count
+
+
+@dataclass
+class ExportPaths:
+    """Files written by ``export_deck``."""
+    tsv_path: Path
+    apkg_path: Path
+
+
+def export_deck(
+    cards: List[Card],
+    out_dir: Path,
+    deck_name: str = DEFAULT_DECK_NAME,
+    pdf_sha256: Optional[str] = None,
+) -> ExportPaths:
+    """
+    Write ``anki_cards.tsv`` and ``anki_cards.apkg`` to ``out_dir``.
+
+    Args:
+        cards: Cards to export
+        out_dir: Destination directory
+        deck_name: Name of the Anki deck in the .apkg
+        pdf_sha256: SHA256 of the source PDF; the exported questions are
+            remembered for it, so runs with ``skip_exported_cards`` skip them
+
+    Returns:
+        ExportPaths
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tsv_path = out_dir / "anki_cards.tsv"
+    write_tsv(cards, tsv_path)
+    apkg = write_apkg(cards, out_dir / "anki_cards.apkg", deck_name=deck_name)
+    if pdf_sha256:
+        get_card_index_store().save(pdf_sha256, cards)
+    return ExportPaths(tsv_path=tsv_path, apkg_path=apkg.path)
+
+
+def session_dir_for(pdf_path: Path, output_root: Path, pdf_sha256: str) -> Path:
+    """
+    Create and return ``<output_root>/<timestamp>_<pdf name>_<sha256 prefix>/`` for one run.
+
+    The hash prefix keeps PDFs with the same name (week1/lecture.pdf and
+    week2/lecture.pdf) apart when they start in the same second; a number
+    is appended if the same PDF does.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Truncate filename to avoid filesystem length limits (especially on encrypted FS)
+    pdf_name_safe = Path(pdf_path).stem.replace(" ", "_")[:50]
+    base = Path(output_root) / f"{timestamp}_{pdf_name_safe}_{pdf_sha256[:8]}"
+    base.parent.mkdir(parents=True, exist_ok=True)
+    session_dir, attempt = base, 1
+    while True:
+        try:
+            session_dir.mkdir()
+            return session_dir
+        except FileExistsError:
+            attempt += 1
+            session_dir = base.with_name(f"{base.name}_{attempt}")
+
+
+@dataclass
+class DocumentResult:
+    """
+    Outcome of ``process_pdf`` for one file.
+
+    Attributes:
+        pdf_path: Input PDF
+        pdf_sha256: SHA256 of the PDF
+        session_dir: Directory holding converted.md, meta.json, the deck and processing_result.json
+        generation: Generation result (cards and bookkeeping)
+        exports: Written TSV and .apkg paths (None if no cards were generated)
+        elapsed_sec: Wall time for the whole document
+    """
+    pdf_path: Path
+    pdf_sha256: str
+    session_dir: Path
+    generation: GenerationResult
+    exports: Optional[ExportPaths]
+    elapsed_sec: float
+
+
+def process_pdf(
+    pdf_path: Path,
+    llm: LLMConfig,
+    options: Optional[GenerationOptions] = None,
+    api_base_url: str = "http://localhost:8080",
+    output_root: Path = Path("outputs"),
+    timeout_seconds: int = 300,
+    deck_name: Optional[str] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+    pages_per_shard: int = DEFAULT_PAGES_PER_SHARD,
+) -> DocumentResult:
+    """
+    Convert → clean → chunk → generate → export one PDF.
+
+    The conversion goes through the conversion cache under
+    ``<output_root>/conversions/<sha256>/``; the results of this run are
+    written to a new ``<output_root>/<timestamp>_<pdf name>_<sha256 prefix>/`` directory,
+    with stage timings in processing_result.json.
+
+    With chunking, PDFs longer than ``pages_per_shard`` pages go through
+    pipeline.run_pdf_pipeline: each page range is converted as its own
+    request and cleaned and chunked while later ranges are still
+    converting. Its stage report is written under "pipeline".
+
+    Args:
+        pdf_path: Input PDF
+        llm: LLM endpoint and model
+        options: Generation options
+        api_base_url: Marker API base URL
+        output_root: Root output directory
+        timeout_seconds: HTTP timeout for the conversion request
+        deck_name: Anki deck name (default: the PDF's file name)
+        should_cancel: Polled between chunk completions
+        on_error: Called as ``on_error(chunk_id, exception)`` when a chunk fails
+        pages_per_shard: Pages per conversion request for long PDFs (0 converts
+            every PDF in one request)
+
+    Returns:
+        DocumentResult
+    """
+    from file_fingerprint import pdf_page_count
+    from marker_client import compute_sha256, convert_pdf_to_markdown, get_marker_client
+    from pipeline import run_pdf_pipeline
+
+    started = time.perf_counter()
+    pdf_path = Path(pdf_path).resolve()
+    output_root = Path(output_root)
+    pdf_sha256 = compute_sha256(pdf_path)
+    session_dir = session_dir_for(pdf_path, output_root, pdf_sha256)
+
+    options = options or GenerationOptions()
+    pipeline_report = None
+    markdown_path = session_dir / "converted.md"
+
+    with recording() as recorder:
+        page_count = pdf_page_count(pdf_path) if options.use_chunking and pages_per_shard > 0 else None
+        if page_count is not None and page_count > pages_per_shard:
+            # Clean and chunk the first page ranges while later ones are still converting
+            warnings: List[str] = []
+            pipelined = run_pdf_pipeline(
+                pdf_path,
+                api_base_url=api_base_url,
+                output_root=output_root,
+                pdf_sha256=pdf_sha256,
+                pages_per_shard=pages_per_shard,
+                max_tokens=chunk_token_limit(options, warnings),
+                timeout_seconds=timeout_seconds,
+            )
+            with open(markdown_path, "w", encoding="utf-8") as f:
+                for index, shard_path in enumerate(pipelined.markdown_paths):
+                    if index:
+                        f.write("\n\n")
+                    f.write(shard_path.read_text(encoding="utf-8"))
+            (session_dir / "meta.json").write_text(json.dumps({
+                "pdf_sha256": pdf_sha256,
+                "pages": page_count,
+                "pages_per_shard": pages_per_shard,
+                "shards": [str(shard_path) for shard_path in pipelined.markdown_paths],
+            }, ensure_ascii=False, indent=2), encoding="utf-8")
+            pipeline_report = {key: value for key, value in pipelined.report.items() if key != "instrumentation"}
+
+            # Card counts per chunk and packing need the whole chunk list
+            generation = generate_cards_for_chunks(
+                [convert_domain_chunk_to_pdfanki(chunk) for chunk in pipelined.chunks],
+                llm,
+                options,
+                pdf_sha256=pdf_sha256,
+                should_cancel=should_cancel,
+                on_error=on_error,
+            )
+            generation.warnings[:0] = warnings
+        else:
+            with span("convert"):
+                paths = convert_pdf_to_markdown(
+                    pdf_path=pdf_path,
+                    api_base_url=api_base_url,
+                    output_root=output_root,
+                    timeout_seconds=timeout_seconds,
+                    streaming=True,
+                    client=get_marker_client(api_base_url),
+                    source_sha256=pdf_sha256,
+                )
+            shutil.copy2(paths.markdown_path, markdown_path)
+            shutil.copy2(paths.meta_path, session_dir / "meta.json")
+
+            generation = generate_cards(
+                markdown_path.read_text(encoding="utf-8"),
+                llm,
+                options,
+                pdf_sha256=pdf_sha256,
+                should_cancel=should_cancel,
+                on_error=on_error,
+            )
+        exports = None
+        if generation.cards:
+            with span("export"):
+                exports = export_deck(generation.cards, session_dir, deck_name or pdf_path.stem, pdf_sha256=pdf_sha256)
+
+    result_path = session_dir / "processing_result.json"
+    result_path.write_text(json.dumps({
+        "pdf_sha256": pdf_sha256,
+        "cards": len(generation.cards),
+        "total_chunks": generation.total_chunks,
+        "failed_chunks": generation.failed_chunks,
+        "reused_chunks": generation.reused_chunks,
+        "requests": generation.requests,
+        "dropped_cards": generation.dropped_cards,
+        "warnings": generation.warnings,
+        **({"pipeline": pipeline_report} if pipeline_report is not None else {}),
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_instrumentation(result_path, recorder)
+
+    return DocumentResult(
+        pdf_path=pdf_path,
+        pdf_sha256=pdf_sha256,
+        session_dir=session_dir,
+        generation=generation,
+        exports=exports,
+        elapsed_sec=time.perf_counter() - started,
+    )
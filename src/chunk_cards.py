@@ -0,0 +1,265 @@
+"""
+Chunk-level card reuse for incremental regeneration.
+
+When a revised PDF changes only a few sections, most of its chunks have
+the same text as before even though the PDF hash differs. Each chunk's
+text is hashed (with whitespace normalized, so reflowed lines do not
+count as an edit) and the cards generated for it are stored under that
+hash and the generation settings. Regenerating a revised deck reuses the
+stored cards of every unchanged chunk and only sends new or edited chunks
+to the LLM, so cost and latency follow the size of the edit rather than
+the size of the document.
+
+The store is a small SQLite database (default: outputs/chunk_cards.sqlite3).
+The same hash is written as ``text_sha256`` for every chunk in chunks.jsonl.
+
+Usage:
+  python src/chunk_cards.py --stats
+  python src/chunk_cards.py --diff old/chunks.jsonl new/chunks.jsonl
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pdf2anki_types import Card, Chunk, SourceReference
+
+DEFAULT_STORE_PATH = Path("outputs") / "chunk_cards.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunk_cards (
+    text_sha256 TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    requested INTEGER NOT NULL,
+    cards TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (text_sha256, settings)
+);
+"""
+
+_CARD_FIELDS = ("question", "answer", "note_type", "extra", "tags")
+
+
+def chunk_text_sha256(text: str) -> str:
+    """Hash of a chunk's text with runs of whitespace collapsed."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def generation_settings_key(model: str, note_type: str, content_focus: str, template: str = "") -> str:
+    """
+    Hash the settings, other than the chunk text, that determine the cards.
+
+    Args:
+        model: LLM model name
+        note_type: "basic" or "cloze"
+        content_focus: Card type focus (definitions, concepts, mixed)
+        template: Prompt and system message text, so a template change
+            invalidates stored cards
+    """
+    payload = json.dumps(
+        {"model": model, "note_type": note_type, "focus": content_focus, "template": template},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChunkCardStore:
+    """
+    SQLite-backed cards per chunk text, safe to share between threads.
+
+    Args:
+        path: Database file path
+    """
+
+    def __init__(self, path: Path = DEFAULT_STORE_PATH) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, text_sha256: str, settings: str, requested: int = 0) -> Optional[List[Card]]:
+        """
+        Stored cards for a chunk, or None.
+
+        Entries generated for fewer than ``requested`` cards are misses, since
+        the LLM was never asked for that many.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT requested, cards FROM chunk_cards WHERE text_sha256 = ? AND settings = ?",
+                (text_sha256, settings),
+            ).fetchone()
+            if row is None or row[0] < requested:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [Card(**card) for card in json.loads(row[1])]
+
+    def put(self, text_sha256: str, settings: str, requested: int, cards: Sequence[Card]) -> None:
+        payload = json.dumps(
+            [{name: getattr(card, name) for name in _CARD_FIELDS} for card in cards], ensure_ascii=False
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunk_cards (text_sha256, settings, requested, cards, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (text_sha256, settings, requested, payload, time.time()),
+            )
+            self._conn.commit()
+
+    def contains(self, text_sha256: str, settings: str, requested: int = 0) -> bool:
+        """True if ``get`` would return stored cards (without counting a lookup)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT requested FROM chunk_cards WHERE text_sha256 = ? AND settings = ?",
+                (text_sha256, settings),
+            ).fetchone()
+        return row is not None and row[0] >= requested
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM chunk_cards").fetchone()[0]
+        return {"path": str(self.path), "entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+@dataclass
+class RegenerationPlan:
+    """
+    Which chunks of a document can reuse stored cards.
+
+    Attributes:
+        unchanged: Indices of chunks whose cards are stored
+        changed: Indices of new or edited chunks that need the LLM
+    """
+    unchanged: List[int] = field(default_factory=list)
+    changed: List[int] = field(default_factory=list)
+
+
+def plan_regeneration(
+    chunks: Sequence[Chunk], store: ChunkCardStore, settings: str, requested: int = 0
+) -> RegenerationPlan:
+    """Split ``chunks`` into those with stored cards and those to send to the LLM."""
+    plan = RegenerationPlan()
+    for index, chunk in enumerate(chunks):
+        if store.contains(chunk_text_sha256(chunk.text), settings, requested):
+            plan.unchanged.append(index)
+        else:
+            plan.changed.append(index)
+    return plan
+
+
+def reuse_unchanged_chunks(
+    generate_fn: Callable[[Chunk, int], List[Card]],
+    store: ChunkCardStore,
+    settings: str,
+) -> Callable[[Chunk, int], List[Card]]:
+    """
+    Wrap a ``generate_fn(chunk, n)`` so unchanged chunks are answered from ``store``.
+
+    Stored cards are re-attached to the current chunk and PDF; cards from
+    the LLM are stored before they are returned. Safe to call from worker
+    threads.
+    """
+    def generate(chunk: Chunk, requested: int) -> List[Card]:
+        text_sha256 = chunk_text_sha256(chunk.text)
+        cards = store.get(text_sha256, settings, requested)
+        if cards is not None:
+            source = chunk.source_ref
+            for card in cards:
+                card.source_ref = SourceReference(pdf_sha256=source.pdf_sha256 if source else "", chunk_id=chunk.id)
+            return cards[:requested]
+        cards = generate_fn(chunk, requested) or []
+        if cards:
+            store.put(text_sha256, settings, requested, cards)
+        return cards
+
+    return generate
+
+
+def diff_chunk_files(old_path: Path, new_path: Path) -> Dict[str, List[str]]:
+    """
+    Compare two chunks.jsonl files by chunk text hash.
+
+    Returns:
+        Chunk ids of the new file grouped as "unchanged" and "changed", and
+        ids of the old file whose text no longer appears as "removed"
+    """
+    def load(path: Path) -> List[Tuple[str, str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return [(r["id"], r.get("text_sha256") or chunk_text_sha256(r["text"])) for r in records]
+
+    old, new = load(old_path), load(new_path)
+    old_hashes = {digest for _, digest in old}
+    new_hashes = {digest for _, digest in new}
+    return {
+        "unchanged": [chunk_id for chunk_id, digest in new if digest in old_hashes],
+        "changed": [chunk_id for chunk_id, digest in new if digest not in old_hashes],
+        "removed": [chunk_id for chunk_id, digest in old if digest not in new_hashes],
+    }
+
+
+_default_store: Optional[ChunkCardStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_chunk_card_store() -> ChunkCardStore:
+    """
+    Return the process-wide chunk card store.
+
+    Configured by CHUNK_CARD_STORE_PATH (default: outputs/chunk_cards.sqlite3).
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ChunkCardStore(Path(os.getenv("CHUNK_CARD_STORE_PATH", str(DEFAULT_STORE_PATH))))
+        return _default_store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect stored chunk cards or diff two chunk files")
+    parser.add_argument("--stats", action="store_true", help="Print store statistics (default)")
+    parser.add_argument("--diff", nargs=2, type=Path, metavar=("OLD", "NEW"), help="Compare two chunks.jsonl files")
+    args = parser.parse_args()
+
+    if args.diff:
+        diff = diff_chunk_files(*args.diff)
+        print(json.dumps({name: len(ids) for name, ids in diff.items()}))
+        print(json.dumps(diff, indent=2))
+    else:
+        print(json.dumps(get_chunk_card_store().stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,293 @@
+"""
+Bounded-parallel card generation across chunks.
+
+This module runs one LLM request per chunk on a thread pool while keeping the
+semantics of the original sequential loop: results are assembled in chunk
+order, the total card budget is never over-requested, and a cancel check is
+honored between completions. It has no Streamlit dependency; UI callers pass
+callbacks for progress and error reporting, which are always invoked on the
+calling thread.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from pdf2anki_types import Card
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute.
+
+    Either limit may be None to disable it. A single request larger than the
+    per-minute token budget is admitted once the bucket is full rather than
+    blocking forever.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        now = clock()
+        # [capacity, level, last_refill]
+        self._request_bucket = [requests_per_minute, requests_per_minute, now] if requests_per_minute else None
+        self._token_bucket = [tokens_per_minute, tokens_per_minute, now] if tokens_per_minute else None
+
+    @staticmethod
+    def _refill(bucket: list, now: float) -> None:
+        capacity, level, last = bucket
+        bucket[1] = min(capacity, level + (now - last) * capacity / 60.0)
+        bucket[2] = now
+
+    @staticmethod
+    def _wait_time(bucket: Optional[list], amount: float) -> float:
+        if bucket is None or amount <= 0:
+            return 0.0
+        capacity, level, _ = bucket
+        need = min(amount, capacity)
+        if level >= need:
+            return 0.0
+        return (need - level) * 60.0 / capacity
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request using ``tokens`` tokens may be sent.
+
+        Returns:
+            Total seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                for bucket in (self._request_bucket, self._token_bucket):
+                    if bucket is not None:
+                        self._refill(bucket, now)
+                delay = max(
+                    self._wait_time(self._request_bucket, 1),
+                    self._wait_time(self._token_bucket, tokens),
+                )
+                if delay <= 0:
+                    if self._request_bucket is not None:
+                        self._request_bucket[1] -= 1
+                    if self._token_bucket is not None:
+                        self._token_bucket[1] -= min(tokens, self._token_bucket[0])
+                    return waited
+            self._sleep(delay)
+            waited += delay
+
+
+_limiters: Dict[Tuple[str, Optional[float], Optional[float]], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    endpoint: str,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+) -> RateLimiter:
+    """Return the shared limiter for an LLM endpoint (one per base URL and limit pair)."""
+    key = (endpoint, requests_per_minute, tokens_per_minute)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            _limiters[key] = limiter
+        return limiter
+
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if number > 0 else None
+
+
+def limits_from_env() -> Tuple[int, Optional[float], Optional[float]]:
+    """
+    Read generation limits from the environment.
+
+    Returns:
+        (max_concurrency, requests_per_minute, tokens_per_minute) from
+        LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE
+    """
+    concurrency = _env_number("LLM_MAX_CONCURRENCY")
+    return (
+        int(concurrency) if concurrency else DEFAULT_MAX_CONCURRENCY,
+        _env_number("LLM_REQUESTS_PER_MINUTE"),
+        _env_number("LLM_TOKENS_PER_MINUTE"),
+    )
+
+
+@dataclass
+class GenerationOutcome:
+    """
+    Result of a concurrent generation run.
+
+    Attributes:
+        cards: Cards in chunk order, truncated to the requested total
+        cancelled: True if the run stopped because of the cancel check
+        completed_chunks: Number of chunks whose request finished (successfully or not)
+        failed_chunks: Number of chunks whose request raised
+        dropped_cards: Number of cards removed by the ``filter_cards`` callback
+    """
+    cards: List[Card] = field(default_factory=list)
+    cancelled: bool = False
+    completed_chunks: int = 0
+    failed_chunks: int = 0
+    dropped_cards: int = 0
+
+
+def generate_cards_concurrently(
+    chunks: Sequence[T],
+    generate_fn: Callable[[T, int], List[Card]],
+    num_cards: int,
+    cards_per_chunk: int,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    on_error: Optional[Callable[[T, BaseException], None]] = None,
+    filter_cards: Optional[Callable[[List[Card]], List[Card]]] = None,
+    cards_for: Optional[Callable[[T], int]] = None,
+    poll_interval: float = 0.2,
+) -> GenerationOutcome:
+    """
+    Generate cards for ``chunks`` with at most ``max_concurrency`` requests in flight.
+
+    Each chunk is asked for ``min(cards_per_chunk, remaining)`` cards, where
+    ``remaining`` is the requested total minus cards already delivered and
+    cards reserved by in-flight requests. When a request returns fewer cards
+    than it asked for, the shortfall is released for later chunks, matching
+    the sequential loop's ``remaining_cards`` bookkeeping. Cards removed by
+    ``filter_cards`` (e.g. duplicates) are released the same way.
+
+    Args:
+        chunks: Chunks in document order
+        generate_fn: Called on a worker thread as ``generate_fn(chunk, n)``
+        num_cards: Total number of cards wanted
+        cards_per_chunk: Cards to request per chunk
+        max_concurrency: Maximum simultaneous requests
+        should_cancel: Polled on the calling thread; returning True stops the run
+        on_progress: Called as ``on_progress(completed, total_chunks)``
+        on_error: Called with the chunk and exception when ``generate_fn`` raises
+        filter_cards: Called on the calling thread with each chunk's cards, in
+            chunk order, and returns the cards to keep
+        cards_for: Cards to request for a chunk instead of ``cards_per_chunk``
+            (e.g. for a request that packs several chunks)
+
+    Returns:
+        GenerationOutcome with cards assembled in chunk order
+    """
+    outcome = GenerationOutcome()
+    total = len(chunks)
+    if total == 0 or num_cards <= 0:
+        return outcome
+
+    max_concurrency = max(1, int(max_concurrency))
+    results: Dict[int, List[Card]] = {}
+    pending: Dict[Future, Tuple[int, int]] = {}
+    delivered = 0
+    reserved = 0
+    next_index = 0
+    next_filtered = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="card-gen")
+    try:
+        while True:
+            if should_cancel is not None and should_cancel():
+                outcome.cancelled = True
+                break
+
+            while (
+                len(pending) < max_concurrency
+                and next_index < total
+                and num_cards - delivered - reserved > 0
+            ):
+                wanted = cards_for(chunks[next_index]) if cards_for is not None else cards_per_chunk
+                requested = min(wanted, num_cards - delivered - reserved)
+                # Run in a copy of the caller's context (e.g. its instrumentation recorder)
+                future = executor.submit(contextvars.copy_context().run, generate_fn, chunks[next_index], requested)
+                pending[future] = (next_index, requested)
+                reserved += requested
+                next_index += 1
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, requested = pending.pop(future)
+                reserved -= requested
+                try:
+                    cards = future.result() or []
+                except Exception as exc:
+                    cards = []
+                    outcome.failed_chunks += 1
+                    if on_error is not None:
+                        on_error(chunks[index], exc)
+                results[index] = cards
+                delivered += len(cards)
+                outcome.completed_chunks += 1
+                if on_progress is not None:
+                    on_progress(outcome.completed_chunks, total)
+
+            # Filter in chunk order so the earliest copy of a duplicate is the one kept
+            while filter_cards is not None and next_filtered in results:
+                cards = results[next_filtered]
+                kept = filter_cards(cards) if cards else cards
+                results[next_filtered] = kept
+                delivered -= len(cards) - len(kept)
+                outcome.dropped_cards += len(cards) - len(kept)
+                next_filtered += 1
+    finally:
+        # Do not wait for in-flight requests after a cancel; their results are discarded.
+        executor.shutdown(wait=not outcome.cancelled, cancel_futures=True)
+
+    for index in sorted(results):
+        cards = results[index]
+        if filter_cards is not None and index >= next_filtered and cards:
+            # Left behind a gap by a cancelled run
+            kept = filter_cards(cards)
+            outcome.dropped_cards += len(cards) - len(kept)
+            cards = kept
+        outcome.cards.extend(cards)
+    outcome.cards = outcome.cards[:num_cards]
+    return outcome
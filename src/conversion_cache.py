@@ -0,0 +1,262 @@
+"""
+Content-addressed cache for Marker API conversions.
+
+Conversions are stored under ``<output_root>/conversions/<sha256>/`` by
+``marker_client.convert_pdf_to_markdown``. This module decides whether such a
+directory already holds a usable result for the same PDF, engine version and
+conversion options, keeps hit/miss counters, and evicts old entries by age
+and total size.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout of a conversion directory changes.
+CACHE_SCHEMA_VERSION = 1
+
+MARKDOWN_FILENAME = "marker.md"
+META_FILENAME = "meta.json"
+ERROR_FILENAME = "error.log"
+
+
+@dataclass
+class CacheStats:
+    """Counters for a conversion cache instance."""
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def make_cache_key(source_sha256: str, engine_version: str, options: Optional[dict] = None) -> str:
+    """
+    Build the cache key for a conversion.
+
+    The key covers the PDF content hash, the conversion engine version and any
+    options that influence the converted output, so changing any of them
+    forces a fresh conversion.
+    """
+    payload = {
+        "schema": CACHE_SCHEMA_VERSION,
+        "source_sha256": source_sha256,
+        "engine_version": engine_version,
+        "options": options or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _last_used(conv_dir: Path) -> float:
+    """Return the last time a conversion directory was written or served."""
+    meta_path = conv_dir / META_FILENAME
+    try:
+        return meta_path.stat().st_mtime
+    except OSError:
+        try:
+            return conv_dir.stat().st_mtime
+        except OSError:
+            return 0.0
+
+
+class ConversionCache:
+    """
+    Cache of completed conversions rooted at ``<output_root>/conversions``.
+
+    Args:
+        output_root: Base output directory (the same one passed to
+            ``convert_pdf_to_markdown``)
+        max_bytes: Evict least recently used entries once the cache grows
+            beyond this many bytes (None disables size-based eviction)
+        max_age_seconds: Evict entries not used for this long (None disables
+            age-based eviction)
+    """
+
+    def __init__(
+        self,
+        output_root: Path,
+        max_bytes: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+    ) -> None:
+        self.root = Path(output_root).resolve() / "conversions"
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def entry_dir(self, source_sha256: str) -> Path:
+        return self.root / source_sha256
+
+    def lookup(self, source_sha256: str, cache_key: str) -> Optional[Tuple[Path, Path]]:
+        """
+        Return ``(markdown_path, meta_path)`` for a completed conversion, or None.
+
+        A directory only counts as a hit when its meta.json records the same
+        cache key and marker.md is present. Hits refresh the entry's recency
+        for LRU eviction.
+        """
+        conv_dir = self.entry_dir(source_sha256)
+        markdown_path = conv_dir / MARKDOWN_FILENAME
+        meta_path = conv_dir / META_FILENAME
+
+        meta = None
+        if markdown_path.is_file() and meta_path.is_file():
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                meta = None
+
+        with self._lock:
+            if not meta or meta.get("cache_key") != cache_key:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+
+        try:
+            os.utime(meta_path, None)
+        except OSError:
+            pass
+        logger.info(f"Conversion cache hit for {source_sha256}")
+        return markdown_path, meta_path
+
+    def record_refresh(self) -> None:
+        """Count a lookup that was skipped because the caller asked for a refresh."""
+        with self._lock:
+            self.stats.refreshes += 1
+            self.stats.misses += 1
+
+    def entries(self) -> List[Tuple[Path, int, float]]:
+        """List cache entries as ``(directory, size_bytes, last_used)``."""
+        if not self.root.is_dir():
+            return []
+        result = []
+        for conv_dir in self.root.iterdir():
+            if conv_dir.is_dir():
+                result.append((conv_dir, _dir_size(conv_dir), _last_used(conv_dir)))
+        return result
+
+    def evict(self, protect: Optional[str] = None, now: Optional[float] = None) -> int:
+        """
+        Remove expired entries, then the least recently used ones until the
+        cache fits within ``max_bytes``.
+
+        Args:
+            protect: SHA256 of an entry that must be kept (e.g. the one just written)
+            now: Reference timestamp (defaults to the current time)
+
+        Returns:
+            Number of entries removed
+        """
+        if self.max_bytes is None and self.max_age_seconds is None:
+            return 0
+
+        now = time.time() if now is None else now
+        entries = [e for e in self.entries() if e[0].name != protect]
+        removed: List[Tuple[Path, int]] = []
+
+        if self.max_age_seconds is not None:
+            keep = []
+            for conv_dir, size, last_used in entries:
+                if now - last_used > self.max_age_seconds:
+                    removed.append((conv_dir, size))
+                else:
+                    keep.append((conv_dir, size, last_used))
+            entries = keep
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            if protect:
+                total += _dir_size(self.entry_dir(protect))
+            for conv_dir, size, _ in sorted(entries, key=lambda e: e[2]):
+                if total <= self.max_bytes:
+                    break
+                removed.append((conv_dir, size))
+                total -= size
+
+        for conv_dir, size in removed:
+            shutil.rmtree(conv_dir, ignore_errors=True)
+            logger.info(f"Evicted cached conversion {conv_dir.name} ({size} bytes)")
+
+        with self._lock:
+            self.stats.evictions += len(removed)
+            self.stats.evicted_bytes += sum(size for _, size in removed)
+        return len(removed)
+
+
+_caches: Dict[Path, ConversionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}")
+        return None
+
+
+def get_conversion_cache(output_root: Path) -> ConversionCache:
+    """
+    Return the process-wide cache for ``output_root``.
+
+    Sharing one instance per root keeps hit/miss counters across calls.
+    Limits come from CONVERSION_CACHE_MAX_MB and CONVERSION_CACHE_MAX_AGE_DAYS
+    when set.
+    """
+    root = Path(output_root).resolve()
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            max_mb = _env_float("CONVERSION_CACHE_MAX_MB")
+            max_age_days = _env_float("CONVERSION_CACHE_MAX_AGE_DAYS")
+            cache = ConversionCache(
+                root,
+                max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else None,
+                max_age_seconds=max_age_days * 86400 if max_age_days is not None else None,
+            )
+            _caches[root] = cache
+        return cache
@@ -0,0 +1,258 @@
+"""
+Local daemon protocol for keeping a converter resident between CLI calls.
+
+Loading the marker-pdf models often takes longer than converting a short
+PDF. ``ConversionDaemon`` serves a conversion handler over a loopback TCP
+socket so repeated CLI invocations can reuse one warm process, and
+``DaemonClient`` talks to it.
+
+Other users of the machine can reach a loopback port too, so the daemon
+writes a random token to a file only its owner can read (default:
+~/.cache/pdf2anki/marker-daemon.token, override with
+MARKER_DAEMON_TOKEN_PATH) and serves only requests that carry it. The
+file is removed when the daemon stops.
+
+The protocol is newline-delimited JSON, one request and one response per
+line; a connection may carry any number of requests, each with the token:
+
+  {"op": "convert", "token": ..., ...handler arguments...} -> {"ok": true, "result": {...}}
+  {"op": "ping", "token": ...}                             -> {"ok": true, "pid": ..., ...}
+  {"op": "shutdown", "token": ...}                         -> {"ok": true}
+
+Failures are reported as {"ok": false, "error": "..."}; a request with a
+wrong token also closes the connection.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAEMON_HOST = "127.0.0.1"
+DEFAULT_DAEMON_PORT = int(os.getenv("MARKER_DAEMON_PORT", "8766"))
+DEFAULT_TOKEN_PATH = Path(os.getenv(
+    "MARKER_DAEMON_TOKEN_PATH",
+    str(Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "pdf2anki" / "marker-daemon.token"),
+))
+
+
+class DaemonError(RuntimeError):
+    """Raised by DaemonClient when the daemon reports a failure."""
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+
+def _write_token(path: Path, token: str) -> None:
+    """Write ``token`` to ``path``, readable and writable by the owner only."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        # O_CREAT's mode does not apply to a file left over from an earlier daemon
+        os.chmod(path, 0o600)
+        f.write(token)
+
+
+class ConversionDaemon:
+    """
+    Serves ``handler`` to local clients.
+
+    Requests are handled one at a time (the resident models are not shared
+    between concurrent conversions), but any number of clients may connect
+    and queue work.
+
+    Args:
+        handler: Called with a convert request's fields (without "op"); its
+            return value is sent back as "result"
+        host: Address to bind; loopback by default
+        port: Port to bind (0 picks a free port)
+        token_path: Where to write the token clients must send
+            (default: MARKER_DAEMON_TOKEN_PATH)
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Dict[str, object]],
+        host: str = DEFAULT_DAEMON_HOST,
+        port: int = DEFAULT_DAEMON_PORT,
+        token_path: Optional[Path] = None,
+    ) -> None:
+        self.handler = handler
+        self.token_path = Path(token_path or DEFAULT_TOKEN_PATH)
+        self._token = secrets.token_urlsafe(32)
+        self.started_at = time.time()
+        self.converted = 0
+        self._work_lock = threading.Lock()
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    response = daemon._dispatch(line)
+                    try:
+                        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                    except OSError:
+                        # The client gave up waiting (see DaemonClient.request)
+                        return
+                    if response.get("shutdown"):
+                        threading.Thread(target=daemon.shutdown, daemon=True).start()
+                        return
+                    if response.get("unauthorized"):
+                        return
+
+        self._server = _Server((host, port), RequestHandler)
+        # Only after binding, so a second daemon cannot replace the running one's token
+        _write_token(self.token_path, self._token)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _dispatch(self, line: bytes) -> Dict[str, object]:
+        try:
+            request = json.loads(line)
+            token = request.pop("token", None)
+            if not isinstance(token, str) or not hmac.compare_digest(token, self._token):
+                return {"ok": False, "error": "Invalid daemon token", "unauthorized": True}
+            op = request.pop("op", None)
+            if op == "ping":
+                return {
+                    "ok": True,
+                    "pid": os.getpid(),
+                    "uptime_sec": round(time.time() - self.started_at, 3),
+                    "converted": self.converted,
+                }
+            if op == "shutdown":
+                return {"ok": True, "shutdown": True}
+            if op != "convert":
+                return {"ok": False, "error": f"Unknown op: {op!r}"}
+            with self._work_lock:
+                result = self.handler(**request)
+                self.converted += 1
+            return {"ok": True, "result": result}
+        except Exception as e:
+            logger.exception("Daemon request failed")
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def serve_forever(self) -> None:
+        logger.info(f"Conversion daemon listening on {self.address[0]}:{self.address[1]}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.token_path.unlink(missing_ok=True)
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+
+
+class DaemonClient:
+    """
+    Client for a running ConversionDaemon; usable as a context manager.
+
+    Args:
+        host: Daemon address
+        port: Daemon port
+        timeout_seconds: Timeout for each request (conversions can be slow);
+            a request that times out raises DaemonError, and the next request
+            opens a new connection
+        token_path: The daemon's token file (default: MARKER_DAEMON_TOKEN_PATH)
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_DAEMON_HOST,
+        port: int = DEFAULT_DAEMON_PORT,
+        timeout_seconds: Optional[float] = 600,
+        token_path: Optional[Path] = None,
+    ) -> None:
+        # A missing token file means no daemon is running (OSError, see connect)
+        self._token = Path(token_path or DEFAULT_TOKEN_PATH).read_text(encoding="utf-8").strip()
+        self._address = (host, port)
+        self.timeout_seconds = timeout_seconds
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._open()
+
+    def _open(self) -> None:
+        self._sock = socket.create_connection(self._address, timeout=self.timeout_seconds)
+        self._file = self._sock.makefile("rwb")
+
+    @classmethod
+    def connect(cls, host: str = DEFAULT_DAEMON_HOST, port: int = DEFAULT_DAEMON_PORT, **kwargs) -> Optional["DaemonClient"]:
+        """Return a client if a daemon is listening, otherwise None."""
+        try:
+            return cls(host, port, **kwargs)
+        except OSError:
+            return None
+
+    def request(self, op: str, **fields: object) -> Dict[str, object]:
+        if self._file is None:
+            self._open()
+        try:
+            self._file.write(json.dumps({"op": op, "token": self._token, **fields}, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        except socket.timeout:
+            # A socket file cannot be read again after a timeout, and a late
+            # reply would be taken as the next request's; start over
+            self.close()
+            raise DaemonError(f"No reply from the daemon within {self.timeout_seconds}s")
+        if not line:
+            self.close()
+            raise DaemonError("Daemon closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", "unknown error"))
+        return response
+
+    def convert(self, **fields: object) -> Dict[str, object]:
+        return self.request("convert", **fields)["result"]
+
+    def ping(self) -> Dict[str, object]:
+        return self.request("ping")
+
+    def shutdown(self) -> None:
+        self.request("shutdown")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._sock.close()
+            self._file = self._sock = None
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -9,8 +9,16 @@ Outputs layout (under --outdir):
       meta.json             # ConversionMeta
       conversion_result.json# ConversionResult
 
+Loading the marker-pdf models usually costs more than converting a short
+PDF, so the models are loaded once per process: several files (or glob
+patterns) can be passed to --input, and --daemon keeps a process with the
+models resident that later CLI calls hand their files to.
+
 Usage:
   python src/convert_pdf_marker.py --input /path/to/input.pdf --outdir outputs
+  python src/convert_pdf_marker.py --input "slides/*.pdf" --outdir outputs
+  python src/convert_pdf_marker.py --daemon &   # later --input calls use it
+  python src/convert_pdf_marker.py --stop-daemon
 
 Copyright (C) 2025  Masanori Tani
 
@@ -31,10 +39,11 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
 import argparse
-import hashlib
+import glob
 import json
 import re
 import sys
+import threading
 import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
@@ -42,8 +51,8 @@ from importlib import metadata
 from pathlib import Path
 from typing import Iterable, List, Optional, Tuple
 
-# External deps
-from pypdf import PdfReader
+from conversion_daemon import DEFAULT_DAEMON_PORT, ConversionDaemon, DaemonClient, DaemonError
+from file_fingerprint import file_sha256, pdf_page_count
 
 try:
     # marker-pdf API (commonly imported as "marker")
@@ -77,19 +86,11 @@ class ConversionResult:
 
 
 def compute_sha256(path: Path) -> str:
-    sha256 = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            sha256.update(chunk)
-    return sha256.hexdigest()
+    return file_sha256(path)
 
 
 def read_pdf_pages(path: Path) -> int:
-    try:
-        reader = PdfReader(str(path))
-        return len(reader.pages)
-    except Exception:
-        return 0
+    return pdf_page_count(path) or 0
 
 
 def clean_markdown(md: str) -> str:
@@ -101,9 +102,22 @@ def clean_markdown(md: str) -> str:
 
 
 
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_converter() -> "PdfConverter":
+    """Return the process-wide PdfConverter, loading the models on first use."""
+    global _converter
+    with _converter_lock:
+        if _converter is None:
+            _converter = PdfConverter(artifact_dict=create_model_dict())
+        return _converter
+
+
 def convert_with_marker(pdf_path: Path) -> Tuple[str, Optional[str]]:
     """Return (markdown_text, images_dir?)."""
-    converter = PdfConverter(artifact_dict=create_model_dict())
+    converter = get_converter()
     rendered = converter(str(pdf_path))
 
     # Try common access paths to obtain markdown
@@ -119,18 +133,19 @@ def convert_with_marker(pdf_path: Path) -> Tuple[str, Optional[str]]:
     raise RuntimeError("Unsupported marker-pdf output structure; please update code for your version.")
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="Convert PDF to Markdown with marker-pdf and write meta/chunks")
-    parser.add_argument("--input", required=True, help="Path to input PDF")
-    parser.add_argument("--outdir", default="outputs", help="Root output directory (default: outputs)")
-    args = parser.parse_args()
+def engine_version() -> str:
+    try:
+        return metadata.version("marker-pdf")
+    except Exception:
+        # Fallback to try alternative dist name
+        try:
+            return metadata.version("marker")
+        except Exception:
+            return "unknown"
 
-    input_pdf = Path(args.input).expanduser().resolve()
-    if not input_pdf.exists() or input_pdf.suffix.lower() != ".pdf":
-        print(f"ERROR: invalid input PDF: {input_pdf}", file=sys.stderr)
-        sys.exit(2)
 
-    out_root = Path(args.outdir).expanduser().resolve()
+def convert_file(input_pdf: Path, out_root: Path) -> dict:
+    """Convert one PDF into ``out_root/conversions/<sha256>/`` and return the output paths."""
     out_root.mkdir(parents=True, exist_ok=True)
 
     pdf_sha256 = compute_sha256(input_pdf)
@@ -140,16 +155,6 @@ def main() -> None:
     conv_dir.mkdir(parents=True, exist_ok=True)
 
     # Convert
-    engine_name = "marker-pdf"
-    try:
-        engine_version = metadata.version("marker-pdf")
-    except Exception:
-        # Fallback to try alternative dist name
-        try:
-            engine_version = metadata.version("marker")
-        except Exception:
-            engine_version = "unknown"
-
     t0 = time.perf_counter()
     md_text, images_dir = convert_with_marker(input_pdf)
     elapsed = time.perf_counter() - t0
@@ -165,7 +170,7 @@ def main() -> None:
         source_path=str(input_pdf),
         source_sha256=pdf_sha256,
         pages=pages,
-        engine={"name": engine_name, "version": engine_version},
+        engine={"name": "marker-pdf", "version": engine_version()},
         elapsed_sec=elapsed,
         created_at=datetime.now(timezone.utc).isoformat(),
     )
@@ -181,14 +186,100 @@ def main() -> None:
     result_path = conv_dir / "conversion_result.json"
     result_path.write_text(json.dumps(result_obj.__dict__, ensure_ascii=False, indent=2), encoding="utf-8")
 
-    print(json.dumps({
+    return {
         "markdown_path": str(marker_md_path),
         "meta_path": str(meta_path),
         "conversion_result": str(result_path),
-    }, ensure_ascii=False))
+    }
 
 
-if __name__ == "__main__":
-    main()
+def expand_inputs(patterns: Iterable[str]) -> List[Path]:
+    """Expand paths and glob patterns into a de-duplicated list of files."""
+    paths: List[Path] = []
+    for pattern in patterns:
+        pattern = str(Path(pattern).expanduser())
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            path = Path(match).resolve()
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def convert_daemon_request(pdf_path: str, outdir: str) -> dict:
+    """Handle a daemon "convert" request for one PDF."""
+    input_pdf = Path(pdf_path)
+    if not input_pdf.is_file() or input_pdf.suffix.lower() != ".pdf":
+        raise ValueError(f"invalid input PDF: {input_pdf}")
+    return convert_file(input_pdf, Path(outdir))
+
+
+def serve_daemon(port: int) -> None:
+    """Load the models and serve conversions until asked to stop."""
+    t0 = time.perf_counter()
+    get_converter()
+    print(f"Models loaded in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    daemon = ConversionDaemon(convert_daemon_request, port=port)
+    host, bound_port = daemon.address
+    print(f"Conversion daemon listening on {host}:{bound_port}", file=sys.stderr)
+    daemon.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert PDF to Markdown with marker-pdf and write meta/chunks")
+    parser.add_argument("--input", nargs="+", help="Input PDFs or glob patterns")
+    parser.add_argument("--outdir", default="outputs", help="Root output directory (default: outputs)")
+    parser.add_argument("--daemon", action="store_true", help="Keep the models resident and serve conversions to later calls")
+    parser.add_argument("--stop-daemon", action="store_true", help="Stop a running daemon")
+    parser.add_argument("--no-daemon", action="store_true", help="Convert in this process even if a daemon is running")
+    parser.add_argument("--port", type=int, default=DEFAULT_DAEMON_PORT,
+                        help=f"Daemon port on 127.0.0.1 (default: MARKER_DAEMON_PORT or {DEFAULT_DAEMON_PORT})")
+    args = parser.parse_args()
 
+    if args.daemon:
+        serve_daemon(args.port)
+        return
+    if args.stop_daemon:
+        client = DaemonClient.connect(port=args.port)
+        if client is None:
+            print("No daemon is running", file=sys.stderr)
+            sys.exit(1)
+        with client:
+            client.shutdown()
+        return
+    if not args.input:
+        parser.error("--input is required unless --daemon or --stop-daemon is given")
+
+    input_pdfs = expand_inputs(args.input)
+    invalid = [p for p in input_pdfs if not p.exists() or p.suffix.lower() != ".pdf"]
+    if not input_pdfs or invalid:
+        for p in invalid or args.input:
+            print(f"ERROR: invalid input PDF: {p}", file=sys.stderr)
+        sys.exit(2)
+
+    out_root = Path(args.outdir).expanduser().resolve()
+    client = None if args.no_daemon else DaemonClient.connect(port=args.port)
 
+    failed = 0
+    for input_pdf in input_pdfs:
+        t0 = time.perf_counter()
+        try:
+            if client is not None:
+                output = client.convert(pdf_path=str(input_pdf), outdir=str(out_root))
+            else:
+                output = convert_file(input_pdf, out_root)
+        except (DaemonError, OSError, RuntimeError) as e:
+            failed += 1
+            print(f"ERROR: failed to convert {input_pdf}: {e}", file=sys.stderr)
+            continue
+        output["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+        print(json.dumps(output, ensure_ascii=False), flush=True)
+
+    if client is not None:
+        client.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Fast, memoized file fingerprints (SHA256 and PDF page count).
+
+Every stage keys its outputs by the source PDF's SHA256, so the same file
+used to be hashed several times per run, and page counts parsed the whole
+PDF. This module hashes through a memory map (falling back to large
+buffered reads), counts pages from the document catalog without loading
+the file into memory, and remembers both in a small SQLite store keyed by
+(device, inode, size, mtime). Unchanged files are never re-read.
+
+Usage:
+  python src/file_fingerprint.py file1.pdf [file2.pdf ...]
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Entries describe files wherever they live, so the store is per user rather than per output directory
+DEFAULT_FINGERPRINT_PATH = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "pdf2anki" / "fingerprints.sqlite3"
+
+# Bytes handed to hashlib per update; large enough that the GIL is released
+# for most of the work, small enough not to fault in a whole multi-GB map at once
+HASH_WINDOW_SIZE = 16 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT,
+    pages INTEGER,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (device, inode, size, mtime_ns)
+);
+"""
+
+FileIdentity = Tuple[int, int, int, int]
+
+
+def file_identity(stat: os.stat_result) -> FileIdentity:
+    """(device, inode, size, mtime) — changes whenever the file's content can have changed."""
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def hash_file(path: Path) -> str:
+    """SHA256 of a file, read through a memory map where possible."""
+    sha256 = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return sha256.hexdigest()
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Pipes, special files, some network filesystems
+            buffer = bytearray(READ_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                sha256.update(view[:n])
+            return sha256.hexdigest()
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(mapped), HASH_WINDOW_SIZE):
+                    sha256.update(view[offset:offset + HASH_WINDOW_SIZE])
+            finally:
+                view.release()
+    return sha256.hexdigest()
+
+
+def count_pdf_pages(path: Path) -> Optional[int]:
+    """
+    Page count of a PDF, or None if it cannot be read.
+
+    Reads the trailer, the cross-reference data and the catalog's page tree
+    root (/Pages /Count) from the open file; the document is not loaded into
+    memory and individual pages are not parsed unless /Count is unusable.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf is not installed; page counts are unavailable")
+        return None
+    try:
+        with Path(path).open("rb") as f:
+            # Passing a file object (not a path) keeps pypdf from reading the whole file
+            reader = PdfReader(f)
+            try:
+                count = reader.trailer["/Root"]["/Pages"]["/Count"]
+                if int(count) >= 0:
+                    return int(count)
+            except Exception:
+                pass
+            return len(reader.pages)
+    except Exception as e:
+        logger.warning(f"Could not count pages of {Path(path).name}: {e}")
+        return None
+
+
+class FingerprintStore:
+    """
+    SQLite-backed memo of file hashes and page counts, safe to share between threads.
+
+    Args:
+        path: Database file path
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, identity: FileIdentity, column: str) -> Optional[object]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column} FROM fingerprints "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                identity,
+            ).fetchone()
+            if row is not None and row[0] is not None:
+                self._conn.execute(
+                    "UPDATE fingerprints SET last_access = ? "
+                    "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                    (time.time(), *identity),
+                )
+                self._conn.commit()
+                return row[0]
+        return None
+
+    def _put(self, identity: FileIdentity, path: Path, column: str, value: object) -> None:
+        with self._lock:
+            # Earlier versions of the same file are stale
+            self._conn.execute(
+                "DELETE FROM fingerprints WHERE device = ? AND inode = ? AND NOT (size = ? AND mtime_ns = ?)",
+                identity,
+            )
+            self._conn.execute(
+                "INSERT INTO fingerprints (device, inode, size, mtime_ns, path, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+                (*identity, str(path), time.time()),
+            )
+            self._conn.execute(
+                f"UPDATE fingerprints SET {column} = ?, path = ? "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                (value, str(path), *identity),
+            )
+            self._conn.commit()
+
+    def sha256(self, path: Path) -> str:
+        """SHA256 of ``path``, hashed only if the file changed since it was last seen."""
+        path = Path(path)
+        identity = file_identity(path.stat())
+        cached = self._get(identity, "sha256")
+        if cached is not None:
+            return str(cached)
+        digest = hash_file(path)
+        # Only remember the hash if the file did not change while it was read
+        if file_identity(path.stat()) == identity:
+            self._put(identity, path.resolve(), "sha256", digest)
+        return digest
+
+    def pages(self, path: Path) -> Optional[int]:
+        """Page count of the PDF at ``path``, memoized like ``sha256``."""
+        path = Path(path)
+        identity = file_identity(path.stat())
+        cached = self._get(identity, "pages")
+        if cached is not None:
+            return int(cached)
+        pages = count_pdf_pages(path)
+        if pages is not None:
+            self._put(identity, path.resolve(), "pages", pages)
+        return pages
+
+    def remember(self, path: Path, sha256: str) -> None:
+        """Record a hash computed elsewhere (e.g. from bytes that were just written to ``path``)."""
+        path = Path(path)
+        self._put(file_identity(path.stat()), path.resolve(), "sha256", sha256)
+
+    def prune(self, max_entries: int) -> int:
+        """Keep the ``max_entries`` most recently used entries; returns the number removed."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM fingerprints WHERE rowid NOT IN "
+                "(SELECT rowid FROM fingerprints ORDER BY last_access DESC LIMIT ?)",
+                (max_entries,),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries, hashed, counted = self._conn.execute(
+                "SELECT COUNT(*), COUNT(sha256), COUNT(pages) FROM fingerprints"
+            ).fetchone()
+        return {"path": str(self.path), "entries": entries, "hashed": hashed, "page_counts": counted}
+
+
+_default_store: Optional[FingerprintStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_fingerprint_store() -> FingerprintStore:
+    """
+    Return the process-wide fingerprint store.
+
+    Configured by FINGERPRINT_DB_PATH (default: ~/.cache/pdf2anki/fingerprints.sqlite3).
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = FingerprintStore(Path(os.getenv("FINGERPRINT_DB_PATH", str(DEFAULT_FINGERPRINT_PATH))))
+        return _default_store
+
+
+def file_sha256(path: Path) -> str:
+    """Memoized SHA256 of a file (see FingerprintStore.sha256)."""
+    return get_fingerprint_store().sha256(path)
+
+
+def pdf_page_count(path: Path) -> Optional[int]:
+    """Memoized page count of a PDF (see FingerprintStore.pages)."""
+    return get_fingerprint_store().pages(path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Print the SHA256 and page count of files")
+    parser.add_argument("files", nargs="+", help="Files to fingerprint")
+    args = parser.parse_args()
+
+    for name in args.files:
+        started = time.perf_counter()
+        digest = file_sha256(Path(name))
+        pages = pdf_page_count(Path(name)) if name.lower().endswith(".pdf") else None
+        print(json.dumps({
+            "path": name,
+            "sha256": digest,
+            "pages": pages,
+            "elapsed_sec": round(time.perf_counter() - started, 4),
+        }))
@@ -0,0 +1,299 @@
+"""
+Lightweight stage instrumentation.
+
+Code marks its stages with ``span("cleaning")`` context managers (or wraps
+generators with ``instrumented``). Each span records wall time, CPU time of
+the running thread, bytes in/out and the process's peak RSS, and is
+aggregated by name in the active ``SpanRecorder``. Spans nest: a span's
+``self_wall_sec`` excludes time spent in spans opened inside it, so fused
+streaming stages (e.g. chunking pulling from cleaning) are reported
+separately.
+
+A recorder is made active for a block with ``recording()``; outside of one,
+spans go to a process-wide recorder. Nested recorders forward their spans
+outwards, so the process-wide recorder keeps running totals. Recording
+costs a few microseconds per span, so it stays on by default; set
+PDF2ANKI_INSTRUMENTATION=0 to turn spans into no-ops.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:  # Windows
+    HAS_RESOURCE = False
+
+T = TypeVar("T")
+
+ENABLED = os.getenv("PDF2ANKI_INSTRUMENTATION", "1").lower() not in ("0", "false", "no")
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, if the platform reports it."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class SpanStats:
+    """Totals for all spans with one name."""
+    count: int = 0
+    wall_sec: float = 0.0
+    self_wall_sec: float = 0.0
+    cpu_sec: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    peak_rss_bytes: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        for key in ("wall_sec", "self_wall_sec", "cpu_sec"):
+            data[key] = round(data[key], 6)
+        return data
+
+
+class Span:
+    """An open span; add byte counts with ``add_bytes``."""
+
+    __slots__ = ("name", "bytes_in", "bytes_out", "_wall", "_cpu", "_child_wall")
+
+    def __init__(self, name: str, bytes_in: int = 0) -> None:
+        self.name = name
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self._child_wall = 0.0
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+
+class _NullSpan:
+    """Stands in for Span when instrumentation is disabled."""
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+# Spans open on each thread, innermost last (shared by all recorders so
+# nesting works across them)
+_local = threading.local()
+
+
+def _open_spans() -> List[Span]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class SpanRecorder:
+    """
+    Aggregates spans by name; safe to share between threads.
+
+    Args:
+        parent: Recorder that also receives every span recorded here
+    """
+
+    def __init__(self, parent: Optional["SpanRecorder"] = None) -> None:
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._stats: Dict[str, SpanStats] = {}
+
+    @contextmanager
+    def span(self, name: str, bytes_in: int = 0) -> Iterator[Span]:
+        """Time the enclosed block as one occurrence of ``name``."""
+        stack = _open_spans()
+        current = Span(name, bytes_in)
+        stack.append(current)
+        try:
+            yield current
+        finally:
+            wall = time.perf_counter() - current._wall
+            cpu = time.thread_time() - current._cpu
+            stack.pop()
+            if stack:
+                stack[-1]._child_wall += wall
+            self._add(current, wall, cpu)
+
+    def record(self, name: str, wall_sec: float, cpu_sec: float = 0.0, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        """Add a span measured by the caller (for code that cannot be wrapped in ``span``)."""
+        current = Span(name, bytes_in)
+        current.bytes_out = bytes_out
+        self._add(current, wall_sec, cpu_sec)
+
+    def _add(self, current: Span, wall: float, cpu: float) -> None:
+        rss = peak_rss_bytes()
+        with self._lock:
+            stats = self._stats.get(current.name)
+            if stats is None:
+                stats = self._stats[current.name] = SpanStats()
+            stats.count += 1
+            stats.wall_sec += wall
+            stats.self_wall_sec += wall - current._child_wall
+            stats.cpu_sec += cpu
+            stats.bytes_in += current.bytes_in
+            stats.bytes_out += current.bytes_out
+            if rss is not None:
+                stats.peak_rss_bytes = max(stats.peak_rss_bytes or 0, rss)
+        if self.parent is not None:
+            self.parent._add(current, wall, cpu)
+
+    def instrumented(
+        self,
+        name: str,
+        iterable: Iterable[T],
+        size: Optional[Callable[[T], int]] = None,
+        bytes_in: int = 0,
+    ) -> Iterator[T]:
+        """
+        Yield from ``iterable``, recording all of its steps as one span named ``name``.
+
+        Only the time spent producing items is counted, not the time the
+        consumer spends between them. ``size`` gives each item's bytes_out;
+        ``bytes_in`` is the size of the input as a whole. Generators yield
+        many small items (e.g. one per line), so the steps are summed into
+        a single span when the iteration ends rather than recorded one by one.
+        """
+        iterator = iter(iterable)
+        current = Span(name, bytes_in)
+        wall = cpu = 0.0
+        try:
+            while True:
+                stack = _open_spans()
+                stack.append(current)
+                started, started_cpu = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    step = time.perf_counter() - started
+                    wall += step
+                    cpu += time.thread_time() - started_cpu
+                    stack.pop()
+                    if stack:
+                        stack[-1]._child_wall += step
+                if size is not None:
+                    current.bytes_out += size(item)
+                yield item
+        finally:
+            self._add(current, wall, cpu)
+
+    def stats(self) -> Dict[str, SpanStats]:
+        with self._lock:
+            return {name: SpanStats(**asdict(stats)) for name, stats in self._stats.items()}
+
+    def to_dict(self) -> Dict[str, dict]:
+        return {name: stats.to_dict() for name, stats in self.stats().items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_process_recorder = SpanRecorder()
+_current_recorder: contextvars.ContextVar[Optional[SpanRecorder]] = contextvars.ContextVar(
+    "pdf2anki_span_recorder", default=None
+)
+
+
+def get_recorder() -> SpanRecorder:
+    """The recorder spans currently go to: the innermost ``recording()``, else the process-wide one."""
+    return _current_recorder.get() or _process_recorder
+
+
+@contextmanager
+def recording(recorder: Optional[SpanRecorder] = None) -> Iterator[SpanRecorder]:
+    """
+    Send spans opened in this block (and in threads started with a copy of
+    this context) to ``recorder``, or to a new recorder that forwards them
+    to the recorder that was active before.
+    """
+    recorder = recorder or SpanRecorder(parent=get_recorder())
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+@contextmanager
+def span(name: str, bytes_in: int = 0) -> Iterator[Span]:
+    """Record the enclosed block in the active recorder (see SpanRecorder.span)."""
+    if not ENABLED:
+        yield _NULL_SPAN
+        return
+    with get_recorder().span(name, bytes_in) as current:
+        yield current
+
+
+def record_span(name: str, wall_sec: float, cpu_sec: float = 0.0, bytes_in: int = 0, bytes_out: int = 0) -> None:
+    """Add a caller-measured span to the active recorder (see SpanRecorder.record)."""
+    if ENABLED:
+        get_recorder().record(name, wall_sec, cpu_sec, bytes_in, bytes_out)
+
+
+def instrumented(
+    name: str,
+    iterable: Iterable[T],
+    size: Optional[Callable[[T], int]] = None,
+    bytes_in: int = 0,
+) -> Iterable[T]:
+    """Time the steps of ``iterable`` as one span in the active recorder (see SpanRecorder.instrumented)."""
+    if not ENABLED:
+        return iterable
+    return get_recorder().instrumented(name, iterable, size, bytes_in)
+
+
+def utf8_size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def write_instrumentation(path: Path, recorder: SpanRecorder, key: str = "instrumentation") -> None:
+    """Merge ``recorder``'s spans into the JSON object at ``path`` under ``key``, creating the file if needed."""
+    path = Path(path)
+    data = {}
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            data = {}
+    merged = dict(data.get(key) or {})
+    merged.update(recorder.to_dict())
+    data[key] = merged
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -0,0 +1,224 @@
+"""
+Durable per-file ledger for long batch runs.
+
+A job manifest is a small SQLite database that records, for every source
+file of a batch job, the last stage it completed (hashed, uploaded,
+converted, cleaned, chunked, generated), the stage in flight, the file's
+hash and artifacts, and the last error. Re-running a job consults the
+manifest first, so files that already finished are skipped without even
+being re-hashed, and files interrupted mid-stage restart from that stage.
+A file whose size or modification time changed starts over.
+
+Usage:
+  python src/job_manifest.py outputs/manifests/job.sqlite3
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+# Stages in the order a file passes through them
+STAGES = ("hashed", "uploaded", "converted", "cleaned", "chunked", "generated")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    stage TEXT,
+    in_flight TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    artifacts TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def stage_reached(completed: Optional[str], stage: str) -> bool:
+    """Return True if ``completed`` is ``stage`` or a later stage."""
+    if completed is None:
+        return False
+    return STAGES.index(completed) >= STAGES.index(stage)
+
+
+def default_manifest_path(output_root: Path, input_dir: Path) -> Path:
+    """Manifest location for a job identified by its input directory."""
+    input_dir = Path(input_dir).resolve()
+    digest = hashlib.sha256(str(input_dir).encode("utf-8")).hexdigest()[:12]
+    return Path(output_root) / "manifests" / f"{input_dir.name or 'root'}-{digest}.sqlite3"
+
+
+@dataclass
+class ManifestEntry:
+    """State of one source file."""
+    source_path: str
+    size: int
+    mtime_ns: int
+    sha256: Optional[str] = None
+    stage: Optional[str] = None
+    in_flight: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    artifacts: Dict[str, object] = field(default_factory=dict)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """True if the file on disk is unchanged since it was recorded."""
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+class JobManifest:
+    """
+    SQLite-backed job ledger, safe to share between threads.
+
+    Every update is committed immediately, so a crash loses at most the
+    stage that was in flight.
+
+    Args:
+        path: Database file path
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _key(source_path: Path) -> str:
+        return str(Path(source_path).resolve())
+
+    def get(self, source_path: Path) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_path, size, mtime_ns, sha256, stage, in_flight, error, attempts, artifacts "
+                "FROM files WHERE source_path = ?",
+                (self._key(source_path),),
+            ).fetchone()
+        if row is None:
+            return None
+        entry = ManifestEntry(*row[:8])
+        entry.artifacts = json.loads(row[8] or "{}")
+        return entry
+
+    def lookup(self, source_path: Path, stat: Optional[os.stat_result] = None) -> Optional[ManifestEntry]:
+        """
+        Return the entry for an unchanged file, or None.
+
+        Entries for files whose size or modification time changed are reset,
+        so the file is processed from scratch.
+        """
+        entry = self.get(source_path)
+        if entry is None:
+            return None
+        stat = stat or Path(source_path).stat()
+        if not entry.matches(stat):
+            with self._lock:
+                self._conn.execute("DELETE FROM files WHERE source_path = ?", (entry.source_path,))
+                self._conn.commit()
+            return None
+        return entry
+
+    def _upsert(self, source_path: Path, stat: Optional[os.stat_result], **values) -> None:
+        key = self._key(source_path)
+        stat = stat or Path(source_path).stat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO files (source_path, size, mtime_ns, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(source_path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns",
+                (key, stat.st_size, stat.st_mtime_ns, time.time()),
+            )
+            assignments = ", ".join(f"{name} = ?" for name in values)
+            self._conn.execute(
+                f"UPDATE files SET {assignments}, updated_at = ? WHERE source_path = ?",
+                (*values.values(), time.time(), key),
+            )
+            self._conn.commit()
+
+    def begin(self, source_path: Path, stage: str, stat: Optional[os.stat_result] = None) -> None:
+        """Record that ``stage`` started for a file."""
+        entry = self.get(source_path)
+        self._upsert(source_path, stat, in_flight=stage, attempts=(entry.attempts if entry else 0) + 1)
+
+    def complete(
+        self,
+        source_path: Path,
+        stage: str,
+        stat: Optional[os.stat_result] = None,
+        sha256: Optional[str] = None,
+        **artifacts: object,
+    ) -> None:
+        """Record that ``stage`` finished, with any artifacts it produced."""
+        entry = self.get(source_path)
+        values: Dict[str, object] = {"in_flight": None, "error": None}
+        if entry is None or not stage_reached(entry.stage, stage):
+            values["stage"] = stage
+        if sha256 is not None:
+            values["sha256"] = sha256
+        if artifacts:
+            merged = dict(entry.artifacts) if entry else {}
+            merged.update(artifacts)
+            values["artifacts"] = json.dumps(merged, ensure_ascii=False)
+        self._upsert(source_path, stat, **values)
+
+    def fail(self, source_path: Path, stage: str, error: str, stat: Optional[os.stat_result] = None) -> None:
+        """Record that ``stage`` failed; the file is retried from that stage next run."""
+        self._upsert(source_path, stat, in_flight=None, error=f"{stage}: {error}")
+
+    def summary(self) -> Dict[str, object]:
+        """Count files by last completed stage, plus failed and in-flight files."""
+        with self._lock:
+            by_stage = dict(self._conn.execute(
+                "SELECT COALESCE(stage, 'pending'), COUNT(*) FROM files GROUP BY stage"
+            ).fetchall())
+            total, failed, in_flight = self._conn.execute(
+                "SELECT COUNT(*), COUNT(error), COUNT(in_flight) FROM files"
+            ).fetchone()
+        return {
+            "path": str(self.path),
+            "files": total,
+            "by_stage": {stage: by_stage.get(stage, 0) for stage in ("pending",) + STAGES},
+            "failed": failed,
+            "in_flight": in_flight,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the state of a batch job manifest")
+    parser.add_argument("manifest", help="Path to the manifest database")
+    args = parser.parse_args()
+
+    print(json.dumps(JobManifest(Path(args.manifest)).summary(), ensure_ascii=False, indent=2))
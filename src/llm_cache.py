@@ -0,0 +1,229 @@
+"""
+Persistent on-disk cache of LLM chat completion responses.
+
+Responses are stored in a SQLite database (default: outputs/llm_cache.sqlite3)
+keyed by a hash of the model name, system message, prompt text and generation
+parameters. Identical requests are answered from disk without calling the API.
+Entries expire after a TTL and the least recently used ones are evicted when
+the cache exceeds its entry limit.
+
+Usage:
+  python src/llm_cache.py --stats
+  python src/llm_cache.py --prune
+  python src/llm_cache.py --clear
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+DEFAULT_CACHE_PATH = Path("outputs") / "llm_cache.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+"""
+
+
+def make_cache_key(model: str, system_message: str, prompt: str, params: Optional[dict] = None) -> str:
+    """Hash everything that determines the model's response."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "system": system_message,
+            "prompt": prompt,
+            "params": params or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed response cache, safe to share between threads.
+
+    Args:
+        path: Database file path
+        ttl_seconds: Entries older than this are treated as misses and deleted
+            (None keeps entries forever)
+        max_entries: Keep at most this many entries, evicting the least
+            recently used ones (None disables the limit)
+        clock: Time source, injectable for tests
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key``, or None on a miss."""
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """Store a response and evict least recently used entries beyond ``max_entries``."""
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, model, response, now, now),
+            )
+            if self.max_entries is not None:
+                cursor = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self.evictions += max(cursor.rowcount, 0)
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Delete expired entries. Returns the number of entries removed."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (self._clock() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            removed = max(cursor.rowcount, 0)
+            self.expired += removed
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, object]:
+        """Return hit/miss counters for this process plus on-disk totals."""
+        with self._lock:
+            entries, stored_hits, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(LENGTH(response)), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "entries": entries,
+            "lifetime_hits": stored_hits,
+            "response_bytes": size,
+        }
+
+
+_default_cache: Optional[LLMResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Return the process-wide response cache.
+
+    Configured by LLM_CACHE_PATH, LLM_CACHE_TTL_DAYS and LLM_CACHE_MAX_ENTRIES.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl_days = os.getenv("LLM_CACHE_TTL_DAYS")
+            max_entries = os.getenv("LLM_CACHE_MAX_ENTRIES")
+            _default_cache = LLMResponseCache(
+                Path(os.getenv("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH))),
+                ttl_seconds=float(ttl_days) * 86400 if ttl_days else None,
+                max_entries=int(max_entries) if max_entries else None,
+            )
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or maintain the LLM response cache")
+    parser.add_argument("--stats", action="store_true", help="Print cache statistics (default)")
+    parser.add_argument("--prune", action="store_true", help="Delete entries older than LLM_CACHE_TTL_DAYS")
+    parser.add_argument("--clear", action="store_true", help="Delete all entries")
+    args = parser.parse_args()
+
+    cache = get_llm_cache()
+    if args.clear:
+        cache.clear()
+    if args.prune:
+        print(json.dumps({"pruned": cache.prune()}))
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
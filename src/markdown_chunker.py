@@ -6,7 +6,8 @@ section headings and token limits, preserving semantic structure.
 """
 
 import re
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 try:
     import tiktoken
@@ -16,6 +17,28 @@ except ImportError:
 
 from domain_types import Chunk, ChunkingResult, SourceReference
 
+# Separator used when joining paragraphs/sentences into a sub-chunk
+_JOIN_SEPARATOR = "\n\n"
+
+MarkdownStream = Union[str, Iterable[str]]
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(name: str = "cl100k_base"):
+    """
+    Return the tiktoken encoding, loaded once per process.
+
+    Returns None when tiktoken is unavailable or the encoding cannot be
+    loaded (e.g. no network for the first download); the failure is
+    memoized so callers fall back to the approximation without retrying.
+    """
+    if not HAS_TIKTOKEN:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
 
 def estimate_tokens(text: str) -> int:
     """
@@ -30,10 +53,10 @@ def estimate_tokens(text: str) -> int:
     Returns:
         Estimated token count
     """
-    if HAS_TIKTOKEN:
+    encoding = _get_encoding()
+    if encoding is not None:
         try:
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
+            return len(encoding.encode(text, disallowed_special=()))
         except Exception:
             pass
     
@@ -41,6 +64,30 @@ def estimate_tokens(text: str) -> int:
     return len(text) // 4
 
 
+def estimate_tokens_many(texts: Sequence[str]) -> List[int]:
+    """
+    Estimate token counts for many texts in one call.
+    
+    Uses tiktoken's ``encode_batch`` (which encodes in parallel threads)
+    when available, with the same fallback as estimate_tokens.
+    
+    Args:
+        texts: Texts to count tokens for
+    
+    Returns:
+        Token counts in the same order as ``texts``
+    """
+    if not texts:
+        return []
+    encoding = _get_encoding()
+    if encoding is not None:
+        try:
+            return [len(tokens) for tokens in encoding.encode_batch(list(texts), disallowed_special=())]
+        except Exception:
+            pass
+    return [len(text) // 4 for text in texts]
+
+
 def extract_section_title(line: str) -> Optional[str]:
     """
     Extract section title from a markdown heading line.
@@ -93,44 +140,36 @@ def split_by_headings(md: str) -> List[Tuple[Optional[str], str]]:
     return sections
 
 
-def split_large_chunk(text: str, max_tokens: int, section_title: Optional[str]) -> List[str]:
+def _split_large_chunk_counted(text: str, max_tokens: int) -> List[Tuple[str, int]]:
     """
-    Split a chunk that exceeds max_tokens into smaller chunks.
+    Split ``text`` like split_large_chunk, returning ``(text, token_count)`` pairs.
     
-    Splits by paragraphs first, then by sentences if still too large.
-    
-    Args:
-        text: Text content to split
-        max_tokens: Maximum tokens per chunk
-        section_title: Title of the section (will be prepended to all sub-chunks)
-    
-    Returns:
-        List of text chunks
+    Every paragraph is counted once (in a single batch), and only paragraphs
+    that are too large have their sentences counted. Sub-chunk totals are the
+    sum of their parts rather than a re-encoding of the joined text.
     """
-    chunks: List[str] = []
+    chunks: List[Tuple[str, int]] = []
     
     # Try splitting by paragraphs first
     paragraphs = re.split(r'\n\n+', text)
+    paragraph_tokens = estimate_tokens_many(paragraphs)
     current_chunk: List[str] = []
     current_tokens = 0
     
-    for para in paragraphs:
-        para_tokens = estimate_tokens(para)
-        
+    for para, para_tokens in zip(paragraphs, paragraph_tokens):
         if para_tokens > max_tokens:
             # Paragraph itself is too large, split by sentences
             sentences = re.split(r'(?<=[.!?])\s+', para)
-            for sentence in sentences:
-                sent_tokens = estimate_tokens(sentence)
+            for sentence, sent_tokens in zip(sentences, estimate_tokens_many(sentences)):
                 if current_tokens + sent_tokens > max_tokens and current_chunk:
-                    chunks.append("\n\n".join(current_chunk))
+                    chunks.append((_JOIN_SEPARATOR.join(current_chunk), current_tokens))
                     current_chunk = []
                     current_tokens = 0
                 current_chunk.append(sentence)
                 current_tokens += sent_tokens
         else:
             if current_tokens + para_tokens > max_tokens and current_chunk:
-                chunks.append("\n\n".join(current_chunk))
+                chunks.append((_JOIN_SEPARATOR.join(current_chunk), current_tokens))
                 current_chunk = []
                 current_tokens = 0
             current_chunk.append(para)
@@ -138,8 +177,60 @@ def split_large_chunk(text: str, max_tokens: int, section_title: Optional[str])
     
     # Add remaining content
     if current_chunk:
-        chunks.append("\n\n".join(current_chunk))
+        chunks.append((_JOIN_SEPARATOR.join(current_chunk), current_tokens))
+    
+    return chunks
+
+
+def split_large_chunk(text: str, max_tokens: int, section_title: Optional[str]) -> List[str]:
+    """
+    Split a chunk that exceeds max_tokens into smaller chunks.
+    
+    Splits by paragraphs first, then by sentences if still too large.
+    
+    Args:
+        text: Text content to split
+        max_tokens: Maximum tokens per chunk
+        section_title: Title of the section (will be prepended to all sub-chunks)
+    
+    Returns:
+        List of text chunks
+    """
+    return [chunk_text for chunk_text, _ in _split_large_chunk_counted(text, max_tokens)]
+
+
+def _section_chunks(
+    section_title: Optional[str],
+    section_content: str,
+    pdf_sha256: str,
+    max_tokens: int,
+    first_index: int,
+    section_tokens: Optional[int] = None,
+) -> List[Chunk]:
+    """Build the Chunk objects for one heading section, numbered from ``first_index``."""
+    if section_tokens is None:
+        section_tokens = estimate_tokens(section_content)
+    
+    if section_tokens <= max_tokens:
+        # Section fits in one chunk
+        pieces = [(section_content, section_tokens)]
+    else:
+        # Section is too large, split it
+        pieces = _split_large_chunk_counted(section_content, max_tokens)
     
+    chunks: List[Chunk] = []
+    for offset, (piece_text, piece_tokens) in enumerate(pieces):
+        chunk_id = f"chunk_{first_index + offset:04d}"
+        chunks.append(Chunk(
+            id=chunk_id,
+            text=piece_text.strip(),
+            token_count=piece_tokens,
+            source_ref=SourceReference(
+                pdf_sha256=pdf_sha256,
+                chunk_id=chunk_id
+            ),
+            section_title=section_title
+        ))
     return chunks
 
 
@@ -152,6 +243,9 @@ def chunk_markdown(md: str, pdf_sha256: str, max_tokens: int = 2000) -> Chunking
     2. If any chunk exceeds max_tokens, split further by paragraphs/sentences
     3. Assign sequential IDs and calculate token counts
     
+    Token counts are computed once per span: all sections are counted in one
+    batch, and the counts of split sub-chunks are summed from their parts.
+    
     Args:
         md: Markdown text to chunk
         pdf_sha256: SHA256 hash of the source PDF
@@ -161,45 +255,20 @@ def chunk_markdown(md: str, pdf_sha256: str, max_tokens: int = 2000) -> Chunking
         ChunkingResult with list of Chunk objects
     """
     chunks: List[Chunk] = []
-    chunk_counter = 1
     
     # Step 1: Split by headings
     sections = split_by_headings(md)
+    section_tokens_list = estimate_tokens_many([content for _, content in sections])
     
-    for section_title, section_content in sections:
-        section_tokens = estimate_tokens(section_content)
-        
-        if section_tokens <= max_tokens:
-            # Section fits in one chunk
-            chunk_id = f"chunk_{chunk_counter:04d}"
-            chunks.append(Chunk(
-                id=chunk_id,
-                text=section_content.strip(),
-                token_count=section_tokens,
-                source_ref=SourceReference(
-                    pdf_sha256=pdf_sha256,
-                    chunk_id=chunk_id
-                ),
-                section_title=section_title
-            ))
-            chunk_counter += 1
-        else:
-            # Section is too large, split it
-            sub_chunks = split_large_chunk(section_content, max_tokens, section_title)
-            for sub_chunk_text in sub_chunks:
-                chunk_id = f"chunk_{chunk_counter:04d}"
-                sub_tokens = estimate_tokens(sub_chunk_text)
-                chunks.append(Chunk(
-                    id=chunk_id,
-                    text=sub_chunk_text.strip(),
-                    token_count=sub_tokens,
-                    source_ref=SourceReference(
-                        pdf_sha256=pdf_sha256,
-                        chunk_id=chunk_id
-                    ),
-                    section_title=section_title
-                ))
-                chunk_counter += 1
+    for (section_title, section_content), section_tokens in zip(sections, section_tokens_list):
+        chunks.extend(_section_chunks(
+            section_title,
+            section_content,
+            pdf_sha256,
+            max_tokens,
+            first_index=len(chunks) + 1,
+            section_tokens=section_tokens,
+        ))
     
     # Calculate totals
     total_tokens = sum(chunk.token_count for chunk in chunks)
@@ -210,3 +279,68 @@ def chunk_markdown(md: str, pdf_sha256: str, max_tokens: int = 2000) -> Chunking
         total_tokens=total_tokens
     )
 
+
+def _iter_lines(stream: MarkdownStream) -> Iterator[str]:
+    """
+    Yield lines of ``stream`` without terminators, as ``text.split("\n")`` would.
+    
+    ``stream`` may be a string or any iterable of text pieces (e.g. a text
+    file handle); pieces need not align with line boundaries.
+    """
+    if isinstance(stream, str):
+        yield from stream.split("\n")
+        return
+    pending = ""
+    for piece in stream:
+        if not piece:
+            continue
+        parts = (pending + piece).split("\n")
+        pending = parts.pop()
+        yield from parts
+    yield pending
+
+
+def iter_chunks(
+    stream: MarkdownStream,
+    pdf_sha256: str,
+    max_tokens: int = 2000,
+    start_index: int = 1,
+) -> Iterator[Chunk]:
+    """
+    Incrementally split markdown into chunks.
+    
+    Produces the same chunks as chunk_markdown, but reads ``stream`` line by
+    line and yields each section's chunks as soon as the next heading (or
+    the end of input) closes it, so only one section is held in memory.
+    
+    Args:
+        stream: Markdown text, a text file handle, or any iterable of text pieces
+        pdf_sha256: SHA256 hash of the source PDF
+        max_tokens: Maximum tokens per chunk (default: 2000)
+        start_index: Number of the first chunk ID (default: 1 → "chunk_0001")
+    
+    Yields:
+        Chunk objects in document order
+    """
+    next_index = start_index
+    current_section_title: Optional[str] = None
+    current_content: List[str] = []
+    
+    for line in _iter_lines(stream):
+        title = extract_section_title(line)
+        if title is not None:
+            if current_content:
+                section_chunks = _section_chunks(
+                    current_section_title, "\n".join(current_content), pdf_sha256, max_tokens, next_index
+                )
+                next_index += len(section_chunks)
+                yield from section_chunks
+            current_section_title = title
+            current_content = [line]  # Include the heading line
+        else:
+            current_content.append(line)
+    
+    if current_content:
+        yield from _section_chunks(
+            current_section_title, "\n".join(current_content), pdf_sha256, max_tokens, next_index
+        )
@@ -4,113 +4,250 @@ Enhanced markdown cleaning module for PDF conversion artifacts.
 This module provides functions to clean markdown output from PDF converters,
 removing OCR artifacts, repetitive headers/footers, and normalizing formatting
 while preserving important content like LaTeX math expressions.
+
+Cleaning is line-streaming: the source (a string, an iterator of lines or a
+file handle) is read once, line by line. Lines that survive OCR filtering are
+spooled (in memory for small inputs, to a temporary file for large ones)
+while header/footer candidates are counted, then replayed through the
+remaining steps, so large conversions are cleaned in bounded memory.
 """
 
 import re
-from typing import List
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
 from domain_types import CleaningResult
 
+# Precompiled patterns (applied per line)
+_PUNCTUATION_ONLY = re.compile(r'^[|\\/_\-\+\*\^~`]+$')
+_ALNUM = re.compile(r'[a-zA-Z0-9]')
+_MATH = re.compile(r'\$.*\$')
+_IMAGE = re.compile(r'!\[.*?\]\(.*?\)')
+_SPACES = re.compile(r'[ \t]+')
 
-def clean_markdown(md: str, remove_images: bool = False) -> CleaningResult:
+# Header/footer candidates must be shorter than this and appear at least
+# _REPETITION_THRESHOLD times
+_MAX_HEADER_FOOTER_LENGTH = 100
+_REPETITION_THRESHOLD = 3
+
+# Number of removed patterns reported per category (and in total)
+_MAX_REPORTED_PATTERNS = 50
+
+# Inputs larger than this are spooled to a temporary file between passes
+_SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+MarkdownSource = Union[str, Iterable[str]]
+
+
+def _iter_normalized_lines(source: MarkdownSource, length: List[int]) -> Iterator[str]:
     """
-    Clean markdown text by removing artifacts and normalizing formatting.
-    
+    Yield lines of ``source`` with CRLF/CR normalized to LF, without terminators.
+
+    Yields exactly what ``text.split("\\n")`` would for the normalized text.
+    ``source`` may be a string or any iterable of text pieces (e.g. a file
+    handle); pieces need not align with line boundaries. The raw character
+    count is accumulated in ``length[0]``.
+    """
+    chunks = (source,) if isinstance(source, str) else source
+    pending = ""
+    carry_cr = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        length[0] += len(chunk)
+        if carry_cr:
+            chunk = "\r" + chunk
+            carry_cr = False
+        if chunk.endswith("\r"):
+            # May be the first half of a CRLF split across pieces
+            chunk = chunk[:-1]
+            carry_cr = True
+        chunk = chunk.replace("\r\n", "\n").replace("\r", "\n")
+        parts = (pending + chunk).split("\n")
+        pending = parts.pop()
+        yield from parts
+    if carry_cr:
+        yield pending
+        pending = ""
+    yield pending
+
+
+class _LineSpool:
+    """Holds the lines kept by the first pass until the second pass replays them."""
+
+    def __init__(self, in_memory: bool) -> None:
+        self._lines: Optional[List[str]] = [] if in_memory else None
+        self._file = None
+        if not in_memory:
+            self._file = tempfile.SpooledTemporaryFile(
+                max_size=_SPOOL_MAX_SIZE, mode="w+", encoding="utf-8",
+                newline="\n", errors="surrogatepass",
+            )
+
+    def append(self, line: str) -> None:
+        if self._lines is not None:
+            self._lines.append(line)
+        else:
+            self._file.write(line)
+            self._file.write("\n")
+
+    def replay(self) -> Iterator[str]:
+        if self._lines is not None:
+            yield from self._lines
+            return
+        self._file.seek(0)
+        for line in self._file:
+            yield line[:-1]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._lines = None
+
+
+def iter_clean_markdown(
+    source: MarkdownSource,
+    remove_images: bool = False,
+    result: Optional[CleaningResult] = None,
+) -> Iterator[str]:
+    """
+    Clean markdown from a string, an iterator of lines or a file handle.
+
+    Yields pieces of the cleaned text in order; concatenated, they equal
+    ``clean_markdown(text).cleaned_text``. When ``result`` is given, its
+    ``removed_patterns`` and ``stats`` are filled in once the iterator is
+    exhausted (``cleaned_text`` is left untouched).
+
     Args:
-        md: Raw markdown text from PDF conversion
+        source: Raw markdown text, or an iterable of text pieces
         remove_images: If True, remove image references. If False, keep them.
-    
-    Returns:
-        CleaningResult with cleaned text and statistics
+        result: Optional CleaningResult to receive statistics
+
+    Yields:
+        Pieces of cleaned markdown text
     """
-    removed_patterns: List[str] = []
+    length = [0]
     stats: dict = {
-        "original_length": len(md),
+        "original_length": 0,
         "lines_removed": 0,
         "artifacts_removed": 0,
     }
-    
-    text = md
-    
-    # Step 1: Normalize line endings
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    
-    # Step 2: Remove trailing whitespace from lines
-    text = re.sub(r"[ \t]+$", "", text, flags=re.MULTILINE)
-    
-    # Step 3: Collapse excessive newlines (3+ to 2)
-    original_lines = len(text.split("\n"))
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    stats["lines_removed"] = original_lines - len(text.split("\n"))
-    
-    # Step 4: Remove common OCR artifacts (isolated punctuation, excessive punctuation)
-    # Remove lines that are just punctuation or symbols
-    lines = text.split("\n")
-    cleaned_lines = []
-    for line in lines:
-        stripped = line.strip()
-        # Skip lines that are just punctuation/symbols (but preserve math expressions)
-        if stripped and not re.match(r'^[|\\/_\-\+\*\^~`]+$', stripped):
-            # Check if it's a valid line (has alphanumeric content or is a heading/list)
-            if re.search(r'[a-zA-Z0-9]', stripped) or stripped.startswith('#') or stripped.startswith('-') or stripped.startswith('*'):
-                cleaned_lines.append(line)
-            elif re.search(r'\$.*\$', stripped):  # Preserve lines with math
-                cleaned_lines.append(line)
+    ocr_patterns: List[str] = []
+    repetitive_patterns_removed: List[str] = []
+    image_patterns: List[str] = []
+    line_counts: Dict[str, int] = {}
+    spool = _LineSpool(in_memory=isinstance(source, str))
+
+    try:
+        # Pass 1: normalize, drop OCR artifacts, count header/footer candidates
+        lines_removed = 0
+        empty_run = 0
+        seen_line_before_run = False
+        for line in _iter_normalized_lines(source, length):
+            # Remove trailing whitespace from lines
+            line = line.rstrip(" \t")
+
+            # Track how many lines collapsing 3+ newlines to 2 would remove
+            if not line:
+                empty_run += 1
             else:
-                stats["artifacts_removed"] += 1
-                removed_patterns.append(f"OCR artifact: {stripped[:50]}")
-        elif not stripped:  # Preserve empty lines (for paragraph breaks)
-            cleaned_lines.append(line)
-    
-    text = "\n".join(cleaned_lines)
-    
-    # Step 5: Remove repetitive headers/footers (page numbers, document titles)
-    # Detect lines that appear multiple times and are likely headers/footers
-    lines = text.split("\n")
-    line_counts: dict[str, int] = {}
-    for line in lines:
-        stripped = line.strip()
-        if stripped and len(stripped) < 100:  # Short lines are more likely headers/footers
-            line_counts[stripped] = line_counts.get(stripped, 0) + 1
-    
-    # Remove lines that appear 3+ times and are likely headers/footers
-    repetitive_patterns = [line for line, count in line_counts.items() 
-                          if count >= 3 and not line.startswith('#') 
-                          and not re.search(r'\$.*\$', line)]  # Don't remove math
-    
-    if repetitive_patterns:
-        cleaned_lines = []
-        for line in lines:
+                if empty_run:
+                    lines_removed += max(0, seen_line_before_run + empty_run - 2)
+                    empty_run = 0
+                seen_line_before_run = True
+
+            # Remove common OCR artifacts (isolated punctuation, excessive punctuation)
             stripped = line.strip()
-            if stripped not in repetitive_patterns:
-                cleaned_lines.append(line)
+            if not stripped:
+                # Preserve empty lines (for paragraph breaks)
+                spool.append(line)
+                continue
+            if _PUNCTUATION_ONLY.match(stripped):
+                continue
+            # Keep lines with alphanumeric content, headings, lists or math
+            if (_ALNUM.search(stripped) or stripped.startswith('#') or stripped.startswith('-')
+                    or stripped.startswith('*') or _MATH.search(stripped)):
+                spool.append(line)
+                if len(stripped) < _MAX_HEADER_FOOTER_LENGTH:
+                    line_counts[stripped] = line_counts.get(stripped, 0) + 1
             else:
                 stats["artifacts_removed"] += 1
-                removed_patterns.append(f"Repetitive header/footer: {stripped[:50]}")
-        text = "\n".join(cleaned_lines)
-    
-    # Step 6: Remove image references if requested
-    if remove_images:
-        image_pattern = r'!\[.*?\]\(.*?\)'
-        image_matches = re.findall(image_pattern, text)
-        if image_matches:
-            text = re.sub(image_pattern, '', text)
-            stats["artifacts_removed"] += len(image_matches)
-            removed_patterns.extend([f"Image reference: {img[:50]}" for img in image_matches])
-    
-    # Step 7: Clean up any remaining excessive whitespace
-    text = re.sub(r'[ \t]+', ' ', text)  # Multiple spaces to single space
-    text = re.sub(r'\n{3,}', '\n\n', text)  # Multiple newlines to double
-    
-    # Step 8: Final trim
-    text = text.strip() + "\n"
-    
-    stats["final_length"] = len(text)
-    stats["reduction_percent"] = round((1 - len(text) / len(md)) * 100, 2) if md else 0
-    
-    return CleaningResult(
-        cleaned_text=text,
-        removed_patterns=removed_patterns[:50],  # Limit to first 50 for readability
-        stats=stats
-    )
+                if len(ocr_patterns) < _MAX_REPORTED_PATTERNS:
+                    ocr_patterns.append(f"OCR artifact: {stripped[:50]}")
+        if empty_run:
+            lines_removed += max(0, seen_line_before_run + empty_run - 3)
+        stats["lines_removed"] = lines_removed
+        stats["original_length"] = length[0]
+
+        # Lines that appear 3+ times are likely headers/footers (but keep headings and math)
+        repetitive = {
+            text for text, count in line_counts.items()
+            if count >= _REPETITION_THRESHOLD and not text.startswith('#') and not _MATH.search(text)
+        }
+        line_counts.clear()
+
+        # Pass 2: drop headers/footers, remove images, normalize spaces, and
+        # emit with blank-line runs collapsed and the whole text trimmed
+        final_length = 0
+        held: Optional[str] = None
+        blank_lines: List[str] = []
+        for line in spool.replay():
+            stripped = line.strip()
+            if stripped in repetitive:
+                stats["artifacts_removed"] += 1
+                if len(repetitive_patterns_removed) < _MAX_REPORTED_PATTERNS:
+                    repetitive_patterns_removed.append(f"Repetitive header/footer: {stripped[:50]}")
+                continue
+
+            if remove_images and '![' in line:
+                image_matches = _IMAGE.findall(line)
+                if image_matches:
+                    line = _IMAGE.sub('', line)
+                    stats["artifacts_removed"] += len(image_matches)
+                    for img in image_matches:
+                        if len(image_patterns) < _MAX_REPORTED_PATTERNS:
+                            image_patterns.append(f"Image reference: {img[:50]}")
+
+            line = _SPACES.sub(' ', line)
+
+            if not line.strip():
+                if held is not None and not (line == "" and blank_lines and blank_lines[-1] == ""):
+                    blank_lines.append(line)
+                continue
+            if held is None:
+                held = line.lstrip()
+                continue
+            piece = held + "\n" + "".join(blank + "\n" for blank in blank_lines)
+            final_length += len(piece)
+            yield piece
+            held = line
+            blank_lines = []
+
+        piece = (held.rstrip() if held is not None else "") + "\n"
+        final_length += len(piece)
+        yield piece
+    finally:
+        spool.close()
+
+    if result is not None:
+        original_length = stats["original_length"]
+        stats["final_length"] = final_length
+        stats["reduction_percent"] = round((1 - final_length / original_length) * 100, 2) if original_length else 0
+        result.removed_patterns = (ocr_patterns + repetitive_patterns_removed + image_patterns)[:_MAX_REPORTED_PATTERNS]
+        result.stats = stats
 
+
+def clean_markdown(md: str, remove_images: bool = False) -> CleaningResult:
+    """
+    Clean markdown text by removing artifacts and normalizing formatting.
+
+    Args:
+        md: Raw markdown text from PDF conversion
+        remove_images: If True, remove image references. If False, keep them.
+
+    Returns:
+        CleaningResult with cleaned text and statistics
+    """
+    result = CleaningResult(cleaned_text="")
+    result.cleaned_text = "".join(iter_clean_markdown(md, remove_images=remove_images, result=result))
+    return result
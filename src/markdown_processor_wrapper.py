@@ -21,6 +21,8 @@ from pdf2anki_types import Chunk as PdfAnkiChunk, ChunkingResult as PdfAnkiChunk
 # Import domain_types for conversion
 from domain_types import Chunk as DomainChunk, ChunkingResult as DomainChunkingResult, SourceReference as DomainSourceReference
 
+from instrumentation import span, utf8_size
+
 
 def convert_domain_chunk_to_pdfanki(domain_chunk: DomainChunk) -> PdfAnkiChunk:
     """Convert a domain_types.Chunk to pdf2anki_types.Chunk."""
@@ -67,15 +69,18 @@ def process_markdown_for_streamlit(
         Tuple of (cleaned_markdown, chunking_result) where chunking_result uses pdf2anki_types
     """
     # Step 1: Clean markdown
-    cleaning_result = _clean_markdown(markdown_content, remove_images=remove_images)
-    cleaned_markdown = cleaning_result.cleaned_text
+    with span("cleaning", bytes_in=utf8_size(markdown_content)) as cleaning:
+        cleaning_result = _clean_markdown(markdown_content, remove_images=remove_images)
+        cleaned_markdown = cleaning_result.cleaned_text
+        cleaning.add_bytes(bytes_out=utf8_size(cleaned_markdown))
     
     # Step 2: Chunk markdown
-    domain_chunking_result = _chunk_markdown(
-        cleaned_markdown,
-        pdf_sha256=pdf_sha256,
-        max_tokens=max_tokens
-    )
+    with span("chunking", bytes_in=utf8_size(cleaned_markdown)):
+        domain_chunking_result = _chunk_markdown(
+            cleaned_markdown,
+            pdf_sha256=pdf_sha256,
+            max_tokens=max_tokens
+        )
     
     # Step 3: Convert to pdf2anki_types
     pdfanki_chunking_result = convert_domain_chunking_result_to_pdfanki(domain_chunking_result)
@@ -107,7 +112,8 @@ def get_semantic_info_for_chunk(chunk: PdfAnkiChunk) -> dict:
         section_title=chunk.section_title
     )
     
-    return _identify_semantic_structures(domain_chunk)
+    with span("semantic_detection", bytes_in=utf8_size(chunk.text)):
+        return _identify_semantic_structures(domain_chunk)
 
 
 def load_pdf_sha256_from_meta(meta_path: Path) -> Optional[str]:
@@ -17,19 +17,26 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import hashlib
+import codecs
 import json
 import logging
 import os
+import threading
 import time
+import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from conversion_cache import ConversionCache, get_conversion_cache, make_cache_key
+from file_fingerprint import file_sha256
+from instrumentation import record_span
+from streaming_json import Base64FileSink, StreamingJSONParser, TextFileSink
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,17 +49,285 @@ class ConversionResultPaths:
 
 
 def compute_sha256(path: Path) -> str:
-    sha256 = hashlib.sha256()
-    with path.open('rb') as f:
-        for chunk in iter(lambda: f.read(8192), b''):
-            sha256.update(chunk)
-    return sha256.hexdigest()
+    """SHA256 of a file; unchanged files are not re-read (see file_fingerprint)."""
+    return file_sha256(path)
 
 
 def ensure_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
 
+# Read size for streamed uploads and responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class MarkerClient:
+    """
+    Reusable Marker API client with a pooled keep-alive session.
+
+    Connections are kept open between conversions, and 429/5xx responses and
+    connection errors are retried by the mounted adapter with exponential
+    backoff, waiting for the server's Retry-After header when it sends one.
+
+    Args:
+        api_base_url: e.g. "http://localhost:8080"
+        timeout_seconds: HTTP timeout per request
+        api_convert_path: Conversion endpoint path
+        max_retries: Retries for 429/5xx responses and connection errors
+        pool_maxsize: Connections kept per host (default: MARKER_POOL_SIZE or 10)
+        backoff_factor: Base of the exponential backoff, in seconds
+        session: Session to configure (default: a new one)
+    """
+
+    def __init__(
+        self,
+        api_base_url: str,
+        timeout_seconds: int = 300,
+        api_convert_path: str = "/convert",
+        max_retries: int = 3,
+        pool_maxsize: Optional[int] = None,
+        backoff_factor: float = 1.0,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self.api_base_url = api_base_url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self.api_convert_path = api_convert_path
+        if pool_maxsize is None:
+            pool_maxsize = int(os.getenv("MARKER_POOL_SIZE", "10"))
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = session or requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout_seconds)
+        return self.session.post(url, **kwargs)
+
+    def convert(self, pdf_path: Path, output_root: Path, **kwargs) -> "ConversionResultPaths":
+        """Convert a PDF through this client; see convert_pdf_to_markdown."""
+        kwargs.setdefault("timeout_seconds", self.timeout_seconds)
+        kwargs.setdefault("api_convert_path", self.api_convert_path)
+        return convert_pdf_to_markdown(
+            pdf_path=pdf_path,
+            api_base_url=self.api_base_url,
+            output_root=output_root,
+            client=self,
+            **kwargs,
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "MarkerClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_clients: Dict[str, MarkerClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_marker_client(api_base_url: str) -> MarkerClient:
+    """Return the process-wide client for a Marker API base URL."""
+    key = api_base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MarkerClient(key)
+            _clients[key] = client
+        return client
+
+
+class MultipartFileBody:
+    """
+    A multipart/form-data body that streams a single file from disk.
+
+    requests sends file-like bodies in blocks and takes Content-Length from
+    ``len()``, so the PDF is never held in memory. ``seek(0)`` rewinds the
+    body for a retry.
+    """
+
+    def __init__(self, field_name: str, path: Path, filename: str, content_type: str) -> None:
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        safe_name = filename.replace('"', "%22")
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{safe_name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self._path = path
+        self._file_size = path.stat().st_size
+        self._file = None
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self)
+        self._position = min(max(0, offset), len(self))
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self) - self._position
+        parts = []
+        while size > 0 and self._position < len(self):
+            head_end = len(self._head)
+            file_end = head_end + self._file_size
+            if self._position < head_end:
+                data = self._head[self._position:self._position + size]
+            elif self._position < file_end:
+                if self._file is None:
+                    self._file = self._path.open("rb")
+                self._file.seek(self._position - head_end)
+                data = self._file.read(min(size, file_end - self._position))
+                if not data:
+                    raise IOError("PDF file shrank while uploading")
+            else:
+                offset = self._position - file_end
+                data = self._tail[offset:offset + size]
+            parts.append(data)
+            self._position += len(data)
+            size -= len(data)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ConversionResponseWriter:
+    """
+    Writes a conversion response body to ``marker.md`` and ``images/`` as it arrives.
+
+    Feed the raw body with ``feed`` and finish with ``close`` (or ``abort``
+    on failure). JSON bodies are parsed incrementally: the markdown string is
+    written to disk as it arrives and base64 images are decoded straight into
+    files, so neither is held in memory. Other bodies are saved as markdown.
+    """
+
+    def __init__(self, conv_dir: Path, content_type: Optional[str] = None) -> None:
+        self.markdown_path = conv_dir / "marker.md"
+        self.images_dir = conv_dir / "images"
+        self.image_count = 0
+        self.response_json = None
+        self._partial_path = conv_dir / "marker.md.part"
+        self._sinks = []
+        self._markdown_sink = None
+        self._text_file = None
+        self._parser = None
+        if "json" in (content_type or "application/json"):
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+            self._parser = StreamingJSONParser(self._sink_for)
+        else:
+            # Plain markdown body
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            self._text_file = self._partial_path.open("w", encoding="utf-8", newline="")
+
+    def _sink_for(self, path):
+        # New API format (v1): {"output": ...}; old format: {"result": {"markdown": ...}}
+        if path in (("output",), ("result", "markdown")) and self._markdown_sink is None:
+            self._markdown_sink = TextFileSink(self._partial_path)
+            self._sinks.append(self._markdown_sink)
+            return self._markdown_sink
+        if len(path) == 3 and path[:2] == ("result", "images"):
+            name = Path(str(path[2])).name
+            if name:
+                ensure_dir(self.images_dir)
+                self.image_count += 1
+                sink = Base64FileSink(self.images_dir / name)
+                self._sinks.append(sink)
+                return sink
+        return None
+
+    def feed(self, chunk: bytes) -> None:
+        text = self._decoder.decode(chunk)
+        if self._parser is not None:
+            self._parser.feed(text)
+        else:
+            self._text_file.write(text)
+
+    def close(self) -> int:
+        """
+        Finish the body and move the markdown into place.
+
+        Returns:
+            Number of images written
+        """
+        tail = self._decoder.decode(b"", final=True)
+        if self._parser is None:
+            self._text_file.write(tail)
+            self._text_file.close()
+            self._partial_path.replace(self.markdown_path)
+            return 0
+
+        self._parser.feed(tail)
+        response_json = self.response_json = self._parser.close()
+        if not isinstance(response_json, dict) or not (
+            response_json.get("success") is True or response_json.get("status") == "Success"
+        ):
+            logger.warning(f"Unexpected API response status: {str(response_json)[:200]}")
+        if self._markdown_sink is None:
+            logger.warning("No markdown in API response. Saving the response itself.")
+            self._partial_path.write_text(json.dumps(response_json, ensure_ascii=False), encoding="utf-8")
+        self._partial_path.replace(self.markdown_path)
+        return self.image_count
+
+    def abort(self) -> None:
+        """Close any open files and discard the partial markdown."""
+        if self._text_file is not None:
+            self._text_file.close()
+        for sink in self._sinks:
+            try:
+                sink.close()
+            except Exception:
+                pass
+        self._partial_path.unlink(missing_ok=True)
+
+
+def _stream_response_to_disk(response: requests.Response, conv_dir: Path) -> int:
+    """
+    Write a streamed conversion response to ``marker.md`` and ``images/``.
+
+    Returns:
+        Number of images written
+    """
+    writer = ConversionResponseWriter(conv_dir, response.headers.get("Content-Type"))
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if chunk:
+                writer.feed(chunk)
+        return writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+
 def convert_pdf_to_markdown(
     pdf_path: Path,
     api_base_url: str,
@@ -60,15 +335,37 @@ def convert_pdf_to_markdown(
     timeout_seconds: int = 300,
     api_convert_path: str = "/convert",
     max_retries: int = 3,
+    use_cache: bool = True,
+    refresh: bool = False,
+    engine_version: Optional[str] = None,
+    cache: Optional[ConversionCache] = None,
+    streaming: bool = False,
+    client: Optional[MarkerClient] = None,
+    source_sha256: Optional[str] = None,
 ) -> ConversionResultPaths:
     """
     Send a PDF file to Marker API and persist the returned markdown and metadata.
 
+    If ``conversions/<sha256>/`` already holds a successful conversion made
+    with the same engine version and options, it is returned without any
+    network call.
+
     - pdf_path: input PDF file path
     - api_base_url: e.g. "http://localhost:8000"
     - output_root: base directory to store conversion artifacts
     - api_convert_path: endpoint path (default: /marker/upload)
     - max_retries: maximum number of retry attempts for 429/5xx errors
+    - use_cache: reuse a cached conversion when available (default: True)
+    - refresh: ignore any cached conversion and overwrite it
+    - engine_version: identifies the server-side engine; defaults to the
+      MARKER_ENGINE_VERSION env var. Changing it invalidates cached results.
+    - cache: cache instance (default: shared cache for output_root)
+    - streaming: stream the upload from disk and write the markdown and
+      images (to ``images/``) as the response arrives, instead of holding
+      the request and response bodies in memory
+    - client: MarkerClient whose pooled session sends the request; its
+      adapter handles retries, so max_retries is not applied again here
+    - source_sha256: SHA256 of the PDF if the caller already has it
     """
     pdf_path = pdf_path.resolve()
     output_root = output_root.resolve()
@@ -76,8 +373,28 @@ def convert_pdf_to_markdown(
     if not pdf_path.exists() or pdf_path.suffix.lower() != ".pdf":
         raise ValueError(f"Invalid PDF path: {pdf_path}")
 
-    source_sha256 = compute_sha256(pdf_path)
+    if source_sha256 is None:
+        source_sha256 = compute_sha256(pdf_path)
     conv_dir = output_root / "conversions" / source_sha256
+
+    if engine_version is None:
+        engine_version = os.getenv("MARKER_ENGINE_VERSION", "unknown")
+    cache_key = make_cache_key(
+        source_sha256,
+        engine_version,
+        {"api_convert_path": api_convert_path},
+    )
+    if use_cache:
+        if cache is None:
+            cache = get_conversion_cache(output_root)
+        if refresh:
+            cache.record_refresh()
+        else:
+            cached = cache.lookup(source_sha256, cache_key)
+            if cached is not None:
+                markdown_path, meta_path = cached
+                return ConversionResultPaths(markdown_path=markdown_path, meta_path=meta_path)
+
     ensure_dir(conv_dir)
 
     # Copy source for reproducibility (optional: skip large copies if undesired)
@@ -85,24 +402,42 @@ def convert_pdf_to_markdown(
 
     url = api_base_url.rstrip("/") + api_convert_path
     logger.info(f"Converting PDF: {pdf_path.name} (SHA256: {source_sha256})")
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
     
     # Retry logic with exponential backoff
     retry_count = 0
     last_exception = None
+    post = requests.post
+    if client is not None:
+        # The client's adapter already retries (honoring Retry-After)
+        post = client.post
+        max_retries = 0
+    body = MultipartFileBody("pdf_file", pdf_path, pdf_path.name, "application/pdf") if streaming else None
     
     while retry_count <= max_retries:
         try:
-            with pdf_path.open('rb') as f:
-                files = {"pdf_file": (pdf_path.name, f, "application/pdf")}
-                headers = {"Accept": "application/json"}
-                
-                logger.info(f"Sending request to {url} (attempt {retry_count + 1}/{max_retries + 1})")
-                response = requests.post(
-                    url, 
-                    files=files, 
-                    headers=headers,
-                    timeout=timeout_seconds
+            logger.info(f"Sending request to {url} (attempt {retry_count + 1}/{max_retries + 1})")
+            if body is not None:
+                body.seek(0)
+                response = post(
+                    url,
+                    data=body,
+                    headers={"Accept": "application/json", "Content-Type": body.content_type},
+                    timeout=timeout_seconds,
+                    stream=True,
                 )
+            else:
+                with pdf_path.open('rb') as f:
+                    files = {"pdf_file": (pdf_path.name, f, "application/pdf")}
+                    headers = {"Accept": "application/json"}
+
+                    response = post(
+                        url, 
+                        files=files, 
+                        headers=headers,
+                        timeout=timeout_seconds
+                    )
 
             # Check for retriable status codes
             if response.status_code in [429, 500, 502, 503, 504]:
@@ -112,6 +447,8 @@ def convert_pdf_to_markdown(
                         f"Received status {response.status_code}. "
                         f"Retrying in {wait_time}s... (attempt {retry_count + 1}/{max_retries})"
                     )
+                    if body is not None:
+                        response.close()
                     time.sleep(wait_time)
                     retry_count += 1
                     continue
@@ -150,27 +487,43 @@ def convert_pdf_to_markdown(
                 logger.error(f"Max retries exceeded. Error log saved to {error_path}")
                 raise
 
-    # API returns JSON with structure: {"output": "...", "success": True, ...}
-    try:
-        response_json = response.json()
-        # Check for new API format (v1)
-        if response_json.get("success") is True and "output" in response_json:
-            markdown_text = response_json["output"]
-        # Check for old API format
-        elif response_json.get("status") == "Success" and "result" in response_json:
-            markdown_text = response_json["result"].get("markdown", "")
-        else:
-            # Fallback: try to use response text directly
+    image_count = None
+    if body is not None:
+        body.close()
+        image_count = _stream_response_to_disk(response, conv_dir)
+        markdown_path = conv_dir / "marker.md"
+    else:
+        # API returns JSON with structure: {"output": "...", "success": True, ...}
+        try:
+            response_json = response.json()
+            # Check for new API format (v1)
+            if response_json.get("success") is True and "output" in response_json:
+                markdown_text = response_json["output"]
+            # Check for old API format
+            elif response_json.get("status") == "Success" and "result" in response_json:
+                markdown_text = response_json["result"].get("markdown", "")
+            else:
+                # Fallback: try to use response text directly
+                markdown_text = response.text
+                logger.warning(f"Unexpected API response format: {response_json}")
+        except (json.JSONDecodeError, KeyError) as e:
+            # Fallback: use response text if JSON parsing fails
+            logger.warning(f"Failed to parse JSON response: {e}. Using response text.")
             markdown_text = response.text
-            logger.warning(f"Unexpected API response format: {response_json}")
-    except (json.JSONDecodeError, KeyError) as e:
-        # Fallback: use response text if JSON parsing fails
-        logger.warning(f"Failed to parse JSON response: {e}. Using response text.")
-        markdown_text = response.text
-
-    markdown_path = conv_dir / "marker.md"
-    markdown_path.write_text(markdown_text, encoding="utf-8")
+
+        markdown_path = conv_dir / "marker.md"
+        markdown_path.write_text(markdown_text, encoding="utf-8")
     logger.info(f"Markdown saved to {markdown_path}")
+    record_span(
+        "conversion",
+        time.perf_counter() - started,
+        time.thread_time() - cpu_started,
+        bytes_in=pdf_path.stat().st_size,
+        bytes_out=markdown_path.stat().st_size,
+    )
+
+    # A stale error log from an earlier failed attempt no longer applies
+    (conv_dir / "error.log").unlink(missing_ok=True)
 
     meta = {
         "source_path": str(pdf_path),
@@ -178,11 +531,19 @@ def convert_pdf_to_markdown(
         "api_url": url,
         "status_code": response.status_code,
         "retry_count": retry_count,
+        "engine_version": engine_version,
+        "cache_key": cache_key,
     }
+    if image_count is not None:
+        meta["streaming"] = True
+        meta["images"] = image_count
     meta_path = conv_dir / "meta.json"
     meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
     logger.info(f"Metadata saved to {meta_path}")
 
+    if use_cache and cache is not None:
+        cache.evict(protect=source_sha256)
+
     return ConversionResultPaths(markdown_path=markdown_path, meta_path=meta_path)
 
 
@@ -194,17 +555,35 @@ if __name__ == "__main__":
     parser.add_argument("--api", type=str, default=os.getenv("MARKER_API_BASE", "http://localhost:8080"), help="Marker API base URL")
     parser.add_argument("--out", type=str, default=str(Path("outputs")), help="Output root directory")
     parser.add_argument("--timeout", type=int, default=120, help="HTTP timeout seconds")
+    parser.add_argument("--no-cache", action="store_true", help="Always convert, even if a cached conversion exists")
+    parser.add_argument("--refresh", action="store_true", help="Ignore a cached conversion and overwrite it")
+    parser.add_argument("--engine-version", type=str, default=None, help="Engine version used in the cache key (default: $MARKER_ENGINE_VERSION)")
+    parser.add_argument("--cache-max-mb", type=float, default=None, help="Evict least recently used conversions above this total size")
+    parser.add_argument("--cache-max-age-days", type=float, default=None, help="Evict conversions unused for this many days")
+    parser.add_argument("--stream", action="store_true", help="Stream the upload and write markdown and images to disk as they arrive")
     args = parser.parse_args()
 
+    cache = get_conversion_cache(Path(args.out))
+    if args.cache_max_mb is not None:
+        cache.max_bytes = int(args.cache_max_mb * 1024 * 1024)
+    if args.cache_max_age_days is not None:
+        cache.max_age_seconds = args.cache_max_age_days * 86400
+
     result = convert_pdf_to_markdown(
         pdf_path=Path(args.pdf),
         api_base_url=args.api,
         output_root=Path(args.out),
         timeout_seconds=args.timeout,
+        use_cache=not args.no_cache,
+        refresh=args.refresh,
+        engine_version=args.engine_version,
+        cache=cache,
+        streaming=args.stream,
     )
     print(json.dumps({
         "markdown_path": str(result.markdown_path),
-        "meta_path": str(result.meta_path)
+        "meta_path": str(result.meta_path),
+        "cache": cache.stats.to_dict(),
     }, ensure_ascii=False))
 
 
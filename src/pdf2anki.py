@@ -0,0 +1,253 @@
+"""
+Headless PDF → Anki command line tool.
+
+Runs convert → clean → chunk → generate → export for many PDFs without
+starting the web UI, e.g. in nightly batch jobs. Each PDF gets its own
+``<outdir>/<timestamp>_<pdf name>_<sha256 prefix>/`` directory with
+converted.md, anki_cards.tsv, anki_cards.apkg and processing_result.json,
+the same files a run through the Streamlit app produces. Documents are processed in
+parallel (--jobs), and each document sends several requests to the LLM
+at once (--llm-concurrency), packing small chunks together up to the
+model's context window (LLM_CONTEXT_TOKENS); requests to one endpoint
+share its rate limits (LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE)
+across documents.
+
+The LLM is configured through the same environment variables (or .env
+file) as the app: LLM_API_BASE / LLM_MODEL / LLM_API_KEY, or
+OPENAI_API_KEY / OPENAI_MODEL.
+
+Usage:
+  python src/pdf2anki.py lecture1.pdf lecture2.pdf --num-cards 30
+  python src/pdf2anki.py slides/ --note-type cloze --jobs 4 --llm-concurrency 8 --summary nightly.json
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from card_engine import (
+    DEFAULT_PAGES_PER_SHARD,
+    DocumentResult,
+    GenerationOptions,
+    LLMConfig,
+    LLMNotConfiguredError,
+    process_pdf,
+)
+from concurrent_generation import limits_from_env
+
+DEFAULT_JOBS = 2
+
+
+def collect_pdfs(inputs: Sequence[Path], recursive: bool = True) -> List[Path]:
+    """PDF files named in ``inputs`` or found under directories in it, without duplicates."""
+    pdfs: List[Path] = []
+    seen = set()
+    for path in inputs:
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            found = sorted(p for p in path.glob(pattern) if p.is_file() and p.suffix.lower() == ".pdf")
+        else:
+            found = [path]
+        for pdf in found:
+            key = pdf.resolve()
+            if key not in seen:
+                seen.add(key)
+                pdfs.append(pdf)
+    return pdfs
+
+
+def document_summary(result: DocumentResult) -> Dict[str, object]:
+    generation = result.generation
+    return {
+        "pdf": str(result.pdf_path),
+        "status": "ok" if generation.cards else "no_cards",
+        "pdf_sha256": result.pdf_sha256,
+        "session_dir": str(result.session_dir),
+        "apkg_path": str(result.exports.apkg_path) if result.exports else None,
+        "cards": len(generation.cards),
+        "total_chunks": generation.total_chunks,
+        "failed_chunks": generation.failed_chunks,
+        "reused_chunks": generation.reused_chunks,
+        "requests": generation.requests,
+        "dropped_cards": generation.dropped_cards,
+        "warnings": generation.warnings,
+        "elapsed_sec": round(result.elapsed_sec, 3),
+    }
+
+
+def run_batch(
+    pdfs: Sequence[Path],
+    llm: LLMConfig,
+    options: GenerationOptions,
+    api_base_url: str,
+    output_root: Path,
+    jobs: int = DEFAULT_JOBS,
+    timeout_seconds: int = 300,
+    deck_name: Optional[str] = None,
+    pages_per_shard: int = DEFAULT_PAGES_PER_SHARD,
+    on_result: Optional[Callable[[Dict[str, object]], None]] = None,
+) -> Dict[str, object]:
+    """
+    Process ``pdfs`` with at most ``jobs`` documents in flight.
+
+    A document that fails (conversion error, unreadable file, ...) is
+    reported with status "failed" and does not stop the others; one that
+    yields no cards is reported with status "no_cards" and its warnings.
+
+    Returns:
+        Summary with per-document results in input order
+    """
+    started = time.perf_counter()
+    results: Dict[int, Dict[str, object]] = {}
+
+    def run(pdf: Path) -> Dict[str, object]:
+        chunk_errors: List[str] = []
+        try:
+            result = process_pdf(
+                pdf,
+                llm,
+                options,
+                api_base_url=api_base_url,
+                output_root=output_root,
+                timeout_seconds=timeout_seconds,
+                deck_name=deck_name,
+                pages_per_shard=pages_per_shard,
+                on_error=lambda chunk_id, error: chunk_errors.append(f"{chunk_id}: {type(error).__name__}: {error}"),
+            )
+        except Exception as exc:
+            return {"pdf": str(pdf), "status": "failed", "error": f"{type(exc).__name__}: {exc}"}
+        summary = document_summary(result)
+        if chunk_errors:
+            summary["errors"] = chunk_errors
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="pdf2anki") as executor:
+        futures = {executor.submit(run, pdf): index for index, pdf in enumerate(pdfs)}
+        for future in as_completed(futures):
+            summary = future.result()
+            results[futures[future]] = summary
+            if on_result is not None:
+                on_result(summary)
+
+    documents = [results[index] for index in sorted(results)]
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": len(documents),
+        "ok": sum(1 for d in documents if d["status"] == "ok"),
+        "failed": sum(1 for d in documents if d["status"] == "failed"),
+        "no_cards": sum(1 for d in documents if d["status"] == "no_cards"),
+        "cards": sum(d.get("cards", 0) for d in documents),
+        "elapsed_sec": round(elapsed, 3),
+        "results": documents,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert PDFs to Anki decks without the web UI")
+    parser.add_argument("inputs", nargs="+", type=Path, help="PDF files or directories of PDFs")
+    parser.add_argument("--api", default=os.getenv("MARKER_API_BASE", "http://localhost:8080"), help="Marker API base URL")
+    parser.add_argument("--outdir", default="outputs", help="Root output directory (default: outputs)")
+    parser.add_argument("--num-cards", type=int, default=10, help="Cards per PDF (default: 10)")
+    parser.add_argument("--card-type", choices=["definitions", "concepts", "mixed"], default="mixed", help="Content focus (default: mixed)")
+    parser.add_argument("--note-type", choices=["basic", "cloze"], default="basic", help="Note type (default: basic)")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="Maximum tokens per chunk (default: 2000)")
+    parser.add_argument("--no-chunking", action="store_true", help="Send each document as one prompt instead of per chunk")
+    parser.add_argument("--no-packing", action="store_true", help="Send every chunk in its own request")
+    parser.add_argument("--context-tokens", type=int, default=None,
+                        help="Model context window used to pack chunks (default: LLM_CONTEXT_TOKENS or 8192)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help=f"PDFs processed in parallel (default: {DEFAULT_JOBS})")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help=f"Parallel LLM requests per PDF (default: LLM_MAX_CONCURRENCY or {limits_from_env()[0]})")
+    parser.add_argument("--timeout", type=int, default=300, help="HTTP timeout seconds per conversion")
+    parser.add_argument("--pages-per-shard", type=int, default=DEFAULT_PAGES_PER_SHARD,
+                        help=f"Convert longer PDFs in page ranges of this size, chunking each while the next converts (0 disables, default: {DEFAULT_PAGES_PER_SHARD})")
+    parser.add_argument("--deck", default=None, help="Deck name for every PDF (default: each PDF's file name)")
+    parser.add_argument("--no-recursive", action="store_true", help="Only use PDFs directly inside input directories")
+    parser.add_argument("--no-response-cache", action="store_true", help="Always call the LLM, even for identical prompts")
+    parser.add_argument("--no-reuse", action="store_true", help="Regenerate cards for unchanged sections of revised PDFs")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep cards that repeat other questions of the same PDF's run")
+    parser.add_argument("--skip-exported", action="store_true",
+                        help="Only add cards whose questions are not in a deck exported earlier for the same PDF")
+    parser.add_argument("--summary", default=None, help="Also write the summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    try:
+        llm = LLMConfig.from_env()
+    except LLMNotConfiguredError as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 2
+
+    pdfs = collect_pdfs([p.expanduser() for p in args.inputs], recursive=not args.no_recursive)
+    if not pdfs:
+        print("ERROR: no PDF files found", file=sys.stderr)
+        return 2
+
+    options = GenerationOptions(
+        num_cards=args.num_cards,
+        card_type=args.card_type,
+        note_type=args.note_type,
+        use_chunking=not args.no_chunking,
+        max_tokens_per_chunk=args.max_tokens,
+        max_concurrency=args.llm_concurrency,
+        use_response_cache=not args.no_response_cache,
+        deduplicate=not args.no_dedup,
+        skip_exported_cards=args.skip_exported,
+        reuse_unchanged_sections=not args.no_reuse,
+        pack_chunks=not args.no_packing,
+        context_tokens=args.context_tokens,
+    )
+
+    def report(summary: Dict[str, object]) -> None:
+        detail = summary.get("error") or f"{summary.get('cards')} cards → {summary.get('apkg_path') or summary.get('session_dir')}"
+        print(f"[{summary['status']}] {summary['pdf']} ({detail})", file=sys.stderr, flush=True)
+
+    summary = run_batch(
+        pdfs,
+        llm,
+        options,
+        api_base_url=args.api,
+        output_root=Path(args.outdir).expanduser(),
+        jobs=args.jobs,
+        timeout_seconds=args.timeout,
+        deck_name=args.deck,
+        pages_per_shard=args.pages_per_shard,
+        on_result=report,
+    )
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    output = {key: value for key, value in summary.items() if key != "results"}
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+    # A PDF without a deck needs attention as much as a failed one
+    return 1 if summary["failed"] or summary["no_cards"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
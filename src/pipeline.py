@@ -0,0 +1,508 @@
+"""
+Pipelined convert → clean → chunk → generate execution.
+
+The generic part of this module is a small stage scheduler: each stage runs
+on its own worker thread(s) and stages are connected by bounded queues, so
+early items flow downstream while later ones are still being produced, and a
+slow stage applies back-pressure instead of letting work pile up in memory.
+Every stage records busy time, time starved for input and time blocked on a
+full output queue, which identifies the bottleneck.
+
+``run_pdf_pipeline`` applies it to PDFs: the PDF is split into page ranges
+with pypdf, each range is converted through the Marker API as its own
+request (and cached like any other conversion), then cleaned, chunked and
+optionally sent to the LLM while later ranges are still converting.
+
+Usage:
+  python src/pipeline.py --input /path/to/input.pdf --outdir outputs --pages-per-shard 10
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from domain_types import Chunk
+from instrumentation import instrumented, recording, span, utf8_size
+from pdf2anki_types import Card
+
+logger = logging.getLogger(__name__)
+
+_END = object()  # Sentinel marking the end of a stage's input
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline stage.
+
+    Attributes:
+        name: Stage name used in metrics
+        fn: Maps one input item to an iterable of output items (may be empty)
+        workers: Worker threads for this stage. With more than one worker the
+            stage's output order is not guaranteed.
+    """
+    name: str
+    fn: Callable[[Any], Iterable[Any]]
+    workers: int = 1
+
+
+@dataclass
+class StageMetrics:
+    """Counters collected for one stage."""
+    name: str
+    workers: int = 1
+    items_in: int = 0
+    items_out: int = 0
+    busy_sec: float = 0.0
+    starved_sec: float = 0.0
+    blocked_sec: float = 0.0
+    errors: int = 0
+
+    def to_dict(self, elapsed_sec: float) -> dict:
+        capacity = elapsed_sec * self.workers
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_sec": round(self.busy_sec, 4),
+            "starved_sec": round(self.starved_sec, 4),
+            "blocked_sec": round(self.blocked_sec, 4),
+            "errors": self.errors,
+            "throughput_items_per_sec": round(self.items_in / elapsed_sec, 4) if elapsed_sec > 0 else 0.0,
+            "utilization": round(self.busy_sec / capacity, 4) if capacity > 0 else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues.
+
+    Args:
+        stages: Stages in order
+        queue_size: Capacity of each inter-stage queue
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 4) -> None:
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.metrics = [StageMetrics(name=s.name, workers=max(1, s.workers)) for s in stages]
+        self.elapsed_sec = 0.0
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    def _put(self, q: "queue.Queue", item: Any, metrics: Optional[StageMetrics]) -> bool:
+        """Put with back-pressure accounting; returns False if the pipeline is stopping."""
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if metrics is not None:
+            with self._lock:
+                metrics.blocked_sec += time.perf_counter() - t0
+        return not self._stop.is_set()
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _feed(self, source: Iterable[Any], out_q: "queue.Queue") -> None:
+        try:
+            for item in source:
+                if not self._put(out_q, item, None):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put_end(out_q)
+
+    def _put_end(self, q: "queue.Queue") -> None:
+        # Normally wait for room like any other item. While stopping, the
+        # consumer may be gone and the items are discarded anyway, so drain
+        # to make sure the sentinel gets through.
+        while True:
+            try:
+                q.put(_END, timeout=0.1)
+                return
+            except queue.Full:
+                if not self._stop.is_set():
+                    continue
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _worker(self, stage: Stage, metrics: StageMetrics, in_q: "queue.Queue",
+                out_q: "queue.Queue", remaining: List[int]) -> None:
+        try:
+            while True:
+                t0 = time.perf_counter()
+                item = in_q.get()
+                with self._lock:
+                    metrics.starved_sec += time.perf_counter() - t0
+                if item is _END:
+                    in_q.put(_END)  # Let sibling workers see it too
+                    break
+                if self._stop.is_set():
+                    continue  # Drain without processing
+                with self._lock:
+                    metrics.items_in += 1
+                t0 = time.perf_counter()
+                try:
+                    outputs = stage.fn(item) or ()
+                    for output in outputs:
+                        busy = time.perf_counter() - t0
+                        with self._lock:
+                            metrics.busy_sec += busy
+                            metrics.items_out += 1
+                        if not self._put(out_q, output, metrics):
+                            break
+                        t0 = time.perf_counter()
+                    with self._lock:
+                        metrics.busy_sec += time.perf_counter() - t0
+                except BaseException as e:
+                    with self._lock:
+                        metrics.errors += 1
+                    logger.error(f"Pipeline stage '{stage.name}' failed: {e}")
+                    self._fail(e)
+        finally:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._put_end(out_q)
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        """
+        Feed ``source`` through the stages and yield the last stage's outputs.
+
+        Raises the first exception raised by any stage once the pipeline has
+        shut down.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        # Each thread runs in a copy of the caller's context so instrumentation
+        # spans reach the caller's recorder
+        threads = [threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._feed, source, queues[0]),
+            name="pipeline-source",
+            daemon=True,
+        )]
+        for index, (stage, metrics) in enumerate(zip(self.stages, self.metrics)):
+            remaining = [metrics.workers]
+            for n in range(metrics.workers):
+                threads.append(threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._worker, stage, metrics, queues[index], queues[index + 1], remaining),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True,
+                ))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        finished = False
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    break
+                if not self._stop.is_set():
+                    yield item
+            finished = True
+        finally:
+            if not finished:
+                # The consumer stopped early; wind the stages down
+                self._stop.set()
+            for thread in threads:
+                thread.join(timeout=1.0 if self._stop.is_set() else None)
+            self.elapsed_sec = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+
+    def report(self) -> dict:
+        """Per-stage throughput and back-pressure, plus the busiest stage."""
+        stages = [m.to_dict(self.elapsed_sec) for m in self.metrics]
+        bottleneck = max(stages, key=lambda s: s["utilization"])["name"] if stages else None
+        return {
+            "elapsed_sec": round(self.elapsed_sec, 4),
+            "queue_size": self.queue_size,
+            "bottleneck": bottleneck,
+            "stages": stages,
+        }
+
+
+# ---------------------------------------------------------------------------
+# PDF pipeline
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class PdfShard:
+    """A page range of the source PDF written to its own file."""
+    index: int
+    start_page: int  # 1-based, inclusive
+    end_page: int  # 1-based, inclusive
+    path: Path
+
+
+@dataclass
+class PipelineResult:
+    """
+    Output of run_pdf_pipeline.
+
+    Attributes:
+        chunks: Chunks in document order
+        cards: Generated cards in chunk order (empty when generation is disabled)
+        markdown_paths: Converted markdown of each page range, in page order
+        report: Pipeline.report() output
+    """
+    chunks: List[Chunk] = field(default_factory=list)
+    cards: List[Card] = field(default_factory=list)
+    markdown_paths: List[Path] = field(default_factory=list)
+    report: dict = field(default_factory=dict)
+
+
+def iter_pdf_shards(pdf_path: Path, pages_per_shard: int, workdir: Path) -> Iterator[PdfShard]:
+    """Split ``pdf_path`` into files of at most ``pages_per_shard`` pages each."""
+    from pypdf import PdfReader, PdfWriter
+
+    # Reading from the open file (not a path) keeps pypdf from loading the whole PDF into memory
+    with pdf_path.open("rb") as source:
+        reader = PdfReader(source)
+        total = len(reader.pages)
+        pages_per_shard = max(1, pages_per_shard)
+        for index, start in enumerate(range(0, total, pages_per_shard)):
+            end = min(start + pages_per_shard, total)
+            writer = PdfWriter()
+            for page_number in range(start, end):
+                writer.add_page(reader.pages[page_number])
+            shard_path = workdir / f"{pdf_path.stem[:50]}_p{start + 1:05d}-{end:05d}.pdf"
+            with shard_path.open("wb") as f:
+                writer.write(f)
+            yield PdfShard(index=index, start_page=start + 1, end_page=end, path=shard_path)
+
+
+def run_pdf_pipeline(
+    pdf_path: Path,
+    api_base_url: str,
+    output_root: Path,
+    pdf_sha256: Optional[str] = None,
+    pages_per_shard: int = 10,
+    max_tokens: int = 2000,
+    queue_size: int = 4,
+    generate_fn: Optional[Callable[[Chunk, int], List[Card]]] = None,
+    cards_per_chunk: int = 3,
+    max_cards: Optional[int] = None,
+    generate_workers: int = 4,
+    remove_images: bool = False,
+    timeout_seconds: int = 300,
+) -> PipelineResult:
+    """
+    Convert, clean, chunk and optionally generate cards with overlapping stages.
+
+    Each page range is converted as a separate Marker API request, so cleaning
+    of the first pages starts while later pages are still converting. Header
+    and footer detection therefore runs per page range rather than over the
+    whole document. Chunk IDs are numbered continuously across ranges, and
+    ``start_page``/``end_page`` record the range each chunk came from.
+
+    Args:
+        pdf_path: Input PDF
+        api_base_url: Marker API base URL
+        output_root: Root for conversion artifacts (shards use the conversion cache)
+        pdf_sha256: SHA256 of the whole PDF (computed if omitted)
+        pages_per_shard: Pages per conversion request
+        max_tokens: Maximum tokens per chunk
+        queue_size: Capacity of each inter-stage queue
+        generate_fn: Optional ``generate_fn(chunk, n)`` returning cards; when
+            omitted the pipeline stops after chunking
+        cards_per_chunk: Cards requested per chunk
+        max_cards: Stop requesting cards once this many are delivered or in flight
+        generate_workers: Parallel generation requests
+        remove_images: Remove image references while cleaning
+        timeout_seconds: HTTP timeout per conversion request
+
+    Returns:
+        PipelineResult with chunks, cards and the stage report
+    """
+    from marker_client import compute_sha256, convert_pdf_to_markdown, get_marker_client
+    from markdown_chunker import iter_chunks
+    from markdown_cleaner import clean_markdown
+
+    pdf_path = Path(pdf_path).resolve()
+    output_root = Path(output_root).resolve()
+    if pdf_sha256 is None:
+        pdf_sha256 = compute_sha256(pdf_path)
+
+    client = get_marker_client(api_base_url)
+    markdown_paths = {}
+
+    def convert(shard: PdfShard) -> Iterator[Tuple[PdfShard, str]]:
+        paths = convert_pdf_to_markdown(
+            pdf_path=shard.path,
+            api_base_url=api_base_url,
+            output_root=output_root,
+            timeout_seconds=timeout_seconds,
+            client=client,
+        )
+        markdown_paths[shard.index] = paths.markdown_path
+        yield shard, paths.markdown_path.read_text(encoding="utf-8")
+
+    def clean(item: Tuple[PdfShard, str]) -> Iterator[Tuple[PdfShard, str]]:
+        shard, markdown_text = item
+        with span("cleaning", bytes_in=utf8_size(markdown_text)) as cleaning:
+            cleaned_text = clean_markdown(markdown_text, remove_images=remove_images).cleaned_text
+            cleaning.add_bytes(bytes_out=utf8_size(cleaned_text))
+        yield shard, cleaned_text
+
+    next_index = [1]
+    # Document position of each chunk id; generate workers finish out of order
+    positions = {}
+
+    def chunk(item: Tuple[PdfShard, str]) -> Iterator[Chunk]:
+        shard, cleaned_text = item
+        chunks = instrumented(
+            "chunking",
+            iter_chunks(cleaned_text, pdf_sha256=pdf_sha256, max_tokens=max_tokens, start_index=next_index[0]),
+            size=lambda c: utf8_size(c.text),
+            bytes_in=utf8_size(cleaned_text),
+        )
+        for c in chunks:
+            c.start_page = shard.start_page
+            c.end_page = shard.end_page
+            positions[c.id] = next_index[0]
+            next_index[0] += 1
+            yield c
+
+    stages = [Stage("convert", convert), Stage("clean", clean), Stage("chunk", chunk)]
+
+    budget_lock = threading.Lock()
+    budget = {"delivered": 0, "reserved": 0}
+
+    def generate(c: Chunk) -> Iterator[Tuple[Chunk, List[Card]]]:
+        with budget_lock:
+            available = cards_per_chunk
+            if max_cards is not None:
+                available = min(available, max_cards - budget["delivered"] - budget["reserved"])
+            if available <= 0:
+                yield c, []
+                return
+            budget["reserved"] += available
+        cards: List[Card] = []
+        try:
+            cards = generate_fn(c, available) or []
+        finally:
+            with budget_lock:
+                budget["reserved"] -= available
+                budget["delivered"] += len(cards)
+        yield c, cards
+
+    if generate_fn is not None:
+        stages.append(Stage("generate", generate, workers=generate_workers))
+
+    result = PipelineResult()
+    with recording() as recorder, tempfile.TemporaryDirectory(prefix="pdf2anki_shards_") as workdir:
+        pipeline = Pipeline(stages, queue_size=queue_size)
+        outputs = list(pipeline.run(iter_pdf_shards(pdf_path, pages_per_shard, Path(workdir))))
+
+    if generate_fn is None:
+        result.chunks = outputs
+    else:
+        outputs.sort(key=lambda pair: positions[pair[0].id])
+        result.chunks = [c for c, _ in outputs]
+        for _, cards in outputs:
+            result.cards.extend(cards)
+        if max_cards is not None:
+            result.cards = result.cards[:max_cards]
+    result.markdown_paths = [markdown_paths[index] for index in sorted(markdown_paths)]
+    result.report = pipeline.report()
+    result.report["instrumentation"] = recorder.to_dict()
+    return result
+
+
+def main() -> None:
+    import argparse
+
+    from marker_client import compute_sha256
+
+    parser = argparse.ArgumentParser(description="Convert, clean and chunk a PDF with overlapping pipeline stages")
+    parser.add_argument("--input", required=True, help="Path to input PDF")
+    parser.add_argument("--api", default=os.getenv("MARKER_API_BASE", "http://localhost:8080"), help="Marker API base URL")
+    parser.add_argument("--outdir", default="outputs", help="Root output directory (default: outputs)")
+    parser.add_argument("--pages-per-shard", type=int, default=10, help="Pages per conversion request (default: 10)")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="Maximum tokens per chunk (default: 2000)")
+    parser.add_argument("--queue-size", type=int, default=4, help="Capacity of each inter-stage queue (default: 4)")
+    parser.add_argument("--timeout", type=int, default=300, help="HTTP timeout seconds per conversion request")
+    args = parser.parse_args()
+
+    pdf_path = Path(args.input).expanduser().resolve()
+    out_root = Path(args.outdir).expanduser().resolve()
+    pdf_sha256 = compute_sha256(pdf_path)
+
+    result = run_pdf_pipeline(
+        pdf_path,
+        api_base_url=args.api,
+        output_root=out_root,
+        pdf_sha256=pdf_sha256,
+        pages_per_shard=args.pages_per_shard,
+        max_tokens=args.max_tokens,
+        queue_size=args.queue_size,
+        timeout_seconds=args.timeout,
+    )
+
+    from process_markdown import chunk_to_dict
+
+    out_dir = out_root / "conversions" / pdf_sha256
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunks_jsonl_path = out_dir / "chunks.jsonl"
+    with open(chunks_jsonl_path, "w", encoding="utf-8") as f:
+        for c in result.chunks:
+            f.write(json.dumps(chunk_to_dict(c), ensure_ascii=False) + "\n")
+    report_path = out_dir / "pipeline_report.json"
+    report_path.write_text(json.dumps(result.report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(json.dumps({
+        "chunks_jsonl_path": str(chunks_jsonl_path),
+        "pipeline_report_path": str(report_path),
+        "total_chunks": len(result.chunks),
+        "bottleneck": result.report.get("bottleneck"),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,18 @@ import argparse
 import json
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional, TextIO
 
-from domain_types import ConversionMeta
-from markdown_chunker import chunk_markdown
-from markdown_cleaner import clean_markdown
+from chunk_cards import chunk_text_sha256
+from domain_types import Chunk, CleaningResult, ConversionMeta
+from instrumentation import instrumented, recording, span, utf8_size
+from markdown_chunker import iter_chunks
+from markdown_cleaner import iter_clean_markdown
 from semantic_detector import identify_semantic_structures
 
+# Chunks whose semantic structures are repeated in processing_result.json
+SEMANTIC_SAMPLE_SIZE = 10
+
 
 def load_meta(meta_path: Path) -> Optional[dict]:
     """
@@ -40,6 +45,116 @@ def load_meta(meta_path: Path) -> Optional[dict]:
         return None
 
 
+def _tee(pieces: Iterable[str], sink: TextIO) -> Iterator[str]:
+    """Write each text piece to ``sink`` while passing it through."""
+    for piece in pieces:
+        sink.write(piece)
+        yield piece
+
+
+def chunk_to_dict(chunk: Chunk) -> dict:
+    """Convert a Chunk to a dict for JSON serialization."""
+    return {
+        "id": chunk.id,
+        "text": chunk.text,
+        "text_sha256": chunk_text_sha256(chunk.text),  # Unchanged chunks reuse their cards
+        "token_count": chunk.token_count,
+        "source_ref": {
+            "pdf_sha256": chunk.source_ref.pdf_sha256,
+            "chunk_id": chunk.source_ref.chunk_id
+        },
+        "start_page": chunk.start_page,
+        "end_page": chunk.end_page,
+        "section_title": chunk.section_title
+    }
+
+
+def process_conversion(
+    marker_md_path: Path,
+    out_dir: Path,
+    pdf_sha256: str,
+    max_tokens: int = 2000,
+    remove_images: bool = False,
+    save_chunk_files: bool = False,
+) -> dict:
+    """
+    Clean and chunk a converted markdown file and write the results to ``out_dir``.
+
+    Cleaning and chunking run in one streaming pass: cleaned text is written
+    to cleaned.md as it is produced, and each chunk is appended to
+    chunks.jsonl, together with its semantic structures ("semantic") and a
+    hash of its text ("text_sha256"), as soon as its section closes. A summary, including per-stage timings
+    ("instrumentation"), is written to processing_result.json.
+
+    Args:
+        marker_md_path: Path to marker.md
+        out_dir: Output directory
+        pdf_sha256: SHA256 of the source PDF
+        max_tokens: Maximum tokens per chunk
+        remove_images: Remove image references from markdown
+        save_chunk_files: Save individual chunk files in chunks/
+
+    Returns:
+        The processing result summary
+    """
+    cleaning_result = CleaningResult(cleaned_text="")
+    cleaned_md_path = out_dir / "cleaned.md"
+    chunks_jsonl_path = out_dir / "chunks.jsonl"
+    chunks_dir = out_dir / "chunks"
+    if save_chunk_files:
+        chunks_dir.mkdir(exist_ok=True)
+    
+    total_chunks = 0
+    total_tokens = 0
+    semantic_data = {}
+    with recording() as recorder, \
+            open(marker_md_path, 'r', encoding='utf-8') as src, \
+            open(cleaned_md_path, 'w', encoding='utf-8') as cleaned, \
+            open(chunks_jsonl_path, 'w', encoding='utf-8') as f:
+        # Cleaning runs inside chunking's steps; spans report each stage's own time
+        cleaned_pieces = instrumented("cleaning", _tee(
+            iter_clean_markdown(src, remove_images=remove_images, result=cleaning_result),
+            cleaned,
+        ), size=utf8_size, bytes_in=Path(marker_md_path).stat().st_size)
+        chunks = instrumented(
+            "chunking",
+            iter_chunks(cleaned_pieces, pdf_sha256=pdf_sha256, max_tokens=max_tokens),
+            size=lambda chunk: utf8_size(chunk.text),
+        )
+        for chunk in chunks:
+            record = chunk_to_dict(chunk)
+            # Identify semantic structures (definitions, key terms, boundaries) for every chunk
+            with span("semantic_detection", bytes_in=utf8_size(chunk.text)):
+                record["semantic"] = identify_semantic_structures(chunk)
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            total_chunks += 1
+            total_tokens += chunk.token_count
+            if total_chunks <= SEMANTIC_SAMPLE_SIZE:
+                semantic_data[chunk.id] = record["semantic"]
+            
+            # Optionally save individual chunk files
+            if save_chunk_files:
+                (chunks_dir / f"{chunk.id}.md").write_text(chunk.text, encoding='utf-8')
+    
+    processing_result = {
+        "cleaned_md_path": str(cleaned_md_path),
+        "chunks_jsonl_path": str(chunks_jsonl_path),
+        "total_chunks": total_chunks,
+        "total_tokens": total_tokens,
+        "avg_tokens_per_chunk": round(total_tokens / total_chunks, 2) if total_chunks > 0 else 0,
+        "cleaning_stats": cleaning_result.stats,
+        "semantic_structures_sample": semantic_data,  # First chunks only; every chunk's is in chunks.jsonl
+        "instrumentation": recorder.to_dict(),
+    }
+    
+    result_path = out_dir / "processing_result.json"
+    result_path.write_text(
+        json.dumps(processing_result, ensure_ascii=False, indent=2),
+        encoding='utf-8'
+    )
+    return processing_result
+
+
 def main() -> None:
     """Main CLI entry point."""
     parser = argparse.ArgumentParser(
@@ -118,91 +233,40 @@ def main() -> None:
             print("WARNING: Could not determine PDF SHA256. Using placeholder.", file=sys.stderr)
             pdf_sha256 = "unknown"
     
-    # Read markdown
+    # Steps 1-2: Clean and chunk in one streaming pass
     print(f"Reading markdown from: {marker_md_path}", file=sys.stderr)
+    print(f"Cleaning and chunking markdown (max_tokens={args.max_tokens})...", file=sys.stderr)
     try:
-        raw_markdown = marker_md_path.read_text(encoding='utf-8')
-    except Exception as e:
-        print(f"ERROR: Failed to read markdown file: {e}", file=sys.stderr)
+        processing_result = process_conversion(
+            marker_md_path,
+            out_dir,
+            pdf_sha256,
+            max_tokens=args.max_tokens,
+            remove_images=args.remove_images,
+            save_chunk_files=args.save_chunk_files,
+        )
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        print(f"ERROR: Failed to process markdown file: {e}", file=sys.stderr)
         sys.exit(1)
+    cleaned_md_path = processing_result["cleaned_md_path"]
+    chunks_jsonl_path = processing_result["chunks_jsonl_path"]
+    total_chunks = processing_result["total_chunks"]
+    total_tokens = processing_result["total_tokens"]
+    result_path = out_dir / "processing_result.json"
     
-    # Step 1: Clean markdown
-    print("Cleaning markdown...", file=sys.stderr)
-    cleaning_result = clean_markdown(raw_markdown, remove_images=args.remove_images)
-    
-    # Save cleaned markdown
-    cleaned_md_path = out_dir / "cleaned.md"
-    cleaned_md_path.write_text(cleaning_result.cleaned_text, encoding='utf-8')
     print(f"Saved cleaned markdown to: {cleaned_md_path}", file=sys.stderr)
-    
-    # Step 2: Chunk markdown
-    print(f"Chunking markdown (max_tokens={args.max_tokens})...", file=sys.stderr)
-    chunking_result = chunk_markdown(
-        cleaning_result.cleaned_text,
-        pdf_sha256=pdf_sha256,
-        max_tokens=args.max_tokens
-    )
-    
-    # Save chunks.jsonl
-    chunks_jsonl_path = out_dir / "chunks.jsonl"
-    with open(chunks_jsonl_path, 'w', encoding='utf-8') as f:
-        for chunk in chunking_result.chunks:
-            # Convert Chunk to dict for JSON serialization
-            chunk_dict = {
-                "id": chunk.id,
-                "text": chunk.text,
-                "token_count": chunk.token_count,
-                "source_ref": {
-                    "pdf_sha256": chunk.source_ref.pdf_sha256,
-                    "chunk_id": chunk.source_ref.chunk_id
-                },
-                "start_page": chunk.start_page,
-                "end_page": chunk.end_page,
-                "section_title": chunk.section_title
-            }
-            f.write(json.dumps(chunk_dict, ensure_ascii=False) + "\n")
-    
-    print(f"Saved {chunking_result.total_chunks} chunks to: {chunks_jsonl_path}", file=sys.stderr)
-    
-    # Step 3: Optionally save individual chunk files
+    print(f"Saved {total_chunks} chunks to: {chunks_jsonl_path}", file=sys.stderr)
     if args.save_chunk_files:
-        chunks_dir = out_dir / "chunks"
-        chunks_dir.mkdir(exist_ok=True)
-        for chunk in chunking_result.chunks:
-            chunk_file_path = chunks_dir / f"{chunk.id}.md"
-            chunk_file_path.write_text(chunk.text, encoding='utf-8')
-        print(f"Saved individual chunk files to: {chunks_dir}", file=sys.stderr)
-    
-    # Step 4: Identify semantic structures (optional, for metadata)
-    semantic_data = {}
-    for chunk in chunking_result.chunks[:10]:  # Limit to first 10 chunks for performance
-        semantic_data[chunk.id] = identify_semantic_structures(chunk)
-    
-    # Step 5: Create processing result summary
-    processing_result = {
-        "cleaned_md_path": str(cleaned_md_path),
-        "chunks_jsonl_path": str(chunks_jsonl_path),
-        "total_chunks": chunking_result.total_chunks,
-        "total_tokens": chunking_result.total_tokens,
-        "avg_tokens_per_chunk": round(chunking_result.total_tokens / chunking_result.total_chunks, 2) if chunking_result.total_chunks > 0 else 0,
-        "cleaning_stats": cleaning_result.stats,
-        "semantic_structures_sample": semantic_data  # Sample from first 10 chunks
-    }
-    
-    result_path = out_dir / "processing_result.json"
-    result_path.write_text(
-        json.dumps(processing_result, ensure_ascii=False, indent=2),
-        encoding='utf-8'
-    )
+        print(f"Saved individual chunk files to: {out_dir / 'chunks'}", file=sys.stderr)
     print(f"Saved processing result to: {result_path}", file=sys.stderr)
     
     # Print summary to stdout (JSON for programmatic use)
     print(json.dumps({
-        "cleaned_md_path": str(cleaned_md_path),
-        "chunks_jsonl_path": str(chunks_jsonl_path),
+        "cleaned_md_path": cleaned_md_path,
+        "chunks_jsonl_path": chunks_jsonl_path,
         "processing_result_path": str(result_path),
-        "total_chunks": chunking_result.total_chunks,
-        "total_tokens": chunking_result.total_tokens
+        "total_chunks": total_chunks,
+        "total_tokens": total_tokens
     }, ensure_ascii=False))
 
 
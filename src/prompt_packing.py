@@ -0,0 +1,143 @@
+"""
+Token-budget-aware packing of chunks into LLM requests.
+
+Slide decks and lecture notes often chunk into hundreds of sections of a
+few dozen tokens each. Sending each as its own request repeats the prompt
+template (formatting and MathJax rules) hundreds of times and costs one
+round trip per section. Instead, consecutive chunks are packed into one
+request, each as a delimited section with its own card count (see
+anki_core.build_packed_prompt), until the model's context window or its
+reply budget is full. A chunk that fills a request on its own is sent
+alone, so chunks are only split across requests when they do not fit
+together.
+
+The context size comes from LLM_CONTEXT_TOKENS (default: 8192, the
+smallest window of the local models PDF2Anki is used with); token counts
+use the same tokenizer as the chunker.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Collection, List, Optional, Sequence
+
+from markdown_chunker import estimate_tokens
+
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Rough reply size of one card (question, answer and list numbering)
+CARD_REPLY_TOKENS = 100
+
+# Section marker, its blank line and its line in the per-section card counts
+SECTION_OVERHEAD_TOKENS = 24
+
+
+def context_tokens_from_env() -> int:
+    """The model's context window in tokens, from LLM_CONTEXT_TOKENS (default: 8192)."""
+    try:
+        value = int(os.getenv("LLM_CONTEXT_TOKENS", ""))
+    except ValueError:
+        return DEFAULT_CONTEXT_TOKENS
+    return value if value > 0 else DEFAULT_CONTEXT_TOKENS
+
+
+@dataclass
+class PackingBudget:
+    """
+    What one request may hold.
+
+    Attributes:
+        content_tokens: Tokens left for chunk text after the prompt template
+            and the reply are reserved
+        max_cards: Cards that fit in the reply
+    """
+    content_tokens: int
+    max_cards: int
+
+
+def packing_budget(
+    template: str,
+    completion_tokens: int,
+    context_tokens: Optional[int] = None,
+) -> PackingBudget:
+    """
+    Budget of one request to a model with ``context_tokens`` of context.
+
+    Args:
+        template: The prompt without any content (counted once per request)
+        completion_tokens: Tokens reserved for the reply (max_completion_tokens)
+        context_tokens: Context window (default: LLM_CONTEXT_TOKENS or 8192)
+
+    Returns:
+        PackingBudget; at least one token and one card, so a model with a tiny
+        window still gets one chunk per request
+    """
+    context = context_tokens or context_tokens_from_env()
+    content_tokens = context - completion_tokens - estimate_tokens(template)
+    return PackingBudget(
+        content_tokens=max(1, content_tokens),
+        max_cards=max(1, completion_tokens // CARD_REPLY_TOKENS),
+    )
+
+
+def pack_sections(
+    costs: Sequence[int],
+    cards_per_section: int,
+    budget: PackingBudget,
+    standalone: Collection[int] = (),
+) -> List[List[int]]:
+    """
+    Group consecutive sections into requests that fit ``budget``.
+
+    Sections are taken in order and added to the current request until the
+    next one would exceed the content tokens or the reply's card budget.
+    A section larger than the budget gets a request of its own.
+
+    Args:
+        costs: Token count of each section's content
+        cards_per_section: Cards asked for per section
+        budget: Per-request budget
+        standalone: Indices that must not share a request (e.g. chunks
+            answered from stored cards)
+
+    Returns:
+        Lists of section indices, one per request, in document order
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    max_sections = max(1, budget.max_cards // max(1, cards_per_section))
+
+    for index, cost in enumerate(costs):
+        if index in standalone:
+            if current:
+                groups.append(current)
+                current, current_tokens = [], 0
+            groups.append([index])
+            continue
+        cost += SECTION_OVERHEAD_TOKENS
+        if current and (current_tokens + cost > budget.content_tokens or len(current) >= max_sections):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += cost
+
+    if current:
+        groups.append(current)
+    return groups
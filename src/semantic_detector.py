@@ -3,6 +3,11 @@ Semantic structure detection for markdown content.
 
 This module identifies definitions, key terms, and concept boundaries
 in markdown chunks to enrich metadata for flashcard generation.
+
+All patterns are compiled once at import. Each is a scan that starts
+with a literal character ("*", '"' or a newline), which the regex engine
+finds without trying the pattern at every position; concept boundaries
+are found in one scan over the text rather than by matching every line.
 """
 
 import re
@@ -10,156 +15,156 @@ from typing import Dict, List
 
 from domain_types import Chunk
 
+# Definition patterns: "**X** is (a) Y", "**X**: Y", "**X** - Y"
+_DEFINITION_IS = re.compile(r'\*\*([^*]+)\*\*\s+is\s+(?:a|an|the)?\s*(.+?)(?:\.|$|,|;)', re.IGNORECASE)
+# Colon and dash definitions start a line; both are found in one scan
+# anchored on the newline (see below) and told apart by group 2
+_DEFINITION_LINE = re.compile(r'\n\s*\*\*([^*]+)\*\*\s*([:-])\s*(.+?)(?:\.|$|,|;)', re.MULTILINE)
+
+# Key term patterns: bold, italic (but not math expressions), quoted
+_BOLD = re.compile(r'\*\*([^*]+)\*\*')
+_ITALIC = re.compile(r'(?<!\$)\*([^*]+)\*(?!\$)')
+_QUOTED = re.compile(r'"([^"]{3,50})"')
+
+# Concept boundaries: a heading, bullet or numbered-list marker at the
+# start of a line (after indentation) followed by whitespace and text.
+# Line patterns anchor on the newline rather than ``^`` so the regex
+# engine jumps from line to line instead of trying them at every
+# character; they run over "\n" + text so the first line has a newline too.
+_BOUNDARY = re.compile(r'\n[^\S\n]*(?:(\#{1,6})|[-*+]|(\d+[.)]))[^\S\n]+\S')
+
+
+def _is_key_term_length(term: str) -> bool:
+    return len(term) > 2 and len(term) < 50  # Reasonable length
+
+
+def _unique_terms(terms: List[str]) -> List[str]:
+    """Remove duplicates (case-insensitively) while preserving order."""
+    seen = set()
+    unique_terms = []
+    for term in terms:
+        term_lower = term.lower()
+        if term_lower not in seen:
+            seen.add(term_lower)
+            unique_terms.append(term)
+    return unique_terms
+
 
 def identify_definitions(text: str) -> List[Dict[str, str]]:
     """
     Identify definition patterns in text.
-    
+
     Patterns:
     - "X is Y" or "X is a Y"
     - "X: Y" (colon definition)
     - "X - Y" (dash definition)
     - "X (definition)" (parenthetical)
-    
+
     Args:
         text: Text to analyze
-    
+
     Returns:
         List of dicts with 'term' and 'definition' keys
     """
     definitions: List[Dict[str, str]] = []
-    
-    # Pattern 1: "X is Y" or "X is a/an/the Y"
-    pattern1 = r'\*\*([^*]+)\*\*\s+is\s+(?:a|an|the)?\s*(.+?)(?:\.|$|,|;)'
-    for match in re.finditer(pattern1, text, re.IGNORECASE):
+    for match in _DEFINITION_IS.finditer(text):
         definitions.append({
             'term': match.group(1).strip(),
             'definition': match.group(2).strip()
         })
-    
-    # Pattern 2: "X: Y" (colon definition, often in lists)
-    pattern2 = r'^\s*\*\*([^*]+)\*\*\s*:\s*(.+?)(?:\.|$|,|;)'
-    for match in re.finditer(pattern2, text, re.MULTILINE):
-        definitions.append({
-            'term': match.group(1).strip(),
-            'definition': match.group(2).strip()
-        })
-    
-    # Pattern 3: "X - Y" (dash definition)
-    pattern3 = r'^\s*\*\*([^*]+)\*\*\s*-\s*(.+?)(?:\.|$|,|;)'
-    for match in re.finditer(pattern3, text, re.MULTILINE):
-        definitions.append({
+
+    # Colon definitions are listed before dash definitions
+    by_separator: Dict[str, List[Dict[str, str]]] = {':': [], '-': []}
+    for match in _DEFINITION_LINE.finditer("\n" + text):
+        by_separator[match.group(2)].append({
             'term': match.group(1).strip(),
-            'definition': match.group(2).strip()
+            'definition': match.group(3).strip()
         })
-    
+    definitions.extend(by_separator[':'])
+    definitions.extend(by_separator['-'])
     return definitions
 
 
 def identify_key_terms(text: str) -> List[str]:
     """
     Identify key terms in text.
-    
+
     Looks for:
     - Bold text (**term**)
     - Italic text (*term*)
     - Terms in quotes ("term")
     - Capitalized phrases (likely proper nouns or acronyms)
-    
+
     Args:
         text: Text to analyze
-    
+
     Returns:
         List of identified key terms
     """
     terms: List[str] = []
-    
-    # Bold text
-    bold_pattern = r'\*\*([^*]+)\*\*'
-    for match in re.finditer(bold_pattern, text):
-        term = match.group(1).strip()
-        if len(term) > 2 and len(term) < 50:  # Reasonable length
-            terms.append(term)
-    
-    # Italic text (but not math expressions)
-    italic_pattern = r'(?<!\$)\*([^*]+)\*(?!\$)'
-    for match in re.finditer(italic_pattern, text):
-        term = match.group(1).strip()
-        if len(term) > 2 and len(term) < 50:
-            terms.append(term)
-    
-    # Terms in quotes
-    quote_pattern = r'"([^"]{3,50})"'
-    for match in re.finditer(quote_pattern, text):
+    for pattern in (_BOLD, _ITALIC):
+        for match in pattern.finditer(text):
+            term = match.group(1).strip()
+            if _is_key_term_length(term):
+                terms.append(term)
+    for match in _QUOTED.finditer(text):
         terms.append(match.group(1).strip())
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_terms = []
-    for term in terms:
-        term_lower = term.lower()
-        if term_lower not in seen:
-            seen.add(term_lower)
-            unique_terms.append(term)
-    
-    return unique_terms
+    return _unique_terms(terms)
 
 
 def identify_concept_boundaries(text: str) -> List[Dict[str, str]]:
     """
     Identify concept boundaries in text.
-    
+
     Looks for:
     - Section transitions (headings)
     - Bullet lists (likely concept lists)
     - Numbered lists (likely concept lists)
-    
+
     Args:
         text: Text to analyze
-    
+
     Returns:
         List of dicts with concept boundary information
     """
     boundaries: List[Dict[str, str]] = []
-    
-    lines = text.split("\n")
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        
-        # Check for headings
-        if re.match(r'^#{1,6}\s+', stripped):
+    scanned = "\n" + text
+    line = -1
+    counted_to = 0
+    for match in _BOUNDARY.finditer(scanned):
+        start = match.start()
+        line += scanned.count("\n", counted_to, start + 1)
+        counted_to = start + 1
+        end = scanned.find("\n", start + 1)
+        stripped = scanned[start + 1:end if end >= 0 else len(scanned)].strip()
+        if match.group(1) is not None:
             boundaries.append({
                 'type': 'heading',
                 'text': stripped,
-                'line': i
-            })
-        
-        # Check for bullet lists
-        if re.match(r'^[-*+]\s+', stripped):
-            boundaries.append({
-                'type': 'bullet_list',
-                'text': stripped[:100],  # First 100 chars
-                'line': i
+                'line': line
             })
-        
-        # Check for numbered lists
-        if re.match(r'^\d+[.)]\s+', stripped):
+        elif match.group(2) is not None:
             boundaries.append({
                 'type': 'numbered_list',
                 'text': stripped[:100],
-                'line': i
+                'line': line
+            })
+        else:
+            boundaries.append({
+                'type': 'bullet_list',
+                'text': stripped[:100],  # First 100 chars
+                'line': line
             })
-    
     return boundaries
 
 
 def identify_semantic_structures(chunk: Chunk) -> Dict:
     """
     Identify semantic structures in a chunk.
-    
+
     Args:
         chunk: Chunk to analyze
-    
+
     Returns:
         Dictionary with semantic structure information:
         - definitions: List of term/definition pairs
@@ -171,4 +176,3 @@ def identify_semantic_structures(chunk: Chunk) -> Dict:
         'key_terms': identify_key_terms(chunk.text),
         'concept_boundaries': identify_concept_boundaries(chunk.text)
     }
-
@@ -0,0 +1,365 @@
+"""
+Incremental JSON parsing with streamed string values.
+
+Marker API responses carry the whole document as one JSON string (plus
+base64 images), so ``response.json()`` holds several copies of a possibly
+very large body in memory. ``StreamingJSONParser`` consumes the body piece
+by piece and lets the caller route selected string values (chosen by their
+path in the document) to sinks such as open files, instead of building them
+in memory. Everything else is parsed into ordinary Python values.
+
+Copyright (C) 2025  Masanori Tani
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import codecs
+import json
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, List, Optional, TextIO, Tuple, Union
+
+JSONPath = Tuple[Union[str, int], ...]
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+_LITERAL = re.compile(r'[-+.0-9a-zA-Z]*')
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# Parser states
+_VALUE = 0  # Expecting a value
+_ARRAY_FIRST = 1  # After '[': a value or ']'
+_OBJECT_FIRST = 2  # After '{': a key or '}'
+_OBJECT_KEY = 3  # After ',' in an object: a key
+_COLON = 4  # After a key
+_AFTER_VALUE = 5  # After a value: ',' or a closing bracket
+_STRING = 6
+_LITERAL_STATE = 7  # Inside a number, true, false or null
+_END = 8
+
+
+class JSONStreamError(ValueError):
+    """Raised when the streamed document is not valid JSON."""
+
+
+class StringSink:
+    """
+    Receives a streamed string value.
+
+    ``write`` is called with consecutive decoded pieces; ``close`` is called
+    once the string ends and its return value is stored in the parsed
+    document in place of the string.
+    """
+
+    def write(self, piece: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> Any:
+        return None
+
+
+class TextFileSink(StringSink):
+    """Writes a string value to a text file and stores the file path."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.length = 0
+        self._file: TextIO = self.path.open("w", encoding="utf-8", newline="")
+
+    def write(self, piece: str) -> None:
+        self._file.write(piece)
+        self.length += len(piece)
+
+    def close(self) -> Any:
+        self._file.close()
+        return str(self.path)
+
+
+class Base64FileSink(StringSink):
+    """Decodes a base64 string value into a binary file and stores the file path."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.size = 0
+        self._pending = ""
+        self._file: BinaryIO = self.path.open("wb")
+
+    def write(self, piece: str) -> None:
+        data = self._pending + "".join(piece.split())
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if usable:
+            try:
+                decoded = base64.b64decode(data[:usable], validate=True)
+            except binascii.Error as e:
+                raise JSONStreamError(f"Invalid base64 data for {self.path.name}: {e}") from e
+            self._file.write(decoded)
+            self.size += len(decoded)
+
+    def close(self) -> Any:
+        try:
+            if self._pending:
+                raise JSONStreamError(f"Truncated base64 data for {self.path.name}")
+        finally:
+            self._file.close()
+        return str(self.path)
+
+
+class StreamingJSONParser:
+    """
+    Push parser for a single JSON document.
+
+    Args:
+        sink_for: Called with the path of every string value (e.g.
+            ``("result", "markdown")``); returning a StringSink streams that
+            value to the sink, returning None parses it normally.
+    """
+
+    def __init__(self, sink_for: Optional[Callable[[JSONPath], Optional[StringSink]]] = None) -> None:
+        self._sink_for = sink_for or (lambda path: None)
+        # Frames are [container, key]; for arrays key is the current index
+        self._stack: List[list] = []
+        self._state = _VALUE
+        self._root: Any = None
+        self._string_parts: List[str] = []
+        self._string_sink: Optional[StringSink] = None
+        self._string_is_key = False
+        self._escape = ""
+        self._high_surrogate: Optional[int] = None
+        self._literal: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self._state == _END
+
+    def _path(self) -> JSONPath:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _emit(self, value: Any) -> None:
+        if not self._stack:
+            self._root = value
+            self._state = _END
+            return
+        container, key = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+        self._state = _AFTER_VALUE
+
+    def _close_container(self, bracket: str) -> None:
+        container = self._stack.pop()[0]
+        if (bracket == "}") != isinstance(container, dict):
+            raise JSONStreamError(f"Mismatched '{bracket}'")
+        self._emit(container)
+
+    def _start_value(self, char: str) -> bool:
+        """Begin a value at ``char``; returns True if ``char`` was consumed."""
+        if self._stack and isinstance(self._stack[-1][0], list):
+            self._stack[-1][1] = len(self._stack[-1][0])
+        if char == "{":
+            self._stack.append([{}, None])
+            self._state = _OBJECT_FIRST
+        elif char == "[":
+            self._stack.append([[], 0])
+            self._state = _ARRAY_FIRST
+        elif char == '"':
+            self._string_is_key = False
+            self._string_sink = self._sink_for(self._path())
+            self._string_parts = []
+            self._state = _STRING
+        elif char in "-0123456789tfn":
+            self._literal = []
+            self._state = _LITERAL_STATE
+            return False
+        else:
+            raise JSONStreamError(f"Unexpected character {char!r}")
+        return True
+
+    def _flush_surrogate(self) -> None:
+        # A high surrogate not followed by a low one is kept as is
+        if self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            self._string_piece(chr(high))
+
+    def _string_piece(self, piece: str) -> None:
+        if not piece:
+            return
+        if self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            piece = chr(high) + piece
+        if self._string_sink is not None:
+            self._string_sink.write(piece)
+        else:
+            self._string_parts.append(piece)
+
+    def _end_string(self) -> None:
+        self._flush_surrogate()
+        if self._string_is_key:
+            self._stack[-1][1] = "".join(self._string_parts)
+            self._string_parts = []
+            self._state = _COLON
+            return
+        if self._string_sink is not None:
+            sink, self._string_sink = self._string_sink, None
+            value = sink.close()
+        else:
+            value = "".join(self._string_parts)
+        self._string_parts = []
+        self._emit(value)
+
+    def _finish_escape(self) -> None:
+        escape, self._escape = self._escape, ""
+        if escape[1] != "u":
+            if escape[1] not in _SIMPLE_ESCAPES:
+                raise JSONStreamError(f"Invalid escape {escape!r}")
+            self._string_piece(_SIMPLE_ESCAPES[escape[1]])
+            return
+        try:
+            code = int(escape[2:], 16)
+        except ValueError:
+            raise JSONStreamError(f"Invalid escape {escape!r}") from None
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            self._string_piece(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+        elif 0xD800 <= code <= 0xDBFF:
+            self._flush_surrogate()
+            self._high_surrogate = code
+        else:
+            self._string_piece(chr(code))
+
+    def _finish_literal(self) -> None:
+        text = "".join(self._literal)
+        self._literal = []
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            raise JSONStreamError(f"Invalid literal {text!r}") from None
+        self._emit(value)
+
+    def feed(self, text: str) -> None:
+        """Parse the next piece of the document."""
+        i = 0
+        n = len(text)
+        while i < n:
+            state = self._state
+            if state == _STRING:
+                while self._escape and i < n:
+                    self._escape += text[i]
+                    i += 1
+                    if len(self._escape) == 6 or (len(self._escape) == 2 and self._escape[1] != "u"):
+                        self._finish_escape()
+                if self._escape:
+                    break
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    self._string_piece(text[i:])
+                    break
+                j = match.start()
+                if j > i:
+                    self._string_piece(text[i:j])
+                if text[j] == '"':
+                    self._end_string()
+                else:
+                    self._escape = "\\"
+                i = j + 1
+                continue
+
+            if state == _LITERAL_STATE:
+                match = _LITERAL.match(text, i)
+                self._literal.append(match.group())
+                i = match.end()
+                if i < n:
+                    self._finish_literal()
+                continue
+
+            i = _WHITESPACE.match(text, i).end()
+            if i >= n:
+                break
+            char = text[i]
+
+            if state == _VALUE:
+                if self._start_value(char):
+                    i += 1
+            elif state == _ARRAY_FIRST:
+                if char == "]":
+                    self._close_container("]")
+                    i += 1
+                elif self._start_value(char):
+                    i += 1
+            elif state in (_OBJECT_FIRST, _OBJECT_KEY):
+                if char == "}" and state == _OBJECT_FIRST:
+                    self._close_container("}")
+                elif char == '"':
+                    self._string_is_key = True
+                    self._string_sink = None
+                    self._string_parts = []
+                    self._state = _STRING
+                else:
+                    raise JSONStreamError(f"Expected an object key, got {char!r}")
+                i += 1
+            elif state == _COLON:
+                if char != ":":
+                    raise JSONStreamError(f"Expected ':', got {char!r}")
+                self._state = _VALUE
+                i += 1
+            elif state == _AFTER_VALUE:
+                if char == ",":
+                    self._state = _OBJECT_KEY if isinstance(self._stack[-1][0], dict) else _VALUE
+                elif char in "}]":
+                    self._close_container(char)
+                else:
+                    raise JSONStreamError(f"Expected ',' or a closing bracket, got {char!r}")
+                i += 1
+            else:
+                raise JSONStreamError(f"Unexpected data after the document: {char!r}")
+
+    def close(self) -> Any:
+        """Finish parsing and return the document."""
+        if self._state == _LITERAL_STATE and not self._stack:
+            self._finish_literal()
+        if self._state != _END:
+            raise JSONStreamError("Truncated JSON document")
+        return self._root
+
+
+def parse_json_stream(
+    chunks: Iterable[Union[bytes, str]],
+    sink_for: Optional[Callable[[JSONPath], Optional[StringSink]]] = None,
+    encoding: str = "utf-8",
+) -> Any:
+    """
+    Parse a JSON document from an iterable of byte or text pieces.
+
+    Args:
+        chunks: Pieces of the document (e.g. ``response.iter_content(...)``)
+        sink_for: See StreamingJSONParser
+        encoding: Encoding of byte pieces
+
+    Returns:
+        The parsed document, with streamed strings replaced by their sinks'
+        ``close()`` results
+    """
+    parser = StreamingJSONParser(sink_for)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parser.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+    parser.feed(decoder.decode(b"", final=True))
+    return parser.close()
@@ -29,19 +29,26 @@ from datetime import datetime
 import shutil
 import hashlib
 from typing import List, Optional
-import openai
 from openai import APIError, RateLimitError, APIConnectionError, APITimeoutError
 from dotenv import load_dotenv
 
 # Import our local modules
-from marker_client import convert_pdf_to_markdown
-from pdf2anki_types import Card, SourceReference
-from anki_core import build_llm_prompt_script, build_prompt, parse_cards_from_output
-from markdown_processor_wrapper import (
-    process_markdown_for_streamlit,
-    get_semantic_info_for_chunk,
-    load_pdf_sha256_from_meta
+from marker_client import convert_pdf_to_markdown, get_marker_client
+from pdf2anki_types import Card
+from anki_core import build_llm_prompt_script
+from instrumentation import recording, write_instrumentation
+from concurrent_generation import limits_from_env
+from llm_cache import get_llm_cache
+from apkg_writer import DEFAULT_DECK_NAME
+from card_engine import (
+    GenerationOptions,
+    LLMConfig,
+    LLMNotConfiguredError,
+    export_deck,
+    generate_cards,
+    session_dir_for,
 )
+from markdown_processor_wrapper import load_pdf_sha256_from_meta
 
 # Load environment variables
 load_dotenv()
@@ -78,85 +85,14 @@ if 'converting_pdf_hash' not in st.session_state:
     st.session_state.converting_pdf_hash = None
 if 'session_output_dir' not in st.session_state:
     st.session_state.session_output_dir = None
+if 'apkg_path' not in st.session_state:
+    st.session_state.apkg_path = None
 
 
-
-def generate_cards_from_chunk(
-    chunk_text: str,
-    chunk_id: str,
-    num_cards_per_chunk: int,
-    card_type: str,
-    note_type: str,
-    model_name: str,
-    pdf_sha256: Optional[str] = None,
-    semantic_info: Optional[dict] = None
-) -> List[Card]:
-    """
-    Generate Anki cards from a single chunk using OpenAI API.
-    
-    Args:
-        chunk_text: The chunk text content
-        chunk_id: ID of the chunk
-        num_cards_per_chunk: Number of cards to generate from this chunk
-        card_type: Type of cards to generate
-        note_type: Note type (basic or cloze)
-        model_name: LLM model name
-        semantic_info: Optional semantic structure information
-    
-    Returns:
-        List of Card objects
-    """
-    # Enhance prompt with semantic information if available
-    enhanced_content = chunk_text
-    if semantic_info:
-        key_terms = semantic_info.get("key_terms", [])
-        definitions = semantic_info.get("definitions", [])
-        if key_terms:
-            enhanced_content += f"\n\nKey terms in this section: {', '.join(key_terms[:10])}"
-        if definitions:
-            enhanced_content += "\n\nImportant definitions:\n"
-            for def_item in definitions[:5]:
-                enhanced_content += f"- {def_item.get('term', '')}: {def_item.get('definition', '')}\n"
-    
-    # Prepare the prompt
-    prompt_template = build_prompt(
-        note_type=note_type,
-        num_cards=num_cards_per_chunk,
-        content_focus=card_type,
-        markdown_content=enhanced_content,
-    )
-
-    try:
-        # Call OpenAI API (without temperature parameter as default)
-        response = openai.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that creates educational flashcards."},
-                {"role": "user", "content": prompt_template}
-            ],
-            max_completion_tokens=2000
-        )
-        
-        # Parse the response
-        content = response.choices[0].message.content
-        cards = parse_cards_from_output(content, note_type)
-        
-        # Add chunk reference to cards
-        for card in cards:
-            if card.source_ref is None:
-                card.source_ref = SourceReference(
-                    pdf_sha256=pdf_sha256 or "",
-                    chunk_id=chunk_id
-                )
-            else:
-                if pdf_sha256:
-                    card.source_ref.pdf_sha256 = pdf_sha256
-                card.source_ref.chunk_id = chunk_id
-        
-        return cards
-        
-    except RateLimitError as e:
-        error_msg = str(e)
+def report_chunk_error(error: BaseException, chunk_id: str) -> None:
+    """Show an error raised while generating cards for a chunk."""
+    if isinstance(error, RateLimitError):
+        error_msg = str(error)
         if "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
             st.error(f"**API Quota Exceeded** (chunk {chunk_id})\n\n"
                     f"You have exceeded your OpenAI API quota. Please check your billing and plan details.\n\n"
@@ -165,9 +101,12 @@ def generate_cards_from_chunk(
             st.warning(f"**Rate Limit Error** (chunk {chunk_id})\n\n"
                       f"Too many requests. Please wait a moment and try again.\n\n"
                       f"Error: {error_msg}")
-        return []
-    except APIError as e:
-        error_msg = str(e)
+    elif isinstance(error, (APIConnectionError, APITimeoutError)):
+        st.warning(f"**Connection Error** (chunk {chunk_id})\n\n"
+                  f"Failed to connect to the API. Please check your internet connection and try again.\n\n"
+                  f"Error: {str(error)}")
+    elif isinstance(error, APIError):
+        error_msg = str(error)
         if "model_not_found" in error_msg.lower():
             st.error(f"**Model Not Found** (chunk {chunk_id})\n\n"
                     f"The specified model does not exist or you don't have access to it.\n\n"
@@ -181,15 +120,8 @@ def generate_cards_from_chunk(
         else:
             st.error(f"**API Error** (chunk {chunk_id})\n\n"
                     f"Error: {error_msg}")
-        return []
-    except (APIConnectionError, APITimeoutError) as e:
-        st.warning(f"**Connection Error** (chunk {chunk_id})\n\n"
-                  f"Failed to connect to the API. Please check your internet connection and try again.\n\n"
-                  f"Error: {str(e)}")
-        return []
-    except Exception as e:
-        st.warning(f"**Error generating cards from chunk {chunk_id}**: {str(e)}")
-        return []
+    else:
+        st.warning(f"**Error generating cards from chunk {chunk_id}**: {str(error)}")
 
 
 def generate_anki_cards(
@@ -200,9 +132,15 @@ def generate_anki_cards(
     use_chunking: bool = True,
     pdf_sha256: Optional[str] = None,
     max_tokens_per_chunk: int = 2000,
+    max_concurrency: Optional[int] = None,
+    use_response_cache: bool = True,
+    deduplicate: bool = True,
+    skip_exported_cards: bool = False,
+    reuse_unchanged_sections: bool = True,
+    pack_chunks: bool = True,
 ) -> List[Card]:
     """
-    Generate Anki cards from markdown content using OpenAI API.
+    Generate Anki cards from markdown content with the card engine, reporting progress and errors in the UI.
     
     Args:
         markdown_content: The markdown content to generate cards from
@@ -212,156 +150,116 @@ def generate_anki_cards(
         use_chunking: Whether to use chunking-based processing (default: True)
         pdf_sha256: SHA256 hash of the source PDF (required if use_chunking=True)
         max_tokens_per_chunk: Maximum tokens per chunk (default: 2000)
+        max_concurrency: Maximum parallel LLM requests (default: LLM_MAX_CONCURRENCY or 4)
+        use_response_cache: Reuse stored responses for identical prompts (default: True)
+        deduplicate: Drop cards whose question duplicates another card of this
+            run (default: True)
+        skip_exported_cards: Also drop cards already exported earlier for the
+            same PDF (default: False)
+        reuse_unchanged_sections: Reuse the stored cards of chunks whose text
+            was seen before (e.g. in an earlier revision of the PDF) instead of
+            sending them to the LLM again (default: True)
+        pack_chunks: Send consecutive small chunks together in one request,
+            up to the model's context window (default: True)
     
     Returns:
         List of Card objects
     """
-    # Configure LLM endpoint
-    llm_base = os.getenv("LLM_API_BASE")
-    llm_model = os.getenv("LLM_MODEL", "llama-3.1-8b-instruct")
-    if llm_base:
-        # Use OpenAI-compatible endpoint (e.g., llama.cpp, vLLM)
-        openai.base_url = llm_base.rstrip("/")
-        openai.api_key = os.getenv("LLM_API_KEY", "no-key-required")
-        model_name = llm_model
-    else:
-        # Fallback to OpenAI
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            st.error("No LLM configured. Set LLM_API_BASE (for Llama) or OPENAI_API_KEY.")
-            return []
-        openai.api_key = api_key
-        # Use OPENAI_MODEL env var if set, otherwise default to gpt-5
-        model_name = os.getenv("OPENAI_MODEL", "gpt-5")
+    try:
+        llm = LLMConfig.from_env()
+    except LLMNotConfiguredError as e:
+        st.error(str(e))
+        return []
+    
+    options = GenerationOptions(
+        num_cards=num_cards,
+        card_type=card_type,
+        note_type=note_type,
+        use_chunking=use_chunking,
+        max_tokens_per_chunk=max_tokens_per_chunk,
+        max_concurrency=max_concurrency,
+        use_response_cache=use_response_cache,
+        deduplicate=deduplicate,
+        skip_exported_cards=skip_exported_cards,
+        reuse_unchanged_sections=reuse_unchanged_sections,
+        pack_chunks=pack_chunks,
+    )
+    
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    status_text.text("Processing chunks...")
     
-    # Use chunking-based approach if enabled
-    if use_chunking:
-        if not pdf_sha256:
-            st.warning("PDF SHA256 not provided. Falling back to non-chunking mode.")
-            use_chunking = False
+    def show_progress(completed: int, total: int) -> None:
+        status_text.text(f"Processed request {completed}/{total}...")
+        progress_bar.progress(completed / total)
     
-    if use_chunking:
-        # Process markdown: clean and chunk
-        cleaned_markdown, chunking_result = process_markdown_for_streamlit(
+    try:
+        result = generate_cards(
             markdown_content,
+            llm,
+            options,
             pdf_sha256=pdf_sha256,
-            max_tokens=max_tokens_per_chunk,
-            remove_images=False
+            should_cancel=lambda: st.session_state.cancel_generation,
+            on_progress=show_progress,
+            on_error=lambda chunk_id, error: report_chunk_error(error, chunk_id),
         )
-        
-        # Calculate cards per chunk
-        total_chunks = chunking_result.total_chunks
-        if total_chunks == 0:
-            st.warning("No chunks created from markdown content.")
-            return []
-        
-        cards_per_chunk = max(1, num_cards // total_chunks)
-        remaining_cards = num_cards
-        
-        all_cards: List[Card] = []
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Process each chunk
-        for i, chunk in enumerate(chunking_result.chunks):
-            if remaining_cards <= 0:
-                break
-            
-            # Check if generation was cancelled
-            if st.session_state.cancel_generation:
-                st.warning("Card generation cancelled by user.")
-                progress_bar.empty()
-                status_text.empty()
-                st.session_state.cancel_generation = False
-                st.session_state.generating = False
-                return all_cards[:num_cards] if all_cards else []
-            
-            status_text.text(f"Processing chunk {i+1}/{total_chunks}...")
-            progress_bar.progress((i + 1) / total_chunks)
-            
-            # Get semantic info for the chunk
-            semantic_info = get_semantic_info_for_chunk(chunk)
-            
-            # Generate cards from this chunk
-            chunk_cards = generate_cards_from_chunk(
-                chunk_text=chunk.text,
-                chunk_id=chunk.id,
-                num_cards_per_chunk=min(cards_per_chunk, remaining_cards),
-                card_type=card_type,
-                note_type=note_type,
-                model_name=model_name,
-                pdf_sha256=pdf_sha256,
-                semantic_info=semantic_info
-            )
-            
-            all_cards.extend(chunk_cards)
-            remaining_cards -= len(chunk_cards)
-        
+    except RateLimitError as e:
+        error_msg = str(e)
+        if "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
+            st.error("**API Quota Exceeded**\n\n"
+                    "You have exceeded your OpenAI API quota. Please check your billing and plan details.\n\n"
+                    "For more information: https://platform.openai.com/docs/guides/error-codes/api-errors")
+        else:
+            st.warning("**Rate Limit Error**\n\n"
+                      "Too many requests. Please wait a moment and try again.\n\n"
+                      f"Error: {error_msg}")
+        return []
+    except APIError as e:
+        error_msg = str(e)
+        if "model_not_found" in error_msg.lower():
+            st.error("**Model Not Found**\n\n"
+                    "The specified model does not exist or you don't have access to it.\n\n"
+                    f"Error: {error_msg}\n\n"
+                    "Please check your OPENAI_MODEL setting in .env file.")
+        elif "max_tokens" in error_msg.lower() or ("unsupported_parameter" in error_msg.lower() and "max_tokens" in error_msg.lower()):
+            st.error("**Unsupported Parameter**\n\n"
+                    "This model requires 'max_completion_tokens' instead of 'max_tokens'.\n\n"
+                    f"Error: {error_msg}\n\n"
+                    "Please update the code or use a different model.")
+        else:
+            st.error(f"**API Error**: {error_msg}")
+        return []
+    except (APIConnectionError, APITimeoutError) as e:
+        st.warning("**Connection Error**\n\n"
+                  "Failed to connect to the API. Please check your internet connection and try again.\n\n"
+                  f"Error: {str(e)}")
+        return []
+    except Exception as e:
+        st.error(f"**Error generating cards**: {str(e)}")
+        return []
+    finally:
         progress_bar.empty()
         status_text.empty()
-        
-        return all_cards[:num_cards]  # Limit to requested number
     
-    else:
-        # Original non-chunking approach
-        prompt_template = build_prompt(
-            note_type=note_type,
-            num_cards=num_cards,
-            content_focus=card_type,
-            markdown_content=markdown_content,
+    for warning in result.warnings:
+        st.warning(warning)
+    if result.reused_chunks:
+        st.info(
+            f"Reused cards for {result.reused_chunks} unchanged chunks; "
+            f"{result.total_chunks - result.reused_chunks} new or edited chunks went to the LLM."
         )
+    if result.requests < result.total_chunks - result.reused_chunks:
+        st.info(f"Packed {result.total_chunks - result.reused_chunks} chunks into {result.requests} LLM requests.")
+    if result.dropped_cards:
+        st.info(f"Skipped {result.dropped_cards} duplicate cards.")
+    
+    if result.cancelled:
+        st.warning("Card generation cancelled by user.")
+        st.session_state.cancel_generation = False
+        st.session_state.generating = False
+    
+    return result.cards
 
-        try:
-            # Call OpenAI API (without temperature parameter as default)
-            response = openai.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that creates educational flashcards."},
-                    {"role": "user", "content": prompt_template}
-                ],
-                max_completion_tokens=2000
-            )
-            
-            # Parse the response
-            content = response.choices[0].message.content
-            cards = parse_cards_from_output(content, note_type)
-            
-            return cards
-            
-        except RateLimitError as e:
-            error_msg = str(e)
-            if "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
-                st.error("**API Quota Exceeded**\n\n"
-                        "You have exceeded your OpenAI API quota. Please check your billing and plan details.\n\n"
-                        "For more information: https://platform.openai.com/docs/guides/error-codes/api-errors")
-            else:
-                st.warning("**Rate Limit Error**\n\n"
-                          "Too many requests. Please wait a moment and try again.\n\n"
-                          f"Error: {error_msg}")
-            return []
-        except APIError as e:
-            error_msg = str(e)
-            if "model_not_found" in error_msg.lower():
-                st.error("**Model Not Found**\n\n"
-                        "The specified model does not exist or you don't have access to it.\n\n"
-                        f"Error: {error_msg}\n\n"
-                        "Please check your OPENAI_MODEL setting in .env file.")
-            elif "max_tokens" in error_msg.lower() or ("unsupported_parameter" in error_msg.lower() and "max_tokens" in error_msg.lower()):
-                st.error("**Unsupported Parameter**\n\n"
-                        "This model requires 'max_completion_tokens' instead of 'max_tokens'.\n\n"
-                        f"Error: {error_msg}\n\n"
-                        "Please update the code or use a different model.")
-            else:
-                st.error(f"**API Error**: {error_msg}")
-            return []
-        except (APIConnectionError, APITimeoutError) as e:
-            st.warning("**Connection Error**\n\n"
-                      "Failed to connect to the API. Please check your internet connection and try again.\n\n"
-                      f"Error: {str(e)}")
-            return []
-        except Exception as e:
-            st.error(f"**Error generating cards**: {str(e)}")
-            return []
 
 
 def main():
@@ -417,6 +315,42 @@ def main():
             value=2000,
             help="Maximum tokens per chunk (affects chunk size)"
         )
+        max_concurrency = st.number_input(
+            "Parallel LLM requests",
+            min_value=1,
+            max_value=32,
+            value=limits_from_env()[0],
+            help="How many chunks are sent to the LLM at the same time (LLM_MAX_CONCURRENCY)"
+        )
+        use_response_cache = st.checkbox(
+            "Reuse cached LLM responses",
+            value=True,
+            help="Answer identical prompts from outputs/llm_cache.sqlite3 instead of calling the API again"
+        )
+        reuse_unchanged_sections = st.checkbox(
+            "Reuse cards of unchanged sections",
+            value=True,
+            help="When a revised PDF is uploaded, chunks whose text is unchanged keep their earlier cards "
+                 "(outputs/chunk_cards.sqlite3); only new or edited chunks are sent to the LLM"
+        )
+        pack_chunks = st.checkbox(
+            "Pack small chunks into one request",
+            value=True,
+            help="Send consecutive small chunks (e.g. slides) together, as many as fit the model's "
+                 "context window (LLM_CONTEXT_TOKENS, default 8192), instead of one request per chunk"
+        )
+        deduplicate = st.checkbox(
+            "Skip duplicate cards",
+            value=True,
+            help="Drop cards whose question repeats another card of this run"
+        )
+        skip_exported_cards = st.checkbox(
+            "Only add cards not exported before",
+            value=False,
+            disabled=not deduplicate,
+            help="Also drop cards already in a deck exported earlier for the same PDF "
+                 "(outputs/card_index.sqlite3), so the new deck only holds additions"
+        )
         
         # LLM configuration (OpenAI-compatible or OpenAI)
         st.subheader("LLM API")
@@ -455,11 +389,13 @@ def main():
             st.json(file_details)
             
             # Convert button
-            # Compute PDF hash to prevent duplicate conversions
-            uploaded_file.seek(0)  # Reset file pointer
-            pdf_content = uploaded_file.read()
-            pdf_hash = hashlib.sha256(pdf_content).hexdigest()
-            uploaded_file.seek(0)  # Reset again for later use
+            # Compute PDF hash to prevent duplicate conversions. Streamlit reruns
+            # this script on every interaction, so hash each upload only once.
+            upload_key = (getattr(uploaded_file, "file_id", None), uploaded_file.name, uploaded_file.size)
+            if st.session_state.get('upload_hash_key') != upload_key:
+                st.session_state.upload_hash_key = upload_key
+                st.session_state.upload_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+            pdf_hash = st.session_state.upload_hash
             
             # Check if this PDF is already being converted
             is_same_pdf_converting = (
@@ -484,24 +420,23 @@ def main():
                     try:
                         # Save uploaded file temporarily
                         with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                            tmp_file.write(pdf_content)
+                            tmp_file.write(uploaded_file.getbuffer())
                             tmp_path = Path(tmp_file.name)
                         
                         # Create session output directory in outputs folder
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        # Truncate filename to avoid filesystem length limits (especially on encrypted FS)
-                        pdf_name_safe = Path(uploaded_file.name).stem.replace(" ", "_")[:50]
-                        session_dir_name = f"{timestamp}_{pdf_name_safe}"
                         outputs_root = Path("outputs")
-                        session_output_dir = outputs_root / session_dir_name
-                        session_output_dir.mkdir(parents=True, exist_ok=True)
+                        session_output_dir = session_dir_for(Path(uploaded_file.name), outputs_root, pdf_hash)
                         
-                        # Convert PDF to Markdown (using temporary directory first)
-                        temp_output_root = Path(tempfile.mkdtemp())
+                        # Convert PDF to Markdown. Conversions are kept under
+                        # outputs/conversions/<sha256>/ so re-uploading the same PDF
+                        # is served from the conversion cache.
                         result = convert_pdf_to_markdown(
                             pdf_path=tmp_path,
                             api_base_url=marker_api_url,
-                            output_root=temp_output_root
+                            output_root=outputs_root,
+                            streaming=True,
+                            client=get_marker_client(marker_api_url),
+                            source_sha256=pdf_hash,
                         )
                         
                         # Copy conversion results to session output directory
@@ -537,9 +472,8 @@ def main():
                         st.session_state.session_output_dir = session_output_dir
                         st.session_state.conversion_done = True
                         
-                        # Clean up temp PDF and temp output directory
+                        # Clean up temp PDF
                         os.unlink(tmp_path)
-                        shutil.rmtree(temp_output_root, ignore_errors=True)
                         
                         st.success("✅ PDF converted successfully!")
                         if pdf_sha256:
@@ -568,13 +502,9 @@ def main():
                 markdown_text = md_bytes.decode("utf-8", errors="replace")
                 
                 # Prepare session output directory
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                # Truncate filename to avoid filesystem length limits
-                md_name_safe = Path(uploaded_md.name).stem.replace(" ", "_")[:50]
-                session_dir_name = f"{timestamp}_{md_name_safe}"
-                outputs_root = Path("outputs")
-                session_output_dir = outputs_root / session_dir_name
-                session_output_dir.mkdir(parents=True, exist_ok=True)
+                session_output_dir = session_dir_for(
+                    Path(uploaded_md.name), Path("outputs"), hashlib.sha256(md_bytes).hexdigest()
+                )
                 
                 # Save markdown to standardized filename to align with downstream logic
                 final_markdown_path = session_output_dir / "converted.md"
@@ -589,7 +519,7 @@ def main():
                             {
                                 "source_type": "markdown",
                                 "original_filename": uploaded_md.name,
-                                "created_at": timestamp,
+                                "created_at": datetime.now().strftime("%Y%m%d_%H%M%S"),
                                 "source_sha256": None
                             },
                             meta_f,
@@ -661,7 +591,7 @@ def main():
                 st.session_state.cancel_generation = False
                 st.session_state.generating = True
                 
-                with st.spinner(f"Generating {num_cards} Anki cards..."):
+                with st.spinner(f"Generating {num_cards} Anki cards..."), recording() as recorder:
                     cards = generate_anki_cards(
                         st.session_state.markdown_content,
                         num_cards=num_cards,
@@ -670,7 +600,16 @@ def main():
                         use_chunking=use_chunking,
                         pdf_sha256=st.session_state.pdf_sha256,
                         max_tokens_per_chunk=max_tokens_per_chunk,
+                        max_concurrency=max_concurrency,
+                        use_response_cache=use_response_cache,
+                        deduplicate=deduplicate,
+                        skip_exported_cards=skip_exported_cards,
+                        reuse_unchanged_sections=reuse_unchanged_sections,
+                        pack_chunks=pack_chunks,
                     )
+                    if st.session_state.session_output_dir:
+                        # Stage timings of this run (cleaning, chunking, prompts, LLM calls, parsing)
+                        write_instrumentation(st.session_state.session_output_dir / "processing_result.json", recorder)
                     
                     # Reset generating flag
                     st.session_state.generating = False
@@ -684,11 +623,17 @@ def main():
                             tsv_lines.append(card.to_tsv_row())
                         st.session_state.tsv_content = "\n".join(tsv_lines)
                         
-                        # Save TSV file to session output directory
+                        # Save the TSV and the native Anki package (importable without
+                        # field mapping) to the session output directory
                         if st.session_state.session_output_dir:
-                            tsv_path = st.session_state.session_output_dir / "anki_cards.tsv"
-                            with open(tsv_path, 'w', encoding='utf-8') as f:
-                                f.write(st.session_state.tsv_content)
+                            deck_name = Path(uploaded_file.name).stem if uploaded_file is not None else DEFAULT_DECK_NAME
+                            exports = export_deck(
+                                cards,
+                                st.session_state.session_output_dir,
+                                deck_name=deck_name,
+                                pdf_sha256=st.session_state.pdf_sha256,
+                            )
+                            st.session_state.apkg_path = exports.apkg_path
                         
                         # Generate and save prompt script to session output directory
                         if st.session_state.session_output_dir and st.session_state.markdown_path:
@@ -704,6 +649,12 @@ def main():
                             os.chmod(prompt_script_path, 0o755)  # Make executable
                         
                         st.success(f"✅ Generated {len(cards)} cards successfully!")
+                        if use_response_cache:
+                            cache_stats = get_llm_cache().stats()
+                            st.caption(
+                                f"LLM response cache: {cache_stats['hits']} hits, "
+                                f"{cache_stats['misses']} misses, {cache_stats['entries']} stored responses"
+                            )
                         if st.session_state.session_output_dir:
                             st.info(f"Files saved to: {st.session_state.session_output_dir}")
                     else:
@@ -758,6 +709,15 @@ def main():
                     file_name=tsv_download_name,
                     mime="text/tab-separated-values"
                 )
+            apkg_path = st.session_state.apkg_path
+            if apkg_path and Path(apkg_path).exists():
+                with open(apkg_path, 'rb') as apkg_file:
+                    st.download_button(
+                        label="🗂️ Download Anki deck (.apkg)",
+                        data=apkg_file,
+                        file_name=f"{Path(tsv_download_name).stem}.apkg" if st.session_state.tsv_content else "anki_cards.apkg",
+                        mime="application/octet-stream"
+                    )
     
     # Instructions
     with st.expander("📖 How to use"):
@@ -766,8 +726,8 @@ def main():
         2. **Convert to Markdown**: Click the "Convert to Markdown" button
         3. **Or upload an existing Markdown**: Use the "Upload Markdown" uploader to skip the PDF conversion
         3. **Generate Cards**: Once converted, click "Generate Anki Cards"
-        4. **Download Results**: Download the Markdown file and/or TSV file
-        5. **Import to Anki**:
+        4. **Download Results**: Download the Markdown file, the Anki deck (.apkg) and/or the TSV file
+        5. **Import to Anki**: Double-click the .apkg file (or File → Import it), or import the TSV:
            - Open Anki Desktop
            - Go to File → Import
            - Select the downloaded TSV file
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+import card_dedup
+import chunk_cards
+import file_fingerprint
+import llm_cache
+
+# Environment variable and module holding each process-wide store
+STORES = [
+    ("CARD_INDEX_PATH", card_dedup, "_default_store"),
+    ("CHUNK_CARD_STORE_PATH", chunk_cards, "_default_store"),
+    ("FINGERPRINT_DB_PATH", file_fingerprint, "_default_store"),
+    ("LLM_CACHE_PATH", llm_cache, "_default_cache"),
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path_factory, monkeypatch):
+    """Point every process-wide store at a fresh directory, never at outputs/ or ~/.cache."""
+    root = tmp_path_factory.mktemp("stores")
+    for variable, module, attribute in STORES:
+        monkeypatch.setenv(variable, str(root / f"{variable.lower()}.sqlite3"))
+        monkeypatch.setattr(module, attribute, None)
@@ -6,7 +6,13 @@ ROOT = Path(__file__).resolve().parents[1]
 SRC = ROOT / "src"
 sys.path.insert(0, str(SRC))
 
-from anki_core import build_output_instructions, build_prompt, parse_cards_from_output
+from anki_core import (
+    build_output_instructions,
+    build_packed_prompt,
+    build_prompt,
+    parse_cards_from_output,
+    parse_packed_cards_from_output,
+)
 from pdf2anki_types import Card
 
 
@@ -22,12 +28,12 @@ def test_build_output_instructions_cloze():
     assert "Question:" not in txt
 
 
-def test_build_prompt_contains_focus_and_content_truncation():
-    content = "X" * 10000
+def test_build_prompt_contains_focus_and_full_content():
+    content = "X" * 10000 + "END"
     prompt = build_prompt("basic", 5, "mixed", content)
     assert "key concepts" in prompt
-    # truncated
-    assert len(prompt) < 6000
+    # not truncated; callers keep content within the context window
+    assert prompt.rstrip().endswith(content)
 
 
 def test_parse_basic_cards_from_output():
@@ -53,4 +59,23 @@ def test_parse_cloze_cards_from_output():
     assert cards[0].note_type == "cloze"
 
 
+def test_packed_prompt_delimits_sections_and_parses_back():
+    prompt = build_packed_prompt("basic", "definitions", [("Alpha text", 2), ("Beta text", 1)])
+    assert "SECTION 1: exactly 2 flashcards" in prompt and "SECTION 2: exactly 1 flashcards" in prompt
+    assert prompt.index("=== SECTION 1 ===\nAlpha text") < prompt.index("=== SECTION 2 ===\nBeta text")
 
+    # Sections out of order, with markdown decoration, preamble and a skipped section
+    output = (
+        "Here are the cards:\n"
+        "### === SECTION 2 ===\n1. Question: What is beta?\n   Answer: B\n\n"
+        "=== SECTION 1 ===\n1. Question: What is alpha?\n   Answer: A\n\n"
+        "2. Question: Alpha again?\n   Answer: A2\n"
+    )
+    cards = parse_packed_cards_from_output(output, "basic", 3)
+    assert [[c.question for c in section] for section in cards] == [
+        ["What is alpha?", "Alpha again?"],
+        ["What is beta?"],
+        [],
+    ]
+    # A reply without markers belongs to the first section
+    assert len(parse_packed_cards_from_output("1. Question: Q?\n   Answer: A", "basic", 2)[0]) == 1
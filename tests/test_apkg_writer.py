@@ -0,0 +1,71 @@
+import json
+import sqlite3
+import sys
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from apkg_writer import BASIC_MODEL_ID, CLOZE_MODEL_ID, iter_tsv_cards, write_apkg
+from pdf2anki_types import Card, SourceReference
+
+
+def _open_collection(apkg_path, tmp_path):
+    with zipfile.ZipFile(apkg_path) as archive:
+        assert sorted(archive.namelist()) == ["collection.anki2", "media"]
+        assert archive.read("media") == b"{}"
+        archive.extract("collection.anki2", tmp_path)
+    return sqlite3.connect(str(tmp_path / "collection.anki2"))
+
+
+def _cards():
+    source = SourceReference(pdf_sha256="abc", chunk_id="chunk_0001")
+    yield Card(question="What is <b>entropy</b>?", answer="Uncertainty", tags=["info theory", "ml"], source_ref=source)
+    yield Card(question="{{c1::Entropy}} is measured in {{c2::bits}}", answer="", note_type="cloze",
+               extra="Shannon", source_ref=source)
+    yield Card(question="What is entropy?", answer="Without markup", source_ref=source)
+    yield Card(question="What is <b>entropy</b>?", answer="Same source and question", source_ref=source)
+
+
+def test_basic_and_cloze_notes_are_written_in_batches(tmp_path):
+    result = write_apkg(_cards(), tmp_path / "out" / "deck.apkg", deck_name="Lecture 1", batch_size=2)
+    assert (result.notes, result.cards, result.skipped) == (3, 4, 1)
+
+    conn = _open_collection(result.path, tmp_path)
+    notes = conn.execute("SELECT id, mid, flds, sfld, tags FROM notes ORDER BY id").fetchall()
+    assert [(mid, flds.split("\x1f")) for _, mid, flds, _, _ in notes] == [
+        (BASIC_MODEL_ID, ["What is <b>entropy</b>?", "Uncertainty"]),
+        (CLOZE_MODEL_ID, ["{{c1::Entropy}} is measured in {{c2::bits}}", "Shannon"]),
+        (BASIC_MODEL_ID, ["What is entropy?", "Without markup"]),
+    ]
+    assert notes[0][3] == "What is entropy?" and notes[0][4] == " info_theory ml "
+    cloze_id = notes[1][0]
+    assert [o for (o,) in conn.execute("SELECT ord FROM cards WHERE nid = ? ORDER BY ord", (cloze_id,))] == [0, 1]
+
+    models, decks = (json.loads(v) for v in conn.execute("SELECT models, decks FROM col").fetchone())
+    assert models[str(CLOZE_MODEL_ID)]["type"] == 1
+    assert [f["name"] for f in models[str(BASIC_MODEL_ID)]["flds"]] == ["Front", "Back"]
+    assert "Lecture 1" in [d["name"] for d in decks.values()]
+    (deck_id,) = conn.execute("SELECT DISTINCT did FROM cards").fetchone()
+    assert decks[str(deck_id)]["name"] == "Lecture 1"
+
+
+def test_guids_are_stable_across_exports(tmp_path):
+    first = write_apkg(_cards(), tmp_path / "a.apkg")
+    second = write_apkg(_cards(), tmp_path / "b.apkg")
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    guids = [
+        [g for (g,) in _open_collection(result.path, tmp_path / name).execute("SELECT guid FROM notes ORDER BY id")]
+        for result, name in ((first, "a"), (second, "b"))
+    ]
+    assert guids[0] == guids[1] and len(set(guids[0])) == 3
+
+
+def test_tsv_rows_round_trip(tmp_path):
+    tsv = tmp_path / "cards.tsv"
+    cards = [Card(question="{{c1::Q}}", answer="", note_type="cloze", extra="E", tags=["a", "b"])]
+    tsv.write_text("\n".join(c.to_tsv_row() for c in cards) + "\n\n", encoding="utf-8")
+    assert list(iter_tsv_cards(tsv, "cloze")) == cards
@@ -0,0 +1,99 @@
+import base64
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from batch_convert import BatchItemResult, find_pdfs, summarize
+
+
+def test_summary_reports_throughput_and_latency_percentiles():
+    results = [
+        BatchItemResult(source_path=f"{i}.pdf", status="converted", size_bytes=1024 * 1024, pages=10, latency_sec=float(i))
+        for i in range(1, 21)
+    ]
+    results.append(BatchItemResult(source_path="c.pdf", status="cached", size_bytes=5, pages=3))
+    results.append(BatchItemResult(source_path="f.pdf", status="failed", error="boom"))
+
+    summary = summarize(results, elapsed_sec=10.0)
+
+    assert (summary.files, summary.converted, summary.cached, summary.failed) == (22, 20, 1, 1)
+    assert summary.pages_per_sec == 20.0 and summary.mb_per_sec == 2.0
+    assert summary.latency_p50_sec == 10.0 and summary.latency_p95_sec == 19.0
+    assert "results" not in summary.to_dict()
+
+
+def test_find_pdfs_walks_subdirectories(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ["b.pdf", "a.PDF", "sub/c.pdf", "notes.txt"]:
+        (tmp_path / name).write_bytes(b"%PDF")
+
+    assert [p.relative_to(tmp_path).as_posix() for p in find_pdfs(tmp_path)] == ["a.PDF", "b.pdf", "sub/c.pdf"]
+    assert len(find_pdfs(tmp_path, recursive=False)) == 2
+
+
+def test_convert_directory_streams_results_and_skips_cached(tmp_path):
+    pytest.importorskip("aiohttp")
+    from batch_convert import convert_directory
+
+    lock = threading.Lock()
+    state = {"posts": 0, "active": 0, "peak": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            with lock:
+                state["posts"] += 1
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                first = state["posts"] == 1
+            self.rfile.read(int(self.headers["Content-Length"]))
+            if first:
+                status, body, extra = 503, b"busy", {"Retry-After": "0"}
+            else:
+                status, extra = 200, {"Content-Type": "application/json"}
+                body = json.dumps({
+                    "status": "Success",
+                    "result": {"markdown": "# Converted\n", "images": {"0_image_0.png": base64.b64encode(b"png").decode()}},
+                }).encode()
+            self.send_response(status)
+            for name, value in {"Content-Length": str(len(body)), **extra}.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            with lock:
+                state["active"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    input_dir = tmp_path / "pdfs"
+    input_dir.mkdir()
+    for i in range(5):
+        (input_dir / f"doc{i}.pdf").write_bytes(f"%PDF-1.4 document {i}".encode())
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        api = f"http://127.0.0.1:{server.server_port}"
+        first = convert_directory(input_dir, api, tmp_path / "out", max_concurrency=2)
+        second = convert_directory(input_dir, api, tmp_path / "out", max_concurrency=2)
+    finally:
+        server.shutdown()
+
+    assert first.converted == 5 and first.failed == 0
+    assert state["posts"] == 6 and state["peak"] <= 2
+    assert first.latency_p95_sec is not None
+    for result in first.results:
+        conv_dir = Path(result.markdown_path).parent
+        assert Path(result.markdown_path).read_text(encoding="utf-8") == "# Converted\n"
+        assert (conv_dir / "images" / "0_image_0.png").read_bytes() == b"png"
+    assert second.cached == 5 and second.converted == 0
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from run_benchmarks import compare, parse_size, run_benchmarks
+from synthetic import generate_markdown, generate_model_output
+
+
+def test_synthetic_documents_are_deterministic_and_marker_like():
+    text = generate_markdown(20 * 1024)
+    assert text == generate_markdown(20 * 1024)
+    assert len(text.encode("utf-8")) >= 20 * 1024
+    for marker in ["# Chapter", "$$", "| Method |", "![](_page_", "**"]:
+        assert marker in text
+    assert generate_model_output(3).count("Question:") == 3
+
+
+def test_runner_reports_every_benchmark_and_compares_runs():
+    assert parse_size("10KB") == 10 * 1024 and parse_size("1.5MB") == 1536 * 1024 and parse_size("123") == 123
+
+    document = run_benchmarks(["4KB"], repeat=1, log=lambda line: None)
+    names = [r["name"] for r in document["results"]]
+    assert names == [
+        "clean_markdown", "chunk_markdown", "identify_semantic_structures", "parse_cards_from_output",
+        "card_to_tsv_row", "process_conversion_streaming", "end_to_end",
+    ]
+    assert all(r["median_sec"] >= 0 and r["size"] == "4KB" for r in document["results"])
+    assert document["environment"]["tokenizer"] in ("tiktoken", "approximate")
+
+    rows = compare(document, document)
+    assert len(rows) == len(names) and all(row["ratio"] == 1.0 for row in rows if row["baseline_sec"])
@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from card_dedup import CardIndex, CardIndexStore, fingerprint, normalize_question
+from pdf2anki_types import Card
+
+
+def test_normalization_ignores_markup_delimiters_and_case():
+    assert normalize_question(r"What does  \(E = mc^2\) <b>relate</b>?") == "what does e = mc ^ 2 relate"
+    assert normalize_question("What does $E=mc^2$ relate") == "what does e = mc ^ 2 relate"
+    assert normalize_question("The {{c1::mitochondria::organelle}} is the POWERHOUSE.") == (
+        "the mitochondria is the powerhouse"
+    )
+    assert fingerprint("What is entropy?") == fingerprint("  what is ENTROPY ")
+
+
+def test_different_math_is_not_a_duplicate():
+    for a, b in [("$x^2$", "$x_2$"), ("2+3", "2*3"), ("$a<b$", "$a>b$"), ("3.14", "314")]:
+        assert fingerprint(f"What is {a}?")[0] != fingerprint(f"What is {b}?")[0]
+
+    # Long questions whose SimHashes are close still differ in their formula
+    base = "In the lecture example about the quadratic growth of the loss, what is the value of {} when x equals three?"
+    index = CardIndex()
+    index.add(base.format("$x^2$"))
+    assert index.lookup(base.format("$x_2$")) is None
+    assert index.lookup(base.format("$y^2$")) is None
+    assert index.lookup(base.format(r"\(x^2\)")) == base.format("$x^2$")
+
+
+def test_index_drops_duplicates_within_a_run():
+    index = CardIndex()
+    cards = [
+        Card(question="What is the entropy of a fair coin?", answer="1 bit"),
+        Card(question="what is the **entropy** of a fair coin", answer="One bit"),
+        Card(question="What is the derivative of sin x?", answer="cos x"),
+        Card(question="What is the derivative of cos x?", answer="-sin x"),
+    ]
+    kept = index.filter(cards)
+    assert [c.answer for c in kept] == ["1 bit", "cos x", "-sin x"]
+    assert index.duplicates == 1 and len(index) == 3
+    assert index.lookup("WHAT IS THE ENTROPY OF A FAIR COIN") == "What is the entropy of a fair coin?"
+
+
+def test_near_duplicates_are_found_through_simhash_bands():
+    base = "Explain how the backpropagation algorithm computes the gradient of the loss for each weight in a deep network"
+    index = CardIndex()
+    index.add(base)
+    assert fingerprint(base + " formally")[0] != fingerprint(base)[0]
+    assert index.lookup(base + " formally") == base
+    assert index.lookup(base + " briefly") is None
+    assert CardIndex(max_distance=0).lookup(base) is None
+
+
+def test_store_persists_cards_per_pdf(tmp_path):
+    path = tmp_path / "index.sqlite3"
+    store = CardIndexStore(path)
+    assert store.save("pdf-a", [Card(question="What is entropy?", answer="a")]) == 1
+    assert store.save("pdf-a", [Card(question="what is entropy", answer="b")]) == 0
+    store.close()
+
+    reopened = CardIndexStore(path)
+    assert reopened.load("pdf-a").filter([Card(question="What is ENTROPY?", answer="c")]) == []
+    assert len(reopened.load("pdf-b")) == 0
+    assert reopened.stats()["entries"] == 1
+    assert reopened.forget("pdf-a") == 1 and len(reopened.load("pdf-a")) == 0
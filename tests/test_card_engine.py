@@ -0,0 +1,173 @@
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+import card_engine
+from card_engine import GenerationOptions, LLMConfig, LLMNotConfiguredError, export_deck, generate_cards
+from pdf2anki import collect_pdfs
+
+
+def _fake_llm(monkeypatch, prompts):
+    def complete(prompt, llm, rate_limiter=None, response_cache=None):
+        prompts.append(prompt)
+        if "=== SECTION 1 ===" in prompt:
+            # Packed prompt: answer every section under its marker
+            counts = re.findall(r"SECTION (\d+): exactly (\d+)", prompt)
+            return "\n".join(
+                f"=== SECTION {k} ===\n" + "\n\n".join(
+                    f"{i + 1}. Question: Slide question {len(prompts)}.{k}.{i}?\n   Answer: A" for i in range(int(n))
+                )
+                for k, n in counts
+            )
+        n = int(prompt.split("Generate exactly ")[1].split()[0])
+        # The first question repeats in every reply
+        return "\n\n".join(
+            f"{i + 1}. Question: {'What is shared?' if i == 0 else f'Question {len(prompts)}.{i}?'}\n   Answer: A"
+            for i in range(n)
+        )
+    monkeypatch.setattr(card_engine, "complete_prompt", complete)
+
+
+def test_engine_has_no_ui_dependency():
+    code = "import sys; sys.path.insert(0, 'src'); import card_engine, pdf2anki; print('streamlit' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_llm_config_from_env(monkeypatch):
+    for name in ("LLM_API_BASE", "LLM_MODEL", "LLM_API_KEY", "OPENAI_API_KEY", "OPENAI_MODEL"):
+        monkeypatch.delenv(name, raising=False)
+    with pytest.raises(LLMNotConfiguredError):
+        LLMConfig.from_env()
+    monkeypatch.setenv("LLM_API_BASE", "http://localhost:8000/v1/")
+    assert LLMConfig.from_env() == LLMConfig("llama-3.1-8b-instruct", "http://localhost:8000/v1", "no-key-required")
+
+
+def test_generate_cards_chunks_deduplicates_and_reports(monkeypatch, tmp_path):
+    prompts = []
+    _fake_llm(monkeypatch, prompts)
+    markdown = "\n\n".join(f"# Part {i}\n\n" + f"Part {i} covers topic {i}. " * 40 for i in range(4))
+    progress = []
+    options = GenerationOptions(num_cards=8, use_response_cache=False, reuse_unchanged_sections=False, pack_chunks=False)
+
+    result = generate_cards(markdown, LLMConfig("m"), options, pdf_sha256="sha", on_progress=lambda *p: progress.append(p))
+    assert result.total_chunks == len(prompts) == 4
+    assert [c.question for c in result.cards].count("What is shared?") == 1
+    assert result.dropped_cards == 3
+    assert len(result.cards) == 5 and progress[-1] == (4, 4)
+    assert {c.source_ref.pdf_sha256 for c in result.cards} == {"sha"}
+
+    fallback = generate_cards(markdown, LLMConfig("m"), options)
+    assert fallback.warnings == ["PDF SHA256 not provided. Falling back to non-chunking mode."]
+    assert fallback.total_chunks == 0 and len(fallback.cards) == 8
+
+    exports = export_deck(result.cards, tmp_path / "deck", deck_name="Deck", pdf_sha256="sha")
+    assert exports.apkg_path.exists()
+    assert exports.tsv_path.read_text(encoding="utf-8").count("\n") == 4
+
+
+def test_regeneration_only_skips_exported_cards_on_request(monkeypatch, tmp_path):
+    _fake_llm(monkeypatch, [])
+    markdown = "# Part\n\n" + "The part covers one topic. " * 40
+    options = GenerationOptions(num_cards=3, use_response_cache=False, reuse_unchanged_sections=False)
+
+    first = generate_cards(markdown, LLMConfig("m"), options, pdf_sha256="sha")
+    # Generating alone remembers nothing, so a regeneration is complete again
+    assert len(generate_cards(markdown, LLMConfig("m"), options, pdf_sha256="sha").cards) == 3
+
+    export_deck(first.cards[:1], tmp_path / "deck", pdf_sha256="sha")
+    options.skip_exported_cards = True
+    again = generate_cards(markdown, LLMConfig("m"), options, pdf_sha256="sha")
+    # The exported question is skipped, the questions of the new reply are kept
+    assert "What is shared?" not in [c.question for c in again.cards]
+    assert again.cards and again.dropped_cards == 1 and not again.warnings
+
+
+def test_generate_cards_packs_small_chunks(monkeypatch):
+    prompts = []
+    _fake_llm(monkeypatch, prompts)
+    markdown = "\n\n".join(f"# Slide {i}\n\nSlide {i} introduces term number {i}." for i in range(60))
+    options = GenerationOptions(num_cards=60, use_response_cache=False, deduplicate=False)
+
+    result = generate_cards(markdown, LLMConfig("m"), options, pdf_sha256="sha")
+    # 60 one-card chunks, at most 20 cards per reply
+    assert result.total_chunks == 60 and result.requests == len(prompts) == 3
+    assert len(result.cards) == 60
+    assert [c.source_ref.chunk_id for c in result.cards] == [f"chunk_{i:04d}" for i in range(1, 61)]
+    assert "Slide 0 introduces" in prompts[0] and "Slide 19 introduces" in prompts[0]
+
+    # Cards of packed chunks are stored per chunk, so an unchanged rerun sends nothing
+    again = generate_cards(markdown, LLMConfig("m"), options, pdf_sha256="sha")
+    assert again.reused_chunks == 60 and again.requests == 0 and len(prompts) == 3
+    assert [c.question for c in again.cards] == [c.question for c in result.cards]
+
+    # A small context window splits the packs further
+    tight = GenerationOptions(num_cards=60, use_response_cache=False, deduplicate=False,
+                              reuse_unchanged_sections=False, context_tokens=2800)
+    assert generate_cards(markdown, LLMConfig("m"), tight, pdf_sha256="sha").requests > 3
+
+
+def test_session_dirs_of_same_named_pdfs_do_not_collide(tmp_path):
+    dirs = [
+        card_engine.session_dir_for(tmp_path / "week1" / "lecture.pdf", tmp_path / "out", "aaaa" * 16),
+        card_engine.session_dir_for(tmp_path / "week2" / "lecture.pdf", tmp_path / "out", "bbbb" * 16),
+        card_engine.session_dir_for(tmp_path / "week2" / "lecture.pdf", tmp_path / "out", "bbbb" * 16),
+    ]
+    assert len(set(dirs)) == 3 and all(d.is_dir() for d in dirs)
+    assert dirs[0].name.endswith("_lecture_aaaaaaaa")
+
+
+def test_collect_pdfs_expands_directories(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("b.pdf", "a.PDF", "sub/c.pdf", "notes.txt"):
+        (tmp_path / name).write_bytes(b"%PDF")
+    assert [p.name for p in collect_pdfs([tmp_path])] == ["a.PDF", "b.pdf", "c.pdf"]
+    assert [p.name for p in collect_pdfs([tmp_path / "b.pdf", tmp_path], recursive=False)] == ["b.pdf", "a.PDF"]
+
+
+def test_cli_runs_pdfs_end_to_end(tmp_path, monkeypatch):
+    pytest.importorskip("openai")
+    pytest.importorskip("multipart")
+    sys.path.insert(0, str(ROOT / "benchmarks"))
+    sys.path.insert(0, str(ROOT / "tests"))
+    from load_test import write_test_pdf
+    from mock_servers import MockLLMConfig, MockMarkerConfig, create_llm_app, create_marker_app
+    from test_load_test import _serve
+
+    import pdf2anki
+
+    servers = [_serve(create_marker_app(MockMarkerConfig(latency_sec=0))), _serve(create_llm_app(MockLLMConfig(latency_sec=0)))]
+    (_, _, marker_url), (_, _, llm_url) = servers
+    (tmp_path / "in").mkdir()
+    try:
+        for i in range(3):
+            write_test_pdf(tmp_path / "in" / f"doc{i}.pdf", pages=2 + i, title=f"Doc {i}")
+        monkeypatch.setenv("LLM_API_BASE", llm_url + "/v1")
+        summary_path = tmp_path / "summary.json"
+        code = pdf2anki.main([
+            str(tmp_path / "in"), "--api", marker_url, "--outdir", str(tmp_path / "out"),
+            "--num-cards", "6", "--jobs", "3", "--summary", str(summary_path), "--no-response-cache",
+            "--pages-per-shard", "3",
+        ])
+    finally:
+        for server, thread, _ in servers:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    assert code == 0
+    summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    assert summary["ok"] == 3 and summary["cards"] > 0
+    assert all(Path(d["apkg_path"]).exists() for d in summary["results"])
+    # Only the 4-page PDF is longer than a shard and goes through the pipeline
+    reports = [json.loads((Path(d["session_dir"]) / "processing_result.json").read_text(encoding="utf-8"))
+               for d in summary["results"]]
+    assert ["pipeline" in r for r in reports] == [False, False, True]
+    assert [s["name"] for s in reports[2]["pipeline"]["stages"]] == ["convert", "clean", "chunk"]
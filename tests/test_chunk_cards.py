@@ -0,0 +1,71 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from chunk_cards import (
+    ChunkCardStore,
+    chunk_text_sha256,
+    diff_chunk_files,
+    generation_settings_key,
+    plan_regeneration,
+    reuse_unchanged_chunks,
+)
+from concurrent_generation import generate_cards_concurrently
+from markdown_processor_wrapper import process_markdown_for_streamlit
+from pdf2anki_types import Card
+
+
+def _document(edited_section=None):
+    sections = []
+    for i in range(8):
+        body = f"Section {i} explains concept {i} in detail. " * 20
+        if i == edited_section:
+            body += "A sentence added in the revised slides."
+        sections.append(f"# Section {i}\n\n{body}")
+    return "\n\n".join(sections)
+
+
+def test_only_edited_chunks_reach_the_llm(tmp_path):
+    store = ChunkCardStore(tmp_path / "chunk_cards.sqlite3")
+    settings = generation_settings_key("m", "basic", "mixed")
+    calls = []
+
+    def llm(chunk, n):
+        calls.append(chunk.text)
+        return [Card(question=f"{chunk.id} q{i}", answer=chunk.text[:20], source_ref=chunk.source_ref) for i in range(n)]
+
+    def run(markdown, pdf_sha256):
+        _, result = process_markdown_for_streamlit(markdown, pdf_sha256=pdf_sha256, max_tokens=1000)
+        generate = reuse_unchanged_chunks(llm, store, settings)
+        outcome = generate_cards_concurrently(result.chunks, generate, num_cards=16, cards_per_chunk=2)
+        return result.chunks, outcome.cards
+
+    chunks, first = run(_document(), "rev1")
+    assert len(calls) == len(chunks) == 8
+
+    calls.clear()
+    revised, second = run(_document(edited_section=5), "rev2")
+    assert len(calls) == 1 and "revised slides" in calls[0]
+    assert plan_regeneration(revised, store, settings, 2).changed == []
+    assert len(second) == 16
+    assert {c.source_ref.pdf_sha256 for c in second} == {"rev2"}
+    assert [c.question for c in second[:2]] == [c.question for c in first[:2]]
+
+    # Other settings, or more cards than were asked for, are not reused
+    assert plan_regeneration(revised, store, generation_settings_key("m", "cloze", "mixed")).unchanged == []
+    assert plan_regeneration(revised, store, settings, 3).unchanged == []
+    assert store.stats()["hits"] == 7
+
+
+def test_text_hash_ignores_reflowed_whitespace(tmp_path):
+    assert chunk_text_sha256("a  b\nc") == chunk_text_sha256(" a b c ")
+    assert chunk_text_sha256("a b c") != chunk_text_sha256("a b d")
+
+    old, new = tmp_path / "old.jsonl", tmp_path / "new.jsonl"
+    old.write_text("\n".join(json.dumps({"id": i, "text": t}) for i, t in [("c1", "x"), ("c2", "y")]), encoding="utf-8")
+    new.write_text("\n".join(json.dumps({"id": i, "text": t}) for i, t in [("c1", "x\n"), ("c2", "z")]), encoding="utf-8")
+    assert diff_chunk_files(old, new) == {"unchanged": ["c1"], "changed": ["c2"], "removed": ["c2"]}
@@ -0,0 +1,115 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from concurrent_generation import RateLimiter, generate_cards_concurrently
+from pdf2anki_types import Card
+
+
+def _cards(label, n):
+    return [Card(question=f"{label}-{i}", answer="a") for i in range(n)]
+
+
+def test_results_are_assembled_in_chunk_order():
+    delays = [0.05, 0.0, 0.03, 0.01]
+
+    def generate(index, n):
+        time.sleep(delays[index])
+        return _cards(index, n)
+
+    outcome = generate_cards_concurrently(list(range(4)), generate, num_cards=8, cards_per_chunk=2, max_concurrency=4)
+
+    assert [c.question for c in outcome.cards] == [f"{i}-{j}" for i in range(4) for j in range(2)]
+    assert outcome.completed_chunks == 4 and not outcome.cancelled
+
+
+def test_concurrency_limit_and_budget_are_respected():
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+    requested = []
+
+    def generate(index, n):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            requested.append(n)
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        # Chunk 0 fails to produce cards; its budget goes to later chunks
+        return [] if index == 0 else _cards(index, n)
+
+    outcome = generate_cards_concurrently(list(range(10)), generate, num_cards=5, cards_per_chunk=2, max_concurrency=2)
+
+    assert peak[0] <= 2
+    assert len(outcome.cards) == 5
+    assert max(requested) <= 2
+
+
+def test_errors_are_reported_and_cancel_stops_submission():
+    errors = []
+    seen = []
+
+    def generate(index, n):
+        seen.append(index)
+        if index == 1:
+            raise RuntimeError("boom")
+        return _cards(index, n)
+
+    outcome = generate_cards_concurrently(
+        list(range(3)), generate, num_cards=3, cards_per_chunk=1, max_concurrency=1,
+        on_error=lambda chunk, exc: errors.append((chunk, str(exc))),
+    )
+    assert errors == [(1, "boom")]
+    assert outcome.failed_chunks == 1
+
+    outcome = generate_cards_concurrently(
+        list(range(3)), generate, num_cards=3, cards_per_chunk=1, should_cancel=lambda: True,
+    )
+    assert outcome.cancelled and outcome.cards == []
+
+
+def test_rate_limiter_waits_for_token_budget():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600, clock=lambda: now[0], sleep=sleep)
+
+    assert limiter.acquire(tokens=600) == 0
+    waited = limiter.acquire(tokens=300)
+
+    assert abs(waited - 30.0) < 1e-6
+
+
+def test_filtered_cards_release_budget_in_chunk_order():
+    delays = [0.03, 0.0, 0.0, 0.0]
+    seen = set()
+
+    def generate(index, n):
+        time.sleep(delays[index])
+        # Every chunk repeats "shared"; chunk 0 finishes last but keeps its copy
+        return [Card(question="shared", answer=str(index))] + _cards(index, n - 1)
+
+    def keep_new(cards):
+        kept = [c for c in cards if c.question not in seen]
+        seen.update(c.question for c in kept)
+        return kept
+
+    outcome = generate_cards_concurrently(
+        list(range(4)), generate, num_cards=6, cards_per_chunk=2, max_concurrency=4, filter_cards=keep_new
+    )
+
+    assert [c.answer for c in outcome.cards if c.question == "shared"] == ["0"]
+    assert outcome.dropped_cards == 3
+    # Budget freed by the dropped cards is spent on the remaining chunks
+    assert len(outcome.cards) == 5
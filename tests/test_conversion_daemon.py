@@ -0,0 +1,82 @@
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from conversion_daemon import ConversionDaemon, DaemonClient, DaemonError
+
+
+def test_daemon_reuses_one_process_for_many_requests(tmp_path):
+    loads = []
+
+    def make_handler():
+        loads.append(1)  # Stands in for loading the models once
+
+        def handler(pdf_path, outdir):
+            if pdf_path.endswith("bad.pdf"):
+                raise RuntimeError("cannot convert")
+            return {"markdown_path": f"{outdir}/{Path(pdf_path).stem}.md"}
+
+        return handler
+
+    token_path = tmp_path / "daemon.token"
+    daemon = ConversionDaemon(make_handler(), port=0, token_path=token_path)
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    host, port = daemon.address
+    if os.name == "posix":
+        assert stat.S_IMODE(token_path.stat().st_mode) == 0o600
+
+    with DaemonClient.connect(host, port, token_path=token_path) as client:
+        assert client.convert(pdf_path="/in/a.pdf", outdir="/out") == {"markdown_path": "/out/a.md"}
+        with pytest.raises(DaemonError, match="cannot convert"):
+            client.convert(pdf_path="/in/bad.pdf", outdir="/out")
+        # The connection stays usable after a failure
+        assert client.convert(pdf_path="/in/b.pdf", outdir="/out")["markdown_path"] == "/out/b.md"
+
+    # A client without the token is turned away
+    with socket.create_connection((host, port), timeout=5) as sock:
+        sock.sendall(b'{"op": "convert", "pdf_path": "/in/a.pdf", "outdir": "/out"}\n')
+        assert b"Invalid daemon token" in sock.makefile("rb").readline()
+
+    with DaemonClient.connect(host, port, token_path=token_path) as client:
+        assert client.ping()["converted"] == 2
+        client.shutdown()
+
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert loads == [1]
+    assert not token_path.exists()
+    assert DaemonClient.connect(host, port, timeout_seconds=1, token_path=token_path) is None
+
+
+def test_client_reconnects_after_a_timed_out_conversion(tmp_path):
+    def handler(pdf_path, outdir):
+        if pdf_path.endswith("slow.pdf"):
+            time.sleep(0.8)
+        return {"markdown_path": f"{outdir}/{Path(pdf_path).stem}.md"}
+
+    token_path = tmp_path / "daemon.token"
+    daemon = ConversionDaemon(handler, port=0, token_path=token_path)
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    host, port = daemon.address
+
+    with DaemonClient.connect(host, port, timeout_seconds=0.5, token_path=token_path) as client:
+        with pytest.raises(DaemonError, match="No reply"):
+            client.convert(pdf_path="/in/slow.pdf", outdir="/out")
+        # The next files of a run still go through, on a new connection (the first
+        # waits for the daemon to finish the slow file)
+        assert client.convert(pdf_path="/in/a.pdf", outdir="/out") == {"markdown_path": "/out/a.md"}
+        assert client.convert(pdf_path="/in/b.pdf", outdir="/out") == {"markdown_path": "/out/b.md"}
+        client.shutdown()
+    thread.join(timeout=5)
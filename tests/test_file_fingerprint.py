@@ -0,0 +1,64 @@
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+import file_fingerprint
+from file_fingerprint import FingerprintStore, count_pdf_pages, hash_file
+
+
+@pytest.mark.parametrize("size", [0, 1, file_fingerprint.HASH_WINDOW_SIZE + 7])
+def test_hash_file_matches_hashlib(tmp_path, size):
+    path = tmp_path / "data.bin"
+    data = os.urandom(size)
+    path.write_bytes(data)
+    assert hash_file(path) == hashlib.sha256(data).hexdigest()
+
+
+def test_store_hashes_unchanged_files_once(tmp_path, monkeypatch):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 first")
+    calls = []
+    real_hash = file_fingerprint.hash_file
+    monkeypatch.setattr(file_fingerprint, "hash_file", lambda p: calls.append(p) or real_hash(p))
+
+    store = FingerprintStore(tmp_path / "fp.sqlite3")
+    first = store.sha256(path)
+    store.close()
+    # A new store on the same database still knows the file
+    store = FingerprintStore(tmp_path / "fp.sqlite3")
+    assert store.sha256(path) == first and len(calls) == 1
+
+    path.write_bytes(b"%PDF-1.4 second!")
+    assert store.sha256(path) == hashlib.sha256(b"%PDF-1.4 second!").hexdigest()
+    assert len(calls) == 2
+
+    other = tmp_path / "b.pdf"
+    other.write_bytes(b"%PDF-1.4 uploaded")
+    store.remember(other, "f" * 64)
+    assert store.sha256(other) == "f" * 64 and len(calls) == 2
+    assert store.stats()["hashed"] == 2
+
+
+def test_page_count_reads_catalog(tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    writer = pypdf.PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=72, height=72)
+    path = tmp_path / "three.pdf"
+    with path.open("wb") as f:
+        writer.write(f)
+
+    assert count_pdf_pages(path) == 3
+    store = FingerprintStore(tmp_path / "fp.sqlite3")
+    assert store.pages(path) == 3 and store.stats()["page_counts"] == 1
+
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    assert count_pdf_pages(broken) is None
@@ -0,0 +1,88 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from instrumentation import SpanRecorder, get_recorder, instrumented, recording, span, write_instrumentation
+
+
+def test_nested_spans_report_self_time_and_bytes():
+    with recording() as recorder:
+        with span("outer", bytes_in=10) as outer:
+            time.sleep(0.02)
+            with span("inner"):
+                time.sleep(0.05)
+            outer.add_bytes(bytes_out=4)
+        stats = recorder.stats()
+
+    assert stats["outer"].count == 1 and stats["inner"].count == 1
+    assert stats["outer"].wall_sec >= stats["inner"].wall_sec >= 0.05
+    assert stats["outer"].self_wall_sec < stats["inner"].wall_sec
+    assert (stats["outer"].bytes_in, stats["outer"].bytes_out) == (10, 4)
+
+
+def test_instrumented_generators_separate_fused_stages():
+    def produce():
+        for piece in ["ab", "cd", "ef"]:
+            time.sleep(0.01)
+            yield piece
+
+    def consume(pieces):
+        for piece in pieces:
+            time.sleep(0.02)
+            yield piece.upper()
+
+    with recording() as recorder:
+        upper = list(instrumented("outer", consume(instrumented("inner", produce(), size=len)), bytes_in=6))
+    stats = recorder.stats()
+
+    assert upper == ["AB", "CD", "EF"]
+    assert stats["inner"].count == stats["outer"].count == 1
+    assert stats["inner"].bytes_out == 6 and stats["outer"].bytes_in == 6
+    assert stats["outer"].self_wall_sec >= 0.06 and stats["inner"].self_wall_sec >= 0.03
+    assert stats["outer"].self_wall_sec < stats["outer"].wall_sec
+
+
+def test_recorders_forward_spans_to_parents_and_threads_share_context():
+    import contextvars
+
+    def work():
+        with span("work"):
+            pass
+
+    outer = SpanRecorder()
+    with recording(outer):
+        with recording() as inner:
+            work()
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+            thread.start()
+            thread.join()
+        assert get_recorder() is outer
+
+    assert inner.stats()["work"].count == 2
+    assert outer.stats()["work"].count == 2
+
+
+def test_process_conversion_writes_stage_timings(tmp_path):
+    from process_markdown import process_conversion
+
+    marker_md = tmp_path / "marker.md"
+    marker_md.write_text("# Title\n\nDefinition: A term is a word.\n\n## Next\n\nMore text here.\n", encoding="utf-8")
+
+    result = process_conversion(marker_md, tmp_path, "sha")
+    on_disk = json.loads((tmp_path / "processing_result.json").read_text(encoding="utf-8"))
+
+    timings = on_disk["instrumentation"]
+    assert set(timings) >= {"cleaning", "chunking", "semantic_detection"}
+    assert timings["cleaning"]["bytes_in"] == marker_md.stat().st_size
+    # One span per stage, however many pieces its generator yields
+    assert timings["chunking"]["count"] == timings["cleaning"]["count"] == 1
+    assert timings["semantic_detection"]["count"] == result["total_chunks"]
+
+    write_instrumentation(tmp_path / "processing_result.json", SpanRecorder())
+    assert json.loads((tmp_path / "processing_result.json").read_text(encoding="utf-8"))["total_chunks"] == result["total_chunks"]
@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from job_manifest import JobManifest, stage_reached
+
+
+def test_manifest_tracks_stages_and_artifacts(tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    manifest = JobManifest(tmp_path / "job.sqlite3")
+
+    manifest.begin(pdf, "hashed")
+    manifest.complete(pdf, "hashed", sha256="abc", pages=3)
+    manifest.begin(pdf, "uploaded")
+    manifest.fail(pdf, "uploaded", "HTTP 500")
+    manifest.close()
+
+    # Reopening sees the committed state
+    manifest = JobManifest(tmp_path / "job.sqlite3")
+    entry = manifest.lookup(pdf)
+    assert entry.stage == "hashed" and entry.sha256 == "abc"
+    assert entry.artifacts == {"pages": 3}
+    assert entry.error == "uploaded: HTTP 500" and entry.attempts == 2
+    assert manifest.summary()["failed"] == 1
+
+    manifest.complete(pdf, "converted", markdown_path="m.md")
+    # Completing an earlier stage again does not move the file backwards
+    manifest.complete(pdf, "hashed")
+    entry = manifest.lookup(pdf)
+    assert entry.stage == "converted" and entry.error is None
+    assert entry.artifacts == {"pages": 3, "markdown_path": "m.md"}
+    assert stage_reached(entry.stage, "uploaded") and not stage_reached(entry.stage, "cleaned")
+
+
+def test_manifest_resets_changed_files(tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    manifest = JobManifest(tmp_path / "job.sqlite3")
+    manifest.complete(pdf, "converted", sha256="abc")
+
+    pdf.write_bytes(b"%PDF-1.4 edited")
+    os.utime(pdf, ns=(0, 0))
+
+    assert manifest.lookup(pdf) is None
+    assert manifest.summary()["files"] == 0
+
+
+def test_batch_resumes_from_manifest_without_rehashing(tmp_path, monkeypatch):
+    pytest.importorskip("aiohttp")
+    import batch_convert
+
+    posts = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            posts.append(self.path)
+            body = json.dumps({"status": "Success", "result": {"markdown": "# Title\n\nSome text.\n"}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    input_dir = tmp_path / "pdfs"
+    input_dir.mkdir()
+    for i in range(3):
+        (input_dir / f"doc{i}.pdf").write_bytes(f"%PDF-1.4 document {i}".encode())
+    manifest = JobManifest(tmp_path / "job.sqlite3")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        api = f"http://127.0.0.1:{server.server_port}"
+        first = batch_convert.convert_directory(
+            input_dir, api, tmp_path / "out", manifest=manifest, process=True, use_cache=False,
+        )
+
+        def no_hashing(path):
+            raise AssertionError(f"{path} was hashed again")
+
+        monkeypatch.setattr(batch_convert, "compute_sha256", no_hashing)
+        second = batch_convert.convert_directory(input_dir, api, tmp_path / "out", manifest=manifest, process=True)
+        # --no-cache and a new engine version convert again, still without re-hashing
+        refreshed = batch_convert.convert_directory(
+            input_dir, api, tmp_path / "out", manifest=manifest, process=True, use_cache=False,
+        )
+        upgraded = batch_convert.convert_directory(
+            input_dir, api, tmp_path / "out", manifest=manifest, process=True, engine_version="2",
+        )
+    finally:
+        server.shutdown()
+
+    assert first.converted == 3
+    assert second.cached == 3 and second.failed == 0
+    assert refreshed.converted == 3 and upgraded.converted == 3 and len(posts) == 9
+    summary = manifest.summary()
+    assert summary["by_stage"]["chunked"] == 3 and summary["in_flight"] == 0
+    for result in first.results:
+        entry = manifest.lookup(Path(result.source_path))
+        chunks = Path(entry.artifacts["chunks_jsonl_path"]).read_text(encoding="utf-8").splitlines()
+        assert entry.artifacts["total_chunks"] == len(chunks) >= 1
@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from anki_core import parse_cards_from_output
+from llm_cache import LLMResponseCache, make_cache_key
+
+
+def test_key_depends_on_every_input():
+    base = make_cache_key("m", "sys", "prompt", {"max_completion_tokens": 2000})
+    assert base == make_cache_key("m", "sys", "prompt", {"max_completion_tokens": 2000})
+    assert base != make_cache_key("m2", "sys", "prompt", {"max_completion_tokens": 2000})
+    assert base != make_cache_key("m", "sys2", "prompt", {"max_completion_tokens": 2000})
+    assert base != make_cache_key("m", "sys", "prompt2", {"max_completion_tokens": 2000})
+    assert base != make_cache_key("m", "sys", "prompt", {"max_completion_tokens": 1000})
+
+
+def test_hit_feeds_parser_and_persists(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = LLMResponseCache(path)
+    key = make_cache_key("m", "sys", "prompt")
+    assert cache.get(key) is None
+    cache.put(key, "m", "1. Question: Q?\n   Answer: A")
+    cache.close()
+
+    reopened = LLMResponseCache(path)
+    cards = parse_cards_from_output(reopened.get(key), "basic")
+    assert [c.question for c in cards] == ["Q?"]
+    stats = reopened.stats()
+    assert stats["hits"] == 1 and stats["entries"] == 1
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    now = [0.0]
+    cache = LLMResponseCache(tmp_path / "c.sqlite3", ttl_seconds=100, max_entries=2, clock=lambda: now[0])
+    for name in ("a", "b"):
+        cache.put(name, "m", name)
+        now[0] += 1
+    cache.get("a")  # "b" becomes least recently used
+    cache.put("c", "m", "c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.stats()["evictions"] == 1
+
+    now[0] += 1000
+    assert cache.get("c") is None
+    assert cache.stats()["expired"] == 1
@@ -0,0 +1,109 @@
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+uvicorn = pytest.importorskip("uvicorn")
+pytest.importorskip("multipart")
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fastapi.testclient import TestClient
+
+from anki_core import build_packed_prompt, build_prompt, parse_cards_from_output, parse_packed_cards_from_output
+from load_test import LoadTest, LoadTestConfig, latency_summary
+from mock_servers import MockLLMConfig, MockMarkerConfig, create_llm_app, create_marker_app
+
+
+def _serve(app):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "mock server did not start"
+        time.sleep(0.02)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def test_mock_servers_speak_the_marker_and_openai_formats():
+    pdf = {"pdf_file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")}
+    # One event loop for the whole block, so the celery task keeps running between requests
+    with TestClient(create_marker_app(MockMarkerConfig(latency_sec=0.01, markdown_bytes=2048, images=1))) as marker:
+        body = marker.post("/convert", files=pdf).json()
+        assert body["status"] == "Success"
+        assert len(body["result"]["markdown"]) >= 2048 and len(body["result"]["images"]) == 1
+
+        task_id = marker.post("/celery/convert", files=pdf).json()["task_id"]
+        for _ in range(100):
+            response = marker.get(f"/celery/result/{task_id}")
+            if response.status_code != 202:
+                break
+            time.sleep(0.01)
+        assert response.status_code == 200 and response.json()["result"]["filename"] == "a.pdf"
+
+    llm = TestClient(create_llm_app(MockLLMConfig(latency_sec=0)))
+    for note_type, count in (("basic", 4), ("cloze", 2)):
+        prompt = build_prompt(note_type, count, "mixed", "Entropy measures uncertainty.")
+        reply = llm.post("/v1/chat/completions", json={"model": "m", "messages": [{"role": "user", "content": prompt}]}).json()
+        assert len(parse_cards_from_output(reply["choices"][0]["message"]["content"], note_type)) == count
+        assert reply["usage"]["completion_tokens"] > 0
+
+    prompt = build_packed_prompt("basic", "mixed", [("Entropy measures uncertainty.", 2), ("Bits measure it.", 1)])
+    reply = llm.post("/v1/chat/completions", json={"model": "m", "messages": [{"role": "user", "content": prompt}]}).json()
+    cards = parse_packed_cards_from_output(reply["choices"][0]["message"]["content"], "basic", 2)
+    assert [len(section) for section in cards] == [2, 1]
+
+    assert TestClient(create_llm_app(MockLLMConfig(error_rate=1.0))).post(
+        "/v1/chat/completions", json={"messages": []}
+    ).status_code == 429
+
+
+def test_load_test_reports_throughput_and_tail_latency():
+    servers = [
+        _serve(create_marker_app(MockMarkerConfig(latency_sec=0.05, markdown_bytes=16 * 1024, workers=2))),
+        _serve(create_llm_app(MockLLMConfig(latency_sec=0.01))),
+    ]
+    (_, _, marker_url), (_, _, llm_url) = servers
+    try:
+        test = LoadTest(LoadTestConfig(
+            marker_url=marker_url, llm_url=llm_url + "/v1", sessions=3, iterations=2,
+            pages=2, max_tokens=500, max_cards=6, generate_workers=2, timeout_sec=30,
+        ))
+        try:
+            report = test.run()
+        finally:
+            test.close()
+        packed = LoadTest(LoadTestConfig(
+            marker_url=marker_url, llm_url=llm_url + "/v1", sessions=1, iterations=1,
+            pages=2, max_tokens=300, cards_per_chunk=1, context_tokens=8192, timeout_sec=30,
+        ))
+        try:
+            packed_report = packed.run()
+        finally:
+            packed.close()
+    finally:
+        for server, thread, _ in servers:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    assert report["documents"] == {"total": 6, "ok": 6, "failed": 0}, report["errors"]
+    assert report["totals"]["cards"] == 36
+    assert report["throughput"]["documents_per_min"] > 0
+    assert report["latency"]["convert"]["p50"] >= 0.05
+    assert report["latency"]["llm_request"]["count"] == report["totals"]["llm_requests"]
+    # Small chunks share requests, and every chunk still gets its card
+    totals = packed_report["totals"]
+    assert totals["cards"] == totals["chunks"] > totals["llm_requests"] * 4
+
+    assert latency_summary([1.0, 2.0, 3.0, 4.0])["p95"] == 4.0
+    assert latency_summary([])["p99"] is None
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+import markdown_chunker
+from markdown_chunker import chunk_markdown, estimate_tokens, estimate_tokens_many, iter_chunks, split_large_chunk
+
+
+def test_estimate_tokens_many_matches_single_counts():
+    texts = ["Hello world.", "", "# Heading\n\nSome *markdown* with $x^2$.", "<|endoftext|>"]
+    assert estimate_tokens_many(texts) == [estimate_tokens(t) for t in texts]
+    assert estimate_tokens_many([]) == []
+
+
+def test_encoding_is_loaded_once():
+    markdown_chunker._get_encoding.cache_clear()
+    for _ in range(5):
+        estimate_tokens("some text")
+    estimate_tokens_many(["a", "b"])
+    info = markdown_chunker._get_encoding.cache_info()
+    assert info.misses == 1 and info.hits >= 5
+
+
+def test_chunk_markdown_splits_large_sections_and_sums_tokens():
+    paragraph = "This sentence is about chunking markdown. " * 20
+    md = "# Intro\n\nShort intro.\n\n# Big\n\n" + "\n\n".join([paragraph] * 10)
+
+    result = chunk_markdown(md, pdf_sha256="abc", max_tokens=300)
+
+    assert result.chunks[0].section_title == "Intro"
+    assert result.total_chunks == len(result.chunks) > 2
+    assert [c.id for c in result.chunks] == [f"chunk_{i:04d}" for i in range(1, result.total_chunks + 1)]
+    assert all(c.section_title == "Big" for c in result.chunks[1:])
+    assert result.total_tokens == sum(c.token_count for c in result.chunks)
+    for chunk in result.chunks:
+        # Summed counts approximate a re-encoding of the joined text
+        assert abs(chunk.token_count - estimate_tokens(chunk.text)) <= 0.1 * chunk.token_count + 2
+
+
+def test_split_large_chunk_falls_back_to_sentences():
+    text = "One sentence here. " * 200
+    pieces = split_large_chunk(text, max_tokens=100, section_title=None)
+    assert len(pieces) > 1
+    assert all(estimate_tokens(p) <= 130 for p in pieces)
+    assert " ".join(pieces).split() == text.split()
+
+
+def test_iter_chunks_matches_chunk_markdown_and_is_incremental():
+    md = "Preamble\n" + "".join(f"# S{i}\n\nBody {i}. " + "word " * (i * 80) + "\n\n" for i in range(6))
+    expected = chunk_markdown(md, pdf_sha256="abc", max_tokens=150).chunks
+
+    pieces = [md[i:i + 17] for i in range(0, len(md), 17)]
+    assert list(iter_chunks(iter(pieces), pdf_sha256="abc", max_tokens=150)) == expected
+    assert list(iter_chunks(md, pdf_sha256="abc", max_tokens=150)) == expected
+
+    consumed = []
+
+    def lines():
+        for line in md.splitlines(keepends=True):
+            consumed.append(line)
+            yield line
+
+    first = next(iter_chunks(lines(), pdf_sha256="abc"))
+    assert first.text == "Preamble"
+    assert len(consumed) < len(md.splitlines())
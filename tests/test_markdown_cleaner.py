@@ -0,0 +1,54 @@
+import io
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from domain_types import CleaningResult
+from markdown_cleaner import clean_markdown, iter_clean_markdown
+
+SAMPLE = (
+    "Lecture 1\r\n# Intro  \r\n\r\n\r\n\r\nText with   spaces.\n|||\n??\nLecture 1\n$x$\n"
+    "![fig](a.png) caption\nLecture 1\n\n\n\n- item\n"
+)
+
+
+def test_clean_markdown_removes_artifacts_and_headers():
+    result = clean_markdown(SAMPLE, remove_images=True)
+
+    assert result.cleaned_text == "# Intro\n\nText with spaces.\n$x$\n caption\n\n- item\n"
+    assert result.stats == {
+        "original_length": 111,
+        "lines_removed": 4,
+        "artifacts_removed": 5,
+        "final_length": 48,
+        "reduction_percent": 56.76,
+    }
+    assert result.removed_patterns == [
+        "OCR artifact: ??",
+        "Repetitive header/footer: Lecture 1",
+        "Repetitive header/footer: Lecture 1",
+        "Repetitive header/footer: Lecture 1",
+        "Image reference: ![fig](a.png)",
+    ]
+
+
+def test_streaming_sources_match_string_cleaning():
+    expected = clean_markdown(SAMPLE)
+
+    # Arbitrary piece boundaries, including a CRLF split across pieces
+    pieces = [SAMPLE[i:i + 3] for i in range(0, len(SAMPLE), 3)]
+    for source in (iter(pieces), io.StringIO(SAMPLE, newline="")):
+        result = CleaningResult(cleaned_text="")
+        text = "".join(iter_clean_markdown(source, result=result))
+        assert text == expected.cleaned_text
+        assert result.stats == expected.stats
+        assert result.removed_patterns == expected.removed_patterns
+
+
+def test_empty_input():
+    result = clean_markdown("")
+    assert result.cleaned_text == "\n"
+    assert result.stats["reduction_percent"] == 0
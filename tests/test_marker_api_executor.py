@@ -0,0 +1,115 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "marker-api"))
+
+from marker_api.executor import ConversionExecutor, QueueFullError
+
+
+def _gate():
+    """A conversion function that blocks until the returned event is set."""
+    release = threading.Event()
+
+    def convert(value):
+        assert release.wait(timeout=10)
+        return value * 2
+
+    return convert, release
+
+
+def test_full_executor_rejects_with_retry_after():
+    async def run():
+        executor = ConversionExecutor(workers=1, queue_size=1)
+        convert, release = _gate()
+        running = [asyncio.ensure_future(executor.submit(convert, i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(QueueFullError) as error:
+            await executor.submit(convert, 2)
+        with pytest.raises(QueueFullError):
+            await executor.submit_many(convert, [(3,), (4,)])
+        release.set()
+        results = await asyncio.gather(*running)
+        executor.shutdown()
+        return error.value, results, executor.stats()
+
+    error, results, stats = asyncio.run(run())
+    # No conversion has finished yet, so the estimate is the default
+    assert error.retry_after == 30
+    assert results == [0, 2]
+    assert stats["rejected"] == 2 and stats["admitted"] == 0
+
+
+def test_batch_larger_than_capacity_is_queued():
+    async def run():
+        executor = ConversionExecutor(workers=1, queue_size=1)
+        convert, release = _gate()
+        batch = asyncio.ensure_future(executor.submit_many(convert, [(i,) for i in range(5)]))
+        await asyncio.sleep(0.05)
+        # Two files hold the slots, the other three wait for them
+        waiting = executor.stats()
+        release.set()
+        results = await batch
+        executor.shutdown()
+        return waiting, results, executor.stats()
+
+    waiting, results, stats = asyncio.run(run())
+    assert (waiting["admitted"], waiting["waiting"]) == (2, 3)
+    assert results == [0, 2, 4, 6, 8]
+    assert stats["completed"] == 5 and stats["rejected"] == 0
+    assert stats["admitted"] == 0 and stats["waiting"] == 0
+
+
+def test_cancelled_request_keeps_its_slot_until_the_worker_finishes():
+    async def run():
+        executor = ConversionExecutor(workers=1, queue_size=0)
+        convert, release = _gate()
+        request = asyncio.ensure_future(executor.submit(convert, 1))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        await asyncio.sleep(0.05)
+        # The worker is still converting, so there is no room for another request
+        with pytest.raises(QueueFullError):
+            await executor.submit(convert, 2)
+        during = executor.stats()
+
+        release.set()
+        for _ in range(100):
+            if executor.stats()["admitted"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        after = executor.stats()
+        result = await executor.submit(convert, 3)
+        executor.shutdown()
+        return request.cancelled(), during, after, result
+
+    cancelled, during, after, result = asyncio.run(run())
+    assert cancelled
+    assert during["admitted"] == 1 and during["running"] == 1
+    assert after["admitted"] == 0 and after["completed"] == 1
+    assert result == 6
+
+
+def test_server_answers_a_full_executor_with_503():
+    pytest.importorskip("marker")
+    pytest.importorskip("gradio")
+    from fastapi.testclient import TestClient
+
+    import server
+
+    class FullExecutor:
+        async def submit(self, fn, *args):
+            raise QueueFullError(retry_after=7)
+
+        async def submit_many(self, fn, args_list):
+            raise QueueFullError(retry_after=7)
+
+    server.conversion_executor = FullExecutor()
+    client = TestClient(server.app)
+    response = client.post("/batch_convert", files=[("pdf_files", ("a.pdf", b"%PDF-1.4", "application/pdf"))])
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
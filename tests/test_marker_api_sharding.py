@@ -0,0 +1,74 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "marker-api"))
+
+from pypdf import PdfReader, PdfWriter
+
+from marker_api.sharding import count_pdf_pages, merge_shard_results, split_pdf_pages
+
+
+def _pdf(pages: int) -> bytes:
+    writer = PdfWriter()
+    for i in range(pages):
+        # Page widths tell the pages apart after splitting
+        writer.add_blank_page(width=100 + i, height=100)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _shard(index, start, end, markdown, images=None, toc=None, status="ok"):
+    return {
+        "status": status,
+        "error": None if status == "ok" else "model crashed",
+        "markdown": markdown,
+        "images": images or {},
+        "metadata": {"languages": ["en"], "toc": toc or [], "pages": end - start},
+        "shard": {"index": index, "start_page": start, "end_page": end},
+    }
+
+
+def test_split_pdf_pages_keeps_page_ranges_in_order():
+    content = _pdf(5)
+    shards = split_pdf_pages(content, 2)
+
+    assert count_pdf_pages(content) == 5
+    assert [(start, end) for start, end, _ in shards] == [(0, 2), (2, 4), (4, 5)]
+    widths = [
+        [int(page.mediabox.width) for page in PdfReader(io.BytesIO(data)).pages]
+        for _, _, data in shards
+    ]
+    assert widths == [[100, 101], [102, 103], [104]]
+    assert [(s, e) for s, e, _ in split_pdf_pages(content, 0)] == [(i, i + 1) for i in range(5)]
+
+
+def test_merge_orders_shards_and_renames_images_and_toc():
+    results = [
+        _shard(1, 2, 4, "# Part two\n\n![](0_image_0.png)\n", images={"0_image_0.png": "B"},
+               toc=[{"title": "Two", "page": 0}]),
+        _shard(0, 0, 2, "# Part one\n\n![](1_image_0.png) ![](logo.png)\n",
+               images={"1_image_0.png": "A", "logo.png": "L"}, toc=[{"title": "One", "page_id": 1}]),
+    ]
+
+    merged = merge_shard_results("doc.pdf", results)
+
+    assert merged["status"] == "ok" and merged["filename"] == "doc.pdf"
+    assert merged["markdown"] == (
+        "# Part one\n\n![](1_image_0.png) ![](shard0_logo.png)\n\n"
+        "# Part two\n\n![](2_image_0.png)\n"
+    )
+    assert merged["images"] == {"1_image_0.png": "A", "shard0_logo.png": "L", "2_image_0.png": "B"}
+    assert merged["metadata"]["toc"] == [{"title": "One", "page_id": 1}, {"title": "Two", "page": 2}]
+    assert merged["metadata"]["pages"] == 4
+    assert [s["index"] for s in merged["shards"]] == [0, 1]
+
+
+def test_merge_raises_for_a_failed_shard():
+    results = [_shard(0, 0, 2, "# One\n"), _shard(1, 2, 4, "", status="error")]
+    with pytest.raises(RuntimeError, match=r"Shard 1 \(pages 3-4\) failed: model crashed"):
+        merge_shard_results("doc.pdf", results)
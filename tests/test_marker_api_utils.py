@@ -0,0 +1,54 @@
+import base64
+import io
+import json
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "marker-api"))
+
+# marker_api.utils also reads the device (torch, pynvml) and prints the banner (art)
+for module in ("torch", "pynvml", "art", "PIL"):
+    pytest.importorskip(module)
+
+from PIL import Image
+
+from marker_api.utils import build_conversion_zip, encode_images
+
+
+def _images(count):
+    return {f"{i}_image_0.png": Image.new("RGB", (4 + i, 4), (i * 40, 0, 0)) for i in range(count)}
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_encode_images_keeps_order_in_both_formats(max_workers):
+    images = _images(6)
+
+    raw = encode_images(images, as_base64=False, max_workers=max_workers)
+    encoded = encode_images(images, as_base64=True, max_workers=max_workers)
+
+    assert list(raw) == list(encoded) == list(images)
+    for name, image in images.items():
+        assert base64.b64decode(encoded[name]) == raw[name]
+        assert Image.open(io.BytesIO(raw[name])).size == image.size
+    assert encode_images({}) == {}
+
+
+def test_build_conversion_zip_writes_markdown_metadata_and_stored_images():
+    images = encode_images(_images(2), as_base64=False)
+
+    archive_file = build_conversion_zip("lectures/week 1.pdf", "# Title\n\n![](0_image_0.png)\n", {"pages": 2}, images)
+    try:
+        assert archive_file.tell() == 0
+        with zipfile.ZipFile(archive_file) as archive:
+            assert archive.namelist() == ["week 1.md", "metadata.json", "0_image_0.png", "1_image_0.png"]
+            assert archive.read("week 1.md").decode("utf-8").startswith("# Title")
+            assert json.loads(archive.read("metadata.json")) == {"pages": 2}
+            for name, data in images.items():
+                assert archive.getinfo(name).compress_type == zipfile.ZIP_STORED
+                assert archive.read(name) == data
+    finally:
+        archive_file.close()
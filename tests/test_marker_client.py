@@ -1,3 +1,5 @@
+import json
+import os
 import sys
 from pathlib import Path
 from types import SimpleNamespace
@@ -14,6 +16,9 @@ class FakeResponse:
         self.status_code = status_code
         self.text = text
 
+    def json(self):
+        return json.loads(self.text)
+
     def raise_for_status(self):
         if self.status_code >= 400:
             raise RuntimeError(f"HTTP {self.status_code}")
@@ -38,13 +43,135 @@ def test_convert_pdf_to_markdown_success(monkeypatch, tmp_path):
     assert "Hello from Marker" in Path(result.markdown_path).read_text(encoding="utf-8")
 
 
+def test_convert_pdf_to_markdown_cache_hit_skips_network(monkeypatch, tmp_path):
+    pdf_file = tmp_path / "dummy.pdf"
+    pdf_file.write_bytes(b"%PDF-1.4\n%...cached...")
+    calls = []
+
+    def fake_post(url, files, headers, timeout):
+        calls.append(url)
+        return FakeResponse(200, text=json.dumps({"success": True, "output": "# Cached"}))
+
+    import requests
+    monkeypatch.setattr(requests, "post", fake_post)
+
+    from conversion_cache import ConversionCache
+    cache = ConversionCache(tmp_path / "out")
+    kwargs = dict(pdf_path=pdf_file, api_base_url="http://localhost:8000", output_root=tmp_path / "out", cache=cache)
+
+    first = convert_pdf_to_markdown(**kwargs)
+    second = convert_pdf_to_markdown(**kwargs)
 
+    assert len(calls) == 1
+    assert second.markdown_path == first.markdown_path
+    assert cache.stats.hits == 1 and cache.stats.misses == 1
 
+    # A different engine version or an explicit refresh converts again
+    convert_pdf_to_markdown(engine_version="2.0", **kwargs)
+    convert_pdf_to_markdown(engine_version="2.0", refresh=True, **kwargs)
+    assert len(calls) == 3
+    assert cache.stats.refreshes == 1
 
 
+def test_conversion_cache_evicts_by_age_and_size(tmp_path):
+    from conversion_cache import ConversionCache
 
+    cache = ConversionCache(tmp_path, max_bytes=150, max_age_seconds=100)
+    for name, size, mtime in [("old", 10, 0), ("a", 100, 900), ("b", 100, 950)]:
+        conv_dir = cache.entry_dir(name)
+        conv_dir.mkdir(parents=True)
+        (conv_dir / "marker.md").write_bytes(b"x" * size)
+        meta = conv_dir / "meta.json"
+        meta.write_text("{}")
+        os.utime(meta, (mtime, mtime))
 
+    removed = cache.evict(now=1000)
 
+    assert removed == 2
+    assert [p.name for p, _, _ in cache.entries()] == ["b"]
+    assert cache.stats.evictions == 2
 
 
+def test_convert_pdf_to_markdown_streaming_writes_markdown_and_images(monkeypatch, tmp_path):
+    import base64
+
+    pdf_file = tmp_path / "dummy.pdf"
+    pdf_bytes = b"%PDF-1.4\n%...streamed..." * 100
+    pdf_file.write_bytes(pdf_bytes)
+    body = json.dumps({
+        "status": "Success",
+        "result": {
+            "markdown": "# Title\n\nStreamed é text ![](0_image_0.png)\n",
+            "images": {"0_image_0.png": base64.b64encode(b"\x89PNG fake image").decode()},
+        },
+    }).encode("utf-8")
+    uploads = []
+
+    class StreamingResponse(FakeResponse):
+        headers = {"Content-Type": "application/json"}
+
+        def iter_content(self, chunk_size):
+            for i in range(0, len(body), 7):
+                yield body[i:i + 7]
+
+    def fake_post(url, data, headers, timeout, stream):
+        uploads.append((headers["Content-Type"], len(data), data.read()))
+        return StreamingResponse(200)
+
+    import requests
+    monkeypatch.setattr(requests, "post", fake_post)
 
+    result = convert_pdf_to_markdown(
+        pdf_path=pdf_file, api_base_url="http://localhost:8000", output_root=tmp_path / "out", streaming=True,
+    )
+
+    content_type, length, sent = uploads[0]
+    assert content_type.startswith("multipart/form-data; boundary=")
+    assert length == len(sent) and pdf_bytes in sent
+    assert result.markdown_path.read_text(encoding="utf-8") == "# Title\n\nStreamed é text ![](0_image_0.png)\n"
+    assert (result.markdown_path.parent / "images" / "0_image_0.png").read_bytes() == b"\x89PNG fake image"
+    assert json.loads(result.meta_path.read_text(encoding="utf-8"))["images"] == 1
+
+
+def test_marker_client_retries_with_retry_after_on_one_connection(tmp_path):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from marker_client import MarkerClient
+
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests_seen.append(self.client_address)
+            if len(requests_seen) == 1:
+                status, body, extra = 503, b"busy", {"Retry-After": "0"}
+            else:
+                status, body, extra = 200, json.dumps({"success": True, "output": "# Pooled"}).encode(), {}
+            self.send_response(status)
+            for name, value in {"Content-Length": str(len(body)), **extra}.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        pdf_file = tmp_path / "dummy.pdf"
+        pdf_file.write_bytes(b"%PDF-1.4\n%...pooled...")
+        with MarkerClient(f"http://127.0.0.1:{server.server_port}", backoff_factor=0) as client:
+            result = client.convert(pdf_file, tmp_path / "out", use_cache=False)
+            client.convert(pdf_file, tmp_path / "out", use_cache=False, streaming=True)
+    finally:
+        server.shutdown()
+
+    assert result.markdown_path.read_text(encoding="utf-8") == "# Pooled"
+    assert len(requests_seen) == 3
+    # Keep-alive: every request, including the retry, reused one connection
+    assert len(set(requests_seen)) == 1
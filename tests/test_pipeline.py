@@ -0,0 +1,90 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+import pipeline
+from marker_client import ConversionResultPaths
+from pdf2anki_types import Card
+from pipeline import Pipeline, Stage
+
+
+def test_stages_overlap_and_report_back_pressure():
+    def produce(n):
+        yield n
+
+    def slow(n):
+        time.sleep(0.02)
+        yield n * 10
+
+    p = Pipeline([Stage("produce", produce), Stage("slow", slow)], queue_size=1)
+    outputs = list(p.run(range(10)))
+
+    assert outputs == [n * 10 for n in range(10)]
+    report = p.report()
+    stages = {s["name"]: s for s in report["stages"]}
+    assert stages["produce"]["items_in"] == 10 and stages["slow"]["items_out"] == 10
+    # The fast stage waits on the slow one's full input queue
+    assert stages["produce"]["blocked_sec"] > 0.05
+    assert report["bottleneck"] == "slow"
+
+
+def test_stage_slower_than_put_timeout_keeps_every_item():
+    def slow(n):
+        # Longer than the 0.1 s put timeout, so the end sentinel waits on a full queue
+        time.sleep(0.15)
+        yield n
+
+    p = Pipeline([Stage("slow", slow)], queue_size=2)
+    assert list(p.run(range(6))) == list(range(6))
+
+
+def test_stage_error_is_raised_after_shutdown():
+    def boom(n):
+        if n == 3:
+            raise RuntimeError("stage failed")
+        yield n
+
+    p = Pipeline([Stage("boom", boom, workers=2), Stage("pass", lambda n: [n])], queue_size=2)
+    with pytest.raises(RuntimeError, match="stage failed"):
+        list(p.run(range(100)))
+    assert p.report()["stages"][0]["errors"] == 1
+
+
+def test_pdf_pipeline_numbers_chunks_across_shards(tmp_path, monkeypatch):
+    from pypdf import PdfWriter
+
+    pdf_path = tmp_path / "doc.pdf"
+    writer = PdfWriter()
+    for _ in range(5):
+        writer.add_blank_page(width=200, height=200)
+    with pdf_path.open("wb") as f:
+        writer.write(f)
+
+    def fake_convert(pdf_path, api_base_url, output_root, timeout_seconds=300, **kwargs):
+        out = tmp_path / "md" / (Path(pdf_path).stem + ".md")
+        out.parent.mkdir(exist_ok=True)
+        out.write_text(f"# Part {Path(pdf_path).stem[-11:]}\n\nBody text.\n", encoding="utf-8")
+        return ConversionResultPaths(markdown_path=out, meta_path=out)
+
+    monkeypatch.setattr("marker_client.convert_pdf_to_markdown", fake_convert)
+
+    def generate(chunk, n):
+        return [Card(question=f"{chunk.id}-{i}", answer="a") for i in range(n)]
+
+    result = pipeline.run_pdf_pipeline(
+        pdf_path, "http://marker", tmp_path, pdf_sha256="abc",
+        pages_per_shard=2, generate_fn=generate, cards_per_chunk=2, max_cards=5,
+    )
+
+    assert [c.id for c in result.chunks] == ["chunk_0001", "chunk_0002", "chunk_0003"]
+    assert [(c.start_page, c.end_page) for c in result.chunks] == [(1, 2), (3, 4), (5, 5)]
+    assert len(result.cards) == 5
+    assert [s["name"] for s in result.report["stages"]] == ["convert", "clean", "chunk", "generate"]
+    # Spans from the stage threads reach the run's recorder
+    assert result.report["instrumentation"]["cleaning"]["count"] == 3
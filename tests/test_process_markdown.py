@@ -0,0 +1,36 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+
+def _run(conv_dir: Path) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(SRC / "process_markdown.py"), "--input", str(conv_dir)],
+        capture_output=True, text=True, timeout=60,
+    )
+
+
+def test_cli_reports_undecodable_markdown_as_an_error(tmp_path):
+    conv_dir = tmp_path / "conversions" / "sha"
+    conv_dir.mkdir(parents=True)
+    (conv_dir / "marker.md").write_bytes(b"# Title\n\nLatin-1 text: caf\xe9\n")
+
+    result = _run(conv_dir)
+
+    assert result.returncode == 1
+    assert "ERROR: Failed to process markdown file" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_cli_writes_chunks(tmp_path):
+    conv_dir = tmp_path / "conversions" / "sha"
+    conv_dir.mkdir(parents=True)
+    (conv_dir / "marker.md").write_text("# Title\n\nSome text.\n", encoding="utf-8")
+
+    result = _run(conv_dir)
+
+    assert result.returncode == 0, result.stderr
+    assert (conv_dir / "chunks.jsonl").read_text(encoding="utf-8").count("\n") >= 1
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from prompt_packing import (
+    DEFAULT_CONTEXT_TOKENS,
+    SECTION_OVERHEAD_TOKENS,
+    PackingBudget,
+    context_tokens_from_env,
+    pack_sections,
+    packing_budget,
+)
+
+
+def test_packing_budget_reserves_template_and_reply(monkeypatch):
+    monkeypatch.delenv("LLM_CONTEXT_TOKENS", raising=False)
+    assert context_tokens_from_env() == DEFAULT_CONTEXT_TOKENS
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "32768")
+    assert context_tokens_from_env() == 32768
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "lots")
+    assert context_tokens_from_env() == DEFAULT_CONTEXT_TOKENS
+
+    budget = packing_budget("word " * 100, completion_tokens=2000, context_tokens=8192)
+    assert 6000 < budget.content_tokens < 6092 and budget.max_cards == 20
+    # Never below one chunk and one card per request
+    assert packing_budget("word " * 100, completion_tokens=50, context_tokens=10) == PackingBudget(1, 1)
+
+
+def test_pack_sections_fills_requests_in_order():
+    budget = PackingBudget(content_tokens=10 * (100 + SECTION_OVERHEAD_TOKENS), max_cards=20)
+
+    # Tokens decide: ten 100-token sections per request
+    assert pack_sections([100] * 25, 1, budget) == [list(range(10)), list(range(10, 20)), list(range(20, 25))]
+    # The reply decides: 20 cards are five sections of four cards
+    assert [len(group) for group in pack_sections([10] * 12, 4, budget)] == [5, 5, 2]
+    # Oversized and standalone sections get requests of their own
+    assert pack_sections([100, 5000, 100, 100, 100], 1, budget, standalone={3}) == [[0], [1], [2], [3], [4]]
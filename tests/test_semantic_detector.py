@@ -0,0 +1,57 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from semantic_detector import identify_concept_boundaries, identify_definitions, identify_key_terms
+
+
+def test_definitions_keep_pattern_order():
+    text = (
+        "**Bias** - the expected error.\n"
+        "**Entropy** is a measure of uncertainty, in bits.\n"
+        "  **Variance**: spread around the mean; squared.\n"
+        "**Loss** IS the objective"
+    )
+    assert identify_definitions(text) == [
+        {"term": "Entropy", "definition": "measure of uncertainty"},
+        {"term": "Loss", "definition": "objective"},
+        {"term": "Variance", "definition": "spread around the mean"},
+        {"term": "Bias", "definition": "the expected error"},
+    ]
+
+
+def test_key_terms_skip_math_and_duplicates():
+    assert identify_key_terms('"Hilbert space" and *Softmax*, **Kernels**; **kernels**') == [
+        "Kernels", "Softmax", "Hilbert space",
+    ]
+    assert identify_key_terms("$*x*$") == []
+
+
+def test_concept_boundaries_match_stripped_lines():
+    text = "# Title\n\n  - item one\n##   \n2) second\n####### too deep\n* star\n\t3. third\n-no space"
+    assert identify_concept_boundaries(text) == [
+        {"type": "heading", "text": "# Title", "line": 0},
+        {"type": "bullet_list", "text": "- item one", "line": 2},
+        {"type": "numbered_list", "text": "2) second", "line": 4},
+        {"type": "bullet_list", "text": "* star", "line": 6},
+        {"type": "numbered_list", "text": "3. third", "line": 7},
+    ]
+    assert identify_concept_boundaries("- " + "x" * 150)[0]["text"] == "- " + "x" * 98
+
+
+def test_every_chunk_is_annotated(tmp_path):
+    from process_markdown import process_conversion
+
+    sections = [f"# Part {i}\n\n**Term{i}** is a concept.\n\n" + ("Filler sentence here. " * 150) for i in range(15)]
+    marker_md = tmp_path / "marker.md"
+    marker_md.write_text("\n\n".join(sections), encoding="utf-8")
+
+    result = process_conversion(marker_md, tmp_path, "sha", max_tokens=500)
+    records = [json.loads(line) for line in Path(result["chunks_jsonl_path"]).read_text(encoding="utf-8").splitlines()]
+    assert len(records) == result["total_chunks"] > 10
+    assert all("semantic" in r for r in records)
+    assert {"term": "Term14", "definition": "concept"} in [d for r in records for d in r["semantic"]["definitions"]]
+    assert len(result["semantic_structures_sample"]) == 10
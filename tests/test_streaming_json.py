@@ -0,0 +1,63 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path.insert(0, str(SRC))
+
+from streaming_json import JSONStreamError, StringSink, parse_json_stream
+
+
+def _split(data, rng, max_cuts=10):
+    cuts = sorted(rng.sample(range(len(data) + 1), min(len(data), rng.randint(0, max_cuts))))
+    return [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+
+
+def test_matches_json_loads_for_any_split():
+    rng = random.Random(0)
+    document = {
+        "a": [1, -2.5e3, True, False, None, 'q"uo\\te\n\t/ é \U0001F600'],
+        "empty": {"list": [], "dict": {}},
+        "nested": [[{"x": "日本"}], [[]]],
+    }
+    for ensure_ascii in (True, False):
+        text = json.dumps(document, ensure_ascii=ensure_ascii)
+        for _ in range(100):
+            assert parse_json_stream(_split(text, rng)) == document
+            assert parse_json_stream(_split(text.encode("utf-8"), rng)) == document
+
+
+def test_selected_strings_are_streamed_to_sinks():
+    class Collect(StringSink):
+        def __init__(self):
+            self.pieces = []
+
+        def write(self, piece):
+            self.pieces.append(piece)
+
+        def close(self):
+            return "<streamed>"
+
+    sinks = {}
+
+    def sink_for(path):
+        if path == ("result", "markdown"):
+            sinks[path] = Collect()
+            return sinks[path]
+        return None
+
+    text = json.dumps({"status": "Success", "result": {"markdown": "# T\n" * 50, "pages": 2}})
+    document = parse_json_stream(_split(text, random.Random(1), 20), sink_for)
+
+    assert document == {"status": "Success", "result": {"markdown": "<streamed>", "pages": 2}}
+    assert "".join(sinks[("result", "markdown")].pieces) == "# T\n" * 50
+
+
+@pytest.mark.parametrize("text", ['{"a": 1', '[1,]', '{"a" 1}', '[1}', '{"a": 1}}'])
+def test_invalid_documents_raise(text):
+    with pytest.raises(JSONStreamError):
+        parse_json_stream([text])